@@ -0,0 +1,191 @@
+"""
+Configuración de la aplicación leída desde variables de entorno
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Directorio de la aplicación (backend/app): base de las rutas relativas
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def env_bool(nombre: str, default: bool = False) -> bool:
+    """Leer una variable de entorno como booleano"""
+    valor = os.getenv(nombre)
+    if valor is None:
+        return default
+    return valor.strip().lower() in ("1", "true", "yes", "si", "on")
+
+
+# ========================================
+# ARRANQUE
+# ========================================
+
+# "full": ejecuta Base.metadata.create_all al iniciar (comportamiento histórico)
+# "fast": no ejecuta DDL, solo verifica la versión del esquema
+STARTUP_MODE = os.getenv("STARTUP_MODE", "full").strip().lower()
+
+# Versión de esquema que requiere este código (ver database/schema_version.sql)
+SCHEMA_VERSION_REQUERIDA = 17
+
+# En modo "fast" el arranque falla si schema_version no existe o es menor a la
+# requerida; con true solo se advierte (p.ej. para levantar mientras se migra)
+STARTUP_OMITIR_VERIFICACION_ESQUEMA = env_bool("STARTUP_OMITIR_VERIFICACION_ESQUEMA", False)
+
+# Imprimir el desglose de tiempos de importación por módulo al arrancar
+STARTUP_PROFILE = env_bool("STARTUP_PROFILE", False)
+
+
+# ========================================
+# DIAGNÓSTICO
+# ========================================
+
+DEBUG = env_bool("DEBUG", False)
+
+# Instrumentación SQL por request (conteo de consultas, tiempo en BD, N+1)
+SQL_INSTRUMENTACION = env_bool("SQL_INSTRUMENTACION", True)
+
+# Repeticiones de una misma consulta SELECT en un request para marcarla como N+1
+SQL_UMBRAL_N_MAS_1 = int(os.getenv("SQL_UMBRAL_N_MAS_1", "5"))
+
+# Directorio compartido para agregar métricas entre workers (vacío = un proceso)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or None
+
+# Cada cuántos segundos vuelca cada worker sus métricas al directorio compartido
+METRICS_FLUSH_SEGUNDOS = float(os.getenv("METRICS_FLUSH_SEGUNDOS", "5"))
+
+# Consultas que superan este tiempo (ms) se registran con su EXPLAIN; 0 desactiva
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_EXPLAIN = env_bool("SLOW_QUERY_EXPLAIN", True)
+# Relativa a backend/app; cada worker escribe y rota su propio archivo (slow_queries.<pid>.log)
+SLOW_QUERY_LOG_FILE = os.path.join(DIRECTORIO_APP, os.getenv("SLOW_QUERY_LOG_FILE", "logs/slow_queries.log"))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+
+
+# ========================================
+# NUMERACIÓN DE DOCUMENTOS
+# ========================================
+
+def _parse_bloques(valor: str) -> dict:
+    bloques = {}
+    for par in valor.split(","):
+        if "=" in par:
+            prefijo, tamano = par.split("=", 1)
+            bloques[prefijo.strip().upper()] = max(1, int(tamano))
+    return bloques
+
+
+# Números pre-asignados por worker y serie, p.ej. "MOV=50,RES=20" (MySQL).
+# Con bloques > 1 los números siguen siendo únicos pero pueden no ser
+# correlativos entre workers y quedan huecos al reiniciar.
+SECUENCIA_BLOQUES = _parse_bloques(os.getenv("SECUENCIA_BLOQUES", ""))
+
+
+# ========================================
+# PLANIFICADOR DE TAREAS
+# ========================================
+
+def _parse_cron(valor: str) -> dict:
+    crons = {}
+    for par in valor.split(";"):
+        if "=" in par:
+            tarea, expresion = par.split("=", 1)
+            crons[tarea.strip()] = expresion.strip()
+    return crons
+
+
+# Ejecuta las tareas periódicas en segundo plano. Con varios workers solo
+# el que obtiene el lock GET_LOCK de MySQL (el líder) las programa.
+PLANIFICADOR_ACTIVO = env_bool("PLANIFICADOR_ACTIVO", True)
+
+# Cada cuántos segundos revisa el líder si hay tareas que ejecutar
+PLANIFICADOR_INTERVALO_SEGUNDOS = float(os.getenv("PLANIFICADOR_INTERVALO_SEGUNDOS", "30"))
+
+# Reemplaza la programación por defecto, p.ej. "reservas_vencidas=*/5 * * * *;lotes_vencidos=0 2 * * *"
+PLANIFICADOR_CRON = _parse_cron(os.getenv("PLANIFICADOR_CRON", ""))
+
+
+# ========================================
+# COLA DE TRABAJOS
+# ========================================
+
+# Segundos que un worker reserva un trabajo; lo renueva mientras trabaja
+COLA_LEASE_SEGUNDOS = int(os.getenv("COLA_LEASE_SEGUNDOS", "300"))
+
+# Espera base antes de reintentar un trabajo fallido (se duplica por intento)
+COLA_BACKOFF_SEGUNDOS = int(os.getenv("COLA_BACKOFF_SEGUNDOS", "30"))
+
+# Pausa de un worker cuando no hay trabajos pendientes
+COLA_INTERVALO_SEGUNDOS = float(os.getenv("COLA_INTERVALO_SEGUNDOS", "2"))
+
+# Hilos worker dentro del proceso de la API (0 = solo workers externos: python worker_trabajos.py)
+COLA_WORKERS_EN_PROCESO = int(os.getenv("COLA_WORKERS_EN_PROCESO", "0"))
+
+# Directorio de los archivos generados por los trabajos (PDF, ...)
+COLA_DIRECTORIO_ARCHIVOS = os.getenv("COLA_DIRECTORIO_ARCHIVOS", "storage/trabajos")
+
+
+# ========================================
+# EVENTOS EN VIVO (SSE)
+# ========================================
+
+# Publica alertas, cruces de stock mínimo y cambios de estado en /eventos/stream
+EVENTOS_ACTIVOS = env_bool("EVENTOS_ACTIVOS", True)
+
+# "memoria": un solo proceso. "db": varios workers comparten los eventos por
+# la tabla eventos_sistema, que cada worker lee con una consulta por intervalo
+EVENTOS_BROKER = os.getenv("EVENTOS_BROKER", "memoria").strip().lower()
+EVENTOS_INTERVALO_SEGUNDOS = float(os.getenv("EVENTOS_INTERVALO_SEGUNDOS", "1"))
+
+# Comentario keepalive en conexiones sin eventos (proxies cierran conexiones inactivas)
+EVENTOS_KEEPALIVE_SEGUNDOS = float(os.getenv("EVENTOS_KEEPALIVE_SEGUNDOS", "15"))
+
+# Eventos recientes en memoria para reenviar tras una reconexión (Last-Event-ID)
+EVENTOS_BUFFER = int(os.getenv("EVENTOS_BUFFER", "1000"))
+
+
+# ========================================
+# CONTEOS CÍCLICOS
+# ========================================
+
+# Conteos por año según la clase ABC, p.ej. "A=12,B=4,C=1" (SIN_MOVIMIENTO cuenta como C)
+CONTEO_CICLICO_FRECUENCIAS = {"A": 12, "B": 4, "C": 1, **_parse_bloques(os.getenv("CONTEO_CICLICO_FRECUENCIAS", ""))}
+
+# Productos con exactitud (%) bajo este umbral en el último año se cuentan el doble
+CONTEO_CICLICO_EXACTITUD_MINIMA = float(os.getenv("CONTEO_CICLICO_EXACTITUD_MINIMA", "95"))
+
+# Productos C con valor de inventario sobre este monto se cuentan como B
+CONTEO_CICLICO_VALOR_ALTO = float(os.getenv("CONTEO_CICLICO_VALOR_ALTO", "50000"))
+
+
+# ========================================
+# CACHE DE ESTADÍSTICAS
+# ========================================
+
+# Sirve las estadísticas de los dashboards (get_estadisticas_*) desde memoria
+ESTADISTICAS_CACHE_ACTIVA = env_bool("ESTADISTICAS_CACHE_ACTIVA", True)
+
+# Vigencia por defecto de una estadística calculada
+ESTADISTICAS_TTL_SEGUNDOS = float(os.getenv("ESTADISTICAS_TTL_SEGUNDOS", "60"))
+
+# Tras un cambio en sus tablas la estadística se recalcula a lo más cada
+# tantos segundos (evita recalcular en cada request con escrituras frecuentes)
+ESTADISTICAS_TTL_MINIMO_SEGUNDOS = float(os.getenv("ESTADISTICAS_TTL_MINIMO_SEGUNDOS", "5"))
+
+
+# ========================================
+# DASHBOARD COMPUESTO
+# ========================================
+
+# Widgets que se calculan a la vez, cada uno con su conexión del pool
+# (el pool por defecto admite 15 conexiones: dejar margen para los requests)
+DASHBOARD_HILOS = int(os.getenv("DASHBOARD_HILOS", "4"))
+
+# Plazo por widget si el request no indica otro; pasado el plazo el widget
+# se informa como TIMEOUT y MySQL corta sus consultas (MAX_EXECUTION_TIME)
+DASHBOARD_TIMEOUT_MS = int(os.getenv("DASHBOARD_TIMEOUT_MS", "3000"))
+DASHBOARD_TIMEOUT_MAXIMO_MS = int(os.getenv("DASHBOARD_TIMEOUT_MAXIMO_MS", "15000"))
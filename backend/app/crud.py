@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import Dict, List, Optional, Any
 import models, schemas
 import bcrypt
+import threading
 
 class TipoProductoCRUD:
 
@@ -633,7 +634,9 @@ class ProductoCRUD:
         if not db_producto:
             return None
 
+        delta = nuevo_stock - (db_producto.stock_actual or 0)
         db_producto.stock_actual = nuevo_stock
+        disponibilidad_crud.aplicar_deltas(db, [{"id_producto": producto_id, "id_ubicacion": 0, "en_mano": delta}])
         db.commit()
         db.refresh(db_producto)
         return db_producto
@@ -783,6 +786,8 @@ class ProductoUbicacionCRUD:
         """Crear nueva ubicación de producto"""
         db_ubicacion = models.ProductoUbicacion(**ubicacion.dict())
         db.add(db_ubicacion)
+        db.flush()
+        disponibilidad_crud.aplicar_deltas(db, disponibilidad_crud.deltas_ubicacion(db_ubicacion))
         db.commit()
         db.refresh(db_ubicacion)
         return db_ubicacion
@@ -793,10 +798,12 @@ class ProductoUbicacionCRUD:
         if not db_ubicacion:
             return None
 
+        deltas = disponibilidad_crud.deltas_ubicacion(db_ubicacion, signo=-1)
         update_data = ubicacion_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_ubicacion, field, value)
 
+        disponibilidad_crud.aplicar_deltas(db, deltas + disponibilidad_crud.deltas_ubicacion(db_ubicacion))
         db.commit()
         db.refresh(db_ubicacion)
         return db_ubicacion
@@ -807,6 +814,7 @@ class ProductoUbicacionCRUD:
         if not db_ubicacion:
             return False
 
+        disponibilidad_crud.aplicar_deltas(db, disponibilidad_crud.deltas_ubicacion(db_ubicacion, signo=-1))
         db_ubicacion.activo = False
         db.commit()
         return True
@@ -817,7 +825,9 @@ class ProductoUbicacionCRUD:
         if not db_ubicacion:
             return None
 
+        deltas = disponibilidad_crud.deltas_ubicacion(db_ubicacion, signo=-1)
         db_ubicacion.cantidad = nueva_cantidad
+        disponibilidad_crud.aplicar_deltas(db, deltas + disponibilidad_crud.deltas_ubicacion(db_ubicacion))
         db.commit()
         db.refresh(db_ubicacion)
         return db_ubicacion
@@ -890,7 +900,10 @@ class MovimientoInventarioCRUD:
 
     def create_movimiento(self, db: Session, movimiento: schemas.MovimientoInventarioCreate) -> models.MovimientoInventario:
         """Crear nuevo movimiento"""
-        db_movimiento = models.MovimientoInventario(**movimiento.dict())
+        datos = movimiento.dict()
+        if not datos.get("numero_movimiento"):
+            datos["numero_movimiento"] = secuencia_documento_crud.siguiente_numero(db, "MOV", datos.get("fecha_movimiento"))
+        db_movimiento = models.MovimientoInventario(**datos)
         db.add(db_movimiento)
         db.commit()
         db.refresh(db_movimiento)
@@ -931,39 +944,76 @@ class MovimientoInventarioCRUD:
             return None
 
         # Procesar cada detalle del movimiento
+        deltas = []
         for detalle in db_movimiento.detalles:
-            self._procesar_detalle_movimiento(db, detalle, db_movimiento.tipo_movimiento.afecta_stock)
+            deltas += self._procesar_detalle_movimiento(db, detalle, db_movimiento.tipo_movimiento.afecta_stock)
+
+        # Capas FIFO: las entradas agregan capas y las salidas las consumen
+        afecta_stock = db_movimiento.tipo_movimiento.afecta_stock
+        if afecta_stock in ('AUMENTA', 'DISMINUYE'):
+            lineas = [
+                {"id_producto": detalle.id_producto, "cantidad": detalle.cantidad,
+                 "costo_unitario": detalle.costo_unitario,
+                 "id_ubicacion": detalle.id_ubicacion_destino if afecta_stock == 'AUMENTA' else detalle.id_ubicacion_origen}
+                for detalle in db_movimiento.detalles
+            ]
+            if afecta_stock == 'AUMENTA':
+                capa_costo_crud.agregar_capas(db, lineas, "MOV", db_movimiento.numero_movimiento)
+            else:
+                capa_costo_crud.consumir(db, lineas, "MOV", db_movimiento.numero_movimiento)
+
+        # Las entradas por compra valorizadas actualizan el costo promedio
+        if db_movimiento.tipo_movimiento.codigo_tipo in costo_promedio_crud.TIPOS_ENTRADA_VALORIZADA:
+            costo_promedio_crud.aplicar_entradas(db, [
+                {"id_producto": detalle.id_producto, "cantidad": detalle.cantidad,
+                 "costo_unitario": detalle.costo_unitario}
+                for detalle in db_movimiento.detalles if detalle.costo_unitario
+            ], sumar_stock=False)
 
         db_movimiento.estado = 'PROCESADO'
+        disponibilidad_crud.aplicar_deltas(db, deltas)
         db.commit()
         db.refresh(db_movimiento)
+
+        from utils.metrics import MOVIMIENTOS_PROCESADOS
+        MOVIMIENTOS_PROCESADOS.inc()
         return db_movimiento
 
-    def _procesar_detalle_movimiento(self, db: Session, detalle: models.MovimientoDetalle, afecta_stock: str):
-        """Procesar un detalle de movimiento actualizando las ubicaciones"""
+    def _procesar_detalle_movimiento(self, db: Session, detalle: models.MovimientoDetalle, afecta_stock: str) -> List[Dict[str, Any]]:
+        """Procesar un detalle de movimiento actualizando las ubicaciones; retorna las variaciones de disponibilidad"""
+        deltas = []
+
+        def _sumar(ubicacion, cantidad):
+            anterior = ubicacion.cantidad
+            ubicacion.cantidad = max(0, anterior + cantidad)
+            deltas.append({"id_producto": ubicacion.id_producto, "id_ubicacion": ubicacion.id_ubicacion,
+                           "en_mano": ubicacion.cantidad - anterior})
+
         if afecta_stock == 'AUMENTA':
             if detalle.id_ubicacion_destino:
                 ubicacion = producto_ubicacion_crud.get_ubicacion(db, detalle.id_ubicacion_destino)
                 if ubicacion:
-                    ubicacion.cantidad += detalle.cantidad
+                    _sumar(ubicacion, detalle.cantidad)
 
         elif afecta_stock == 'DISMINUYE':
             if detalle.id_ubicacion_origen:
                 ubicacion = producto_ubicacion_crud.get_ubicacion(db, detalle.id_ubicacion_origen)
                 if ubicacion:
-                    ubicacion.cantidad = max(0, ubicacion.cantidad - detalle.cantidad)
+                    _sumar(ubicacion, -detalle.cantidad)
 
         elif afecta_stock == 'NO_AFECTA':
             # Para transferencias, quitar de origen y agregar a destino
             if detalle.id_ubicacion_origen:
                 ubicacion_origen = producto_ubicacion_crud.get_ubicacion(db, detalle.id_ubicacion_origen)
                 if ubicacion_origen:
-                    ubicacion_origen.cantidad = max(0, ubicacion_origen.cantidad - detalle.cantidad)
+                    _sumar(ubicacion_origen, -detalle.cantidad)
 
             if detalle.id_ubicacion_destino:
                 ubicacion_destino = producto_ubicacion_crud.get_ubicacion(db, detalle.id_ubicacion_destino)
                 if ubicacion_destino:
-                    ubicacion_destino.cantidad += detalle.cantidad
+                    _sumar(ubicacion_destino, detalle.cantidad)
+
+        return deltas
 
 class MovimientoDetalleCRUD:
 
@@ -1058,6 +1108,16 @@ class LoteCRUD:
             models.Lote.estado != 'VENCIDO'
         ).all()
 
+    def marcar_vencidos(self, db: Session) -> int:
+        """Marcar como VENCIDO los lotes activos o en cuarentena con fecha de vencimiento pasada"""
+        from datetime import date
+        count = (db.query(models.Lote)
+                 .filter(models.Lote.fecha_vencimiento < date.today(),
+                         models.Lote.estado.in_(["ACTIVO", "CUARENTENA"]))
+                 .update({models.Lote.estado: "VENCIDO"}, synchronize_session=False))
+        db.commit()
+        return count
+
     def get_lotes_por_vencer(self, db: Session, dias: int = 30) -> List[models.Lote]:
         """Obtener lotes que vencen en X días"""
         from datetime import date, timedelta
@@ -1106,6 +1166,86 @@ class LoteCRUD:
         db.refresh(db_lote)
         return db_lote
 
+    def asignar_lotes(self, db: Session, lineas: List[Dict[str, Any]], criterio: str = "FEFO",
+                      simular: bool = False, permitir_parcial: bool = False, commit: bool = True) -> Dict[str, Any]:
+        """Asignar lotes a varias líneas (producto, cantidad) en una sola pasada
+
+        Lee con una consulta los lotes ACTIVOS no vencidos de todos los productos,
+        bloqueándolos (FOR UPDATE) salvo en simulación, reparte por FEFO
+        (vencimiento, los sin vencimiento al final) o FIFO (fecha_creacion) y
+        descuenta con un único UPDATE ejecutado por lotes (executemany).
+        """
+        from sqlalchemy import bindparam, case, update
+
+        ids_producto = sorted({linea["id_producto"] for linea in lineas})
+        query = db.query(models.Lote).filter(
+            models.Lote.id_producto.in_(ids_producto),
+            models.Lote.estado == 'ACTIVO',
+            models.Lote.cantidad_actual > 0,
+            or_(models.Lote.fecha_vencimiento.is_(None), models.Lote.fecha_vencimiento >= date.today())
+        )
+        if criterio == "FEFO":
+            orden = [models.Lote.fecha_vencimiento.is_(None), models.Lote.fecha_vencimiento, models.Lote.fecha_creacion]
+        else:
+            orden = [models.Lote.fecha_creacion]
+        query = query.order_by(models.Lote.id_producto, *orden, models.Lote.id_lote)
+        if not simular:
+            query = query.with_for_update()
+
+        lotes_por_producto: Dict[int, List[models.Lote]] = {}
+        saldo: Dict[int, int] = {}
+        for lote in query:
+            lotes_por_producto.setdefault(lote.id_producto, []).append(lote)
+            saldo[lote.id_lote] = lote.cantidad_actual
+
+        plan, descuentos = [], {}
+        for linea in lineas:
+            pendiente = linea["cantidad"]
+            picks = []
+            for lote in lotes_por_producto.get(linea["id_producto"], []):
+                if pendiente <= 0:
+                    break
+                tomar = min(pendiente, saldo[lote.id_lote])
+                if tomar <= 0:
+                    continue
+                saldo[lote.id_lote] -= tomar
+                descuentos[lote.id_lote] = descuentos.get(lote.id_lote, 0) + tomar
+                pendiente -= tomar
+                picks.append({"id_lote": lote.id_lote, "numero_lote": lote.numero_lote,
+                              "fecha_vencimiento": lote.fecha_vencimiento, "cantidad": tomar})
+            plan.append({"id_producto": linea["id_producto"], "cantidad_solicitada": linea["cantidad"],
+                         "cantidad_asignada": linea["cantidad"] - pendiente, "lotes": picks})
+
+        completo = all(item["cantidad_asignada"] == item["cantidad_solicitada"] for item in plan)
+        if not completo and not permitir_parcial and not simular:
+            faltantes = ", ".join(
+                f"producto {item['id_producto']} ({item['cantidad_solicitada'] - item['cantidad_asignada']})"
+                for item in plan if item["cantidad_asignada"] < item["cantidad_solicitada"]
+            )
+            # Con commit=False la transacción es del llamador: solo se informa
+            if commit:
+                db.rollback()
+            raise ValueError(f"Stock en lotes insuficiente: {faltantes}")
+
+        if not simular and descuentos:
+            # estado antes que cantidad: MySQL evalúa el SET de izquierda a derecha
+            tabla = models.Lote.__table__
+            db.execute(
+                update(tabla).where(tabla.c.id_lote == bindparam("b_id_lote")).ordered_values(
+                    (tabla.c.estado, case((tabla.c.cantidad_actual - bindparam("b_cantidad") <= 0, 'AGOTADO'),
+                                          else_=tabla.c.estado)),
+                    (tabla.c.cantidad_actual, tabla.c.cantidad_actual - bindparam("b_cantidad")),
+                ),
+                [{"b_id_lote": id_lote, "b_cantidad": cantidad} for id_lote, cantidad in descuentos.items()]
+            )
+            if commit:
+                db.commit()
+            else:
+                db.flush()
+
+        return {"criterio": criterio, "simulado": simular, "completo": completo,
+                "lineas": plan, "lotes_actualizados": 0 if simular else len(descuentos)}
+
     def delete_lote(self, db: Session, lote_id: int) -> bool:
         """Eliminar lote (verificar que no tenga números de serie)"""
         db_lote = self.get_lote(db, lote_id)
@@ -1205,33 +1345,121 @@ class NumeroSerieCRUD:
         db.refresh(db_numero_serie)
         return db_numero_serie
 
-    def reservar_numero_serie(self, db: Session, serie_id: int, cliente: str) -> Optional[models.NumeroSerie]:
-        """Reservar número de serie para un cliente"""
-        db_numero_serie = self.get_numero_serie(db, serie_id)
-        if not db_numero_serie or db_numero_serie.estado != 'DISPONIBLE':
+    def _cambiar_estado_condicional(self, db: Session, serie_id: int, estados_origen: List[str], valores: Dict[str, Any]) -> Optional[models.NumeroSerie]:
+        """UPDATE ... WHERE estado IN (...): dos operadores no pueden tomar la misma serie"""
+        actualizados = db.query(models.NumeroSerie).filter(
+            models.NumeroSerie.id_serie == serie_id,
+            models.NumeroSerie.estado.in_(estados_origen)
+        ).update(valores, synchronize_session=False)
+        db.commit()
+        if not actualizados:
             return None
+        return self.get_numero_serie(db, serie_id)
 
-        db_numero_serie.estado = 'RESERVADO'
-        db_numero_serie.cliente_asignado = cliente
-
-        db.commit()
-        db.refresh(db_numero_serie)
-        return db_numero_serie
+    def reservar_numero_serie(self, db: Session, serie_id: int, cliente: str) -> Optional[models.NumeroSerie]:
+        """Reservar número de serie para un cliente"""
+        return self._cambiar_estado_condicional(
+            db, serie_id, ['DISPONIBLE'], {"estado": 'RESERVADO', "cliente_asignado": cliente}
+        )
 
     def vender_numero_serie(self, db: Session, serie_id: int, cliente: str, fecha_venta: Optional[date] = None) -> Optional[models.NumeroSerie]:
         """Marcar número de serie como vendido"""
+        return self._cambiar_estado_condicional(
+            db, serie_id, ['DISPONIBLE', 'RESERVADO'],
+            {"estado": 'VENDIDO', "cliente_asignado": cliente, "fecha_venta": fecha_venta or date.today()}
+        )
 
-        db_numero_serie = self.get_numero_serie(db, serie_id)
-        if not db_numero_serie or db_numero_serie.estado not in ['DISPONIBLE', 'RESERVADO']:
-            return None
+    def asignar_numeros_serie(self, db: Session, id_producto: int, cantidad: int, nuevo_estado: str = 'RESERVADO',
+                              cliente: Optional[str] = None, id_lote: Optional[int] = None,
+                              id_ubicacion: Optional[int] = None, fecha_venta: Optional[date] = None,
+                              commit: bool = True) -> List[Dict[str, Any]]:
+        """Tomar `cantidad` series DISPONIBLES y cambiarlas de estado en bloque
+
+        Las filas se eligen con FOR UPDATE SKIP LOCKED: dos despachos
+        simultáneos reciben series distintas sin esperarse entre sí.
+        """
+        if nuevo_estado not in ('RESERVADO', 'VENDIDO'):
+            raise ValueError("El estado destino debe ser RESERVADO o VENDIDO")
+
+        query = db.query(models.NumeroSerie.id_serie, models.NumeroSerie.numero_serie).filter(
+            models.NumeroSerie.id_producto == id_producto,
+            models.NumeroSerie.estado == 'DISPONIBLE'
+        )
+        if id_lote:
+            query = query.filter(models.NumeroSerie.id_lote == id_lote)
+        if id_ubicacion:
+            query = query.filter(models.NumeroSerie.id_ubicacion == id_ubicacion)
+        seleccion = (query.order_by(models.NumeroSerie.fecha_ingreso, models.NumeroSerie.numero_serie)
+                     .limit(cantidad).with_for_update(skip_locked=True).all())
+
+        if len(seleccion) < cantidad:
+            db.rollback()
+            raise ValueError(f"Solo hay {len(seleccion)} números de serie disponibles de {cantidad} solicitados")
+
+        valores = {"estado": nuevo_estado, "cliente_asignado": cliente}
+        if nuevo_estado == 'VENDIDO':
+            valores["fecha_venta"] = fecha_venta or date.today()
+        ids = [fila.id_serie for fila in seleccion]
+        for inicio in range(0, len(ids), 1000):
+            db.query(models.NumeroSerie).filter(
+                models.NumeroSerie.id_serie.in_(ids[inicio:inicio + 1000])
+            ).update(valores, synchronize_session=False)
+
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        return [{"id_serie": fila.id_serie, "numero_serie": fila.numero_serie} for fila in seleccion]
 
-        db_numero_serie.estado = 'VENDIDO'
-        db_numero_serie.cliente_asignado = cliente
-        db_numero_serie.fecha_venta = fecha_venta or date.today()
+    MAX_RANGO_SERIES = 10000
 
-        db.commit()
-        db.refresh(db_numero_serie)
-        return db_numero_serie
+    def expandir_rango(self, rango: str) -> List[str]:
+        """Expandir 'EXT-000100..EXT-000400' a la lista de números (ancho del número inicial)"""
+        import re
+
+        coincidencia = re.fullmatch(r"\s*(.*?)(\d+)\s*\.\.\s*(.*?)(\d+)\s*", rango)
+        if not coincidencia:
+            raise ValueError("Formato de rango inválido, use PREFIJO-INICIO..PREFIJO-FIN")
+        prefijo, inicio, prefijo_fin, fin = coincidencia.groups()
+        if prefijo_fin and prefijo_fin != prefijo:
+            raise ValueError("El inicio y el fin del rango deben tener el mismo prefijo")
+        desde, hasta = int(inicio), int(fin)
+        if hasta < desde:
+            raise ValueError("El fin del rango debe ser mayor o igual al inicio")
+        if hasta - desde + 1 > self.MAX_RANGO_SERIES:
+            raise ValueError(f"El rango no puede superar {self.MAX_RANGO_SERIES} números de serie")
+        ancho = len(inicio)
+        return [f"{prefijo}{numero:0{ancho}d}" for numero in range(desde, hasta + 1)]
+
+    def registrar_rango(self, db: Session, id_producto: int, rango: str, fecha_ingreso: Optional[date] = None,
+                        id_lote: Optional[int] = None, id_ubicacion: Optional[int] = None,
+                        omitir_existentes: bool = False) -> Dict[str, Any]:
+        """Registrar un rango de números de serie en la recepción con un solo INSERT por bloque"""
+        numeros = self.expandir_rango(rango)
+
+        existentes = set()
+        for inicio in range(0, len(numeros), 1000):
+            existentes.update(
+                numero for (numero,) in db.query(models.NumeroSerie.numero_serie).filter(
+                    models.NumeroSerie.id_producto == id_producto,
+                    models.NumeroSerie.numero_serie.in_(numeros[inicio:inicio + 1000])
+                )
+            )
+        if existentes and not omitir_existentes:
+            muestra = ", ".join(sorted(existentes)[:10])
+            raise ValueError(f"{len(existentes)} números de serie ya existen para el producto: {muestra}")
+
+        filas = [
+            {"id_producto": id_producto, "numero_serie": numero, "id_lote": id_lote, "id_ubicacion": id_ubicacion,
+             "fecha_ingreso": fecha_ingreso or date.today(), "estado": 'DISPONIBLE'}
+            for numero in numeros if numero not in existentes
+        ]
+        tabla = models.NumeroSerie.__table__
+        for inicio in range(0, len(filas), 1000):
+            db.execute(tabla.insert(), filas[inicio:inicio + 1000])
+        db.commit()
+        return {"registrados": len(filas), "omitidos": len(existentes),
+                "primero": numeros[0], "ultimo": numeros[-1]}
 
     def liberar_numero_serie(self, db: Session, serie_id: int) -> Optional[models.NumeroSerie]:
         """Liberar número de serie (volver a disponible)"""
@@ -1873,12 +2101,231 @@ class DespachosObraCRUD:
 
     def create_despacho(self, db: Session, despacho: schemas.DespachosObraCreate) -> models.DespachosObra:
         """Crear nuevo despacho"""
-        db_despacho = models.DespachosObra(**despacho.dict())
+        datos = despacho.dict()
+        if not datos.get("numero_despacho"):
+            datos["numero_despacho"] = secuencia_documento_crud.siguiente_numero(db, "DSP", datos.get("fecha_despacho"))
+        db_despacho = models.DespachosObra(**datos)
         db.add(db_despacho)
         db.commit()
         db.refresh(db_despacho)
         return db_despacho
 
+    def ingresar_en_obra(self, db: Session, id_obra: int, lineas: List[Dict[str, Any]], referencia: str) -> None:
+        """Sumar al stock de obra líneas (id_producto, cantidad, costo_unitario) y ponderar su costo, sin commit"""
+        from sqlalchemy import Numeric, bindparam, case, update
+
+        inventario_obra_crud.aplicar_cambios_stock(db, [
+            {"id_obra": id_obra, "id_producto": linea["id_producto"], "cantidad_cambio": linea["cantidad"],
+             "motivo": "Despacho a obra", "referencia": referencia}
+            for linea in lineas
+        ], commit=False)
+
+        # Costo promedio ponderado: la cantidad previa es la actual menos lo recién ingresado
+        por_producto: Dict[int, List[Any]] = {}
+        for linea in lineas:
+            acumulado = por_producto.setdefault(linea["id_producto"], [0, 0])
+            acumulado[0] += linea["cantidad"]
+            acumulado[1] += linea["cantidad"] * (linea["costo_unitario"] or 0)
+        tabla = models.InventarioObra.__table__
+        # Tipado: sqlite3 no acepta Decimal como parámetro
+        costo = bindparam("b_costo", type_=Numeric(15, 4))
+        previa = tabla.c.cantidad_actual - bindparam("b_cantidad")
+        db.execute(
+            update(tabla).where(and_(
+                tabla.c.id_obra == bindparam("b_id_obra"),
+                tabla.c.id_producto == bindparam("b_id_producto"),
+                tabla.c.cantidad_actual > 0
+            )).values(costo_promedio=(
+                case((previa > 0, previa * func.coalesce(tabla.c.costo_promedio, costo)), else_=0)
+                + bindparam("b_cantidad") * costo
+            ) / tabla.c.cantidad_actual),
+            [{"b_id_obra": id_obra, "b_id_producto": id_producto, "b_cantidad": cantidad,
+              "b_costo": costo_total / cantidad}
+             for id_producto, (cantidad, costo_total) in por_producto.items()]
+        )
+
+    def despachar_masivo(self, db: Session, solicitud: schemas.DespachoMasivoCreate) -> Dict[str, Any]:
+        """Crear un despacho completo en una sola transacción
+
+        Etapas: validación de stock (bloqueando productos y ubicaciones),
+        cabecera, detalle en bloque, descuento en bodega, ingreso a obra,
+        movimiento DSO en el kardex y disponibilidad. Cada etapa usa una
+        sentencia por tabla (executemany) y se informa su duración.
+        """
+        from sqlalchemy import bindparam, update
+        from utils.cronometro import Cronometro
+        from utils.startup import requerir_migracion
+
+        # Con el trigger por fila aún activo el stock se descontaría dos veces
+        requerir_migracion(db, 5, "despachos_masivos.sql")
+
+        cronometro = Cronometro()
+        datos = solicitud.model_dump()
+        lineas = datos.pop("lineas")
+        cantidades: Dict[int, int] = {}
+        for linea in lineas:
+            cantidades[linea["id_producto"]] = cantidades.get(linea["id_producto"], 0) + linea["cantidad"]
+        ids_producto = sorted(cantidades)
+
+        try:
+            # 1. Validación, bloqueando en orden de id para evitar deadlocks
+            tipo_dso = db.query(models.TipoMovimiento).filter(models.TipoMovimiento.codigo_tipo == "DSO").first()
+            if not tipo_dso:
+                raise ValueError("No existe el tipo de movimiento DSO (Despacho a Obra)")
+            if not db.query(models.Obra.id_obra).filter(models.Obra.id_obra == datos["id_obra"]).first():
+                raise ValueError(f"La obra con ID {datos['id_obra']} no existe")
+
+            productos = {
+                fila.id_producto: fila for fila in
+                db.query(models.Producto.id_producto, models.Producto.stock_actual, models.Producto.costo_promedio)
+                .filter(models.Producto.id_producto.in_(ids_producto))
+                .order_by(models.Producto.id_producto).with_for_update()
+            }
+            no_encontrados = [str(i) for i in ids_producto if i not in productos]
+            if no_encontrados:
+                raise ValueError(f"Productos no encontrados: {', '.join(no_encontrados)}")
+            insuficientes = [
+                f"producto {i} (stock {productos[i].stock_actual or 0}, solicitado {cantidades[i]})"
+                for i in ids_producto if (productos[i].stock_actual or 0) < cantidades[i]
+            ]
+            if insuficientes:
+                raise ValueError(f"Stock insuficiente: {'; '.join(insuficientes)}")
+
+            ubicaciones: Dict[int, List[int]] = {}
+            saldo: Dict[int, int] = {}
+            for fila in (db.query(models.ProductoUbicacion.id_ubicacion, models.ProductoUbicacion.id_producto,
+                                  models.ProductoUbicacion.cantidad)
+                         .filter(models.ProductoUbicacion.id_producto.in_(ids_producto),
+                                 models.ProductoUbicacion.activo == True,
+                                 models.ProductoUbicacion.cantidad > 0)
+                         .order_by(models.ProductoUbicacion.id_ubicacion).with_for_update()):
+                ubicaciones.setdefault(fila.id_producto, []).append(fila.id_ubicacion)
+                saldo[fila.id_ubicacion] = fila.cantidad
+            cronometro.etapa("validacion")
+
+            # 2. Cabecera
+            if not datos.get("numero_despacho"):
+                datos["numero_despacho"] = secuencia_documento_crud.siguiente_numero(db, "DSP", datos.get("fecha_despacho"))
+            db_despacho = models.DespachosObra(**datos)
+            db.add(db_despacho)
+            db.flush()
+            cronometro.etapa("cabecera")
+
+            # 3. Detalle en bloque
+            filas_detalle = []
+            for linea in lineas:
+                costo = linea["costo_unitario"]
+                if costo is None:
+                    costo = productos[linea["id_producto"]].costo_promedio or 0
+                filas_detalle.append({
+                    "id_despacho": db_despacho.id_despacho, "id_producto": linea["id_producto"],
+                    "cantidad_despachada": linea["cantidad"], "id_lote": linea["id_lote"],
+                    "numeros_serie": linea["numeros_serie"], "costo_unitario": costo,
+                    "costo_total": round(costo * linea["cantidad"], 2), "es_herramienta": linea["es_herramienta"],
+                    "requiere_devolucion_obligatoria": linea["requiere_devolucion_obligatoria"],
+                    "observaciones": linea["observaciones"],
+                })
+            db.execute(models.DespachosObraDetalle.__table__.insert(), filas_detalle)
+            cronometro.etapa("detalle")
+
+            # 4. Descuento en bodega: ubicación preferida primero, luego las de más stock
+            picks = []
+            for linea, detalle in zip(lineas, filas_detalle):
+                pendiente = linea["cantidad"]
+                candidatas = sorted(ubicaciones.get(linea["id_producto"], []),
+                                    key=lambda u: (u != linea["id_ubicacion_origen"], -saldo[u]))
+                for id_ubicacion in candidatas:
+                    if pendiente <= 0:
+                        break
+                    tomar = min(pendiente, saldo[id_ubicacion])
+                    if tomar <= 0:
+                        continue
+                    saldo[id_ubicacion] -= tomar
+                    pendiente -= tomar
+                    picks.append((detalle, id_ubicacion, tomar))
+                if pendiente > 0:
+                    # Stock del producto sin ubicación registrada
+                    picks.append((detalle, None, pendiente))
+
+            tabla_productos = models.Producto.__table__
+            db.execute(
+                update(tabla_productos).where(tabla_productos.c.id_producto == bindparam("b_id"))
+                .values(stock_actual=tabla_productos.c.stock_actual - bindparam("b_cantidad")),
+                [{"b_id": id_producto, "b_cantidad": cantidad} for id_producto, cantidad in cantidades.items()]
+            )
+            por_ubicacion: Dict[int, int] = {}
+            for _, id_ubicacion, cantidad in picks:
+                if id_ubicacion:
+                    por_ubicacion[id_ubicacion] = por_ubicacion.get(id_ubicacion, 0) + cantidad
+            if por_ubicacion:
+                tabla_ubicaciones = models.ProductoUbicacion.__table__
+                db.execute(
+                    update(tabla_ubicaciones).where(tabla_ubicaciones.c.id_ubicacion == bindparam("b_id"))
+                    .values(cantidad=tabla_ubicaciones.c.cantidad - bindparam("b_cantidad")),
+                    [{"b_id": id_ubicacion, "b_cantidad": cantidad} for id_ubicacion, cantidad in por_ubicacion.items()]
+                )
+            cronometro.etapa("stock_bodega")
+
+            capa_costo_crud.consumir(db, [
+                {"id_producto": detalle["id_producto"], "cantidad": cantidad, "id_ubicacion": id_ubicacion}
+                for detalle, id_ubicacion, cantidad in picks
+            ], "DSP", datos["numero_despacho"], id_obra=datos["id_obra"])
+            cronometro.etapa("capas_costo")
+
+            # 5. Ingreso a obra
+            self.ingresar_en_obra(db, datos["id_obra"], [
+                {"id_producto": detalle["id_producto"], "cantidad": detalle["cantidad_despachada"],
+                 "costo_unitario": detalle["costo_unitario"]}
+                for detalle in filas_detalle
+            ], datos["numero_despacho"])
+            cronometro.etapa("stock_obra")
+
+            # 6. Kardex: movimiento DSO ya procesado
+            db_movimiento = models.MovimientoInventario(
+                id_tipo_movimiento=tipo_dso.id_tipo_movimiento,
+                numero_movimiento=secuencia_documento_crud.siguiente_numero(db, "MOV", datos["fecha_despacho"]),
+                fecha_movimiento=datetime.now(),
+                id_usuario=datos["id_usuario_despacha"],
+                motivo=f"Despacho {datos['numero_despacho']} a obra {datos['id_obra']}",
+                estado="PROCESADO"
+            )
+            db.add(db_movimiento)
+            db.flush()
+            db.execute(models.MovimientoDetalle.__table__.insert(), [
+                {"id_movimiento": db_movimiento.id_movimiento, "id_producto": detalle["id_producto"],
+                 "id_ubicacion_origen": id_ubicacion, "id_ubicacion_destino": None, "cantidad": cantidad,
+                 "costo_unitario": detalle["costo_unitario"],
+                 "costo_total": round(detalle["costo_unitario"] * cantidad, 2), "observaciones": None}
+                for detalle, id_ubicacion, cantidad in picks
+            ])
+            cronometro.etapa("kardex")
+
+            # 7. Disponibilidad
+            disponibilidad_crud.aplicar_deltas(
+                db,
+                [{"id_producto": i, "id_ubicacion": 0, "en_mano": -cantidades[i]} for i in ids_producto]
+                + [{"id_producto": detalle["id_producto"], "id_ubicacion": id_ubicacion, "en_mano": -cantidad}
+                   for detalle, id_ubicacion, cantidad in picks if id_ubicacion]
+            )
+            cronometro.etapa("disponibilidad")
+
+            db.commit()
+            cronometro.etapa("commit")
+        except Exception:
+            db.rollback()
+            raise
+
+        return {
+            "id_despacho": db_despacho.id_despacho,
+            "numero_despacho": datos["numero_despacho"],
+            "id_movimiento": db_movimiento.id_movimiento,
+            "numero_movimiento": db_movimiento.numero_movimiento,
+            "lineas": len(lineas),
+            "unidades": sum(cantidades.values()),
+            "etapas_ms": cronometro.etapas,
+            "total_ms": cronometro.total_ms,
+        }
+
     def update_despacho(self, db: Session, despacho_id: int, despacho_update: schemas.DespachosObraUpdate) -> Optional[models.DespachosObra]:
         """Actualizar despacho"""
         db_despacho = self.get_despacho(db, despacho_id)
@@ -2019,9 +2466,32 @@ class DespachosObraDetalleCRUD:
                 .all())
 
     def create_detalle(self, db: Session, detalle: schemas.DespachosObraDetalleCreate) -> models.DespachosObraDetalle:
-        """Crear nuevo detalle de despacho"""
+        """Crear nuevo detalle de despacho (descuenta stock de bodega y lo suma a la obra)"""
+        from utils.startup import requerir_migracion
+
+        requerir_migracion(db, 5, "despachos_masivos.sql")
+        db_despacho = despachos_obra_crud.get_despacho(db, detalle.id_despacho)
+        if not db_despacho:
+            raise ValueError(f"El despacho con ID {detalle.id_despacho} no existe")
+
         db_detalle = models.DespachosObraDetalle(**detalle.dict())
         db.add(db_detalle)
+
+        # Efectos que antes aplicaba el trigger tr_after_despacho_detail_insert
+        db.query(models.Producto).filter(models.Producto.id_producto == detalle.id_producto).update(
+            {models.Producto.stock_actual: models.Producto.stock_actual - detalle.cantidad_despachada},
+            synchronize_session=False
+        )
+        despachos_obra_crud.ingresar_en_obra(db, db_despacho.id_obra, [{
+            "id_producto": detalle.id_producto, "cantidad": detalle.cantidad_despachada,
+            "costo_unitario": detalle.costo_unitario
+        }], db_despacho.numero_despacho)
+        capa_costo_crud.consumir(db, [
+            {"id_producto": detalle.id_producto, "cantidad": detalle.cantidad_despachada}
+        ], "DSP", db_despacho.numero_despacho, id_obra=db_despacho.id_obra)
+        disponibilidad_crud.aplicar_deltas(db, [
+            {"id_producto": detalle.id_producto, "id_ubicacion": 0, "en_mano": -detalle.cantidad_despachada}
+        ])
         db.commit()
         db.refresh(db_detalle)
         return db_detalle
@@ -2203,7 +2673,10 @@ class DevolucionesObraCRUD:
 
     def create_devolucion(self, db: Session, devolucion: schemas.DevolucionesObraCreate) -> models.DevolucionesObra:
         """Crear nueva devolución"""
-        db_devolucion = models.DevolucionesObra(**devolucion.dict())
+        datos = devolucion.dict()
+        if not datos.get("numero_devolucion"):
+            datos["numero_devolucion"] = secuencia_documento_crud.siguiente_numero(db, "DEV", datos.get("fecha_devolucion"))
+        db_devolucion = models.DevolucionesObra(**datos)
         db.add(db_devolucion)
         db.commit()
         db.refresh(db_devolucion)
@@ -2595,37 +3068,102 @@ class InventarioObraCRUD:
         db.commit()
         return True
 
-    def actualizar_stock(self, db: Session, id_obra: int, id_producto: int, cantidad_cambio: int, motivo: str = None) -> Optional[models.InventarioObra]:
-        """Actualizar stock de un producto en obra"""
-        from datetime import datetime
+    def aplicar_cambios_stock(self, db: Session, cambios: List[Dict[str, Any]], commit: bool = True) -> int:
+        """Aplicar muchos cambios (id_obra, id_producto, cantidad_cambio) en una transacción
 
-        db_inventario = self.get_inventario_by_obra_producto(db, id_obra, id_producto)
-        if not db_inventario:
-            # Crear nuevo registro si no existe
-            db_inventario = models.InventarioObra(
-                id_obra=id_obra,
-                id_producto=id_producto,
-                cantidad_actual=max(0, cantidad_cambio),
-                fecha_ultimo_movimiento=datetime.now()
-            )
-            if motivo:
-                db_inventario.observaciones = f"Creado: {motivo}"
-            db.add(db_inventario)
+        El stock se actualiza en la base con cantidad_actual + delta (sin leer
+        la fila antes), creando los registros que falten con un upsert. Cada
+        cambio queda en inventario_obra_historial. Retorna los pares
+        obra-producto afectados.
+        """
+        from datetime import datetime
+        from sqlalchemy import bindparam, case, select, update
+        from utils.upsert import upsert
+
+        acumulado: Dict[tuple, int] = {}
+        for cambio in cambios:
+            clave = (cambio["id_obra"], cambio["id_producto"])
+            acumulado[clave] = acumulado.get(clave, 0) + cambio["cantidad_cambio"]
+        if not acumulado:
+            return 0
+
+        ahora = datetime.now()
+        tabla = models.InventarioObra.__table__
+        filas = [
+            {"id_obra": id_obra, "id_producto": id_producto, "cantidad_actual": max(0, delta),
+             "delta": delta, "fecha_ultimo_movimiento": ahora}
+            for (id_obra, id_producto), delta in acumulado.items()
+        ]
+
+        def _nueva_cantidad(delta):
+            return case((tabla.c.cantidad_actual + delta < 0, 0), else_=tabla.c.cantidad_actual + delta)
+
+        # El delta viaja en la columna cantidad_actual del INSERT solo cuando la
+        # fila no existe; en el UPDATE se usa el delta real (puede ser negativo)
+        sin_upsert = not upsert(
+            db, tabla,
+            [{**{k: v for k, v in fila.items() if k != "delta"}, "cantidad_actual": fila["delta"]} for fila in filas],
+            ["id_obra", "id_producto"],
+            lambda nuevos: {
+                "cantidad_actual": _nueva_cantidad(nuevos.cantidad_actual),
+                "fecha_ultimo_movimiento": nuevos.fecha_ultimo_movimiento,
+            }
+        )
+        if sin_upsert:
+            existentes = set(db.execute(
+                select(tabla.c.id_obra, tabla.c.id_producto).where(
+                    tabla.c.id_obra.in_({fila["id_obra"] for fila in filas}),
+                    tabla.c.id_producto.in_({fila["id_producto"] for fila in filas})
+                )
+            ).all())
+            nuevas = [fila for fila in filas if (fila["id_obra"], fila["id_producto"]) not in existentes]
+            previas = [fila for fila in filas if (fila["id_obra"], fila["id_producto"]) in existentes]
+            if previas:
+                db.execute(
+                    update(tabla).where(and_(
+                        tabla.c.id_obra == bindparam("b_id_obra"), tabla.c.id_producto == bindparam("b_id_producto")
+                    )).values(cantidad_actual=_nueva_cantidad(bindparam("b_delta")), fecha_ultimo_movimiento=ahora),
+                    [{"b_id_obra": f["id_obra"], "b_id_producto": f["id_producto"], "b_delta": f["delta"]} for f in previas]
+                )
+            if nuevas:
+                db.execute(tabla.insert(), [{k: v for k, v in fila.items() if k != "delta"} for fila in nuevas])
+        elif any(fila["delta"] < 0 for fila in filas):
+            # Un upsert que inserta con delta negativo deja la fila en negativo: normalizar
+            negativos = [fila for fila in filas if fila["delta"] < 0]
+            db.execute(update(tabla).where(
+                tabla.c.cantidad_actual < 0,
+                tabla.c.id_obra.in_({fila["id_obra"] for fila in negativos}),
+                tabla.c.id_producto.in_({fila["id_producto"] for fila in negativos})
+            ).values(cantidad_actual=0))
+
+        db.execute(models.InventarioObraHistorial.__table__.insert(), [
+            {"id_obra": cambio["id_obra"], "id_producto": cambio["id_producto"],
+             "cantidad_cambio": cambio["cantidad_cambio"], "motivo": (cambio.get("motivo") or "")[:200] or None,
+             "referencia": cambio.get("referencia"), "fecha": ahora}
+            for cambio in cambios
+        ])
+
+        if commit:
+            db.commit()
         else:
-            # Actualizar existente
-            nueva_cantidad = db_inventario.cantidad_actual + cantidad_cambio
-            db_inventario.cantidad_actual = max(0, nueva_cantidad)
-            db_inventario.fecha_ultimo_movimiento = datetime.now()
-
-            if motivo:
-                if db_inventario.observaciones:
-                    db_inventario.observaciones += f"\n{datetime.now().strftime('%Y-%m-%d %H:%M')}: {motivo}"
-                else:
-                    db_inventario.observaciones = f"{datetime.now().strftime('%Y-%m-%d %H:%M')}: {motivo}"
+            db.flush()
+        return len(acumulado)
 
-        db.commit()
-        db.refresh(db_inventario)
-        return db_inventario
+    def actualizar_stock(self, db: Session, id_obra: int, id_producto: int, cantidad_cambio: int, motivo: str = None) -> Optional[models.InventarioObra]:
+        """Actualizar stock de un producto en obra"""
+        self.aplicar_cambios_stock(db, [{
+            "id_obra": id_obra, "id_producto": id_producto, "cantidad_cambio": cantidad_cambio, "motivo": motivo
+        }])
+        return self.get_inventario_by_obra_producto(db, id_obra, id_producto)
+
+    def get_historial(self, db: Session, id_obra: int, id_producto: Optional[int] = None,
+                      skip: int = 0, limit: int = 100) -> List[models.InventarioObraHistorial]:
+        """Historial de cambios de stock de una obra, más recientes primero"""
+        query = db.query(models.InventarioObraHistorial).filter(models.InventarioObraHistorial.id_obra == id_obra)
+        if id_producto:
+            query = query.filter(models.InventarioObraHistorial.id_producto == id_producto)
+        return (query.order_by(models.InventarioObraHistorial.fecha.desc(), models.InventarioObraHistorial.id_historial.desc())
+                .offset(skip).limit(limit).all())
 
     def asignar_herramienta(self, db: Session, inventario_id: int, responsable: str, ubicacion: str = None) -> Optional[models.InventarioObra]:
         """Asignar herramienta a responsable"""
@@ -2826,8 +3364,13 @@ class ReservasCRUD:
 
     def create_reserva(self, db: Session, reserva: schemas.ReservasCreate) -> models.Reservas:
         """Crear nueva reserva"""
-        db_reserva = models.Reservas(**reserva.dict())
+        datos = reserva.dict()
+        if not datos.get("numero_reserva"):
+            datos["numero_reserva"] = secuencia_documento_crud.siguiente_numero(db, "RES", datos.get("fecha_reserva"))
+        db_reserva = models.Reservas(**datos)
         db.add(db_reserva)
+        db.flush()
+        disponibilidad_crud.aplicar_deltas(db, disponibilidad_crud.deltas_reserva(db_reserva))
         db.commit()
         db.refresh(db_reserva)
         return db_reserva
@@ -2838,10 +3381,12 @@ class ReservasCRUD:
         if not db_reserva:
             return None
 
+        deltas = disponibilidad_crud.deltas_reserva(db_reserva, -1)
         update_data = reserva_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_reserva, field, value)
 
+        disponibilidad_crud.aplicar_deltas(db, deltas + disponibilidad_crud.deltas_reserva(db_reserva))
         db.commit()
         db.refresh(db_reserva)
         return db_reserva
@@ -2852,7 +3397,9 @@ class ReservasCRUD:
         if not db_reserva:
             return False
 
+        deltas = disponibilidad_crud.deltas_reserva(db_reserva, -1)
         db.delete(db_reserva)
+        disponibilidad_crud.aplicar_deltas(db, deltas)
         db.commit()
         return True
 
@@ -2862,7 +3409,10 @@ class ReservasCRUD:
         if not db_reserva:
             return None
 
+        deltas = disponibilidad_crud.deltas_reserva(db_reserva, -1)
         db_reserva.estado = nuevo_estado
+        deltas += disponibilidad_crud.deltas_reserva(db_reserva)
+        disponibilidad_crud.aplicar_deltas(db, deltas)
         if observaciones:
             if db_reserva.observaciones:
                 db_reserva.observaciones += f"\n{observaciones}"
@@ -2885,28 +3435,28 @@ class ReservasCRUD:
     def marcar_vencidas(self, db: Session) -> int:
         """Marcar reservas vencidas automáticamente"""
         from datetime import datetime
+        filtro = and_(
+            models.Reservas.estado == "ACTIVA",
+            models.Reservas.fecha_vencimiento_reserva < datetime.now()
+        )
+        deltas = []
+        for reserva in db.query(models.Reservas).filter(filtro).with_for_update():
+            deltas += disponibilidad_crud.deltas_reserva(reserva, -1)
         count = (db.query(models.Reservas)
-                .filter(
-                    models.Reservas.estado == "ACTIVA",
-                    models.Reservas.fecha_vencimiento_reserva < datetime.now()
-                )
-                .update({models.Reservas.estado: "VENCIDA"}))
+                .filter(filtro)
+                .update({models.Reservas.estado: "VENCIDA"}, synchronize_session=False))
+        disponibilidad_crud.aplicar_deltas(db, deltas)
         db.commit()
         return count
 
     def get_cantidad_reservada_producto(self, db: Session, id_producto: int, id_ubicacion: int = None) -> int:
-        """Obtener cantidad total reservada de un producto"""
-        from sqlalchemy import func
-        query = (db.query(func.sum(models.Reservas.cantidad_reservada))
-                .filter(
-                    models.Reservas.id_producto == id_producto,
-                    models.Reservas.estado == "ACTIVA"
-                ))
-
+        """Obtener cantidad total reservada de un producto (desde la tabla de disponibilidad)"""
+        disponibilidad = disponibilidad_crud.consultar(db, [{"id_producto": id_producto}], incluir_ubicaciones=bool(id_ubicacion))
+        if not disponibilidad:
+            return 0
         if id_ubicacion:
-            query = query.filter(models.Reservas.id_ubicacion == id_ubicacion)
-
-        return query.scalar() or 0
+            return next((int(u["reservado"]) for u in disponibilidad[0]["ubicaciones"] if u["id_ubicacion"] == id_ubicacion), 0)
+        return int(disponibilidad[0]["reservado"])
 
     def get_estadisticas_reservas(self, db: Session) -> dict:
         """Obtener estadísticas de reservas"""
@@ -2992,6 +3542,8 @@ class ProgramacionConteosCRUD:
         if not db_programacion:
             return False
 
+        for modelo in (models.ProgramacionConteoLinea, models.ConteoSnapshot):
+            db.query(modelo).filter(modelo.id_programacion == programacion_id).delete(synchronize_session=False)
         db.delete(db_programacion)
         db.commit()
         return True
@@ -3067,11 +3619,89 @@ class ProgramacionConteosCRUD:
 
         db_programacion.estado = "EN_PROCESO"
         db_programacion.fecha_inicio = fecha_inicio
+        self.tomar_snapshot(db, db_programacion)
 
         db.commit()
         db.refresh(db_programacion)
         return db_programacion
 
+    TIPOS_CONTEO_OBRA = ("OBRA", "ALMACEN_OBRA")
+
+    def tomar_snapshot(self, db: Session, programacion: models.ProgramacionConteos) -> int:
+        """Congelar las cantidades del sistema del alcance del conteo (sin commit)
+
+        Una sentencia INSERT ... SELECT por fuente: ubicaciones y stock total
+        del producto para conteos de almacén, inventario de obra para conteos
+        de obra. No hace nada si la programación ya tiene snapshot.
+        """
+        from sqlalchemy import literal, null, select
+
+        tabla = models.ConteoSnapshot.__table__
+        if db.query(models.ConteoSnapshot.id_snapshot).filter(
+            models.ConteoSnapshot.id_programacion == programacion.id_programacion
+        ).first():
+            return 0
+
+        columnas = ["id_programacion", "id_producto", "id_ubicacion", "id_obra", "cantidad_sistema", "fecha_snapshot"]
+        id_programacion = literal(programacion.id_programacion)
+        ahora = literal(datetime.now())
+        fuentes = []
+
+        linea = models.ProgramacionConteoLinea
+        con_lineas = db.query(linea.id_linea).filter(linea.id_programacion == programacion.id_programacion).first()
+
+        if programacion.tipo_conteo in self.TIPOS_CONTEO_OBRA:
+            inventario = models.InventarioObra
+            consulta = select(id_programacion, inventario.id_producto, null(), inventario.id_obra,
+                              inventario.cantidad_actual, ahora)
+            if programacion.id_obra:
+                consulta = consulta.where(inventario.id_obra == programacion.id_obra)
+            fuentes.append(consulta)
+        elif con_lineas:
+            # Conteo cíclico planificado: solo las líneas de la programación
+            ubicacion = models.ProductoUbicacion
+            fuentes.append(select(id_programacion, ubicacion.id_producto, ubicacion.id_ubicacion, null(),
+                                  ubicacion.cantidad, ahora)
+                           .select_from(linea).join(ubicacion, ubicacion.id_ubicacion == linea.id_ubicacion)
+                           .where(linea.id_programacion == programacion.id_programacion))
+            fuentes.append(select(id_programacion, models.Producto.id_producto, null(), null(),
+                                  func.coalesce(models.Producto.stock_actual, 0), ahora)
+                           .select_from(linea).join(models.Producto, models.Producto.id_producto == linea.id_producto)
+                           .where(linea.id_programacion == programacion.id_programacion, linea.id_ubicacion.is_(None)))
+        else:
+            def _alcance(consulta):
+                if programacion.tipo_conteo == "CATEGORIA" and programacion.id_categoria:
+                    consulta = (consulta
+                                .join(models.TipoProducto, models.TipoProducto.id_tipo_producto == models.Producto.id_tipo_producto)
+                                .join(models.Subcategoria, models.Subcategoria.id_subcategoria == models.TipoProducto.id_subcategoria)
+                                .where(models.Subcategoria.id_categoria == programacion.id_categoria))
+                return consulta.where(models.Producto.activo == True)
+
+            ubicacion = models.ProductoUbicacion
+            por_ubicacion = (select(id_programacion, ubicacion.id_producto, ubicacion.id_ubicacion, null(),
+                                    ubicacion.cantidad, ahora)
+                             .select_from(ubicacion)
+                             .join(models.Producto, models.Producto.id_producto == ubicacion.id_producto)
+                             .where(ubicacion.activo == True))
+            if programacion.tipo_conteo == "BODEGA" and programacion.id_bodega:
+                por_ubicacion = (por_ubicacion
+                                 .join(models.Estante, models.Estante.id_estante == ubicacion.id_estante)
+                                 .join(models.Pasillo, models.Pasillo.id_pasillo == models.Estante.id_pasillo)
+                                 .where(models.Pasillo.id_bodega == programacion.id_bodega))
+            fuentes.append(_alcance(por_ubicacion))
+            if programacion.tipo_conteo != "BODEGA":
+                # Conteos sin ubicación comparan contra el stock total del producto
+                fuentes.append(_alcance(
+                    select(id_programacion, models.Producto.id_producto, null(), null(),
+                           func.coalesce(models.Producto.stock_actual, 0), ahora)
+                    .select_from(models.Producto)
+                ))
+
+        total = 0
+        for consulta in fuentes:
+            total += db.execute(tabla.insert().from_select(columnas, consulta)).rowcount or 0
+        return total
+
     def completar_conteo(self, db: Session, programacion_id: int, fecha_fin: date = None, observaciones: str = None) -> Optional[models.ProgramacionConteos]:
         """Completar un conteo en proceso"""
         db_programacion = self.get_programacion(db, programacion_id)
@@ -3302,9 +3932,7 @@ class ConteosFisicosCRUD:
         for conteo in conteos_pendientes:
             diferencia = conteo.cantidad_fisica - conteo.cantidad_sistema
 
-            # Aquí se podría implementar la lógica para crear automáticamente
-            # un movimiento de inventario de ajuste
-            # Por ahora solo se marca como pendiente de ajuste manual
+            # Vista previa: los movimientos de ajuste los genera generar_ajustes
 
             ajustes_procesados.append({
                 "id_conteo": conteo.id_conteo,
@@ -3317,6 +3945,189 @@ class ConteosFisicosCRUD:
 
         return ajustes_procesados
 
+    # Tipos de movimiento de los ajustes por conteo (database/conteos_ajustes.sql)
+    TIPO_AJUSTE_POSITIVO = "AJP"
+    TIPO_AJUSTE_NEGATIVO = "AJN"
+
+    def generar_ajustes(self, db: Session, programacion_id: int, id_usuario: int) -> Optional[Dict[str, Any]]:
+        """Convertir las diferencias sin procesar de una programación en movimientos de ajuste
+
+        Un movimiento AJP con los sobrantes y uno AJN con los faltantes, con el
+        detalle insertado en bloque; stock de productos y ubicaciones con
+        UPDATE ... + delta (executemany), capas de costo y disponibilidad, y
+        los conteos marcados con un solo UPDATE. Los conteos de obra ajustan
+        inventario_obra (con su historial) sin movimiento de bodega. Volver a
+        llamarlo no hace nada: solo toma conteos con ajuste_procesado = False.
+        """
+        from sqlalchemy import bindparam, case, update
+        from utils.cronometro import Cronometro
+
+        cronometro = Cronometro()
+        try:
+            programacion = (db.query(models.ProgramacionConteos)
+                            .filter(models.ProgramacionConteos.id_programacion == programacion_id)
+                            .with_for_update().first())
+            if not programacion:
+                return None
+            if programacion.estado not in ("EN_PROCESO", "COMPLETADO"):
+                raise ValueError(f"Solo se ajustan conteos EN_PROCESO o COMPLETADO (estado: {programacion.estado})")
+
+            pendientes = (db.query(models.ConteosFisicos.id_conteo, models.ConteosFisicos.id_producto,
+                                   models.ConteosFisicos.id_ubicacion, models.ConteosFisicos.id_obra,
+                                   models.ConteosFisicos.cantidad_sistema, models.ConteosFisicos.cantidad_fisica)
+                          .filter(models.ConteosFisicos.id_programacion == programacion_id,
+                                  models.ConteosFisicos.cantidad_fisica != models.ConteosFisicos.cantidad_sistema,
+                                  models.ConteosFisicos.ajuste_procesado == False)
+                          .all())
+            resultado = {"id_programacion": programacion_id, "conteos_ajustados": 0, "ajustes_obra": 0,
+                         "unidades_sumadas": 0, "unidades_restadas": 0, "movimientos": []}
+            if not pendientes:
+                db.rollback()
+                return {**resultado, "etapas_ms": {}, "total_ms": cronometro.total_ms}
+
+            bodega = [conteo for conteo in pendientes if not conteo.id_obra]
+            obra = [conteo for conteo in pendientes if conteo.id_obra]
+            deltas_producto: Dict[int, int] = {}
+            deltas_ubicacion: Dict[int, int] = {}
+            for conteo in bodega:
+                diferencia = conteo.cantidad_fisica - conteo.cantidad_sistema
+                deltas_producto[conteo.id_producto] = deltas_producto.get(conteo.id_producto, 0) + diferencia
+                if conteo.id_ubicacion:
+                    deltas_ubicacion[conteo.id_ubicacion] = deltas_ubicacion.get(conteo.id_ubicacion, 0) + diferencia
+
+            # Bloqueo en orden de id, como los despachos, para evitar deadlocks
+            ids_producto = sorted(deltas_producto)
+            costos: Dict[int, Any] = {}
+            for inicio in range(0, len(ids_producto), 1000):
+                costos.update(
+                    (fila.id_producto, fila.costo_promedio or 0) for fila in
+                    db.query(models.Producto.id_producto, models.Producto.costo_promedio)
+                    .filter(models.Producto.id_producto.in_(ids_producto[inicio:inicio + 1000]))
+                    .order_by(models.Producto.id_producto).with_for_update()
+                )
+            cronometro.etapa("lectura")
+
+            # 1. Movimientos AJP / AJN con su detalle en bloque
+            ids_movimiento: Dict[str, int] = {}
+            for codigo, signo in ((self.TIPO_AJUSTE_POSITIVO, 1), (self.TIPO_AJUSTE_NEGATIVO, -1)):
+                lineas = [conteo for conteo in bodega if (conteo.cantidad_fisica - conteo.cantidad_sistema) * signo > 0]
+                if not lineas:
+                    continue
+                tipo = db.query(models.TipoMovimiento).filter(models.TipoMovimiento.codigo_tipo == codigo).first()
+                if not tipo:
+                    raise ValueError(f"No existe el tipo de movimiento {codigo} (aplicar database/conteos_ajustes.sql)")
+                ahora = datetime.now()
+                db_movimiento = models.MovimientoInventario(
+                    id_tipo_movimiento=tipo.id_tipo_movimiento,
+                    numero_movimiento=secuencia_documento_crud.siguiente_numero(db, "MOV", ahora.date()),
+                    fecha_movimiento=ahora, id_usuario=id_usuario, autorizado_por=id_usuario,
+                    fecha_autorizacion=ahora, estado="PROCESADO",
+                    motivo=f"Ajuste por conteo físico: {programacion.nombre_conteo} (programación {programacion_id})"
+                )
+                db.add(db_movimiento)
+                db.flush()
+                ids_movimiento[codigo] = db_movimiento.id_movimiento
+
+                filas = []
+                for conteo in lineas:
+                    cantidad = (conteo.cantidad_fisica - conteo.cantidad_sistema) * signo
+                    costo = costos.get(conteo.id_producto, 0)
+                    filas.append({
+                        "id_movimiento": db_movimiento.id_movimiento, "id_producto": conteo.id_producto,
+                        "id_ubicacion_origen": conteo.id_ubicacion if signo < 0 else None,
+                        "id_ubicacion_destino": conteo.id_ubicacion if signo > 0 else None,
+                        "cantidad": cantidad, "costo_unitario": costo, "costo_total": round(float(costo) * cantidad, 2),
+                        "observaciones": f"Conteo {conteo.id_conteo}",
+                    })
+                for inicio in range(0, len(filas), 5000):
+                    db.execute(models.MovimientoDetalle.__table__.insert(), filas[inicio:inicio + 5000])
+
+                unidades = sum(fila["cantidad"] for fila in filas)
+                resultado["unidades_sumadas" if signo > 0 else "unidades_restadas"] += unidades
+                resultado["movimientos"].append({
+                    "id_movimiento": db_movimiento.id_movimiento, "numero_movimiento": db_movimiento.numero_movimiento,
+                    "codigo_tipo": codigo, "lineas": len(filas), "unidades": unidades,
+                })
+
+                # Capas FIFO: los sobrantes entran al costo promedio, los faltantes consumen
+                capas = [{"id_producto": fila["id_producto"], "cantidad": fila["cantidad"],
+                          "costo_unitario": fila["costo_unitario"],
+                          "id_ubicacion": fila["id_ubicacion_destino"] or fila["id_ubicacion_origen"]} for fila in filas]
+                if signo > 0:
+                    capa_costo_crud.agregar_capas(db, capas, "AJU", db_movimiento.numero_movimiento)
+                else:
+                    capa_costo_crud.consumir(db, capas, "AJU", db_movimiento.numero_movimiento)
+            cronometro.etapa("movimientos")
+
+            # 2. Stock de bodega con UPDATE ... + delta
+            tabla_productos = models.Producto.__table__
+            filas_productos = [{"b_id": id_producto, "b_delta": delta}
+                               for id_producto, delta in deltas_producto.items() if delta]
+            if filas_productos:
+                db.execute(
+                    update(tabla_productos).where(tabla_productos.c.id_producto == bindparam("b_id"))
+                    .values(stock_actual=func.coalesce(tabla_productos.c.stock_actual, 0) + bindparam("b_delta")),
+                    filas_productos
+                )
+            filas_ubicaciones = [{"b_id": id_ubicacion, "b_delta": delta}
+                                 for id_ubicacion, delta in deltas_ubicacion.items() if delta]
+            if filas_ubicaciones:
+                tabla_ubicaciones = models.ProductoUbicacion.__table__
+                db.execute(
+                    update(tabla_ubicaciones).where(tabla_ubicaciones.c.id_ubicacion == bindparam("b_id"))
+                    .values(cantidad=tabla_ubicaciones.c.cantidad + bindparam("b_delta"),
+                            fecha_ultima_conteo=date.today()),
+                    filas_ubicaciones
+                )
+            cronometro.etapa("stock_bodega")
+
+            # 3. Stock de obra
+            if obra:
+                inventario_obra_crud.aplicar_cambios_stock(db, [
+                    {"id_obra": conteo.id_obra, "id_producto": conteo.id_producto,
+                     "cantidad_cambio": conteo.cantidad_fisica - conteo.cantidad_sistema,
+                     "motivo": "Ajuste por conteo físico", "referencia": f"CONTEO-{programacion_id}"}
+                    for conteo in obra
+                ], commit=False)
+                resultado["ajustes_obra"] = len(obra)
+            cronometro.etapa("stock_obra")
+
+            # 4. Conteos procesados en un solo UPDATE (la programación bloqueada impide capturas nuevas)
+            diferencia = models.ConteosFisicos.cantidad_fisica - models.ConteosFisicos.cantidad_sistema
+            resultado["conteos_ajustados"] = (
+                db.query(models.ConteosFisicos)
+                .filter(models.ConteosFisicos.id_programacion == programacion_id,
+                        models.ConteosFisicos.cantidad_fisica != models.ConteosFisicos.cantidad_sistema,
+                        models.ConteosFisicos.ajuste_procesado == False)
+                .update({
+                    "ajuste_procesado": True,
+                    "id_movimiento_ajuste": case(
+                        (models.ConteosFisicos.id_obra.isnot(None), None),
+                        (diferencia > 0, ids_movimiento.get(self.TIPO_AJUSTE_POSITIVO)),
+                        else_=ids_movimiento.get(self.TIPO_AJUSTE_NEGATIVO)),
+                }, synchronize_session=False)
+            )
+            cronometro.etapa("conteos")
+
+            # 5. Disponibilidad (y eventos de cruce de stock mínimo)
+            ubicacion_producto = {conteo.id_ubicacion: conteo.id_producto for conteo in bodega if conteo.id_ubicacion}
+            disponibilidad_crud.aplicar_deltas(
+                db,
+                [{"id_producto": id_producto, "id_ubicacion": 0, "en_mano": delta}
+                 for id_producto, delta in deltas_producto.items() if delta]
+                + [{"id_producto": ubicacion_producto[id_ubicacion], "id_ubicacion": id_ubicacion, "en_mano": delta}
+                   for id_ubicacion, delta in deltas_ubicacion.items() if delta]
+            )
+            cronometro.etapa("disponibilidad")
+
+            db.commit()
+            cronometro.etapa("commit")
+        except Exception:
+            db.rollback()
+            raise
+
+        return {**resultado, "etapas_ms": cronometro.etapas, "total_ms": cronometro.total_ms}
+
     def get_estadisticas_programacion(self, db: Session, programacion_id: int) -> dict:
         """Obtener estadísticas de conteos para una programación"""
         from sqlalchemy import func
@@ -3382,6 +4193,19 @@ class ConteosFisicosCRUD:
                     .limit(limit)
                     .all())
 
+    def get_exactitud_por_producto(self, db: Session, desde: datetime) -> Dict[int, Dict[str, Any]]:
+        """Conteos y porcentaje de conteos exactos por producto desde una fecha (mismo criterio que get_conteos_por_exactitud)"""
+        from sqlalchemy import case
+
+        exacto = case((models.ConteosFisicos.cantidad_fisica == models.ConteosFisicos.cantidad_sistema, 1), else_=0)
+        filas = (db.query(models.ConteosFisicos.id_producto,
+                          func.count(models.ConteosFisicos.id_conteo),
+                          func.sum(exacto))
+                 .filter(models.ConteosFisicos.fecha_conteo >= desde)
+                 .group_by(models.ConteosFisicos.id_producto))
+        return {id_producto: {"conteos": total, "exactitud": round(float(exactos or 0) / total * 100, 2)}
+                for id_producto, total, exactos in filas}
+
     def get_resumen_por_producto(self, db: Session, producto_id: int) -> dict:
         """Obtener resumen de conteos para un producto específico"""
         from sqlalchemy import func
@@ -3411,6 +4235,121 @@ class ConteosFisicosCRUD:
             } if ultimo_conteo else None
         }
 
+    def capturar_lote(self, db: Session, programacion_id: int, lineas: List[Dict[str, Any]],
+                      id_usuario_contador: int, acumular: bool = False) -> Optional[Dict[str, Any]]:
+        """Registrar miles de líneas escaneadas de una vez
+
+        cantidad_sistema sale del snapshot tomado al iniciar el conteo. Las
+        líneas repetidas (producto, ubicación, obra) se suman; si ya existe un
+        conteo para la misma clave se reemplaza su cantidad_fisica (o se suma
+        con acumular=True), por lo que reenviar un lote no duplica conteos.
+        """
+        from sqlalchemy import bindparam, update
+
+        # Bloquea la programación: la captura y la generación de ajustes no se cruzan
+        programacion = (db.query(models.ProgramacionConteos)
+                        .filter(models.ProgramacionConteos.id_programacion == programacion_id)
+                        .with_for_update().first())
+        if not programacion:
+            return None
+        if programacion.estado != "EN_PROCESO":
+            db.rollback()
+            raise ValueError(f"La programación debe estar EN_PROCESO para registrar conteos (estado: {programacion.estado})")
+        obra_defecto = programacion.id_obra if programacion.tipo_conteo in programacion_conteos_crud.TIPOS_CONTEO_OBRA else None
+
+        agrupadas: Dict[tuple, Dict[str, Any]] = {}
+        for linea in lineas:
+            clave = (linea["id_producto"], linea.get("id_ubicacion"), linea.get("id_obra") or obra_defecto)
+            fila = agrupadas.setdefault(clave, {"cantidad_fisica": 0, "observaciones": None})
+            fila["cantidad_fisica"] += linea["cantidad_fisica"]
+            fila["observaciones"] = linea.get("observaciones") or fila["observaciones"]
+
+        # Programaciones iniciadas antes de existir el snapshot lo toman ahora
+        programacion_conteos_crud.tomar_snapshot(db, programacion)
+
+        ids_producto = sorted({clave[0] for clave in agrupadas})
+        ids_ubicacion = sorted({clave[1] for clave in agrupadas if clave[1]})
+        productos, ubicaciones, snapshot, existentes = set(), {}, {}, {}
+        for inicio in range(0, len(ids_producto), 1000):
+            lote = ids_producto[inicio:inicio + 1000]
+            productos.update(id_producto for (id_producto,) in
+                             db.query(models.Producto.id_producto).filter(models.Producto.id_producto.in_(lote)))
+            for fila in db.query(models.ConteoSnapshot.id_producto, models.ConteoSnapshot.id_ubicacion,
+                                 models.ConteoSnapshot.id_obra, models.ConteoSnapshot.cantidad_sistema).filter(
+                models.ConteoSnapshot.id_programacion == programacion_id, models.ConteoSnapshot.id_producto.in_(lote)
+            ):
+                snapshot[(fila.id_producto, fila.id_ubicacion, fila.id_obra)] = fila.cantidad_sistema
+            for fila in db.query(models.ConteosFisicos.id_conteo, models.ConteosFisicos.id_producto,
+                                 models.ConteosFisicos.id_ubicacion, models.ConteosFisicos.id_obra,
+                                 models.ConteosFisicos.cantidad_fisica, models.ConteosFisicos.ajuste_procesado).filter(
+                models.ConteosFisicos.id_programacion == programacion_id, models.ConteosFisicos.id_producto.in_(lote)
+            ):
+                existentes[(fila.id_producto, fila.id_ubicacion, fila.id_obra)] = fila
+        for inicio in range(0, len(ids_ubicacion), 1000):
+            ubicaciones.update(db.query(models.ProductoUbicacion.id_ubicacion, models.ProductoUbicacion.id_producto)
+                               .filter(models.ProductoUbicacion.id_ubicacion.in_(ids_ubicacion[inicio:inicio + 1000])))
+
+        ahora = datetime.now()
+        nuevos, actualizados, errores = [], [], []
+        resumen = {"sin_diferencia": 0, "sobrantes": 0, "faltantes": 0, "fuera_de_snapshot": 0,
+                   "unidades_sobrantes": 0, "unidades_faltantes": 0}
+        for clave, fila in agrupadas.items():
+            id_producto, id_ubicacion, id_obra = clave
+            if id_producto not in productos:
+                errores.append({"id_producto": id_producto, "id_ubicacion": id_ubicacion, "error": "Producto no existe"})
+                continue
+            if id_ubicacion and ubicaciones.get(id_ubicacion) != id_producto:
+                errores.append({"id_producto": id_producto, "id_ubicacion": id_ubicacion,
+                                "error": "La ubicación no existe o no corresponde al producto"})
+                continue
+            existente = existentes.get(clave)
+            if existente is not None and existente.ajuste_procesado:
+                errores.append({"id_producto": id_producto, "id_ubicacion": id_ubicacion,
+                                "error": f"El conteo {existente.id_conteo} ya tiene ajuste procesado"})
+                continue
+
+            if clave not in snapshot:
+                resumen["fuera_de_snapshot"] += 1
+            sistema = snapshot.get(clave, 0)
+            fisica = fila["cantidad_fisica"] + (existente.cantidad_fisica if existente is not None and acumular else 0)
+            diferencia = fisica - sistema
+            if diferencia > 0:
+                resumen["sobrantes"] += 1
+                resumen["unidades_sobrantes"] += diferencia
+            elif diferencia < 0:
+                resumen["faltantes"] += 1
+                resumen["unidades_faltantes"] -= diferencia
+            else:
+                resumen["sin_diferencia"] += 1
+
+            if existente is not None:
+                actualizados.append({"b_id_conteo": existente.id_conteo, "b_cantidad_fisica": fisica,
+                                     "b_id_usuario": id_usuario_contador, "b_fecha": ahora})
+            else:
+                nuevos.append({"id_programacion": programacion_id, "id_producto": id_producto,
+                               "id_ubicacion": id_ubicacion, "id_obra": id_obra, "cantidad_sistema": sistema,
+                               "cantidad_fisica": fisica, "id_usuario_contador": id_usuario_contador,
+                               "fecha_conteo": ahora, "observaciones": fila["observaciones"],
+                               "ajuste_procesado": False})
+
+        tabla = models.ConteosFisicos.__table__
+        for inicio in range(0, len(nuevos), 1000):
+            db.execute(tabla.insert(), nuevos[inicio:inicio + 1000])
+        if actualizados:
+            db.execute(
+                update(tabla).where(tabla.c.id_conteo == bindparam("b_id_conteo")).values(
+                    cantidad_fisica=bindparam("b_cantidad_fisica"),
+                    id_usuario_contador=bindparam("b_id_usuario"),
+                    fecha_conteo=bindparam("b_fecha"),
+                ),
+                actualizados
+            )
+        db.commit()
+
+        return {"id_programacion": programacion_id, "lineas_recibidas": len(lineas),
+                "registros": len(agrupadas), "insertados": len(nuevos), "actualizados": len(actualizados),
+                "rechazados": len(errores), **resumen, "errores": errores}
+
 # Instancia global
 conteos_fisicos_crud = ConteosFisicosCRUD()
 
@@ -3644,11 +4583,17 @@ class ConfiguracionAlertasCRUD:
         """Obtener alertas que necesitan ser revisadas basado en su frecuencia"""
         from datetime import datetime, timedelta
 
-        # Esta función podría extenderse para incluir lógica de última revisión
-        # Por ahora retorna todas las alertas activas
-        return (db.query(models.ConfiguracionAlertas)
-                .filter(models.ConfiguracionAlertas.activa == True)
-                .all())
+        # Última ejecución del motor por regla; las que nunca se evaluaron también se revisan
+        ultima = (db.query(models.EjecucionAlerta.id_alerta.label("id_alerta"),
+                           func.max(models.EjecucionAlerta.fecha_ejecucion).label("fecha"))
+                  .group_by(models.EjecucionAlerta.id_alerta).subquery())
+        ahora = datetime.now()
+        alertas = (db.query(models.ConfiguracionAlertas, ultima.c.fecha)
+                   .outerjoin(ultima, ultima.c.id_alerta == models.ConfiguracionAlertas.id_alerta)
+                   .filter(models.ConfiguracionAlertas.activa == True)
+                   .all())
+        return [alerta for alerta, fecha in alertas
+                if fecha is None or fecha + timedelta(hours=alerta.frecuencia_revision_horas or 24) <= ahora]
 
     def buscar_alertas(self, db: Session, texto_busqueda: str, skip: int = 0, limit: int = 100) -> List[models.ConfiguracionAlertas]:
         """Buscar alertas por nombre"""
@@ -3864,6 +4809,9 @@ class LogAlertasCRUD:
                     'fecha_visualizacion': fecha_vista
                 }, synchronize_session=False))
 
+        if count:
+            from utils.eventos import registrar
+            registrar(db, "alertas", "alertas.actualizadas", {"ids": log_ids, "estado": "VISTA"})
         db.commit()
         return count
 
@@ -3888,6 +4836,9 @@ class LogAlertasCRUD:
                 )
                 .update(update_data, synchronize_session=False))
 
+        if count:
+            from utils.eventos import registrar
+            registrar(db, "alertas", "alertas.actualizadas", {"ids": log_ids, "estado": "RESUELTA"})
         db.commit()
         return count
 
@@ -6310,34 +7261,8 @@ class OrdenCompraCRUD:
         return db.query(models.OrdenCompra).filter(models.OrdenCompra.numero_orden == numero_orden).first()
 
     def generar_siguiente_numero(self, db: Session) -> str:
-        """Generar el siguiente número de orden de compra de forma incremental"""
-        # Obtener la última orden creada
-        ultima_orden = db.query(models.OrdenCompra).order_by(
-            models.OrdenCompra.id_orden_compra.desc()
-        ).first()
-
-        if not ultima_orden:
-            # Si no hay órdenes, empezar desde 1
-            return "OC-0001"
-
-        # Extraer el número de la última orden
-        # Formato esperado: OC-XXXX donde XXXX es un número
-        try:
-            ultimo_numero = ultima_orden.numero_orden
-            # Si el formato es OC-XXXX, extraer XXXX
-            if ultimo_numero.startswith("OC-"):
-                numero_parte = ultimo_numero.split("-")[1]
-                siguiente = int(numero_parte) + 1
-            else:
-                # Si no sigue el formato, buscar el máximo ID y sumar 1
-                siguiente = ultima_orden.id_orden_compra + 1
-
-            # Formatear con 4 dígitos
-            return f"OC-{str(siguiente).zfill(4)}"
-        except (ValueError, IndexError):
-            # Si hay error al parsear, usar el ID como base
-            siguiente = ultima_orden.id_orden_compra + 1
-            return f"OC-{str(siguiente).zfill(4)}"
+        """Generar el siguiente número de orden de compra (OC-XXXX) desde la secuencia"""
+        return secuencia_documento_crud.siguiente_numero(db, "OC")
 
     def get_ordenes(self, db: Session, skip: int = 0, limit: int = 100,
                    filtros: Optional[schemas.OrdenCompraFilters] = None) -> List[models.OrdenCompra]:
@@ -6415,6 +7340,8 @@ class OrdenCompraCRUD:
         for field, value in update_data.items():
             setattr(db_orden, field, value)
 
+        if 'id_estado' in update_data or 'activo' in update_data:
+            self._refrescar_disponibilidad(db, orden_id)
         db.commit()
         db.refresh(db_orden)
         return db_orden
@@ -6426,9 +7353,20 @@ class OrdenCompraCRUD:
             return False
 
         db_orden.activo = False
+        self._refrescar_disponibilidad(db, orden_id)
         db.commit()
         return True
 
+    def _refrescar_disponibilidad(self, db: Session, orden_id: int):
+        """Recalcular lo pendiente por recibir de los productos de la orden (sin commit)"""
+        db.flush()
+        ids_producto = [
+            id_producto for (id_producto,) in db.query(models.OrdenCompraDetalle.id_producto)
+            .filter(models.OrdenCompraDetalle.id_orden_compra == orden_id).distinct()
+        ]
+        if ids_producto:
+            disponibilidad_crud.refrescar_productos(db, ids_producto)
+
     def count_ordenes(self, db: Session, filtros: Optional[schemas.OrdenCompraFilters] = None) -> int:
         """Contar órdenes con filtros"""
         query = db.query(models.OrdenCompra).filter(models.OrdenCompra.activo == True)
@@ -6456,6 +7394,7 @@ class OrdenCompraCRUD:
         db_orden.id_usuario_aprobador = usuario_aprobador_id
         db_orden.fecha_aprobacion = func.current_timestamp()
 
+        self._refrescar_disponibilidad(db, orden_id)
         db.commit()
         db.refresh(db_orden)
         return db_orden
@@ -6475,6 +7414,7 @@ class OrdenCompraCRUD:
         db_orden.motivo_cancelacion = motivo
         db_orden.fecha_cancelacion = func.current_timestamp()
 
+        self._refrescar_disponibilidad(db, orden_id)
         db.commit()
         db.refresh(db_orden)
         return db_orden
@@ -6496,6 +7436,7 @@ class OrdenCompraCRUD:
         db_orden.motivo_cancelacion = motivo
         db_orden.fecha_cancelacion = func.current_timestamp()
 
+        self._refrescar_disponibilidad(db, orden_id)
         db.commit()
         db.refresh(db_orden)
         return db_orden
@@ -6611,6 +7552,8 @@ class OrdenCompraDetalleCRUD:
 
         db_detalle = models.OrdenCompraDetalle(**detalle_data)
         db.add(db_detalle)
+        db.flush()
+        disponibilidad_crud.refrescar_productos(db, [db_detalle.id_producto])
         db.commit()
         db.refresh(db_detalle)
 
@@ -6633,9 +7576,12 @@ class OrdenCompraDetalleCRUD:
             cantidad_recibida = update_data.get('cantidad_recibida', db_detalle.cantidad_recibida)
             update_data['cantidad_pendiente'] = cantidad_solicitada - cantidad_recibida
 
+        id_producto_anterior = db_detalle.id_producto
         for field, value in update_data.items():
             setattr(db_detalle, field, value)
 
+        db.flush()
+        disponibilidad_crud.refrescar_productos(db, [id_producto_anterior, db_detalle.id_producto])
         db.commit()
         db.refresh(db_detalle)
 
@@ -6652,6 +7598,8 @@ class OrdenCompraDetalleCRUD:
 
         orden_id = db_detalle.id_orden_compra
         db_detalle.activo = False
+        db.flush()
+        disponibilidad_crud.refrescar_productos(db, [db_detalle.id_producto])
         db.commit()
 
         # Actualizar totales de la orden
@@ -6659,15 +7607,17 @@ class OrdenCompraDetalleCRUD:
 
         return True
 
-    def _actualizar_totales_orden(self, db: Session, orden_id: int):
-        """Actualizar totales de la orden basado en sus detalles"""
-        detalles = self.get_detalles_by_orden(db, orden_id)
-        subtotal = sum(detalle.importe_total for detalle in detalles)
-
-        orden = db.query(models.OrdenCompra).filter(models.OrdenCompra.id_orden_compra == orden_id).first()
-        if orden:
-            orden.subtotal = subtotal
-            orden.total = subtotal + orden.impuestos - orden.descuentos
+    def _actualizar_totales_orden(self, db: Session, orden_id: int, commit: bool = True):
+        """Actualizar totales de la orden basado en sus detalles (una sola sentencia)"""
+        subtotal = (db.query(func.coalesce(func.sum(models.OrdenCompraDetalle.importe_total), 0))
+                    .filter(models.OrdenCompraDetalle.id_orden_compra == orden_id,
+                            models.OrdenCompraDetalle.activo == True)
+                    .scalar_subquery())
+        db.query(models.OrdenCompra).filter(models.OrdenCompra.id_orden_compra == orden_id).update({
+            models.OrdenCompra.subtotal: subtotal,
+            models.OrdenCompra.total: subtotal + models.OrdenCompra.impuestos - models.OrdenCompra.descuentos
+        }, synchronize_session=False)
+        if commit:
             db.commit()
 
 
@@ -6788,6 +7738,170 @@ class RecepcionMercanciaCRUD:
 
         return query.count()
 
+    def recibir_masivo(self, db: Session, solicitud: schemas.RecepcionMasivaCreate) -> Dict[str, Any]:
+        """Registrar una recepción completa en una transacción
+
+        Inserta todas las líneas en una sentencia y actualiza las cantidades
+        de la OC, sus totales, el stock y el kardex una vez por recepción,
+        en lugar de una vez por línea.
+        """
+        from sqlalchemy import Numeric, bindparam, update
+        from utils.cronometro import Cronometro
+        from utils.startup import requerir_migracion
+
+        # Con los triggers por fila aún activos el UPDATE del detalle de la OC
+        # falla (error 1442) y los totales se recalcularían por cada línea
+        requerir_migracion(db, 6, "recepciones_masivas.sql")
+
+        cronometro = Cronometro()
+        datos = solicitud.model_dump()
+        lineas = datos.pop("detalles")
+        actualizar_stock = datos.pop("actualizar_stock")
+        id_bodega = datos.pop("id_bodega")
+
+        for linea in lineas:
+            if linea["cantidad_recibida"] != linea["cantidad_aceptada"] + linea["cantidad_rechazada"]:
+                raise ValueError(f"Detalle de orden {linea['id_detalle_orden']}: la cantidad recibida debe ser "
+                                 "igual a la suma de cantidad aceptada y rechazada")
+        if self.get_recepcion_by_numero(db, datos["numero_recepcion"]):
+            raise ValueError(f"Ya existe una recepción con número '{datos['numero_recepcion']}'")
+
+        try:
+            # 1. Validación: la orden y sus líneas se bloquean hasta el commit
+            orden = (db.query(models.OrdenCompra)
+                     .filter(models.OrdenCompra.id_orden_compra == datos["id_orden_compra"])
+                     .with_for_update().first())
+            if not orden:
+                raise ValueError(f"La orden con ID {datos['id_orden_compra']} no existe")
+            if not db.query(models.Usuarios.id_usuario).filter(
+                    models.Usuarios.id_usuario == datos["id_usuario_receptor"]).first():
+                raise ValueError(f"El usuario con ID {datos['id_usuario_receptor']} no existe")
+
+            ids_detalle = sorted({linea["id_detalle_orden"] for linea in lineas})
+            detalles_orden = {
+                fila.id_detalle: fila for fila in
+                db.query(models.OrdenCompraDetalle.id_detalle, models.OrdenCompraDetalle.id_producto,
+                         models.OrdenCompraDetalle.precio_neto, models.OrdenCompraDetalle.cantidad_pendiente)
+                .filter(models.OrdenCompraDetalle.id_orden_compra == orden.id_orden_compra,
+                        models.OrdenCompraDetalle.id_detalle.in_(ids_detalle),
+                        models.OrdenCompraDetalle.activo == True)
+                .order_by(models.OrdenCompraDetalle.id_detalle).with_for_update()
+            }
+            ajenos = [str(i) for i in ids_detalle if i not in detalles_orden]
+            if ajenos:
+                raise ValueError(f"Detalles que no pertenecen a la orden {orden.numero_orden}: {', '.join(ajenos)}")
+            aceptado_detalle: Dict[int, Any] = {}
+            for linea in lineas:
+                aceptado_detalle[linea["id_detalle_orden"]] = (
+                    aceptado_detalle.get(linea["id_detalle_orden"], 0) + linea["cantidad_aceptada"])
+            excedidos = [f"{id_detalle} (aceptado {cantidad}, pendiente {detalles_orden[id_detalle].cantidad_pendiente})"
+                         for id_detalle, cantidad in aceptado_detalle.items()
+                         if cantidad > (detalles_orden[id_detalle].cantidad_pendiente or 0)]
+            if excedidos:
+                raise ValueError(f"La cantidad aceptada supera la pendiente en los detalles: {', '.join(excedidos)}")
+            cronometro.etapa("validacion")
+
+            # 2. Cabecera y detalle en bloque
+            db_recepcion = models.RecepcionMercancia(**datos)
+            db.add(db_recepcion)
+            db.flush()
+            db.execute(models.RecepcionMercanciaDetalle.__table__.insert(),
+                       [{**linea, "id_recepcion": db_recepcion.id_recepcion} for linea in lineas])
+            cronometro.etapa("detalle")
+
+            # 3. Cantidades de la OC: una fila por detalle de orden; el WHERE
+            # repite la validación y una fila no actualizada anula la recepción
+            tabla_detalle = models.OrdenCompraDetalle.__table__
+            aceptada = bindparam("b_cantidad", type_=Numeric(12, 4))
+            actualizadas = db.execute(
+                update(tabla_detalle).where(tabla_detalle.c.id_detalle == bindparam("b_id"),
+                                            tabla_detalle.c.cantidad_pendiente >= aceptada).values(
+                    cantidad_recibida=tabla_detalle.c.cantidad_recibida + aceptada,
+                    cantidad_pendiente=tabla_detalle.c.cantidad_pendiente - aceptada
+                ),
+                [{"b_id": id_detalle, "b_cantidad": cantidad} for id_detalle, cantidad in aceptado_detalle.items()]
+            ).rowcount
+            if actualizadas != len(aceptado_detalle):
+                raise ValueError("La cantidad aceptada supera la pendiente en algún detalle de la orden")
+            orden_compra_detalle_crud._actualizar_totales_orden(db, orden.id_orden_compra, commit=False)
+            orden_completa = not db.query(models.OrdenCompraDetalle.id_detalle).filter(
+                models.OrdenCompraDetalle.id_orden_compra == orden.id_orden_compra,
+                models.OrdenCompraDetalle.activo == True,
+                models.OrdenCompraDetalle.cantidad_pendiente > 0
+            ).first()
+            if orden_completa:
+                db_recepcion.recepcion_completa = True
+            cronometro.etapa("orden_compra")
+
+            # 4. Stock y kardex (entrada por compra)
+            aceptado_producto: Dict[int, Any] = {}
+            for id_detalle, cantidad in aceptado_detalle.items():
+                id_producto = detalles_orden[id_detalle].id_producto
+                aceptado_producto[id_producto] = aceptado_producto.get(id_producto, 0) + cantidad
+            aceptado_producto = {i: c for i, c in aceptado_producto.items() if c > 0}
+
+            db_movimiento = None
+            if actualizar_stock and aceptado_producto:
+                tipo_ent = db.query(models.TipoMovimiento).filter(models.TipoMovimiento.codigo_tipo == "ENT").first()
+                if not tipo_ent:
+                    raise ValueError("No existe el tipo de movimiento ENT (Entrada por Compra)")
+
+                # Stock y costo promedio ponderado en la misma sentencia
+                costo_promedio_crud.aplicar_entradas(db, [
+                    {"id_producto": detalles_orden[id_detalle].id_producto, "cantidad": cantidad,
+                     "costo_unitario": detalles_orden[id_detalle].precio_neto}
+                    for id_detalle, cantidad in aceptado_detalle.items() if cantidad > 0
+                ])
+                capa_costo_crud.agregar_capas(db, [
+                    {"id_producto": detalles_orden[id_detalle].id_producto, "cantidad": cantidad,
+                     "costo_unitario": detalles_orden[id_detalle].precio_neto, "id_bodega": id_bodega}
+                    for id_detalle, cantidad in aceptado_detalle.items() if cantidad > 0
+                ], "REC", datos["numero_recepcion"])
+
+                db_movimiento = models.MovimientoInventario(
+                    id_tipo_movimiento=tipo_ent.id_tipo_movimiento,
+                    numero_movimiento=secuencia_documento_crud.siguiente_numero(db, "MOV", datos["fecha_recepcion"]),
+                    fecha_movimiento=datetime.now(),
+                    id_usuario=datos["id_usuario_receptor"],
+                    motivo=f"Recepción {datos['numero_recepcion']} de OC {orden.numero_orden}",
+                    estado="PROCESADO"
+                )
+                db.add(db_movimiento)
+                db.flush()
+                db.execute(models.MovimientoDetalle.__table__.insert(), [
+                    {"id_movimiento": db_movimiento.id_movimiento, "id_producto": detalles_orden[id_detalle].id_producto,
+                     "id_ubicacion_origen": None, "id_ubicacion_destino": None, "cantidad": int(cantidad),
+                     "costo_unitario": detalles_orden[id_detalle].precio_neto,
+                     "costo_total": round(detalles_orden[id_detalle].precio_neto * cantidad, 2), "observaciones": None}
+                    for id_detalle, cantidad in aceptado_detalle.items() if cantidad > 0
+                ])
+            cronometro.etapa("stock")
+
+            # 5. Disponibilidad: cambia en_transito y, si corresponde, en_mano
+            disponibilidad_crud.refrescar_productos(
+                db, sorted({detalles_orden[i].id_producto for i in aceptado_detalle}))
+            cronometro.etapa("disponibilidad")
+
+            db.commit()
+            cronometro.etapa("commit")
+        except Exception:
+            db.rollback()
+            raise
+
+        return {
+            "id_recepcion": db_recepcion.id_recepcion,
+            "numero_recepcion": datos["numero_recepcion"],
+            "lineas": len(lineas),
+            "cantidad_aceptada": sum(aceptado_detalle.values()),
+            "lineas_orden_actualizadas": len(aceptado_detalle),
+            "productos_actualizados": len(aceptado_producto) if db_movimiento else 0,
+            "id_movimiento": db_movimiento.id_movimiento if db_movimiento else None,
+            "numero_movimiento": db_movimiento.numero_movimiento if db_movimiento else None,
+            "orden_completa": orden_completa,
+            "etapas_ms": cronometro.etapas,
+            "total_ms": cronometro.total_ms,
+        }
+
     def marcar_como_completa(self, db: Session, recepcion_id: int) -> Optional[models.RecepcionMercancia]:
         """Marcar recepción como completa"""
         db_recepcion = self.get_recepcion(db, recepcion_id)
@@ -6896,6 +8010,8 @@ class RecepcionMercanciaDetalleCRUD:
         if detalle_orden:
             detalle_orden.cantidad_recibida = total_recibido
             detalle_orden.cantidad_pendiente = detalle_orden.cantidad_solicitada - total_recibido
+            db.flush()
+            disponibilidad_crud.refrescar_productos(db, [detalle_orden.id_producto])
             db.commit()
 
 
@@ -7707,3 +8823,1918 @@ class TipoDocumentoCompraCRUD:
 
 # Instancia global de TipoDocumentoCompraCRUD
 tipos_documentos_compra_crud = TipoDocumentoCompraCRUD()
+
+
+# ========================================
+# CRUD PARA SECUENCIAS DE DOCUMENTOS
+# ========================================
+
+class SecuenciaDocumentoCRUD:
+    """Asignación de números de documento con incremento atómico, sin MAX/COUNT"""
+
+    # prefijo: (formato, reinicia por año, modelo, columna del número)
+    SERIES = {
+        "OC": ("OC-{numero:04d}", False, models.OrdenCompra, "numero_orden"),
+        "DSP": ("DSP-{anio}-{numero:06d}", True, models.DespachosObra, "numero_despacho"),
+        "DEV": ("DEV-{anio}-{numero:06d}", True, models.DevolucionesObra, "numero_devolucion"),
+        "RES": ("RES-{anio}-{numero:06d}", True, models.Reservas, "numero_reserva"),
+        "MOV": ("MOV-{anio}-{numero:06d}", True, models.MovimientoInventario, "numero_movimiento"),
+    }
+
+    def __init__(self):
+        # (prefijo, anio) -> [siguiente, fin] del bloque pre-asignado a este proceso
+        self._bloques: Dict[tuple, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def get_secuencias(self, db: Session) -> List[models.SecuenciaDocumento]:
+        """Obtener el estado de todas las series"""
+        return db.query(models.SecuenciaDocumento).order_by(
+            models.SecuenciaDocumento.prefijo, models.SecuenciaDocumento.anio
+        ).all()
+
+    def _ultimo_numero_existente(self, conn, prefijo: str, anio: int) -> int:
+        """Último número ya emitido con el formato de la serie (solo al crear la serie)"""
+        from sqlalchemy import select
+
+        formato, _, modelo, campo = self.SERIES[prefijo]
+        columna = getattr(modelo, campo)
+        patron = formato.split("{numero")[0].format(anio=anio) + "%"
+        ultimo = conn.execute(
+            select(columna).where(columna.like(patron))
+            .order_by(func.length(columna).desc(), columna.desc()).limit(1)
+        ).scalar()
+        try:
+            return int(ultimo.rsplit("-", 1)[1]) if ultimo else 0
+        except (ValueError, IndexError):
+            return 0
+
+    def _incrementar_mysql(self, conn, prefijo: str, anio: int, cantidad: int) -> int:
+        from sqlalchemy import text
+
+        parametros = {"prefijo": prefijo, "anio": anio, "cantidad": cantidad}
+        resultado = conn.execute(text(
+            "UPDATE secuencias_documento SET ultimo_valor = LAST_INSERT_ID(ultimo_valor + :cantidad) "
+            "WHERE prefijo = :prefijo AND anio = :anio"
+        ), parametros)
+        if resultado.rowcount:
+            return conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+
+        # Serie nueva: parte del último número emitido con el formato antiguo
+        inicial = self._ultimo_numero_existente(conn, prefijo, anio) + cantidad
+        resultado = conn.execute(text(
+            "INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor) VALUES (:prefijo, :anio, :inicial) "
+            "ON DUPLICATE KEY UPDATE ultimo_valor = LAST_INSERT_ID(ultimo_valor + :cantidad)"
+        ), {**parametros, "inicial": inicial})
+        if resultado.rowcount == 1:
+            return inicial
+        return conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+
+    def _incrementar_generico(self, conn, prefijo: str, anio: int, cantidad: int) -> int:
+        from sqlalchemy import select
+
+        tabla = models.SecuenciaDocumento.__table__
+        condicion = and_(tabla.c.prefijo == prefijo, tabla.c.anio == anio)
+        actual = conn.execute(select(tabla.c.ultimo_valor).where(condicion).with_for_update()).scalar()
+        if actual is None:
+            fin = self._ultimo_numero_existente(conn, prefijo, anio) + cantidad
+            conn.execute(tabla.insert().values(prefijo=prefijo, anio=anio, ultimo_valor=fin))
+        else:
+            fin = actual + cantidad
+            conn.execute(tabla.update().where(condicion).values(ultimo_valor=fin))
+        return fin
+
+    def reservar_bloque(self, db: Session, prefijo: str, anio: int, cantidad: int = 1) -> int:
+        """Reservar `cantidad` números de la serie; retorna el último número del bloque"""
+        if prefijo not in self.SERIES:
+            raise ValueError(f"Serie de documentos '{prefijo}' no definida")
+
+        engine = db.get_bind()
+        if engine.dialect.name == "mysql":
+            # Transacción propia y corta: el contador no queda bloqueado
+            # mientras dure la transacción del documento
+            with engine.begin() as conn:
+                return self._incrementar_mysql(conn, prefijo, anio, cantidad)
+        return self._incrementar_generico(db.connection(), prefijo, anio, cantidad)
+
+    def siguiente_valor(self, db: Session, prefijo: str, anio: int = 0) -> int:
+        """Siguiente número de la serie, usando el bloque pre-asignado si hay"""
+        from config import SECUENCIA_BLOQUES
+
+        tamano = SECUENCIA_BLOQUES.get(prefijo, 1) if db.get_bind().dialect.name == "mysql" else 1
+        if tamano <= 1:
+            return self.reservar_bloque(db, prefijo, anio, 1)
+
+        clave = (prefijo, anio)
+        with self._lock:
+            bloque = self._bloques.get(clave)
+            if not bloque or bloque[0] > bloque[1]:
+                fin = self.reservar_bloque(db, prefijo, anio, tamano)
+                bloque = self._bloques[clave] = [fin - tamano + 1, fin]
+            valor = bloque[0]
+            bloque[0] += 1
+            return valor
+
+    def siguiente_numero(self, db: Session, prefijo: str, fecha: Optional[date] = None) -> str:
+        """Siguiente número formateado, p.ej. OC-0042 o DSP-2026-000123"""
+        if prefijo not in self.SERIES:
+            raise ValueError(f"Serie de documentos '{prefijo}' no definida")
+        formato, por_anio, _, _ = self.SERIES[prefijo]
+        anio = (fecha or date.today()).year if por_anio else 0
+        return formato.format(anio=anio, numero=self.siguiente_valor(db, prefijo, anio))
+
+
+# Instancia global de SecuenciaDocumentoCRUD
+secuencia_documento_crud = SecuenciaDocumentoCRUD()
+
+
+# ========================================
+# CRUD PARA DISPONIBILIDAD (ATP)
+# ========================================
+
+class DisponibilidadCRUD:
+    """Disponibilidad por producto y ubicación mantenida de forma incremental
+
+    La fila con id_ubicacion = 0 es el total del producto: en_mano viene de
+    Producto.stock_actual y en_transito de lo pendiente en OC abiertas. Las
+    filas por ubicación toman en_mano de ProductoUbicacion.cantidad de las
+    ubicaciones activas.
+    """
+
+    CAMPOS = ("en_mano", "reservado", "en_transito")
+    TAMANO_LOTE_IN = 1000
+
+    @staticmethod
+    def _lotes(ids: List[int], tamano: int):
+        for inicio in range(0, len(ids), tamano):
+            yield ids[inicio:inicio + tamano]
+
+    def _calcular(self, db: Session, ids_producto: Optional[List[int]]) -> Dict[tuple, Dict[str, Any]]:
+        """Cifras desde las tablas origen, con una consulta agregada por fuente"""
+        filas: Dict[tuple, Dict[str, Any]] = {}
+
+        def _fila(id_producto, id_ubicacion):
+            clave = (id_producto, id_ubicacion)
+            if clave not in filas:
+                filas[clave] = {"id_producto": id_producto, "id_ubicacion": id_ubicacion,
+                                "en_mano": 0, "reservado": 0, "en_transito": 0}
+            return filas[clave]
+
+        def _filtrar(query, columna):
+            return query.filter(columna.in_(ids_producto)) if ids_producto is not None else query
+
+        for id_producto, stock in _filtrar(
+            db.query(models.Producto.id_producto, models.Producto.stock_actual), models.Producto.id_producto
+        ):
+            _fila(id_producto, 0)["en_mano"] = stock or 0
+
+        for id_producto, id_ubicacion, cantidad in _filtrar(
+            db.query(models.ProductoUbicacion.id_producto, models.ProductoUbicacion.id_ubicacion,
+                     models.ProductoUbicacion.cantidad).filter(models.ProductoUbicacion.activo == True),
+            models.ProductoUbicacion.id_producto
+        ):
+            _fila(id_producto, id_ubicacion)["en_mano"] = cantidad or 0
+
+        reservas = _filtrar(
+            db.query(models.Reservas.id_producto, models.Reservas.id_ubicacion,
+                     func.sum(models.Reservas.cantidad_reservada))
+            .filter(models.Reservas.estado == "ACTIVA"), models.Reservas.id_producto
+        ).group_by(models.Reservas.id_producto, models.Reservas.id_ubicacion)
+        for id_producto, id_ubicacion, cantidad in reservas:
+            _fila(id_producto, 0)["reservado"] += cantidad or 0
+            _fila(id_producto, id_ubicacion)["reservado"] = cantidad or 0
+
+        transito = _filtrar(
+            db.query(models.OrdenCompraDetalle.id_producto, func.sum(models.OrdenCompraDetalle.cantidad_pendiente))
+            .join(models.OrdenCompra, models.OrdenCompra.id_orden_compra == models.OrdenCompraDetalle.id_orden_compra)
+            .join(models.EstadoOrdenCompra, models.EstadoOrdenCompra.id_estado == models.OrdenCompra.id_estado)
+            .filter(
+                models.OrdenCompra.activo == True,
+                models.OrdenCompraDetalle.activo == True,
+                models.OrdenCompraDetalle.cantidad_pendiente > 0,
+                models.EstadoOrdenCompra.es_estado_inicial == False,
+                models.EstadoOrdenCompra.es_estado_final == False,
+            ), models.OrdenCompraDetalle.id_producto
+        ).group_by(models.OrdenCompraDetalle.id_producto)
+        for id_producto, cantidad in transito:
+            _fila(id_producto, 0)["en_transito"] = cantidad or 0
+
+        return filas
+
+    def refrescar_productos(self, db: Session, ids_producto: List[int]) -> int:
+        """Recalcular desde origen las filas de los productos indicados (sin commit)"""
+        ids = sorted(set(ids_producto))
+        tabla = models.DisponibilidadProducto.__table__
+        total = 0
+        for lote in self._lotes(ids, self.TAMANO_LOTE_IN):
+            filas = list(self._calcular(db, lote).values())
+            db.execute(tabla.delete().where(tabla.c.id_producto.in_(lote)))
+            if filas:
+                db.execute(tabla.insert(), filas)
+            total += len(filas)
+        return total
+
+    def recalcular(self, db: Session) -> int:
+        """Reconstruir la tabla completa desde las tablas origen"""
+        tabla = models.DisponibilidadProducto.__table__
+        filas = list(self._calcular(db, None).values())
+        db.execute(tabla.delete())
+        for lote in self._lotes(filas, 5000):
+            db.execute(tabla.insert(), lote)
+        db.commit()
+        return len(filas)
+
+    def _upsert_sumando(self, db: Session, filas: List[Dict[str, Any]]) -> None:
+        from utils.upsert import upsert
+
+        tabla = models.DisponibilidadProducto.__table__
+        if upsert(db, tabla, filas, ["id_producto", "id_ubicacion"],
+                  lambda nuevos: {campo: tabla.c[campo] + nuevos[campo] for campo in self.CAMPOS}):
+            return
+        # Solo llegan claves existentes (ver aplicar_deltas)
+        for fila in filas:
+            db.execute(tabla.update().where(and_(
+                tabla.c.id_producto == fila["id_producto"], tabla.c.id_ubicacion == fila["id_ubicacion"]
+            )).values({campo: tabla.c[campo] + fila[campo] for campo in self.CAMPOS}))
+
+    def aplicar_deltas(self, db: Session, deltas: List[Dict[str, Any]]) -> None:
+        """Sumar variaciones (en_mano/reservado/en_transito) por producto y ubicación, sin commit
+
+        Llamar después de hacer flush del cambio origen: los productos que aún
+        no tienen fila se calculan completos desde las tablas origen.
+        """
+        acumulado: Dict[tuple, Dict[str, Any]] = {}
+        for delta in deltas:
+            clave = (delta["id_producto"], delta.get("id_ubicacion") or 0)
+            fila = acumulado.setdefault(clave, {"id_producto": clave[0], "id_ubicacion": clave[1],
+                                                "en_mano": 0, "reservado": 0, "en_transito": 0})
+            for campo in self.CAMPOS:
+                fila[campo] += delta.get(campo, 0) or 0
+        if not acumulado:
+            return
+
+        from sqlalchemy import select
+
+        db.flush()
+        tabla = models.DisponibilidadProducto.__table__
+        ids = sorted({id_producto for id_producto, _ in acumulado})
+        existentes = set()
+        for lote in self._lotes(ids, self.TAMANO_LOTE_IN):
+            existentes.update(
+                (id_producto, id_ubicacion) for id_producto, id_ubicacion in db.execute(
+                    select(tabla.c.id_producto, tabla.c.id_ubicacion).where(tabla.c.id_producto.in_(lote))
+                )
+            )
+
+        faltantes = {id_producto for id_producto, id_ubicacion in acumulado
+                     if (id_producto, id_ubicacion) not in existentes}
+        if faltantes:
+            self.refrescar_productos(db, list(faltantes))
+        filas = [fila for (id_producto, _), fila in acumulado.items()
+                 if id_producto not in faltantes and any(fila[campo] for campo in self.CAMPOS)]
+        if filas:
+            self._upsert_sumando(db, filas)
+        self._registrar_cruces_stock(db, {id_producto: fila["en_mano"] for (id_producto, id_ubicacion), fila
+                                          in acumulado.items() if id_ubicacion == 0 and fila["en_mano"]})
+
+    def _registrar_cruces_stock(self, db: Session, deltas_en_mano: Dict[int, Any]) -> None:
+        """Evento "stock.cruce" para los productos que entran o salen de bajo mínimo / agotado"""
+        from utils.eventos import eventos_activos, registrar
+
+        if not deltas_en_mano or not eventos_activos():
+            return
+        for lote in self._lotes(sorted(deltas_en_mano), self.TAMANO_LOTE_IN):
+            productos = db.query(models.Producto.id_producto, models.Producto.sku,
+                                 models.Producto.stock_actual, models.Producto.stock_minimo)\
+                .filter(models.Producto.id_producto.in_(lote)).all()
+            for id_producto, sku, stock, minimo in productos:
+                stock, minimo = stock or 0, minimo or 0
+                anterior = stock - deltas_en_mano[id_producto]
+                if (anterior <= minimo) == (stock <= minimo) and (anterior <= 0) == (stock <= 0):
+                    continue
+                registrar(db, "stock", "stock.cruce", {
+                    "id_producto": id_producto, "sku": sku, "stock_anterior": anterior, "stock_actual": stock,
+                    "stock_minimo": minimo, "bajo_minimo": stock <= minimo, "agotado": stock <= 0,
+                })
+
+    def deltas_reserva(self, reserva: models.Reservas, signo: int = 1) -> List[Dict[str, Any]]:
+        """Aporte de una reserva a la disponibilidad (vacío si no está activa)"""
+        if reserva.estado not in (None, "ACTIVA") or not reserva.cantidad_reservada:
+            return []
+        cantidad = signo * reserva.cantidad_reservada
+        return [
+            {"id_producto": reserva.id_producto, "id_ubicacion": 0, "reservado": cantidad},
+            {"id_producto": reserva.id_producto, "id_ubicacion": reserva.id_ubicacion, "reservado": cantidad},
+        ]
+
+    def deltas_ubicacion(self, ubicacion: models.ProductoUbicacion, signo: int = 1) -> List[Dict[str, Any]]:
+        """Aporte de una ubicación a la disponibilidad (vacío si está inactiva)"""
+        if not ubicacion.activo or not ubicacion.cantidad:
+            return []
+        return [{"id_producto": ubicacion.id_producto, "id_ubicacion": ubicacion.id_ubicacion,
+                 "en_mano": signo * ubicacion.cantidad}]
+
+    def consultar(self, db: Session, lineas: List[Dict[str, Any]], incluir_ubicaciones: bool = False) -> List[Dict[str, Any]]:
+        """Disponibilidad de muchos productos en una sola pasada (una consulta por cada 1000 ids)"""
+        solicitado: Dict[int, Any] = {}
+        for linea in lineas:
+            id_producto = linea["id_producto"]
+            if linea.get("cantidad") is not None:
+                solicitado[id_producto] = solicitado.get(id_producto, 0) + linea["cantidad"]
+            else:
+                solicitado.setdefault(id_producto, None)
+        ids = list(solicitado)
+        tabla = models.DisponibilidadProducto.__table__
+
+        def _leer():
+            filas = []
+            for lote in self._lotes(ids, self.TAMANO_LOTE_IN):
+                query = tabla.select().where(tabla.c.id_producto.in_(lote))
+                if not incluir_ubicaciones:
+                    query = query.where(tabla.c.id_ubicacion == 0)
+                filas.extend(db.execute(query))
+            return filas
+
+        filas = _leer()
+        sin_calcular = set(ids) - {fila.id_producto for fila in filas if fila.id_ubicacion == 0}
+        if sin_calcular:
+            # Productos aún no materializados: calcularlos en la transacción
+            # del llamador, que los persiste al confirmar
+            existentes = {
+                id_producto for (id_producto,) in db.query(models.Producto.id_producto)
+                .filter(models.Producto.id_producto.in_(sin_calcular))
+            }
+            if existentes:
+                self.refrescar_productos(db, list(existentes))
+                db.flush()
+                filas = _leer()
+
+        totales: Dict[int, Dict[str, Any]] = {}
+        ubicaciones: Dict[int, List[Dict[str, Any]]] = {}
+        for fila in filas:
+            disponible = fila.en_mano - fila.reservado
+            if fila.id_ubicacion == 0:
+                totales[fila.id_producto] = {
+                    "id_producto": fila.id_producto, "en_mano": fila.en_mano, "reservado": fila.reservado,
+                    "en_transito": fila.en_transito, "disponible": disponible, "atp": disponible + fila.en_transito,
+                }
+            else:
+                ubicaciones.setdefault(fila.id_producto, []).append({
+                    "id_ubicacion": fila.id_ubicacion, "en_mano": fila.en_mano,
+                    "reservado": fila.reservado, "disponible": disponible,
+                })
+
+        resultado = []
+        for id_producto in ids:
+            total = totales.get(id_producto)
+            if total is None:
+                continue
+            cantidad = solicitado[id_producto]
+            if cantidad is not None:
+                total["cantidad_solicitada"] = cantidad
+                total["suficiente"] = total["disponible"] >= cantidad
+            if incluir_ubicaciones:
+                total["ubicaciones"] = ubicaciones.get(id_producto, [])
+            resultado.append(total)
+        return resultado
+
+
+# Instancia global de DisponibilidadCRUD
+disponibilidad_crud = DisponibilidadCRUD()
+
+
+# ========================================
+# CRUD PARA COSTO PROMEDIO PONDERADO
+# ========================================
+
+class CostoPromedioCRUD:
+    """Costo promedio móvil de Producto.costo_promedio
+
+    Cada entrada valorizada ajusta el costo en O(1) con la cantidad y el
+    valor en mano: (stock * costo + cantidad * costo_entrada) / (stock + cantidad).
+    Las salidas no cambian el costo unitario, solo la cantidad.
+    """
+
+    TIPOS_ENTRADA_VALORIZADA = ("ENT",)
+    TAMANO_LOTE = 1000
+
+    def _costo_nuevo(self, tabla, cantidad, costo):
+        from sqlalchemy import case
+
+        previa = case((tabla.c.stock_actual > 0, tabla.c.stock_actual), else_=0)
+        return case(
+            (previa + cantidad > 0,
+             (previa * func.coalesce(tabla.c.costo_promedio, costo) + cantidad * costo) / (previa + cantidad)),
+            else_=costo
+        )
+
+    def aplicar_entradas(self, db: Session, entradas: List[Dict[str, Any]], sumar_stock: bool = True) -> int:
+        """Aplicar entradas (id_producto, cantidad, costo_unitario) al costo, una sentencia por lote y sin commit
+
+        Con sumar_stock la misma sentencia suma la cantidad a stock_actual;
+        el costo se asigna primero porque MySQL evalúa el SET en orden.
+        """
+        from sqlalchemy import Numeric, bindparam, update
+
+        por_producto: Dict[int, List[Any]] = {}
+        for entrada in entradas:
+            if not entrada["cantidad"] or entrada["cantidad"] <= 0 or entrada.get("costo_unitario") is None:
+                continue
+            acumulado = por_producto.setdefault(entrada["id_producto"], [0, 0])
+            acumulado[0] += entrada["cantidad"]
+            acumulado[1] += entrada["cantidad"] * entrada["costo_unitario"]
+        if not por_producto:
+            return 0
+
+        tabla = models.Producto.__table__
+        # Tipados: sqlite3 no acepta Decimal como parámetro
+        cantidad, costo = bindparam("b_cantidad", type_=Numeric(12, 4)), bindparam("b_costo", type_=Numeric(15, 4))
+        valores = [(tabla.c.costo_promedio, self._costo_nuevo(tabla, cantidad, costo))]
+        if sumar_stock:
+            valores.append((tabla.c.stock_actual, tabla.c.stock_actual + cantidad))
+        sentencia = update(tabla).where(tabla.c.id_producto == bindparam("b_id")).ordered_values(*valores)
+
+        filas = [{"b_id": id_producto, "b_cantidad": total, "b_costo": valor / total}
+                 for id_producto, (total, valor) in sorted(por_producto.items()) if total > 0]
+        for inicio in range(0, len(filas), self.TAMANO_LOTE):
+            db.execute(sentencia, filas[inicio:inicio + self.TAMANO_LOTE])
+        return len(filas)
+
+    def reconstruir(self, db: Session, ids_producto: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Recalcular el costo reproduciendo el kardex procesado en orden cronológico
+
+        Lee los movimientos en flujo ordenados por producto, por lo que la
+        memoria no depende del tamaño del historial. Solo actualiza los
+        productos con al menos una entrada valorizada.
+        """
+        from sqlalchemy import bindparam, update
+        from utils.cronometro import Cronometro
+
+        cronometro = Cronometro()
+        consulta = (db.query(models.MovimientoDetalle.id_producto, models.MovimientoDetalle.cantidad,
+                             models.MovimientoDetalle.costo_unitario, models.TipoMovimiento.codigo_tipo,
+                             models.TipoMovimiento.afecta_stock)
+                    .join(models.MovimientoInventario,
+                          models.MovimientoInventario.id_movimiento == models.MovimientoDetalle.id_movimiento)
+                    .join(models.TipoMovimiento,
+                          models.TipoMovimiento.id_tipo_movimiento == models.MovimientoInventario.id_tipo_movimiento)
+                    .filter(models.MovimientoInventario.estado == "PROCESADO"))
+        if ids_producto:
+            consulta = consulta.filter(models.MovimientoDetalle.id_producto.in_(ids_producto))
+        consulta = consulta.order_by(models.MovimientoDetalle.id_producto,
+                                     models.MovimientoInventario.fecha_movimiento,
+                                     models.MovimientoDetalle.id_detalle)
+
+        costos: Dict[int, float] = {}
+        movimientos = 0
+        producto_actual, cantidad, costo = None, 0.0, None
+        for fila in consulta.yield_per(5000):
+            if fila.id_producto != producto_actual:
+                if producto_actual is not None and costo is not None:
+                    costos[producto_actual] = costo
+                producto_actual, cantidad, costo = fila.id_producto, 0.0, None
+            movimientos += 1
+            unidades = float(fila.cantidad or 0)
+            if fila.afecta_stock == "AUMENTA":
+                if fila.codigo_tipo in self.TIPOS_ENTRADA_VALORIZADA and fila.costo_unitario and unidades > 0:
+                    previa = max(cantidad, 0.0)
+                    costo_entrada = float(fila.costo_unitario)
+                    costo = (previa * (costo if costo is not None else costo_entrada) + unidades * costo_entrada) / (previa + unidades)
+                cantidad += unidades
+            elif fila.afecta_stock == "DISMINUYE":
+                cantidad -= unidades
+        if producto_actual is not None and costo is not None:
+            costos[producto_actual] = costo
+
+        tabla = models.Producto.__table__
+        sentencia = update(tabla).where(tabla.c.id_producto == bindparam("b_id")).values(
+            costo_promedio=bindparam("b_costo"))
+        filas = [{"b_id": id_producto, "b_costo": round(valor, 4)} for id_producto, valor in costos.items()]
+        for inicio in range(0, len(filas), self.TAMANO_LOTE):
+            db.execute(sentencia, filas[inicio:inicio + self.TAMANO_LOTE])
+        db.commit()
+
+        return {
+            "movimientos": movimientos,
+            "productos_actualizados": len(filas),
+            "total_ms": cronometro.total_ms,
+        }
+
+
+# Instancia global de CostoPromedioCRUD
+costo_promedio_crud = CostoPromedioCRUD()
+
+
+# ========================================
+# CRUD PARA CAPAS DE COSTO (FIFO)
+# ========================================
+
+class CapaCostoCRUD:
+    """Capas de costo FIFO por producto y bodega
+
+    Las entradas agregan una capa por producto, bodega y documento; las
+    salidas consumen las capas más antiguas (primero las de su bodega) y
+    quedan registradas en consumos_capa, lo que permite valorizar a
+    cualquier fecha sin recalcular el historial.
+    """
+
+    TAMANO_LOTE = 5000
+
+    def _con_bodega(self, db: Session, lineas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copia de las líneas con id_bodega resuelto desde id_ubicacion cuando falta"""
+        ids_ubicacion = {linea.get("id_ubicacion") for linea in lineas
+                         if not linea.get("id_bodega") and linea.get("id_ubicacion")}
+        bodegas: Dict[int, int] = {}
+        if ids_ubicacion:
+            bodegas = dict(
+                db.query(models.ProductoUbicacion.id_ubicacion, models.Pasillo.id_bodega)
+                .join(models.Estante, models.Estante.id_estante == models.ProductoUbicacion.id_estante)
+                .join(models.Pasillo, models.Pasillo.id_pasillo == models.Estante.id_pasillo)
+                .filter(models.ProductoUbicacion.id_ubicacion.in_(ids_ubicacion))
+                .all()
+            )
+        return [{**linea, "id_bodega": linea.get("id_bodega") or bodegas.get(linea.get("id_ubicacion"))}
+                for linea in lineas]
+
+    def _costos_promedio(self, db: Session, ids_producto) -> Dict[int, Any]:
+        return dict(db.query(models.Producto.id_producto, models.Producto.costo_promedio)
+                    .filter(models.Producto.id_producto.in_(ids_producto)).all())
+
+    def _insertar(self, db: Session, tabla, filas: List[Dict[str, Any]]) -> None:
+        for inicio in range(0, len(filas), self.TAMANO_LOTE):
+            db.execute(tabla.insert(), filas[inicio:inicio + self.TAMANO_LOTE])
+
+    def agregar_capas(self, db: Session, entradas: List[Dict[str, Any]], origen: str,
+                      referencia: Optional[str] = None, fecha: Optional[datetime] = None) -> int:
+        """Registrar entradas (id_producto, cantidad, costo_unitario, id_bodega o id_ubicacion) como capas, sin commit
+
+        Sin costo_unitario la capa toma el costo promedio del producto.
+        """
+        fecha = fecha or datetime.now()
+        entradas = [entrada for entrada in self._con_bodega(db, entradas) if entrada["cantidad"] and entrada["cantidad"] > 0]
+        sin_costo = {entrada["id_producto"] for entrada in entradas if not entrada.get("costo_unitario")}
+        promedios = self._costos_promedio(db, sin_costo) if sin_costo else {}
+
+        agrupadas: Dict[tuple, List[Any]] = {}
+        for entrada in entradas:
+            costo = entrada.get("costo_unitario") or promedios.get(entrada["id_producto"]) or 0
+            acumulado = agrupadas.setdefault((entrada["id_producto"], entrada["id_bodega"]), [0, 0])
+            acumulado[0] += entrada["cantidad"]
+            acumulado[1] += entrada["cantidad"] * costo
+
+        filas = [
+            {"id_producto": id_producto, "id_bodega": id_bodega, "fecha_entrada": fecha,
+             "cantidad_inicial": cantidad, "cantidad_restante": cantidad, "costo_unitario": valor / cantidad,
+             "origen": origen, "referencia": referencia}
+            for (id_producto, id_bodega), (cantidad, valor) in agrupadas.items()
+        ]
+        self._insertar(db, models.CapaCosto.__table__, filas)
+        return len(filas)
+
+    def consumir(self, db: Session, salidas: List[Dict[str, Any]], origen: str, referencia: Optional[str] = None,
+                 id_obra: Optional[int] = None, fecha: Optional[datetime] = None) -> Dict[int, Any]:
+        """Consumir capas FIFO para salidas (id_producto, cantidad, id_bodega o id_ubicacion), sin commit
+
+        Lo que las capas no cubren se registra sin capa al costo promedio.
+        Retorna el costo consumido por producto.
+        """
+        from sqlalchemy import bindparam, update
+
+        fecha = fecha or datetime.now()
+        salidas = [salida for salida in self._con_bodega(db, salidas) if salida["cantidad"] and salida["cantidad"] > 0]
+        if not salidas:
+            return {}
+        ids_producto = sorted({salida["id_producto"] for salida in salidas})
+
+        capas: Dict[int, List[List[Any]]] = {}
+        for fila in (db.query(models.CapaCosto.id_capa, models.CapaCosto.id_producto, models.CapaCosto.id_bodega,
+                              models.CapaCosto.cantidad_restante, models.CapaCosto.costo_unitario)
+                     .filter(models.CapaCosto.id_producto.in_(ids_producto), models.CapaCosto.cantidad_restante > 0)
+                     .order_by(models.CapaCosto.id_producto, models.CapaCosto.fecha_entrada, models.CapaCosto.id_capa)
+                     .with_for_update()):
+            capas.setdefault(fila.id_producto, []).append(
+                [fila.id_capa, fila.id_bodega, fila.cantidad_restante, fila.costo_unitario])
+
+        consumos, descuentos, faltantes = [], {}, []
+        costos: Dict[int, Any] = {}
+
+        def _consumo(id_capa, salida, cantidad, costo):
+            consumos.append({
+                "id_capa": id_capa, "id_producto": salida["id_producto"], "id_bodega": salida["id_bodega"],
+                "id_obra": id_obra, "fecha": fecha, "cantidad": cantidad, "costo_unitario": costo,
+                "origen": origen, "referencia": referencia,
+            })
+            costos[salida["id_producto"]] = costos.get(salida["id_producto"], 0) + cantidad * costo
+
+        for salida in salidas:
+            pendiente = salida["cantidad"]
+            candidatas = capas.get(salida["id_producto"], [])
+            if salida["id_bodega"]:
+                # sorted es estable: dentro de cada grupo se mantiene el orden FIFO
+                candidatas = sorted(candidatas, key=lambda capa: capa[1] != salida["id_bodega"])
+            for capa in candidatas:
+                if pendiente <= 0:
+                    break
+                if capa[2] <= 0:
+                    continue
+                tomar = min(pendiente, capa[2])
+                capa[2] -= tomar
+                pendiente -= tomar
+                descuentos[capa[0]] = descuentos.get(capa[0], 0) + tomar
+                _consumo(capa[0], salida, tomar, capa[3])
+            if pendiente > 0:
+                faltantes.append((salida, pendiente))
+
+        if faltantes:
+            promedios = self._costos_promedio(db, {salida["id_producto"] for salida, _ in faltantes})
+            for salida, pendiente in faltantes:
+                _consumo(None, salida, pendiente, promedios.get(salida["id_producto"]) or 0)
+
+        if descuentos:
+            tabla = models.CapaCosto.__table__
+            db.execute(
+                update(tabla).where(tabla.c.id_capa == bindparam("b_id"))
+                .values(cantidad_restante=tabla.c.cantidad_restante - bindparam("b_cantidad")),
+                [{"b_id": id_capa, "b_cantidad": cantidad} for id_capa, cantidad in descuentos.items()]
+            )
+        self._insertar(db, models.ConsumoCapa.__table__, consumos)
+        return costos
+
+    def inicializar(self, db: Session) -> int:
+        """Crear capas de apertura al costo promedio para el stock de productos sin capas"""
+        from sqlalchemy import exists
+
+        productos = (db.query(models.Producto.id_producto, models.Producto.stock_actual, models.Producto.costo_promedio)
+                     .filter(models.Producto.stock_actual > 0,
+                             ~exists().where(models.CapaCosto.id_producto == models.Producto.id_producto))
+                     .order_by(models.Producto.id_producto).all())
+        if not productos:
+            return 0
+
+        # Reparto del stock por bodega según las ubicaciones; el resto queda sin bodega
+        por_bodega: Dict[int, List[Any]] = {}
+        ids = [producto.id_producto for producto in productos]
+        for inicio in range(0, len(ids), 1000):
+            for fila in (db.query(models.ProductoUbicacion.id_producto, models.Pasillo.id_bodega,
+                                  func.sum(models.ProductoUbicacion.cantidad))
+                         .join(models.Estante, models.Estante.id_estante == models.ProductoUbicacion.id_estante)
+                         .join(models.Pasillo, models.Pasillo.id_pasillo == models.Estante.id_pasillo)
+                         .filter(models.ProductoUbicacion.id_producto.in_(ids[inicio:inicio + 1000]),
+                                 models.ProductoUbicacion.cantidad > 0)
+                         .group_by(models.ProductoUbicacion.id_producto, models.Pasillo.id_bodega)):
+                por_bodega.setdefault(fila[0], []).append((fila[1], fila[2]))
+
+        ahora = datetime.now()
+        filas = []
+        for producto in productos:
+            pendiente = producto.stock_actual
+            for id_bodega, cantidad in por_bodega.get(producto.id_producto, []) + [(None, None)]:
+                cantidad = pendiente if cantidad is None else min(pendiente, cantidad)
+                if cantidad <= 0:
+                    continue
+                pendiente -= cantidad
+                filas.append({
+                    "id_producto": producto.id_producto, "id_bodega": id_bodega, "fecha_entrada": ahora,
+                    "cantidad_inicial": cantidad, "cantidad_restante": cantidad,
+                    "costo_unitario": producto.costo_promedio or 0, "origen": "APE", "referencia": "APERTURA",
+                })
+        self._insertar(db, models.CapaCosto.__table__, filas)
+        db.commit()
+        return len(filas)
+
+    def valorizar_csv(self, db: Session, fecha_corte: date, por: str = "bodega"):
+        """Valorización FIFO de todo el catálogo a la fecha de corte, como bloques de líneas CSV
+
+        Una sola consulta agregada leída en flujo: por bodega, lo que queda
+        de cada capa descontando sus consumos hasta la fecha; por obra, el
+        valor FIFO de lo despachado a cada obra.
+        """
+        import csv
+        import io
+        from datetime import timedelta
+
+        limite = datetime.combine(fecha_corte + timedelta(days=1), time.min)
+        if por == "obra":
+            cantidad = func.sum(models.ConsumoCapa.cantidad)
+            valor = func.sum(models.ConsumoCapa.cantidad * models.ConsumoCapa.costo_unitario)
+            consulta = (db.query(models.ConsumoCapa.id_obra, models.ConsumoCapa.id_producto, models.Producto.sku,
+                                 cantidad, valor)
+                        .join(models.Producto, models.Producto.id_producto == models.ConsumoCapa.id_producto)
+                        .filter(models.ConsumoCapa.id_obra.isnot(None), models.ConsumoCapa.fecha < limite)
+                        .group_by(models.ConsumoCapa.id_obra, models.ConsumoCapa.id_producto, models.Producto.sku)
+                        .order_by(models.ConsumoCapa.id_obra, models.ConsumoCapa.id_producto))
+        else:
+            consumido = (db.query(models.ConsumoCapa.id_capa.label("id_capa"),
+                                  func.sum(models.ConsumoCapa.cantidad).label("cantidad"))
+                         .filter(models.ConsumoCapa.id_capa.isnot(None), models.ConsumoCapa.fecha < limite)
+                         .group_by(models.ConsumoCapa.id_capa).subquery())
+            restante = models.CapaCosto.cantidad_inicial - func.coalesce(consumido.c.cantidad, 0)
+            cantidad = func.sum(restante)
+            valor = func.sum(restante * models.CapaCosto.costo_unitario)
+            consulta = (db.query(models.CapaCosto.id_bodega, models.CapaCosto.id_producto, models.Producto.sku,
+                                 cantidad, valor)
+                        .join(models.Producto, models.Producto.id_producto == models.CapaCosto.id_producto)
+                        .outerjoin(consumido, consumido.c.id_capa == models.CapaCosto.id_capa)
+                        .filter(models.CapaCosto.fecha_entrada < limite)
+                        .group_by(models.CapaCosto.id_bodega, models.CapaCosto.id_producto, models.Producto.sku)
+                        .having(cantidad > 0)
+                        .order_by(models.CapaCosto.id_bodega, models.CapaCosto.id_producto))
+
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(["fecha_corte", "id_obra" if por == "obra" else "id_bodega", "id_producto", "sku",
+                           "cantidad", "costo_unitario_fifo", "valor"])
+        for numero, (grupo, id_producto, sku, total, monto) in enumerate(consulta.yield_per(self.TAMANO_LOTE), 1):
+            escritor.writerow([fecha_corte.isoformat(), grupo if grupo is not None else "", id_producto, sku,
+                               total, round(monto / total, 4) if total else 0, round(monto, 2)])
+            if numero % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+# Instancia global de CapaCostoCRUD
+capa_costo_crud = CapaCostoCRUD()
+
+
+# ========================================
+# CRUD PARA KARDEX
+# ========================================
+
+class KardexCRUD:
+    """Kardex por producto con saldos acumulados calculados en SQL (SUM() OVER)"""
+
+    COLUMNAS = ("id_detalle", "id_movimiento", "numero_movimiento", "fecha_movimiento", "codigo_tipo",
+                "id_ubicacion_origen", "id_ubicacion_destino", "entrada", "salida", "costo_unitario",
+                "saldo_cantidad", "saldo_valor")
+    TAMANO_LOTE = 2000
+
+    def consulta(self, db: Session, id_producto: int, id_ubicacion: Optional[int] = None,
+                 fecha_desde: Optional[date] = None, fecha_hasta: Optional[date] = None):
+        """Movimientos procesados del producto con saldo de cantidad y valor
+
+        El saldo se calcula sobre todo el historial y el rango de fechas se
+        aplica después, para que la primera fila arrastre el saldo anterior.
+        Con id_ubicacion las transferencias suman o restan según el lado.
+        """
+        from datetime import timedelta
+        from sqlalchemy import case
+
+        detalle = models.MovimientoDetalle
+        movimiento = models.MovimientoInventario
+        tipo = models.TipoMovimiento
+
+        if id_ubicacion:
+            signo = case((detalle.id_ubicacion_destino == id_ubicacion, 1),
+                         (detalle.id_ubicacion_origen == id_ubicacion, -1), else_=0)
+        else:
+            signo = case((tipo.afecta_stock == "AUMENTA", 1), (tipo.afecta_stock == "DISMINUYE", -1), else_=0)
+        valor = func.coalesce(detalle.costo_total, detalle.cantidad * detalle.costo_unitario, 0)
+        orden = (movimiento.fecha_movimiento, detalle.id_detalle)
+
+        filas = (db.query(
+                    detalle.id_detalle, detalle.id_movimiento, movimiento.numero_movimiento,
+                    movimiento.fecha_movimiento, tipo.codigo_tipo,
+                    detalle.id_ubicacion_origen, detalle.id_ubicacion_destino,
+                    case((signo > 0, detalle.cantidad), else_=0).label("entrada"),
+                    case((signo < 0, detalle.cantidad), else_=0).label("salida"),
+                    detalle.costo_unitario,
+                    func.sum(signo * detalle.cantidad).over(order_by=orden).label("saldo_cantidad"),
+                    func.sum(signo * valor).over(order_by=orden).label("saldo_valor"))
+                 .join(movimiento, movimiento.id_movimiento == detalle.id_movimiento)
+                 .join(tipo, tipo.id_tipo_movimiento == movimiento.id_tipo_movimiento)
+                 .filter(detalle.id_producto == id_producto, movimiento.estado == "PROCESADO"))
+        if id_ubicacion:
+            filas = filas.filter(or_(detalle.id_ubicacion_origen == id_ubicacion,
+                                     detalle.id_ubicacion_destino == id_ubicacion))
+        kardex = filas.subquery()
+
+        consulta = db.query(*[kardex.c[columna] for columna in self.COLUMNAS])
+        if fecha_desde:
+            consulta = consulta.filter(kardex.c.fecha_movimiento >= fecha_desde)
+        if fecha_hasta:
+            consulta = consulta.filter(kardex.c.fecha_movimiento < fecha_hasta + timedelta(days=1))
+        return consulta.order_by(kardex.c.fecha_movimiento, kardex.c.id_detalle)
+
+    def exportar(self, db: Session, id_producto: int, formato: str = "ndjson", **filtros):
+        """Kardex en bloques de texto NDJSON o CSV, leído en flujo desde la base"""
+        import csv
+        import io
+        import json
+
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer) if formato == "csv" else None
+        if escritor:
+            escritor.writerow(self.COLUMNAS)
+
+        for numero, fila in enumerate(self.consulta(db, id_producto, **filtros).yield_per(self.TAMANO_LOTE), 1):
+            valores = [valor.isoformat() if isinstance(valor, datetime) else valor for valor in fila]
+            if escritor:
+                escritor.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(self.COLUMNAS, valores)), default=float, ensure_ascii=False))
+                buffer.write("\n")
+            if numero % self.TAMANO_LOTE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+# Instancia global de KardexCRUD
+kardex_crud = KardexCRUD()
+
+
+# ========================================
+# MOTOR DE EVALUACIÓN DE ALERTAS
+# ========================================
+
+class MotorAlertasCRUD:
+    """Evalúa las reglas de configuracion_alertas en bloque
+
+    Cada tipo de regla es una sola consulta sobre todo el conjunto de
+    datos. El resultado se compara con las alertas abiertas (PENDIENTE o
+    VISTA) de la misma regla para no duplicarlas, las nuevas se insertan
+    en una sentencia y las abiertas que ya no cumplen la regla se resuelven.
+    """
+
+    ESTADOS_ABIERTOS = ("PENDIENTE", "VISTA")
+    # Días por defecto cuando la regla tiene dias_anticipacion = 0
+    DIAS_POR_DEFECTO = {
+        "VENCIMIENTO": 30,
+        "SIN_MOVIMIENTO": 90,
+        "OBRA_SIN_ACTIVIDAD": 30,
+        "DESPACHO_NO_ENTREGADO": 2,
+    }
+    TAMANO_LOTE = 1000
+
+    def _alerta(self, mensaje: str, prioridad: str, id_producto: Optional[int] = None,
+                id_obra: Optional[int] = None, id_despacho: Optional[int] = None) -> Dict[str, Any]:
+        return {"id_producto": id_producto, "id_obra": id_obra, "id_despacho": id_despacho,
+                "mensaje": mensaje, "nivel_prioridad": prioridad}
+
+    # ---------- Reglas (una consulta cada una) ----------
+
+    def _regla_stock_minimo(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        filas = (db.query(models.Producto.id_producto, models.Producto.sku, models.Producto.nombre_producto,
+                          models.Producto.stock_actual, models.Producto.stock_minimo)
+                 .filter(models.Producto.activo == True, models.Producto.stock_minimo > 0,
+                         models.Producto.stock_actual <= models.Producto.stock_minimo))
+        return [self._alerta(f"{f.sku} {f.nombre_producto}: stock {f.stock_actual} bajo el mínimo {f.stock_minimo}",
+                             "CRITICA" if (f.stock_actual or 0) <= 0 else "ALTA", id_producto=f.id_producto)
+                for f in filas]
+
+    def _regla_vencimiento(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        filas = (db.query(models.Lote.id_producto, models.Producto.sku,
+                          func.min(models.Lote.fecha_vencimiento), func.count(models.Lote.id_lote),
+                          func.sum(models.Lote.cantidad_actual))
+                 .join(models.Producto, models.Producto.id_producto == models.Lote.id_producto)
+                 .filter(models.Lote.estado == "ACTIVO", models.Lote.cantidad_actual > 0,
+                         models.Lote.fecha_vencimiento <= hoy + timedelta(days=dias))
+                 .group_by(models.Lote.id_producto, models.Producto.sku))
+        alertas = []
+        for id_producto, sku, vencimiento, lotes, cantidad in filas:
+            restantes = (vencimiento - hoy).days
+            prioridad = "CRITICA" if restantes < 0 else "ALTA" if restantes <= 7 else "MEDIA"
+            alertas.append(self._alerta(
+                f"{sku}: {lotes} lote(s) con {cantidad} unidades vencen desde el {vencimiento.isoformat()}",
+                prioridad, id_producto=id_producto))
+        return alertas
+
+    def _regla_sin_movimiento(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        ultimo = (db.query(models.MovimientoDetalle.id_producto.label("id_producto"),
+                           func.max(models.MovimientoInventario.fecha_movimiento).label("fecha"))
+                  .join(models.MovimientoInventario,
+                        models.MovimientoInventario.id_movimiento == models.MovimientoDetalle.id_movimiento)
+                  .filter(models.MovimientoInventario.estado == "PROCESADO")
+                  .group_by(models.MovimientoDetalle.id_producto).subquery())
+        limite = datetime.combine(hoy - timedelta(days=dias), time.min)
+        filas = (db.query(models.Producto.id_producto, models.Producto.sku, models.Producto.stock_actual, ultimo.c.fecha)
+                 .outerjoin(ultimo, ultimo.c.id_producto == models.Producto.id_producto)
+                 .filter(models.Producto.activo == True, models.Producto.stock_actual > 0,
+                         or_(ultimo.c.fecha.is_(None), ultimo.c.fecha < limite)))
+        return [self._alerta(
+                    f"{f.sku}: {f.stock_actual} unidades sin movimiento "
+                    + (f"desde el {f.fecha.date().isoformat()}" if f.fecha else "registrado"),
+                    "BAJA", id_producto=f.id_producto)
+                for f in filas]
+
+    def _regla_certificacion(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        # No hay fecha de vencimiento de certificados: se alertan los lotes con
+        # stock de productos certificados que no tienen certificado de calidad
+        certificado = or_(models.Producto.certificacion_ul.isnot(None), models.Producto.certificacion_fm.isnot(None),
+                          models.Producto.certificacion_nfpa.isnot(None))
+        filas = (db.query(models.Lote.id_producto, models.Producto.sku, func.count(models.Lote.id_lote))
+                 .join(models.Producto, models.Producto.id_producto == models.Lote.id_producto)
+                 .filter(certificado, models.Lote.cantidad_actual > 0, models.Lote.estado == "ACTIVO",
+                         or_(models.Lote.certificado_calidad.is_(None), models.Lote.certificado_calidad == ""))
+                 .group_by(models.Lote.id_producto, models.Producto.sku))
+        return [self._alerta(f"{sku}: {lotes} lote(s) con stock sin certificado de calidad", "MEDIA", id_producto=id_producto)
+                for id_producto, sku, lotes in filas]
+
+    def _regla_devolucion_pendiente(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        filas = (db.query(models.DespachosObra.id_despacho, models.DespachosObra.id_obra,
+                          models.DespachosObra.numero_despacho, models.DespachosObra.fecha_limite_devolucion)
+                 .filter(models.DespachosObra.requiere_devolucion == True,
+                         models.DespachosObra.estado.in_(["ENTREGADO", "DEVOLUCION_PARCIAL"]),
+                         models.DespachosObra.fecha_limite_devolucion <= hoy + timedelta(days=dias)))
+        return [self._alerta(
+                    f"Despacho {f.numero_despacho}: devolución "
+                    + ("vencida" if f.fecha_limite_devolucion < hoy else "por vencer")
+                    + f" el {f.fecha_limite_devolucion.isoformat()}",
+                    "ALTA" if f.fecha_limite_devolucion < hoy else "MEDIA",
+                    id_obra=f.id_obra, id_despacho=f.id_despacho)
+                for f in filas]
+
+    def _regla_obra_sin_actividad(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        despachos = (db.query(models.DespachosObra.id_obra.label("id_obra"),
+                              func.max(models.DespachosObra.fecha_despacho).label("fecha"))
+                     .group_by(models.DespachosObra.id_obra).subquery())
+        devoluciones = (db.query(models.DevolucionesObra.id_obra.label("id_obra"),
+                                 func.max(models.DevolucionesObra.fecha_devolucion).label("fecha"))
+                        .group_by(models.DevolucionesObra.id_obra).subquery())
+        limite = hoy - timedelta(days=dias)
+        filas = (db.query(models.Obra.id_obra, models.Obra.codigo_obra, despachos.c.fecha, devoluciones.c.fecha)
+                 .outerjoin(despachos, despachos.c.id_obra == models.Obra.id_obra)
+                 .outerjoin(devoluciones, devoluciones.c.id_obra == models.Obra.id_obra)
+                 .filter(models.Obra.estado == "EN_EJECUCION",
+                         or_(despachos.c.fecha.is_(None), despachos.c.fecha < limite),
+                         or_(devoluciones.c.fecha.is_(None), devoluciones.c.fecha < limite)))
+        alertas = []
+        for id_obra, codigo, ultimo_despacho, ultima_devolucion in filas:
+            ultima = max([fecha for fecha in (ultimo_despacho, ultima_devolucion) if fecha], default=None)
+            alertas.append(self._alerta(
+                f"Obra {codigo} en ejecución sin despachos ni devoluciones "
+                + (f"desde el {ultima.isoformat()}" if ultima else "registrados"),
+                "MEDIA", id_obra=id_obra))
+        return alertas
+
+    def _regla_material_vencido_obra(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        filas = (db.query(models.DespachosObra.id_obra, models.DespachosObraDetalle.id_producto, models.Producto.sku,
+                          func.min(models.Lote.fecha_vencimiento))
+                 .join(models.DespachosObraDetalle,
+                       models.DespachosObraDetalle.id_despacho == models.DespachosObra.id_despacho)
+                 .join(models.Lote, models.Lote.id_lote == models.DespachosObraDetalle.id_lote)
+                 .join(models.Producto, models.Producto.id_producto == models.DespachosObraDetalle.id_producto)
+                 .join(models.InventarioObra, and_(
+                     models.InventarioObra.id_obra == models.DespachosObra.id_obra,
+                     models.InventarioObra.id_producto == models.DespachosObraDetalle.id_producto))
+                 .filter(models.InventarioObra.cantidad_actual > 0,
+                         models.Lote.fecha_vencimiento <= hoy + timedelta(days=dias))
+                 .group_by(models.DespachosObra.id_obra, models.DespachosObraDetalle.id_producto, models.Producto.sku))
+        return [self._alerta(f"{sku}: material en obra de un lote que vence el {vencimiento.isoformat()}",
+                             "ALTA" if vencimiento < hoy else "MEDIA", id_producto=id_producto, id_obra=id_obra)
+                for id_obra, id_producto, sku, vencimiento in filas]
+
+    def _regla_despacho_no_entregado(self, db: Session, dias: int, hoy: date) -> List[Dict[str, Any]]:
+        from datetime import timedelta
+
+        filas = (db.query(models.DespachosObra.id_despacho, models.DespachosObra.id_obra,
+                          models.DespachosObra.numero_despacho, models.DespachosObra.fecha_despacho,
+                          models.DespachosObra.estado)
+                 .filter(models.DespachosObra.estado.in_(["PREPARADO", "EN_TRANSITO"]),
+                         models.DespachosObra.fecha_despacho < hoy - timedelta(days=dias)))
+        return [self._alerta(
+                    f"Despacho {f.numero_despacho} del {f.fecha_despacho.isoformat()} sigue en estado {f.estado}",
+                    "ALTA" if (hoy - f.fecha_despacho).days > 2 * dias else "MEDIA",
+                    id_obra=f.id_obra, id_despacho=f.id_despacho)
+                for f in filas]
+
+    REGLAS = {
+        "STOCK_MINIMO": _regla_stock_minimo,
+        "VENCIMIENTO": _regla_vencimiento,
+        "SIN_MOVIMIENTO": _regla_sin_movimiento,
+        "CERTIFICACION_VENCIDA": _regla_certificacion,
+        "DEVOLUCION_PENDIENTE": _regla_devolucion_pendiente,
+        "OBRA_SIN_ACTIVIDAD": _regla_obra_sin_actividad,
+        "MATERIAL_VENCIDO_EN_OBRA": _regla_material_vencido_obra,
+        "DESPACHO_NO_ENTREGADO": _regla_despacho_no_entregado,
+    }
+
+    # ---------- Evaluación ----------
+
+    def _clave(self, fila) -> tuple:
+        if isinstance(fila, dict):
+            return (fila["id_producto"], fila["id_obra"], fila["id_despacho"])
+        return (fila.id_producto, fila.id_obra, fila.id_despacho)
+
+    def evaluar_regla(self, db: Session, regla: models.ConfiguracionAlertas,
+                      resolver_obsoletas: bool = True) -> models.EjecucionAlerta:
+        """Evaluar una regla, insertar las alertas nuevas y registrar la ejecución"""
+        from utils.cronometro import Cronometro
+
+        cronometro = Cronometro()
+        ejecucion = models.EjecucionAlerta(id_alerta=regla.id_alerta, fecha_ejecucion=datetime.now())
+        try:
+            dias = regla.dias_anticipacion or self.DIAS_POR_DEFECTO.get(regla.tipo_alerta, 0)
+            candidatas = self.REGLAS[regla.tipo_alerta](self, db, dias, date.today())
+
+            abiertas = {
+                self._clave(fila): fila.id_log_alerta for fila in
+                db.query(models.LogAlertas.id_log_alerta, models.LogAlertas.id_producto,
+                         models.LogAlertas.id_obra, models.LogAlertas.id_despacho)
+                .filter(models.LogAlertas.id_alerta == regla.id_alerta,
+                        models.LogAlertas.estado.in_(self.ESTADOS_ABIERTOS))
+            }
+            vigentes = {self._clave(alerta) for alerta in candidatas}
+            nuevas = [{**alerta, "id_alerta": regla.id_alerta, "estado": "PENDIENTE", "fecha_generacion": ejecucion.fecha_ejecucion}
+                      for alerta in {self._clave(a): a for a in candidatas}.values()
+                      if self._clave(alerta) not in abiertas]
+            for inicio in range(0, len(nuevas), self.TAMANO_LOTE):
+                db.execute(models.LogAlertas.__table__.insert(), nuevas[inicio:inicio + self.TAMANO_LOTE])
+
+            obsoletas = [id_log for clave, id_log in abiertas.items() if clave not in vigentes] if resolver_obsoletas else []
+            for inicio in range(0, len(obsoletas), self.TAMANO_LOTE):
+                db.query(models.LogAlertas).filter(
+                    models.LogAlertas.id_log_alerta.in_(obsoletas[inicio:inicio + self.TAMANO_LOTE])
+                ).update({
+                    "estado": "RESUELTA", "fecha_resolucion": datetime.now(),
+                    "observaciones_resolucion": "Resuelta automáticamente: la condición ya no se cumple"
+                }, synchronize_session=False)
+
+            ejecucion.candidatos = len(candidatas)
+            ejecucion.nuevas = len(nuevas)
+            ejecucion.resueltas = len(obsoletas)
+            if nuevas or obsoletas:
+                from utils.eventos import registrar
+                registrar(db, "alertas", "alertas.evaluadas", {
+                    "id_alerta": regla.id_alerta, "tipo_alerta": regla.tipo_alerta,
+                    "nuevas": len(nuevas), "resueltas": len(obsoletas),
+                })
+        except Exception as e:
+            db.rollback()
+            ejecucion.estado = "ERROR"
+            ejecucion.error = str(e)[:2000]
+            print(f"⚠️ Error evaluando la alerta {regla.id_alerta} ({regla.tipo_alerta}): {e}")
+
+        ejecucion.duracion_ms = cronometro.total_ms
+        db.add(ejecucion)
+        db.commit()
+        return ejecucion
+
+    def evaluar(self, db: Session, ids_alerta: Optional[List[int]] = None, solo_pendientes: bool = False,
+                resolver_obsoletas: bool = True) -> List[models.EjecucionAlerta]:
+        """Evaluar las reglas activas (o las indicadas); con solo_pendientes, solo las que ya cumplieron su frecuencia"""
+        if solo_pendientes:
+            reglas = configuracion_alertas_crud.get_alertas_para_revision(db)
+        else:
+            reglas = db.query(models.ConfiguracionAlertas).filter(models.ConfiguracionAlertas.activa == True).all()
+        if ids_alerta:
+            reglas = [regla for regla in reglas if regla.id_alerta in ids_alerta]
+        return [self.evaluar_regla(db, regla, resolver_obsoletas) for regla in reglas]
+
+    def get_ejecuciones(self, db: Session, id_alerta: Optional[int] = None,
+                        skip: int = 0, limit: int = 100) -> List[models.EjecucionAlerta]:
+        """Historial de ejecuciones, las más recientes primero"""
+        query = db.query(models.EjecucionAlerta)
+        if id_alerta:
+            query = query.filter(models.EjecucionAlerta.id_alerta == id_alerta)
+        return (query.order_by(models.EjecucionAlerta.id_ejecucion.desc())
+                .offset(skip).limit(limit).all())
+
+
+# Instancia global de MotorAlertasCRUD
+motor_alertas_crud = MotorAlertasCRUD()
+
+
+# ========================================
+# EJECUCIONES DE TAREAS PROGRAMADAS
+# ========================================
+
+class EjecucionesTareasCRUD:
+    """Consultas sobre el historial del planificador de tareas"""
+
+    def get_ejecuciones(self, db: Session, tarea: Optional[str] = None, estado: Optional[str] = None,
+                        skip: int = 0, limit: int = 100) -> List[models.EjecucionTarea]:
+        """Historial de ejecuciones, las más recientes primero"""
+        query = db.query(models.EjecucionTarea)
+        if tarea:
+            query = query.filter(models.EjecucionTarea.tarea == tarea)
+        if estado:
+            query = query.filter(models.EjecucionTarea.estado == estado)
+        return (query.order_by(models.EjecucionTarea.id_ejecucion.desc())
+                .offset(skip).limit(limit).all())
+
+    def get_ultimas_por_tarea(self, db: Session) -> Dict[str, models.EjecucionTarea]:
+        """Última ejecución de cada tarea"""
+        ultimas = (db.query(func.max(models.EjecucionTarea.id_ejecucion))
+                   .group_by(models.EjecucionTarea.tarea))
+        return {ejecucion.tarea: ejecucion for ejecucion in
+                db.query(models.EjecucionTarea).filter(models.EjecucionTarea.id_ejecucion.in_(ultimas))}
+
+    def get_estadisticas(self, db: Session, dias: int = 7) -> List[Dict[str, Any]]:
+        """Ejecuciones, errores y duración promedio/máxima por tarea en los últimos días"""
+        from datetime import timedelta
+        from sqlalchemy import case
+        desde = datetime.now() - timedelta(days=dias)
+        filas = (db.query(models.EjecucionTarea.tarea,
+                          func.count(models.EjecucionTarea.id_ejecucion),
+                          func.sum(case((models.EjecucionTarea.estado == "ERROR", 1), else_=0)),
+                          func.avg(models.EjecucionTarea.duracion_ms),
+                          func.max(models.EjecucionTarea.duracion_ms))
+                 .filter(models.EjecucionTarea.fecha_inicio >= desde)
+                 .group_by(models.EjecucionTarea.tarea))
+        return [{"tarea": tarea, "ejecuciones": total, "errores": int(errores or 0),
+                 "duracion_promedio_ms": round(float(promedio or 0), 2), "duracion_max_ms": float(maximo or 0)}
+                for tarea, total, errores, promedio, maximo in filas]
+
+
+# Instancia global de EjecucionesTareasCRUD
+ejecuciones_tareas_crud = EjecucionesTareasCRUD()
+
+
+# ========================================
+# EVENTOS EN VIVO
+# ========================================
+
+class EventosSistemaCRUD:
+    """Mantención de la tabla eventos_sistema (broker de eventos en base de datos)"""
+
+    def purgar(self, db: Session, horas: int = 24) -> int:
+        """Eliminar los eventos de más de `horas`; los clientes solo se reconectan con ids recientes"""
+        from datetime import timedelta
+        limite = datetime.now() - timedelta(hours=horas)
+        eliminados = (db.query(models.EventoSistema)
+                      .filter(models.EventoSistema.fecha < limite)
+                      .delete(synchronize_session=False))
+        db.commit()
+        return eliminados
+
+
+# Instancia global de EventosSistemaCRUD
+eventos_sistema_crud = EventosSistemaCRUD()
+
+
+# ========================================
+# COLA DE TRABAJOS EN SEGUNDO PLANO
+# ========================================
+
+class TrabajosColaCRUD:
+    """Cola durable: encolar, tomar con lease, renovar, cerrar y consultar trabajos"""
+
+    def encolar(self, db: Session, tipo: str, parametros: Optional[Dict[str, Any]] = None, prioridad: int = 0,
+                max_intentos: int = 3, id_usuario: Optional[int] = None) -> models.TrabajoCola:
+        """Crear un trabajo PENDIENTE; lo toma el primer worker libre"""
+        import json
+        ahora = datetime.now()
+        trabajo = models.TrabajoCola(
+            tipo=tipo, parametros=json.dumps(parametros or {}, default=str, ensure_ascii=False),
+            prioridad=prioridad, max_intentos=max_intentos, estado="PENDIENTE",
+            disponible_desde=ahora, fecha_creacion=ahora, id_usuario=id_usuario
+        )
+        db.add(trabajo)
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    def tomar(self, db: Session, worker: str, lease_segundos: int,
+              tipos: Optional[List[str]] = None) -> Optional[models.TrabajoCola]:
+        """Reservar el trabajo pendiente de mayor prioridad; SKIP LOCKED evita esperar filas que otro worker está tomando"""
+        from datetime import timedelta
+        ahora = datetime.now()
+        query = db.query(models.TrabajoCola).filter(models.TrabajoCola.estado == "PENDIENTE",
+                                                   models.TrabajoCola.disponible_desde <= ahora)
+        if tipos:
+            query = query.filter(models.TrabajoCola.tipo.in_(tipos))
+        trabajo = (query.order_by(models.TrabajoCola.prioridad.desc(), models.TrabajoCola.id_trabajo)
+                   .limit(1).with_for_update(skip_locked=True).first())
+        if trabajo is None:
+            db.rollback()
+            return None
+
+        trabajo.estado = "EN_PROCESO"
+        trabajo.intentos += 1
+        trabajo.worker = worker
+        trabajo.bloqueado_hasta = ahora + timedelta(seconds=lease_segundos)
+        trabajo.fecha_inicio = ahora
+        trabajo.progreso = 0
+        trabajo.mensaje_progreso = None
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    def _filtro_propio(self, db: Session, id_trabajo: int, worker: str):
+        return db.query(models.TrabajoCola).filter(models.TrabajoCola.id_trabajo == id_trabajo,
+                                                   models.TrabajoCola.worker == worker,
+                                                   models.TrabajoCola.estado == "EN_PROCESO")
+
+    def renovar(self, db: Session, id_trabajo: int, worker: str, lease_segundos: int,
+                progreso: Optional[float] = None, mensaje: Optional[str] = None) -> bool:
+        """Extender el lease (y el avance); False si el trabajo se canceló o lo tomó otro worker"""
+        from datetime import timedelta
+        valores = {"bloqueado_hasta": datetime.now() + timedelta(seconds=lease_segundos)}
+        if progreso is not None:
+            valores["progreso"] = round(min(max(progreso, 0), 100), 2)
+        if mensaje is not None:
+            valores["mensaje_progreso"] = mensaje[:255]
+        filas = self._filtro_propio(db, id_trabajo, worker).update(valores, synchronize_session=False)
+        db.commit()
+        return filas == 1
+
+    def completar(self, db: Session, id_trabajo: int, worker: str, resultado: Any) -> bool:
+        """Guardar el resultado; False si el worker ya no era dueño del trabajo"""
+        import json
+        filas = self._filtro_propio(db, id_trabajo, worker).update({
+            "estado": "COMPLETADO", "progreso": 100, "fecha_fin": datetime.now(), "bloqueado_hasta": None,
+            "resultado": json.dumps(resultado, default=str, ensure_ascii=False) if resultado is not None else None
+        }, synchronize_session=False)
+        db.commit()
+        return filas == 1
+
+    def fallar(self, db: Session, id_trabajo: int, worker: str, error: str, backoff_segundos: int) -> Optional[str]:
+        """Reprogramar con backoff exponencial o marcar ERROR al agotar los intentos; retorna el nuevo estado"""
+        from datetime import timedelta
+        trabajo = self._filtro_propio(db, id_trabajo, worker).with_for_update().first()
+        if trabajo is None:
+            db.rollback()
+            return None
+
+        ahora = datetime.now()
+        trabajo.error = error[:4000]
+        trabajo.bloqueado_hasta = None
+        if trabajo.intentos < trabajo.max_intentos:
+            trabajo.estado = "PENDIENTE"
+            trabajo.worker = None
+            trabajo.disponible_desde = ahora + timedelta(seconds=backoff_segundos * 2 ** (trabajo.intentos - 1))
+        else:
+            trabajo.estado = "ERROR"
+            trabajo.fecha_fin = ahora
+        estado = trabajo.estado
+        db.commit()
+        return estado
+
+    def liberar_vencidos(self, db: Session) -> int:
+        """Devolver a la cola los trabajos cuyo worker dejó de renovar el lease"""
+        ahora = datetime.now()
+        vencidos = db.query(models.TrabajoCola).filter(models.TrabajoCola.estado == "EN_PROCESO",
+                                                      models.TrabajoCola.bloqueado_hasta < ahora)
+        agotados = (vencidos.filter(models.TrabajoCola.intentos >= models.TrabajoCola.max_intentos)
+                    .update({"estado": "ERROR", "fecha_fin": ahora, "bloqueado_hasta": None,
+                             "error": "Lease vencido: el worker dejó de responder"}, synchronize_session=False))
+        devueltos = (vencidos.filter(models.TrabajoCola.intentos < models.TrabajoCola.max_intentos)
+                     .update({"estado": "PENDIENTE", "worker": None, "bloqueado_hasta": None,
+                              "disponible_desde": ahora}, synchronize_session=False))
+        db.commit()
+        return agotados + devueltos
+
+    def cancelar(self, db: Session, id_trabajo: int) -> Optional[models.TrabajoCola]:
+        """Cancelar un trabajo pendiente o en proceso (el worker lo detecta al informar avance)"""
+        trabajo = self.get_trabajo(db, id_trabajo)
+        if not trabajo:
+            return None
+        if trabajo.estado not in ("PENDIENTE", "EN_PROCESO"):
+            raise ValueError(f"No se puede cancelar un trabajo en estado {trabajo.estado}")
+        trabajo.estado = "CANCELADO"
+        trabajo.fecha_fin = datetime.now()
+        trabajo.bloqueado_hasta = None
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    def reintentar(self, db: Session, id_trabajo: int) -> Optional[models.TrabajoCola]:
+        """Volver a encolar un trabajo con ERROR o CANCELADO, con los intentos reiniciados"""
+        trabajo = self.get_trabajo(db, id_trabajo)
+        if not trabajo:
+            return None
+        if trabajo.estado not in ("ERROR", "CANCELADO"):
+            raise ValueError(f"Solo se reintentan trabajos con ERROR o CANCELADO (estado actual: {trabajo.estado})")
+        trabajo.estado = "PENDIENTE"
+        trabajo.intentos = 0
+        trabajo.worker = None
+        trabajo.disponible_desde = datetime.now()
+        trabajo.fecha_inicio = trabajo.fecha_fin = None
+        trabajo.progreso = 0
+        trabajo.mensaje_progreso = None
+        db.commit()
+        db.refresh(trabajo)
+        return trabajo
+
+    def purgar(self, db: Session, dias: int = 30) -> int:
+        """Eliminar trabajos terminados hace más de `dias` días"""
+        from datetime import timedelta
+        filas = (db.query(models.TrabajoCola)
+                 .filter(models.TrabajoCola.estado.in_(["COMPLETADO", "ERROR", "CANCELADO"]),
+                         models.TrabajoCola.fecha_fin < datetime.now() - timedelta(days=dias))
+                 .delete(synchronize_session=False))
+        db.commit()
+        return filas
+
+    def get_trabajo(self, db: Session, id_trabajo: int) -> Optional[models.TrabajoCola]:
+        return db.query(models.TrabajoCola).filter(models.TrabajoCola.id_trabajo == id_trabajo).first()
+
+    def get_trabajos(self, db: Session, estado: Optional[str] = None, tipo: Optional[str] = None,
+                     skip: int = 0, limit: int = 100) -> List[models.TrabajoCola]:
+        """Trabajos más recientes primero"""
+        query = db.query(models.TrabajoCola)
+        if estado:
+            query = query.filter(models.TrabajoCola.estado == estado)
+        if tipo:
+            query = query.filter(models.TrabajoCola.tipo == tipo)
+        return query.order_by(models.TrabajoCola.id_trabajo.desc()).offset(skip).limit(limit).all()
+
+    def get_estadisticas(self, db: Session) -> Dict[str, Any]:
+        """Trabajos por tipo y estado, y antigüedad del pendiente más antiguo"""
+        por_estado = {}
+        for tipo, estado, total in (db.query(models.TrabajoCola.tipo, models.TrabajoCola.estado,
+                                             func.count(models.TrabajoCola.id_trabajo))
+                                    .group_by(models.TrabajoCola.tipo, models.TrabajoCola.estado)):
+            por_estado.setdefault(tipo, {})[estado] = total
+        mas_antiguo = (db.query(func.min(models.TrabajoCola.disponible_desde))
+                       .filter(models.TrabajoCola.estado == "PENDIENTE",
+                               models.TrabajoCola.disponible_desde <= datetime.now()).scalar())
+        return {
+            "por_tipo": por_estado,
+            "espera_max_segundos": round((datetime.now() - mas_antiguo).total_seconds(), 1) if mas_antiguo else 0,
+        }
+
+
+# Instancia global de TrabajosColaCRUD
+trabajos_cola_crud = TrabajosColaCRUD()
+
+
+# ========================================
+# PLANIFICADOR DE CONTEOS CÍCLICOS
+# ========================================
+
+class PlanificadorConteosCRUD:
+    """Genera las programaciones CICLICO de un período a partir del análisis ABC
+
+    Cada producto con ubicación en una bodega se cuenta según su clase
+    (CONTEO_CICLICO_FRECUENCIAS, conteos por año), el doble si su exactitud
+    reciente es baja y como B si es C pero de valor alto. Los conteos anuales
+    se escalan a la duración del período (hacia arriba, al menos uno) y se
+    reparten a intervalos regulares entre los días hábiles, desfasados para
+    que cada bodega tenga una carga diaria pareja.
+    """
+
+    TAMANO_LOTE = 5000
+
+    @staticmethod
+    def dias_habiles(fecha_desde: date, fecha_hasta: date, feriados: Optional[List[date]] = None) -> List[date]:
+        from datetime import timedelta
+        excluidos = set(feriados or [])
+        dias, dia = [], fecha_desde
+        while dia <= fecha_hasta:
+            if dia.weekday() < 5 and dia not in excluidos:
+                dias.append(dia)
+            dia += timedelta(days=1)
+        return dias
+
+    @staticmethod
+    def conteos_periodo(conteos_anuales: int, dias_periodo: int) -> int:
+        """Conteos por año llevados a un período que dura `dias_periodo` días (fecha_hasta - fecha_desde)"""
+        import math
+        return max(1, math.ceil(conteos_anuales * dias_periodo / 365)) if conteos_anuales > 0 else 0
+
+    def _frecuencias(self, db: Session, ids_producto, frecuencias: Dict[str, int], dias: int,
+                     dias_periodo: int) -> Dict[int, Dict[str, Any]]:
+        """Clase, conteos anuales y del período (a lo más uno por día hábil) y motivo del ajuste de cada producto"""
+        from datetime import timedelta
+        from config import CONTEO_CICLICO_EXACTITUD_MINIMA, CONTEO_CICLICO_VALOR_ALTO
+
+        vista = models.VistaProductosABC
+        clases = {}
+        ids = sorted(ids_producto)
+        for inicio in range(0, len(ids), 1000):
+            # clasificacion_abc_calculada es una propiedad: se evalúa sobre las filas cargadas
+            for fila in db.query(vista).filter(vista.id_producto.in_(ids[inicio:inicio + 1000])):
+                clases[fila.id_producto] = (fila.clasificacion_abc_calculada, float(fila.valor_inventario or 0))
+        exactitud = conteos_fisicos_crud.get_exactitud_por_producto(db, datetime.now() - timedelta(days=365))
+
+        resultado = {}
+        for id_producto in ids_producto:
+            clase, valor = clases.get(id_producto, ("C", 0.0))
+            clase = clase if clase in ("A", "B") else "C"
+            frecuencia, motivo = frecuencias[clase], None
+            if clase == "C" and valor >= CONTEO_CICLICO_VALOR_ALTO:
+                frecuencia, motivo = max(frecuencia, frecuencias["B"]), "Valor de inventario alto"
+            historial = exactitud.get(id_producto)
+            if historial and historial["exactitud"] < CONTEO_CICLICO_EXACTITUD_MINIMA:
+                frecuencia, motivo = frecuencia * 2, f"Exactitud {historial['exactitud']}% en el último año"
+            resultado[id_producto] = {"clase": clase, "conteos_anuales": frecuencia,
+                                      "frecuencia": min(self.conteos_periodo(frecuencia, dias_periodo), dias),
+                                      "motivo": motivo, "prioridad": (motivo is not None, valor)}
+        return resultado
+
+    @staticmethod
+    def _repartir(productos: List[Dict[str, Any]], dias: int) -> Dict[int, List[Dict[str, Any]]]:
+        """Índice de día -> productos a contar, con carga pareja
+
+        Los productos de una misma frecuencia f tienen período p = dias / f y
+        desfases espaciados p / m dentro del período, así que cada grupo aporta
+        una carga uniforme (±1). Cada grupo empieza en el día menos cargado y
+        los de un conteo por período, que se reparten al final, van de a uno
+        al día con menos líneas.
+        """
+        import heapq
+
+        por_dia: Dict[int, List[Dict[str, Any]]] = {}
+        carga = [0] * dias
+        grupos: Dict[int, List[Dict[str, Any]]] = {}
+        for producto in productos:
+            grupos.setdefault(producto["frecuencia"], []).append(producto)
+        for frecuencia in sorted(grupos, reverse=True):
+            if frecuencia == 1:
+                monticulo = [(lineas, dia) for dia, lineas in enumerate(carga)]
+                heapq.heapify(monticulo)
+                for producto in sorted(grupos[1], key=lambda producto: len(producto["ubicaciones"]), reverse=True):
+                    lineas, dia = heapq.heappop(monticulo)
+                    por_dia.setdefault(dia, []).append(producto)
+                    carga[dia] = lineas + len(producto["ubicaciones"])
+                    heapq.heappush(monticulo, (carga[dia], dia))
+                continue
+            grupo = sorted(grupos[frecuencia], key=lambda producto: producto["prioridad"], reverse=True)
+            periodo = dias / frecuencia
+            fase = min(range(max(1, int(periodo))), key=lambda dia: carga[dia])
+            for indice, producto in enumerate(grupo):
+                desfase = (fase + indice * periodo / len(grupo)) % periodo
+                for vuelta in range(frecuencia):
+                    dia = min(int(desfase + vuelta * periodo), dias - 1)
+                    por_dia.setdefault(dia, []).append(producto)
+                    carga[dia] += len(producto["ubicaciones"])
+        return por_dia
+
+    def planificar(self, db: Session, fecha_desde: date, fecha_hasta: date, id_usuario_responsable: int,
+                   ids_bodega: Optional[List[int]] = None, feriados: Optional[List[date]] = None,
+                   frecuencias: Optional[Dict[str, int]] = None, simular: bool = False,
+                   reemplazar: bool = False) -> Dict[str, Any]:
+        """Generar en bloque las programaciones CICLICO y sus líneas para el período"""
+        from config import CONTEO_CICLICO_FRECUENCIAS
+        from utils.cronometro import Cronometro
+
+        cronometro = Cronometro()
+        if fecha_hasta < fecha_desde:
+            raise ValueError("fecha_hasta debe ser posterior a fecha_desde")
+        dias = self.dias_habiles(fecha_desde, fecha_hasta, feriados)
+        if not dias:
+            raise ValueError("El período no tiene días hábiles")
+        frecuencias = {**CONTEO_CICLICO_FRECUENCIAS, **{clase.upper(): valor for clase, valor in (frecuencias or {}).items()}}
+
+        # Productos activos con ubicación, agrupados por bodega
+        consulta = (db.query(models.ProductoUbicacion.id_producto, models.ProductoUbicacion.id_ubicacion,
+                             models.Pasillo.id_bodega)
+                    .join(models.Producto, models.Producto.id_producto == models.ProductoUbicacion.id_producto)
+                    .join(models.Estante, models.Estante.id_estante == models.ProductoUbicacion.id_estante)
+                    .join(models.Pasillo, models.Pasillo.id_pasillo == models.Estante.id_pasillo)
+                    .filter(models.ProductoUbicacion.activo == True, models.Producto.activo == True))
+        if ids_bodega:
+            consulta = consulta.filter(models.Pasillo.id_bodega.in_(ids_bodega))
+        ubicaciones: Dict[tuple, List[int]] = {}
+        for id_producto, id_ubicacion, id_bodega in consulta.yield_per(self.TAMANO_LOTE):
+            ubicaciones.setdefault((id_bodega, id_producto), []).append(id_ubicacion)
+        # Del 1 de enero al 31 de diciembre dura 364 (o 365) días: un año completo
+        dias_periodo = (fecha_hasta - fecha_desde).days
+        datos = self._frecuencias(db, {id_producto for _, id_producto in ubicaciones}, frecuencias, len(dias),
+                                  dias_periodo)
+        cronometro.etapa("analisis")
+
+        planes: Dict[int, Dict[int, List[Dict[str, Any]]]] = {}
+        productos_por_bodega: Dict[int, List[Dict[str, Any]]] = {}
+        for (id_bodega, id_producto), lista in ubicaciones.items():
+            if not datos[id_producto]["frecuencia"]:
+                continue
+            productos_por_bodega.setdefault(id_bodega, []).append(
+                {"id_producto": id_producto, "ubicaciones": lista, **datos[id_producto]})
+        for id_bodega, productos in productos_por_bodega.items():
+            planes[id_bodega] = self._repartir(productos, len(dias))
+        cronometro.etapa("reparto")
+
+        resumen_bodegas = []
+        for id_bodega in sorted(planes):
+            cargas = [sum(len(producto["ubicaciones"]) for producto in planes[id_bodega].get(dia, []))
+                      for dia in range(len(dias))]
+            resumen_bodegas.append({
+                "id_bodega": id_bodega, "productos": len(productos_por_bodega[id_bodega]), "lineas": sum(cargas),
+                "lineas_por_dia_min": min(cargas), "lineas_por_dia_max": max(cargas),
+                "lineas_por_dia_promedio": round(sum(cargas) / len(dias), 2),
+            })
+        por_clase: Dict[str, int] = {}
+        for dato in datos.values():
+            por_clase[dato["clase"]] = por_clase.get(dato["clase"], 0) + 1
+        resultado = {
+            "fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta, "dias_habiles": len(dias), "simulado": simular,
+            "frecuencias": frecuencias,
+            "conteos_periodo": {clase: self.conteos_periodo(valor, dias_periodo) for clase, valor in frecuencias.items()},
+            "productos": len(datos), "por_clase": por_clase,
+            "frecuencia_ajustada": sum(1 for dato in datos.values() if dato["motivo"]),
+            "programaciones_creadas": 0, "programaciones_reemplazadas": 0,
+            "lineas_creadas": sum(bodega["lineas"] for bodega in resumen_bodegas), "bodegas": resumen_bodegas,
+        }
+        if simular:
+            return {**resultado, "total_ms": cronometro.total_ms}
+
+        try:
+            # Programaciones CICLICO ya generadas (con líneas) y aún sin iniciar en el período
+            existentes = [id_programacion for (id_programacion,) in
+                          db.query(models.ProgramacionConteos.id_programacion)
+                          .filter(models.ProgramacionConteos.tipo_conteo == "CICLICO",
+                                  models.ProgramacionConteos.estado == "PROGRAMADO",
+                                  models.ProgramacionConteos.fecha_programada.between(fecha_desde, fecha_hasta),
+                                  models.ProgramacionConteos.id_bodega.in_(list(planes)),
+                                  models.ProgramacionConteos.id_programacion.in_(
+                                      db.query(models.ProgramacionConteoLinea.id_programacion)))]
+            if existentes and not reemplazar:
+                raise ValueError(f"Ya hay {len(existentes)} programaciones cíclicas planificadas en el período; "
+                                 f"use reemplazar=true para regenerarlas")
+            for inicio in range(0, len(existentes), 1000):
+                lote = existentes[inicio:inicio + 1000]
+                db.query(models.ProgramacionConteoLinea).filter(
+                    models.ProgramacionConteoLinea.id_programacion.in_(lote)).delete(synchronize_session=False)
+                db.query(models.ProgramacionConteos).filter(
+                    models.ProgramacionConteos.id_programacion.in_(lote)).delete(synchronize_session=False)
+            resultado["programaciones_reemplazadas"] = len(existentes)
+            cronometro.etapa("reemplazo")
+
+            nombres_bodega = dict(db.query(models.Bodega.id_bodega, models.Bodega.nombre_bodega)
+                                  .filter(models.Bodega.id_bodega.in_(list(planes))))
+            cabeceras = []
+            for id_bodega, plan in planes.items():
+                for indice_dia, productos in sorted(plan.items()):
+                    cabeceras.append((models.ProgramacionConteos(
+                        nombre_conteo=f"Cíclico {nombres_bodega.get(id_bodega, id_bodega)} {dias[indice_dia].isoformat()}"[:100],
+                        fecha_programada=dias[indice_dia], tipo_conteo="CICLICO", id_bodega=id_bodega,
+                        id_usuario_responsable=id_usuario_responsable, estado="PROGRAMADO",
+                        observaciones=f"Generada por el planificador de conteos cíclicos ({len(productos)} productos)"
+                    ), productos))
+            db.add_all([programacion for programacion, _ in cabeceras])
+            db.flush()
+            cronometro.etapa("programaciones")
+
+            lineas = [
+                {"id_programacion": programacion.id_programacion, "id_producto": producto["id_producto"],
+                 "id_ubicacion": id_ubicacion, "clase_abc": producto["clase"],
+                 "conteos_anuales": producto["conteos_anuales"], "motivo": producto["motivo"]}
+                for programacion, productos in cabeceras
+                for producto in productos
+                for id_ubicacion in producto["ubicaciones"]
+            ]
+            tabla = models.ProgramacionConteoLinea.__table__
+            for inicio in range(0, len(lineas), self.TAMANO_LOTE):
+                db.execute(tabla.insert(), lineas[inicio:inicio + self.TAMANO_LOTE])
+            cronometro.etapa("lineas")
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        resultado["programaciones_creadas"] = len(cabeceras)
+        resultado["lineas_creadas"] = len(lineas)
+        return {**resultado, "total_ms": cronometro.total_ms}
+
+    def get_lineas(self, db: Session, programacion_id: int, skip: int = 0,
+                   limit: int = 1000) -> List[models.ProgramacionConteoLinea]:
+        return (db.query(models.ProgramacionConteoLinea)
+                .filter(models.ProgramacionConteoLinea.id_programacion == programacion_id)
+                .order_by(models.ProgramacionConteoLinea.id_ubicacion, models.ProgramacionConteoLinea.id_producto)
+                .offset(skip).limit(limit).all())
+
+
+# Instancia global de PlanificadorConteosCRUD
+planificador_conteos_crud = PlanificadorConteosCRUD()
+
+
+# ========================================
+# CRUD PARA MÉTRICAS DE TIEMPO DEL WORKFLOW DE COMPRAS
+# ========================================
+
+class MetricasWorkflowCRUD:
+    """Tiempos entre estados de las OC calculados con LAG() sobre historial_estados_oc
+
+    Los días registrados en metricas_workflow_dias_consolidados se leen de
+    metricas_workflow_diarias (agregado por día, proveedor, transición y
+    tramo de duración); los demás días del período se calculan desde el
+    historial.
+    """
+
+    # Límite superior (horas) de cada tramo; el último tramo no tiene límite
+    TRAMOS_HORAS = (1, 2, 4, 8, 12, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720, 1080, 1440, 2160)
+    PERCENTILES = (50, 90, 95)
+    # Etapas del dashboard según el estado al que llega la orden
+    ETAPAS = (
+        ("orden_a_aprobacion", ("PENDIENTE", "APROBADA")),
+        ("aprobacion_a_recepcion", ("ENVIADA", "RECIBIDA")),
+        ("recepcion_a_facturacion", ("FACTURADA",)),
+        ("facturacion_a_conciliacion", ("CONCILIADA",)),
+        ("conciliacion_a_pago", ("PAGADA",)),
+    )
+    DIAS_POR_BLOQUE = 31
+    DIAS_MAXIMOS_CONSOLIDACION = 366
+
+    def _tramo(self, segundos: int) -> int:
+        from bisect import bisect_left
+        return bisect_left(self.TRAMOS_HORAS, segundos / 3600)
+
+    def _transiciones(self, db: Session, desde: datetime, hasta: datetime, id_proveedor: Optional[int] = None):
+        """Cambios de estado en [desde, hasta) con la fecha del cambio anterior (`inicio`)
+
+        LAG() recorre todo el historial de cada orden con cambios en el rango,
+        para que el primer cambio del rango mida desde el anterior; el primer
+        cambio de una orden mide desde su creación. La diferencia en segundos
+        se calcula en Python (TIMESTAMPDIFF es solo de MySQL).
+        """
+        from sqlalchemy import select
+
+        historial = models.HistorialEstadosOc
+        orden = models.OrdenCompra
+        ventana = {"partition_by": historial.id_orden_compra,
+                   "order_by": (historial.fecha_cambio, historial.id_historial)}
+
+        ordenes = select(historial.id_orden_compra).where(historial.fecha_cambio >= desde,
+                                                          historial.fecha_cambio < hasta)
+        cambios = (db.query(
+                      orden.id_proveedor,
+                      func.coalesce(historial.id_estado_anterior,
+                                    func.lag(historial.id_estado_nuevo).over(**ventana)).label("id_estado_anterior"),
+                      historial.id_estado_nuevo, historial.fecha_cambio,
+                      func.coalesce(func.lag(historial.fecha_cambio).over(**ventana),
+                                    orden.fecha_creacion).label("inicio"))
+                   .join(orden, orden.id_orden_compra == historial.id_orden_compra)
+                   .filter(historial.id_orden_compra.in_(ordenes), historial.fecha_cambio < hasta,
+                           orden.activo == True))
+        if id_proveedor:
+            cambios = cambios.filter(orden.id_proveedor == id_proveedor)
+        cambios = cambios.subquery()
+
+        return (db.query(cambios.c.id_proveedor, cambios.c.id_estado_anterior, cambios.c.id_estado_nuevo,
+                         cambios.c.fecha_cambio, cambios.c.inicio)
+                .filter(cambios.c.fecha_cambio >= desde)
+                .all())
+
+    def _agrupar(self, filas, por_dia: bool) -> Dict[tuple, Dict[str, int]]:
+        """(fecha, proveedor, anterior, nuevo, tramo) -> cantidad, total, mínimo y máximo en segundos"""
+        grupos: Dict[tuple, Dict[str, int]] = {}
+        for fila in filas:
+            segundos = max(0, int((fila.fecha_cambio - fila.inicio).total_seconds())) if fila.inicio else 0
+            clave = (fila.fecha_cambio.date() if por_dia else None, fila.id_proveedor,
+                     fila.id_estado_anterior, fila.id_estado_nuevo, self._tramo(segundos))
+            grupo = grupos.get(clave)
+            if grupo is None:
+                grupos[clave] = {"cantidad": 1, "total": segundos, "minimo": segundos, "maximo": segundos}
+            else:
+                grupo["cantidad"] += 1
+                grupo["total"] += segundos
+                grupo["minimo"] = min(grupo["minimo"], segundos)
+                grupo["maximo"] = max(grupo["maximo"], segundos)
+        return grupos
+
+    # ---------- Consolidación diaria ----------
+
+    def get_dias_consolidados(self, db: Session, fecha_desde: date, fecha_hasta: date) -> set:
+        dia = models.MetricaWorkflowDiaConsolidado
+        return {fila.fecha for fila in db.query(dia.fecha).filter(dia.fecha >= fecha_desde, dia.fecha <= fecha_hasta)}
+
+    @staticmethod
+    def _rangos(dias: List[date]) -> List[tuple]:
+        """Días ordenados -> rangos (desde, hasta) de días consecutivos"""
+        from datetime import timedelta
+
+        rangos: List[List[date]] = []
+        for dia in dias:
+            if rangos and dia == rangos[-1][1] + timedelta(days=1):
+                rangos[-1][1] = dia
+            else:
+                rangos.append([dia, dia])
+        return [tuple(rango) for rango in rangos]
+
+    def consolidar(self, db: Session, fecha_desde: date, fecha_hasta: date) -> Dict[str, Any]:
+        """Recalcula metricas_workflow_diarias para los días [fecha_desde, fecha_hasta], por bloques
+
+        Solo los días ya cerrados (anteriores a hoy) quedan registrados como
+        consolidados; las filas de hoy se ignoran al consultar y se reemplazan
+        en la próxima consolidación.
+        """
+        from collections import Counter
+        from datetime import timedelta
+
+        if fecha_hasta < fecha_desde:
+            raise ValueError("fecha_hasta debe ser posterior o igual a fecha_desde")
+        metrica = models.MetricaWorkflowDiaria
+        dia_consolidado = models.MetricaWorkflowDiaConsolidado
+        tabla = metrica.__table__
+        hoy = date.today()
+        dias = filas_insertadas = transiciones = 0
+        inicio = fecha_desde
+        while inicio <= fecha_hasta:
+            fin = min(inicio + timedelta(days=self.DIAS_POR_BLOQUE - 1), fecha_hasta)
+            filas = self._transiciones(db, datetime.combine(inicio, time.min),
+                                       datetime.combine(fin + timedelta(days=1), time.min))
+            grupos = self._agrupar(filas, por_dia=True)
+            db.query(metrica).filter(metrica.fecha >= inicio, metrica.fecha <= fin).delete(synchronize_session=False)
+            if grupos:
+                db.execute(tabla.insert(), [
+                    {"fecha": fecha, "id_proveedor": id_proveedor, "id_estado_anterior": anterior,
+                     "id_estado_nuevo": nuevo, "tramo": tramo, "cantidad": grupo["cantidad"],
+                     "segundos_total": grupo["total"], "segundos_minimo": grupo["minimo"],
+                     "segundos_maximo": grupo["maximo"]}
+                    for (fecha, id_proveedor, anterior, nuevo, tramo), grupo in grupos.items()
+                ])
+            db.query(dia_consolidado).filter(dia_consolidado.fecha >= inicio,
+                                             dia_consolidado.fecha <= fin).delete(synchronize_session=False)
+            por_dia = Counter(fila.fecha_cambio.date() for fila in filas)
+            cerrados = [inicio + timedelta(days=n) for n in range((min(fin, hoy - timedelta(days=1)) - inicio).days + 1)]
+            if cerrados:
+                db.execute(dia_consolidado.__table__.insert(),
+                           [{"fecha": dia, "transiciones": por_dia.get(dia, 0)} for dia in cerrados])
+            db.commit()
+            dias += (fin - inicio).days + 1
+            filas_insertadas += len(grupos)
+            transiciones += len(filas)
+            inicio = fin + timedelta(days=1)
+        return {"dias": dias, "transiciones": transiciones, "filas": filas_insertadas}
+
+    def consolidar_pendientes(self, db: Session) -> Dict[str, Any]:
+        """Consolida los días sin consolidar entre el primer cambio de estado y ayer
+
+        Incluye los días anteriores a una consolidación manual posterior; a lo
+        más DIAS_MAXIMOS_CONSOLIDACION días por ejecución, los más antiguos
+        primero.
+        """
+        from datetime import timedelta
+
+        resultado = {"dias": 0, "transiciones": 0, "filas": 0, "rangos": []}
+        primero = db.query(func.min(models.HistorialEstadosOc.fecha_cambio)).scalar()
+        if primero is None:
+            return resultado
+        desde, ayer = primero.date(), date.today() - timedelta(days=1)
+        consolidados = self.get_dias_consolidados(db, desde, ayer)
+        pendientes = [desde + timedelta(days=n) for n in range((ayer - desde).days + 1)]
+        pendientes = [dia for dia in pendientes if dia not in consolidados][:self.DIAS_MAXIMOS_CONSOLIDACION]
+        for inicio, fin in self._rangos(pendientes):
+            parcial = self.consolidar(db, inicio, fin)
+            for clave in ("dias", "transiciones", "filas"):
+                resultado[clave] += parcial[clave]
+            resultado["rangos"].append({"desde": inicio, "hasta": fin})
+        return resultado
+
+    # ---------- Consulta ----------
+
+    def _percentil(self, tramos: List[Dict[str, int]], percentil: float) -> float:
+        """Percentil aproximado: interpola dentro del tramo entre su mínimo y su máximo"""
+        total = sum(tramo["cantidad"] for tramo in tramos)
+        objetivo = percentil / 100 * total
+        acumulado = 0
+        for tramo in tramos:
+            if acumulado + tramo["cantidad"] >= objetivo:
+                fraccion = (objetivo - acumulado) / tramo["cantidad"]
+                return tramo["minimo"] + (tramo["maximo"] - tramo["minimo"]) * fraccion
+            acumulado += tramo["cantidad"]
+        return tramos[-1]["maximo"] if tramos else 0.0
+
+    @staticmethod
+    def _dias(segundos: float) -> float:
+        return round(segundos / 86400, 2)
+
+    def _resumir(self, tramos: Dict[int, Dict[str, int]]) -> Dict[str, Any]:
+        ordenados = [tramos[indice] for indice in sorted(tramos)]
+        cantidad = sum(tramo["cantidad"] for tramo in ordenados)
+        return {
+            "cantidad": cantidad,
+            "promedio_dias": self._dias(sum(tramo["total"] for tramo in ordenados) / cantidad),
+            "minimo_dias": self._dias(min(tramo["minimo"] for tramo in ordenados)),
+            "maximo_dias": self._dias(max(tramo["maximo"] for tramo in ordenados)),
+            **{f"p{percentil}_dias": self._dias(self._percentil(ordenados, percentil)) for percentil in self.PERCENTILES},
+        }
+
+    def get_metricas(self, db: Session, fecha_desde: date, fecha_hasta: date,
+                     id_proveedor: Optional[int] = None, por_proveedor: bool = False) -> Dict[str, Any]:
+        """Tiempos por transición y por etapa de los cambios de estado ocurridos en el período"""
+        from datetime import timedelta
+
+        if fecha_hasta < fecha_desde:
+            raise ValueError("fecha_hasta debe ser posterior o igual a fecha_desde")
+        metrica = models.MetricaWorkflowDiaria
+
+        # (proveedor o None, anterior, nuevo) -> tramo -> acumulado
+        transiciones: Dict[tuple, Dict[int, Dict[str, int]]] = {}
+
+        def _sumar(id_prov, anterior, nuevo, tramo, cantidad, total, minimo, maximo):
+            clave = (id_prov if por_proveedor else None, anterior, nuevo)
+            actual = transiciones.setdefault(clave, {}).get(tramo)
+            if actual is None:
+                transiciones[clave][tramo] = {"cantidad": int(cantidad), "total": int(total),
+                                              "minimo": int(minimo), "maximo": int(maximo)}
+            else:
+                actual["cantidad"] += int(cantidad)
+                actual["total"] += int(total)
+                actual["minimo"] = min(actual["minimo"], int(minimo))
+                actual["maximo"] = max(actual["maximo"], int(maximo))
+
+        consolidados = self.get_dias_consolidados(db, fecha_desde, fecha_hasta)
+        if consolidados:
+            dia_consolidado = models.MetricaWorkflowDiaConsolidado
+            columnas = [metrica.id_estado_anterior, metrica.id_estado_nuevo, metrica.tramo]
+            if por_proveedor:
+                columnas.insert(0, metrica.id_proveedor)
+            consulta = (db.query(*columnas, func.sum(metrica.cantidad), func.sum(metrica.segundos_total),
+                                 func.min(metrica.segundos_minimo), func.max(metrica.segundos_maximo))
+                        .join(dia_consolidado, dia_consolidado.fecha == metrica.fecha)
+                        .filter(metrica.fecha >= fecha_desde, metrica.fecha <= fecha_hasta))
+            if id_proveedor:
+                consulta = consulta.filter(metrica.id_proveedor == id_proveedor)
+            for fila in consulta.group_by(*columnas).all():
+                if por_proveedor:
+                    _sumar(*fila)
+                else:
+                    _sumar(None, *fila)
+
+        # Días sin consolidar (normalmente solo hoy): desde el historial
+        dias = [fecha_desde + timedelta(days=n) for n in range((fecha_hasta - fecha_desde).days + 1)]
+        sin_consolidar = [dia for dia in dias if dia not in consolidados]
+        for inicio, fin in self._rangos(sin_consolidar):
+            filas = self._transiciones(db, datetime.combine(inicio, time.min),
+                                       datetime.combine(fin + timedelta(days=1), time.min), id_proveedor)
+            for (_, id_prov, anterior, nuevo, tramo), grupo in self._agrupar(filas, por_dia=False).items():
+                _sumar(id_prov, anterior, nuevo, tramo, grupo["cantidad"], grupo["total"], grupo["minimo"], grupo["maximo"])
+
+        estados = dict(db.query(models.EstadoOrdenCompra.id_estado, models.EstadoOrdenCompra.codigo_estado).all())
+
+        def _combinar(claves) -> Dict[tuple, Dict[int, Dict[str, int]]]:
+            # (anterior, nuevo) -> tramo -> acumulado, sumando los proveedores de `claves`
+            combinadas: Dict[tuple, Dict[int, Dict[str, int]]] = {}
+            for clave in claves:
+                destino = combinadas.setdefault(clave[1:], {})
+                for indice, tramo in transiciones[clave].items():
+                    actual = destino.get(indice)
+                    if actual is None:
+                        destino[indice] = dict(tramo)
+                    else:
+                        actual["cantidad"] += tramo["cantidad"]
+                        actual["total"] += tramo["total"]
+                        actual["minimo"] = min(actual["minimo"], tramo["minimo"])
+                        actual["maximo"] = max(actual["maximo"], tramo["maximo"])
+            return combinadas
+
+        def _etapas(combinadas) -> Dict[str, float]:
+            # Promedio por estado de llegada y luego suma por etapa: una orden
+            # que pasa por PENDIENTE y APROBADA suma ambos tiempos
+            por_estado: Dict[str, Dict[str, int]] = {}
+            for (_, nuevo), tramos in combinadas.items():
+                acumulado = por_estado.setdefault(estados.get(nuevo), {"cantidad": 0, "total": 0})
+                for tramo in tramos.values():
+                    acumulado["cantidad"] += tramo["cantidad"]
+                    acumulado["total"] += tramo["total"]
+            tiempos = {
+                etapa: self._dias(sum(por_estado[codigo]["total"] / por_estado[codigo]["cantidad"]
+                                      for codigo in codigos if codigo in por_estado))
+                for etapa, codigos in self.ETAPAS
+            }
+            tiempos["total_workflow"] = round(sum(tiempos.values()), 2)
+            return tiempos
+
+        def _detalle(combinadas) -> List[Dict[str, Any]]:
+            filas = [{"estado_anterior": estados.get(anterior), "estado_nuevo": estados.get(nuevo), **self._resumir(tramos)}
+                     for (anterior, nuevo), tramos in combinadas.items()]
+            return sorted(filas, key=lambda fila: -fila["cantidad"])
+
+        ordenes = db.query(func.count(models.OrdenCompra.id_orden_compra)).filter(
+            models.OrdenCompra.fecha_orden >= fecha_desde,
+            models.OrdenCompra.fecha_orden <= fecha_hasta,
+            models.OrdenCompra.activo == True)
+        if id_proveedor:
+            ordenes = ordenes.filter(models.OrdenCompra.id_proveedor == id_proveedor)
+
+        todas = _combinar(transiciones)
+        resultado = {
+            "periodo": {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta},
+            "dias_consolidados": len(consolidados),
+            "dias_calculados": len(sin_consolidar),
+            "ordenes_analizadas": ordenes.scalar(),
+            "transiciones_analizadas": sum(tramo["cantidad"] for tramos in todas.values() for tramo in tramos.values()),
+            "tiempos_promedio_dias": _etapas(todas),
+            "transiciones": _detalle(todas),
+        }
+        if por_proveedor:
+            claves_por_proveedor: Dict[int, List[tuple]] = {}
+            for clave in transiciones:
+                claves_por_proveedor.setdefault(clave[0], []).append(clave)
+            nombres = dict(db.query(models.Proveedor.id_proveedor, models.Proveedor.nombre_proveedor)
+                           .filter(models.Proveedor.id_proveedor.in_(list(claves_por_proveedor))).all()
+                           ) if claves_por_proveedor else {}
+            detalle_proveedores = []
+            for id_prov, claves in claves_por_proveedor.items():
+                combinadas = _combinar(claves)
+                detalle_proveedores.append({
+                    "id_proveedor": id_prov, "nombre_proveedor": nombres.get(id_prov),
+                    "transiciones_analizadas": sum(tramo["cantidad"] for tramos in combinadas.values()
+                                                   for tramo in tramos.values()),
+                    "tiempos_promedio_dias": _etapas(combinadas),
+                    "transiciones": _detalle(combinadas),
+                })
+            resultado["por_proveedor"] = sorted(detalle_proveedores,
+                                                key=lambda fila: -fila["tiempos_promedio_dias"]["total_workflow"])
+        return resultado
+
+
+# Instancia global de MetricasWorkflowCRUD
+metricas_workflow_crud = MetricasWorkflowCRUD()
@@ -4,69 +4,124 @@ FastAPI para ERP DAEL - Optimizado para uvicorn
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
 # IMPORTS ABSOLUTOS - No relativos
-from database import engine, test_connection, Base
-from routes import unidades_medida
-from routes import tipos_movimiento
-from routes import categorias
-from routes import subcategorias
-from routes import tipos_producto
-from routes import marcas
-from routes import proveedores
-from routes import sucursales_proveedor
-from routes import bodegas
-from routes import pasillos
-from routes import estantes
-from routes import productos
-from routes import producto_proveedores
-from routes import producto_ubicaciones
-from routes import documentos_movimiento
-from routes import movimientos_inventario
-from routes import movimientos_detalle
-from routes import lotes
-from routes import numeros_serie
-from routes import clientes
-from routes import obras
-from routes import almacen_obra
-from routes import despachos_obra
-from routes import despachos_obra_detalle
-from routes import devoluciones_obra
-from routes import devoluciones_obra_detalle
-from routes import inventario_obra
-from routes import reservas
-from routes import programacion_conteos
-from routes import conteos_fisicos
-from routes import configuracion_alertas
-from routes import log_alertas
-from routes import roles
-from routes import usuarios
-from routes import permisos
-from routes import configuracion_sistema
-from routes import inventario_consolidado
-from routes import obras_inventario
-from routes import devoluciones_pendientes
-from routes import productos_abc
-from routes import estados_orden_compra
-from routes import ordenes_compra
-from routes import recepciones_mercancia
-from routes import vistas_ordenes_compra
-from routes import documentos_compra
-from routes import tipos_documentos_compra
-from routes import importacion_dte
-from routes import centros_costo
-from routes import empresas
+from config import (
+    STARTUP_MODE, SCHEMA_VERSION_REQUERIDA, STARTUP_PROFILE, STARTUP_OMITIR_VERIFICACION_ESQUEMA,
+    DEBUG, SQL_INSTRUMENTACION, SQL_UMBRAL_N_MAS_1, PLANIFICADOR_ACTIVO,
+    COLA_WORKERS_EN_PROCESO
+)
+from database import engine, SessionLocal, test_connection, Base
+from utils.startup import (
+    importar_modulos, reportar_tiempos_importacion,
+    get_tiempos_importacion, verificar_version_esquema
+)
+from utils.sql_instrumentation import instalar_instrumentacion, SQLInstrumentacionMiddleware
+from utils.slow_query_log import instalar_registro_consultas_lentas
+from utils.metrics import (
+    MetricasMiddleware, instalar_metricas_pool,
+    iniciar_volcado_periodico, generar_texto_prometheus
+)
+from utils.planificador import planificador
+from utils.tareas import registrar_tareas
+from utils.cola_trabajos import iniciar_workers_en_proceso
+import utils.trabajos  # noqa: F401  (registra los tipos de trabajo)
+from utils.eventos import instalar_eventos_sesion
+from utils.cache_estadisticas import instalar_invalidacion
+from utils.estadisticas import registrar_estadisticas
+from utils.widgets import registrar_widgets
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Crear las tablas en la base de datos
-try:
-    Base.metadata.create_all(bind=engine)
-    print("✅ Tablas de base de datos verificadas/creadas")
-except Exception as e:
-    print(f"⚠️ Error con base de datos: {e}")
+# Routers de la API: (módulo, argumentos extra de include_router)
+ROUTERS = [
+    ("unidades_medida", {}),
+    ("tipos_movimiento", {}),
+    ("categorias", {}),
+    ("subcategorias", {}),
+    ("tipos_producto", {}),
+    ("marcas", {}),
+    ("proveedores", {}),
+    ("sucursales_proveedor", {}),
+    ("bodegas", {}),
+    ("pasillos", {}),
+    ("estantes", {}),
+    ("productos", {}),
+    ("producto_proveedores", {}),
+    ("producto_ubicaciones", {}),
+    ("documentos_movimiento", {}),
+    ("movimientos_inventario", {}),
+    ("movimientos_detalle", {}),
+    ("lotes", {}),
+    ("numeros_serie", {}),
+    ("clientes", {}),
+    ("obras", {}),
+    ("almacen_obra", {}),
+    ("despachos_obra", {}),
+    ("despachos_obra_detalle", {}),
+    ("devoluciones_obra", {}),
+    ("devoluciones_obra_detalle", {}),
+    ("inventario_obra", {}),
+    ("reservas", {}),
+    ("programacion_conteos", {}),
+    ("conteos_fisicos", {}),
+    ("configuracion_alertas", {}),
+    ("log_alertas", {}),
+    ("roles", {}),
+    ("usuarios", {}),
+    ("permisos", {}),
+    ("configuracion_sistema", {}),
+    ("inventario_consolidado", {}),
+    ("obras_inventario", {}),
+    ("devoluciones_pendientes", {}),
+    ("productos_abc", {}),
+    ("estados_orden_compra", {"prefix": "/api/v1/estados-orden-compra", "tags": ["Estados Orden Compra"]}),
+    ("ordenes_compra", {"prefix": "/api/v1/ordenes-compra", "tags": ["Órdenes de Compra"]}),
+    ("recepciones_mercancia", {"prefix": "/api/v1/recepciones-mercancia", "tags": ["Recepciones de Mercancía"]}),
+    ("vistas_ordenes_compra", {"prefix": "/api/v1/vistas-ordenes-compra", "tags": ["Vistas Órdenes de Compra"]}),
+    ("documentos_compra", {"prefix": "/api/v1", "tags": ["Documentos de Compra"]}),
+    ("tipos_documentos_compra", {}),
+    ("importacion_dte", {}),
+    ("centros_costo", {}),
+    ("empresas", {}),
+    ("secuencias_documento", {}),
+    ("disponibilidad", {}),
+    ("costos", {}),
+    ("kardex", {}),
+    ("monitoreo", {}),
+    ("tareas_programadas", {}),
+    ("trabajos", {}),
+    ("eventos", {}),
+    ("dashboard", {}),
+]
+
+# Importar primero los módulos compartidos pesados para que el desglose
+# no los atribuya al primer router que los use
+modulos = importar_modulos(
+    ["models", "schemas", "crud"] + [f"routes.{nombre}" for nombre, _ in ROUTERS]
+)
+if STARTUP_PROFILE:
+    reportar_tiempos_importacion()
+
+if STARTUP_MODE == "fast":
+    # Arranque rápido: sin DDL, solo se verifica la versión del esquema
+    if not verificar_version_esquema(engine, SCHEMA_VERSION_REQUERIDA):
+        if not STARTUP_OMITIR_VERIFICACION_ESQUEMA:
+            raise RuntimeError(
+                f"El esquema de base de datos no está en la versión {SCHEMA_VERSION_REQUERIDA}: aplique los "
+                "scripts de database/ o defina STARTUP_OMITIR_VERIFICACION_ESQUEMA=true para arrancar igual"
+            )
+        print("⚠️ STARTUP_OMITIR_VERIFICACION_ESQUEMA=true: se arranca con el esquema sin verificar")
+else:
+    # Crear las tablas en la base de datos
+    try:
+        Base.metadata.create_all(bind=engine)
+        print("✅ Tablas de base de datos verificadas/creadas")
+    except Exception as e:
+        print(f"⚠️ Error con base de datos: {e}")
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -84,64 +139,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-N-Plus-One"],
 )
 
+# Instrumentación SQL por request
+if SQL_INSTRUMENTACION:
+    instalar_instrumentacion(engine)
+    app.add_middleware(SQLInstrumentacionMiddleware, debug=DEBUG, umbral_n_mas_1=SQL_UMBRAL_N_MAS_1)
+
+# Registro de consultas lentas con EXPLAIN
+instalar_registro_consultas_lentas(engine)
+
+# Métricas Prometheus (latencia por ruta, requests en curso, pool de conexiones)
+app.add_middleware(MetricasMiddleware)
+instalar_metricas_pool(engine)
+iniciar_volcado_periodico()
+
 # Incluir rutas de la API
-app.include_router(unidades_medida.router, prefix="/api/v1")
-app.include_router(tipos_movimiento.router, prefix="/api/v1")
-app.include_router(categorias.router, prefix="/api/v1")
-app.include_router(subcategorias.router, prefix="/api/v1")
-app.include_router(tipos_producto.router, prefix="/api/v1")
-app.include_router(marcas.router, prefix="/api/v1")
-app.include_router(proveedores.router, prefix="/api/v1")
-app.include_router(sucursales_proveedor.router, prefix="/api/v1")
-app.include_router(bodegas.router, prefix="/api/v1")
-app.include_router(pasillos.router, prefix="/api/v1")
-app.include_router(estantes.router, prefix="/api/v1")
-app.include_router(productos.router, prefix="/api/v1")
-app.include_router(producto_proveedores.router, prefix="/api/v1")
-app.include_router(producto_ubicaciones.router, prefix="/api/v1")
-app.include_router(documentos_movimiento.router, prefix="/api/v1")
-app.include_router(movimientos_inventario.router, prefix="/api/v1")
-app.include_router(movimientos_detalle.router, prefix="/api/v1")
-app.include_router(lotes.router, prefix="/api/v1")
-app.include_router(numeros_serie.router, prefix="/api/v1")
-app.include_router(clientes.router, prefix="/api/v1")
-app.include_router(obras.router, prefix="/api/v1")
-app.include_router(almacen_obra.router, prefix="/api/v1")
-app.include_router(despachos_obra.router, prefix="/api/v1")
-app.include_router(despachos_obra_detalle.router, prefix="/api/v1")
-app.include_router(devoluciones_obra.router, prefix="/api/v1")
-app.include_router(devoluciones_obra_detalle.router, prefix="/api/v1")
-app.include_router(inventario_obra.router, prefix="/api/v1")
-app.include_router(reservas.router, prefix="/api/v1")
-app.include_router(programacion_conteos.router, prefix="/api/v1")
-app.include_router(conteos_fisicos.router, prefix="/api/v1")
-app.include_router(configuracion_alertas.router, prefix="/api/v1")
-app.include_router(log_alertas.router, prefix="/api/v1")
-app.include_router(roles.router, prefix="/api/v1")
-app.include_router(usuarios.router, prefix="/api/v1")
-app.include_router(permisos.router, prefix="/api/v1")
-app.include_router(configuracion_sistema.router, prefix="/api/v1")
-app.include_router(inventario_consolidado.router, prefix="/api/v1")
-app.include_router(obras_inventario.router, prefix="/api/v1")
-app.include_router(devoluciones_pendientes.router, prefix="/api/v1")
-app.include_router(productos_abc.router, prefix="/api/v1")
-app.include_router(estados_orden_compra.router, prefix="/api/v1/estados-orden-compra", tags=["Estados Orden Compra"])
-app.include_router(ordenes_compra.router, prefix="/api/v1/ordenes-compra", tags=["Órdenes de Compra"])
-app.include_router(recepciones_mercancia.router, prefix="/api/v1/recepciones-mercancia", tags=["Recepciones de Mercancía"])
-app.include_router(vistas_ordenes_compra.router, prefix="/api/v1/vistas-ordenes-compra", tags=["Vistas Órdenes de Compra"])
-
-# Nuevas rutas de documentos de compra
-app.include_router(documentos_compra.router, prefix="/api/v1", tags=["Documentos de Compra"])
-app.include_router(tipos_documentos_compra.router, prefix="/api/v1")
-app.include_router(importacion_dte.router, prefix="/api/v1")
-
-# Rutas de centros de costo
-app.include_router(centros_costo.router, prefix="/api/v1")
-
-# Rutas de empresas
-app.include_router(empresas.router, prefix="/api/v1")
+for nombre, opciones in ROUTERS:
+    opciones = {"prefix": "/api/v1", **opciones}
+    app.include_router(modulos[f"routes.{nombre}"].router, **opciones)
+
+# Eventos en vivo: se publican al confirmar cada sesión (si EVENTOS_ACTIVOS)
+instalar_eventos_sesion(SessionLocal)
+
+# Estadísticas de los dashboards servidas desde memoria, invalidadas al
+# confirmar cambios en sus tablas (si ESTADISTICAS_CACHE_ACTIVA)
+registrar_estadisticas()
+instalar_invalidacion(SessionLocal)
+
+# Widgets del dashboard compuesto (/dashboard)
+registrar_widgets()
+
+# Tareas periódicas: se registran siempre (disparo manual), pero solo se
+# programan si el planificador está activo y este worker es el líder
+registrar_tareas()
+if PLANIFICADOR_ACTIVO:
+    planificador.iniciar()
+
+# Workers de la cola de trabajos dentro de la API (además de worker_trabajos.py)
+if COLA_WORKERS_EN_PROCESO > 0:
+    iniciar_workers_en_proceso(COLA_WORKERS_EN_PROCESO)
 
 @app.get("/")
 def root():
@@ -154,6 +192,7 @@ def root():
             "docs": "/docs",
             "redoc": "/redoc",
             "health": "/health",
+            "metrics": "/metrics",
             "unidades_medida": "/api/v1/unidades-medida",
             "tipos_movimiento": "/api/v1/tipos-movimiento",
             "categorias": "/api/v1/categorias",
@@ -197,7 +236,16 @@ def root():
             "conciliacion_oc_facturas": "/api/v1/conciliacion-oc-facturas",
             "pagos_ordenes_compra": "/api/v1/pagos-ordenes-compra",
             "workflow_dashboard": "/api/v1/workflow-dashboard",
-            "xml_processor": "/api/v1/xml-processor"
+            "xml_processor": "/api/v1/xml-processor",
+            "secuencias_documento": "/api/v1/secuencias-documento",
+            "disponibilidad": "/api/v1/disponibilidad",
+            "costos": "/api/v1/costos",
+            "kardex": "/api/v1/kardex",
+            "monitoreo": "/api/v1/monitoreo",
+            "tareas_programadas": "/api/v1/tareas-programadas",
+            "trabajos": "/api/v1/trabajos",
+            "eventos": "/api/v1/eventos/stream",
+            "dashboard": "/api/v1/dashboard"
         }
     }
 
@@ -210,3 +258,16 @@ def health_check():
         "mysql_url": "mysql://localhost:3306",
         "message": "API funcionando correctamente"
     }
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(generar_texto_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/startup")
+def startup_check():
+    return {
+        "startup_mode": STARTUP_MODE,
+        "schema_version_requerida": SCHEMA_VERSION_REQUERIDA,
+        "verificacion_esquema_omitida": STARTUP_OMITIR_VERIFICACION_ESQUEMA,
+        "importacion": get_tiempos_importacion()
+    }
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from sqlalchemy import Column, Float, Index, Integer, String, Boolean, Text, TIMESTAMP, Time, func, ForeignKey, DECIMAL, Date, DateTime, Enum, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Float, Index, Integer, String, Boolean, Text, TIMESTAMP, Time, func, ForeignKey, DECIMAL, Date, DateTime, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base  # ← IMPORT ABSOLUTO, no relativo
 from datetime import datetime
@@ -891,6 +891,25 @@ class InventarioObra(Base):
         return f"<InventarioObra(id={self.id_inventario_obra}, obra_id={self.id_obra}, producto_id={self.id_producto}, cantidad={self.cantidad_actual})>"
 
 
+class InventarioObraHistorial(Base):
+    __tablename__ = "inventario_obra_historial"
+
+    id_historial = Column(Integer, primary_key=True, autoincrement=True)
+    id_obra = Column(Integer, ForeignKey("obras.id_obra"), nullable=False)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    cantidad_cambio = Column(Integer, nullable=False)
+    motivo = Column(String(200))
+    referencia = Column(String(50))  # p.ej. número de despacho o devolución
+    fecha = Column(TIMESTAMP, server_default=func.current_timestamp())
+
+    __table_args__ = (
+        Index('idx_historial_obra_producto', 'id_obra', 'id_producto', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<InventarioObraHistorial(obra_id={self.id_obra}, producto_id={self.id_producto}, cambio={self.cantidad_cambio})>"
+
+
 # ========================================
 # MODELO DE RESERVAS
 # ========================================
@@ -1936,7 +1955,8 @@ class VistaProductosABC(Base):
     @property
     def valor_movimiento_anual(self) -> float:
         """Valor de los movimientos anuales"""
-        return round(float(self.movimientos_anuales * self.costo_promedio), 2)
+        # movimientos_anuales es Float y costo_promedio DECIMAL: float * Decimal no está definido
+        return round(float(self.movimientos_anuales or 0) * float(self.costo_promedio or 0), 2)
 
     @property
     def clasificacion_abc_calculada(self) -> str:
@@ -2707,3 +2727,303 @@ class Empresa(Base):
         return f"<Empresa(id={self.id_empresa}, rut='{self.rut_empresa}', razon_social='{self.razon_social}')>"
 
 
+
+
+# ========================================
+# SECUENCIAS DE NUMERACIÓN DE DOCUMENTOS
+# ========================================
+
+class SecuenciaDocumento(Base):
+    __tablename__ = "secuencias_documento"
+
+    prefijo = Column(String(10), primary_key=True)
+    anio = Column(Integer, primary_key=True, default=0)  # 0 = serie sin reinicio anual
+    ultimo_valor = Column(Integer, nullable=False, default=0)
+    fecha_modificacion = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    def __repr__(self):
+        return f"<SecuenciaDocumento(prefijo='{self.prefijo}', anio={self.anio}, ultimo_valor={self.ultimo_valor})>"
+
+
+# ========================================
+# DISPONIBILIDAD (ATP)
+# ========================================
+
+class DisponibilidadProducto(Base):
+    __tablename__ = "disponibilidad_productos"
+
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), primary_key=True)
+    id_ubicacion = Column(Integer, primary_key=True, default=0)  # 0 = total del producto
+    en_mano = Column(DECIMAL(14,4), nullable=False, default=0)
+    reservado = Column(DECIMAL(14,4), nullable=False, default=0)
+    en_transito = Column(DECIMAL(14,4), nullable=False, default=0)  # Solo en la fila total (las OC no tienen ubicación)
+    fecha_actualizacion = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    def __repr__(self):
+        return f"<DisponibilidadProducto(producto={self.id_producto}, ubicacion={self.id_ubicacion}, en_mano={self.en_mano}, reservado={self.reservado})>"
+
+
+# ========================================
+# CAPAS DE COSTO (VALORIZACIÓN FIFO)
+# ========================================
+
+class CapaCosto(Base):
+    __tablename__ = "capas_costo"
+
+    id_capa = Column(Integer, primary_key=True, autoincrement=True)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    id_bodega = Column(Integer, ForeignKey("bodegas.id_bodega"))  # NULL = sin bodega asignada
+    fecha_entrada = Column(DateTime, nullable=False)
+    cantidad_inicial = Column(DECIMAL(14,4), nullable=False)
+    cantidad_restante = Column(DECIMAL(14,4), nullable=False)
+    costo_unitario = Column(DECIMAL(15,4), nullable=False)
+    origen = Column(String(10), nullable=False)  # APE (apertura), REC (recepción), MOV (movimiento)
+    referencia = Column(String(50))
+
+    __table_args__ = (
+        Index('idx_capas_producto_fecha', 'id_producto', 'fecha_entrada', 'id_capa'),
+    )
+
+    def __repr__(self):
+        return f"<CapaCosto(producto={self.id_producto}, restante={self.cantidad_restante}, costo={self.costo_unitario})>"
+
+
+class ConsumoCapa(Base):
+    __tablename__ = "consumos_capa"
+
+    id_consumo = Column(Integer, primary_key=True, autoincrement=True)
+    id_capa = Column(Integer, ForeignKey("capas_costo.id_capa"))  # NULL = salida sin capa (se valoriza al costo promedio)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    id_bodega = Column(Integer, ForeignKey("bodegas.id_bodega"))
+    id_obra = Column(Integer, ForeignKey("obras.id_obra"))  # Destino cuando es un despacho a obra
+    fecha = Column(DateTime, nullable=False)
+    cantidad = Column(DECIMAL(14,4), nullable=False)
+    costo_unitario = Column(DECIMAL(15,4), nullable=False)
+    origen = Column(String(10), nullable=False)  # DSP (despacho), MOV (movimiento)
+    referencia = Column(String(50))
+
+    __table_args__ = (
+        Index('idx_consumos_capa_fecha', 'id_capa', 'fecha'),
+        Index('idx_consumos_obra_fecha', 'id_obra', 'id_producto', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<ConsumoCapa(capa={self.id_capa}, producto={self.id_producto}, cantidad={self.cantidad})>"
+
+
+# ========================================
+# EJECUCIONES DEL MOTOR DE ALERTAS
+# ========================================
+
+class EjecucionAlerta(Base):
+    __tablename__ = "ejecuciones_alertas"
+
+    id_ejecucion = Column(Integer, primary_key=True, autoincrement=True)
+    id_alerta = Column(Integer, ForeignKey("configuracion_alertas.id_alerta"), nullable=False)
+    fecha_ejecucion = Column(DateTime, nullable=False)
+    duracion_ms = Column(DECIMAL(12,2), nullable=False, default=0)
+    candidatos = Column(Integer, nullable=False, default=0)    # Filas que cumplen la regla
+    nuevas = Column(Integer, nullable=False, default=0)        # Alertas insertadas (sin duplicar abiertas)
+    resueltas = Column(Integer, nullable=False, default=0)     # Alertas abiertas cuya condición ya no se cumple
+    estado = Column(Enum('OK', 'ERROR'), nullable=False, default='OK')
+    error = Column(Text)
+
+    __table_args__ = (
+        Index('idx_ejecuciones_alerta_fecha', 'id_alerta', 'fecha_ejecucion'),
+    )
+
+    def __repr__(self):
+        return f"<EjecucionAlerta(alerta={self.id_alerta}, nuevas={self.nuevas}, duracion_ms={self.duracion_ms})>"
+
+
+# ========================================
+# EJECUCIONES DE TAREAS PROGRAMADAS
+# ========================================
+
+class EjecucionTarea(Base):
+    __tablename__ = "ejecuciones_tareas"
+
+    id_ejecucion = Column(Integer, primary_key=True, autoincrement=True)
+    tarea = Column(String(100), nullable=False)
+    origen = Column(Enum('PROGRAMADA', 'MANUAL'), nullable=False, default='PROGRAMADA')
+    fecha_inicio = Column(DateTime, nullable=False)
+    fecha_fin = Column(DateTime)
+    duracion_ms = Column(DECIMAL(12,2))
+    estado = Column(Enum('EN_CURSO', 'OK', 'ERROR'), nullable=False, default='EN_CURSO')
+    resultado = Column(Text)                 # JSON retornado por la tarea
+    error = Column(Text)
+    worker = Column(String(100))             # host:pid que ejecutó la tarea
+
+    __table_args__ = (
+        Index('idx_ejecuciones_tarea_fecha', 'tarea', 'fecha_inicio'),
+    )
+
+    def __repr__(self):
+        return f"<EjecucionTarea(tarea={self.tarea}, estado={self.estado}, duracion_ms={self.duracion_ms})>"
+
+
+# ========================================
+# COLA DE TRABAJOS EN SEGUNDO PLANO
+# ========================================
+
+class TrabajoCola(Base):
+    __tablename__ = "trabajos_cola"
+
+    id_trabajo = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(100), nullable=False)
+    parametros = Column(Text)                    # JSON con los argumentos del trabajo
+    prioridad = Column(Integer, nullable=False, default=0)   # Mayor se toma primero
+    estado = Column(Enum('PENDIENTE', 'EN_PROCESO', 'COMPLETADO', 'ERROR', 'CANCELADO'),
+                    nullable=False, default='PENDIENTE')
+    intentos = Column(Integer, nullable=False, default=0)
+    max_intentos = Column(Integer, nullable=False, default=3)
+    disponible_desde = Column(DateTime, nullable=False)     # Reintentos con backoff
+    bloqueado_hasta = Column(DateTime)                      # Fin del lease del worker actual
+    worker = Column(String(100))
+    progreso = Column(DECIMAL(5,2), nullable=False, default=0)
+    mensaje_progreso = Column(String(255))
+    resultado = Column(Text)                     # JSON retornado por el trabajo
+    error = Column(Text)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"))
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.now)
+    fecha_inicio = Column(DateTime)
+    fecha_fin = Column(DateTime)
+
+    __table_args__ = (
+        Index('idx_trabajos_cola_toma', 'estado', 'prioridad', 'disponible_desde'),
+        Index('idx_trabajos_cola_lease', 'estado', 'bloqueado_hasta'),
+    )
+
+    def __repr__(self):
+        return f"<TrabajoCola(id={self.id_trabajo}, tipo={self.tipo}, estado={self.estado}, intentos={self.intentos})>"
+
+
+# ========================================
+# EVENTOS EN VIVO (BROKER ENTRE WORKERS)
+# ========================================
+
+class EventoSistema(Base):
+    __tablename__ = "eventos_sistema"
+
+    id_evento = Column(Integer, primary_key=True, autoincrement=True)
+    tema = Column(String(50), nullable=False)      # alertas, stock, workflow
+    tipo = Column(String(100), nullable=False)
+    datos = Column(Text)                           # JSON
+    fecha = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_eventos_sistema_fecha', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<EventoSistema(id={self.id_evento}, tema={self.tema}, tipo={self.tipo})>"
+
+
+# ========================================
+# SNAPSHOT DE CANTIDADES PARA CONTEOS FÍSICOS
+# ========================================
+
+class ConteoSnapshot(Base):
+    __tablename__ = "conteos_snapshot"
+
+    id_snapshot = Column(Integer, primary_key=True, autoincrement=True)
+    id_programacion = Column(Integer, ForeignKey("programacion_conteos.id_programacion"), nullable=False)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    # Sin ubicación ni obra: stock total del producto (Producto.stock_actual)
+    id_ubicacion = Column(Integer, ForeignKey("producto_ubicaciones.id_ubicacion"), nullable=True)
+    id_obra = Column(Integer, ForeignKey("obras.id_obra"), nullable=True)
+    cantidad_sistema = Column(Integer, nullable=False)
+    fecha_snapshot = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_conteos_snapshot_programacion', 'id_programacion', 'id_producto'),
+    )
+
+    def __repr__(self):
+        return f"<ConteoSnapshot(programacion={self.id_programacion}, producto={self.id_producto}, ubicacion={self.id_ubicacion}, obra={self.id_obra}, cantidad={self.cantidad_sistema})>"
+
+
+# ========================================
+# LÍNEAS DE CONTEOS CÍCLICOS
+# ========================================
+
+class ProgramacionConteoLinea(Base):
+    __tablename__ = "programacion_conteos_lineas"
+
+    id_linea = Column(Integer, primary_key=True, autoincrement=True)
+    id_programacion = Column(Integer, ForeignKey("programacion_conteos.id_programacion"), nullable=False)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    id_ubicacion = Column(Integer, ForeignKey("producto_ubicaciones.id_ubicacion"), nullable=True)
+    clase_abc = Column(String(1))                 # A, B, C usada al planificar
+    conteos_anuales = Column(Integer)             # Frecuencia asignada al producto
+    motivo = Column(String(100))                  # Por qué se ajustó la frecuencia de su clase
+
+    __table_args__ = (
+        Index('idx_programacion_conteos_lineas_programacion', 'id_programacion', 'id_producto'),
+    )
+
+    def __repr__(self):
+        return f"<ProgramacionConteoLinea(programacion={self.id_programacion}, producto={self.id_producto}, ubicacion={self.id_ubicacion})>"
+
+
+# ========================================
+# HISTORIAL DE ESTADOS DE ÓRDENES DE COMPRA
+# ========================================
+
+class HistorialEstadosOc(Base):
+    """Cambios de estado de las OC (los registra el trigger de ordenes_compra)"""
+    __tablename__ = "historial_estados_oc"
+
+    id_historial = Column(Integer, primary_key=True, autoincrement=True)
+    id_orden_compra = Column(Integer, ForeignKey("ordenes_compra.id_orden_compra"), nullable=False, index=True)
+    id_estado_anterior = Column(Integer, ForeignKey("estados_orden_compra.id_estado"), nullable=True)
+    id_estado_nuevo = Column(Integer, ForeignKey("estados_orden_compra.id_estado"), nullable=False)
+    fecha_cambio = Column(DateTime, nullable=False, server_default=func.current_timestamp(), index=True)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False, index=True)
+    observaciones = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index('idx_historial_estados_oc_orden_fecha', 'id_orden_compra', 'fecha_cambio'),
+    )
+
+    def __repr__(self):
+        return f"<HistorialEstadosOc(orden={self.id_orden_compra}, {self.id_estado_anterior} -> {self.id_estado_nuevo}, fecha={self.fecha_cambio})>"
+
+
+# ========================================
+# MÉTRICAS DIARIAS DEL WORKFLOW DE COMPRAS
+# ========================================
+
+class MetricaWorkflowDiaria(Base):
+    """Tiempos entre estados de las OC agregados por día, proveedor, transición y tramo de duración"""
+    __tablename__ = "metricas_workflow_diarias"
+
+    id_metrica = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(Date, nullable=False)                      # Día en que ocurrió el cambio de estado
+    id_proveedor = Column(Integer, ForeignKey("proveedores.id_proveedor"), nullable=False)
+    id_estado_anterior = Column(Integer, ForeignKey("estados_orden_compra.id_estado"), nullable=True)
+    id_estado_nuevo = Column(Integer, ForeignKey("estados_orden_compra.id_estado"), nullable=False)
+    tramo = Column(Integer, nullable=False)                   # Índice en MetricasWorkflowCRUD.TRAMOS_HORAS (percentiles)
+    cantidad = Column(Integer, nullable=False)
+    segundos_total = Column(BigInteger, nullable=False)
+    segundos_minimo = Column(BigInteger, nullable=False)
+    segundos_maximo = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index('idx_metricas_workflow_diarias_fecha', 'fecha', 'id_proveedor'),
+    )
+
+    def __repr__(self):
+        return f"<MetricaWorkflowDiaria(fecha={self.fecha}, proveedor={self.id_proveedor}, {self.id_estado_anterior} -> {self.id_estado_nuevo}, cantidad={self.cantidad})>"
+
+
+class MetricaWorkflowDiaConsolidado(Base):
+    """Días cerrados ya consolidados en metricas_workflow_diarias (un día sin cambios también se registra)"""
+    __tablename__ = "metricas_workflow_dias_consolidados"
+
+    fecha = Column(Date, primary_key=True)
+    transiciones = Column(Integer, nullable=False, default=0)
+    fecha_consolidacion = Column(TIMESTAMP, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f"<MetricaWorkflowDiaConsolidado(fecha={self.fecha}, transiciones={self.transiciones})>"
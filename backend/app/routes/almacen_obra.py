@@ -7,6 +7,7 @@ from database import get_db
 from models import AlmacenObra, Obra
 from schemas import AlmacenObraCreate, AlmacenObraUpdate, AlmacenObraResponse, AlmacenObraWithRelations
 from crud import almacen_obra_crud, obra_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 # Configuración del router
 router = APIRouter(
@@ -331,7 +332,7 @@ def estadisticas_resumen(
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas generales de almacenes de obra"""
-    return almacen_obra_crud.get_estadisticas_almacenes(db)
+    return cache_estadisticas.obtener("almacenes_obra", db)
 
 @router.get("/stats/condiciones")
 def estadisticas_condiciones(
@@ -7,6 +7,7 @@ from database import get_db
 from models import Cliente
 from schemas import ClienteCreate, ClienteUpdate, ClienteResponse, TipoClienteEnum
 from crud import cliente_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 # Configuración del router
 router = APIRouter(
@@ -245,7 +246,7 @@ def estadisticas_resumen(
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas generales de clientes"""
-    return cliente_crud.get_estadisticas_clientes(db)
+    return cache_estadisticas.obtener("clientes", db)
 
 @router.get("/stats/por-tipo")
 def estadisticas_por_tipo(
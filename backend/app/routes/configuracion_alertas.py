@@ -7,9 +7,14 @@ from models import ConfiguracionAlertas
 from schemas import (
     ConfiguracionAlertasCreate,
     ConfiguracionAlertasUpdate,
-    ConfiguracionAlertasResponse
+    ConfiguracionAlertasResponse,
+    EvaluacionAlertasRequest,
+    EvaluacionAlertasResponse,
+    EjecucionAlertaResponse,
+    TrabajoEncoladoResponse
 )
-from crud import configuracion_alertas_crud
+from crud import configuracion_alertas_crud, motor_alertas_crud, trabajos_cola_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/configuracion-alertas",
@@ -189,9 +194,46 @@ def obtener_alertas_para_revision(db: Session = Depends(get_db)):
     alertas = configuracion_alertas_crud.get_alertas_para_revision(db)
     return [ConfiguracionAlertasResponse.from_orm(alerta) for alerta in alertas]
 
+@router.post("/evaluar", response_model=EvaluacionAlertasResponse)
+def evaluar_alertas(
+    solicitud: EvaluacionAlertasRequest = EvaluacionAlertasRequest(),
+    db: Session = Depends(get_db)
+):
+    """Evaluar las reglas en bloque: genera alertas nuevas y resuelve las que ya no aplican"""
+    ejecuciones = motor_alertas_crud.evaluar(
+        db, ids_alerta=solicitud.ids_alerta, solo_pendientes=solicitud.solo_pendientes,
+        resolver_obsoletas=solicitud.resolver_obsoletas
+    )
+    return EvaluacionAlertasResponse(
+        reglas_evaluadas=len(ejecuciones),
+        alertas_nuevas=sum(ejecucion.nuevas for ejecucion in ejecuciones),
+        alertas_resueltas=sum(ejecucion.resueltas for ejecucion in ejecuciones),
+        errores=sum(1 for ejecucion in ejecuciones if ejecucion.estado == "ERROR"),
+        ejecuciones=ejecuciones
+    )
+
+@router.post("/evaluar/trabajo", response_model=TrabajoEncoladoResponse)
+def encolar_evaluacion_alertas(
+    solicitud: EvaluacionAlertasRequest = EvaluacionAlertasRequest(),
+    db: Session = Depends(get_db)
+):
+    """Evaluar las reglas en segundo plano; el resultado queda en /trabajos/{id}"""
+    return trabajos_cola_crud.encolar(db, "evaluar_alertas", {
+        "ids_alerta": solicitud.ids_alerta, "solo_pendientes": solicitud.solo_pendientes
+    })
+
+@router.get("/ejecuciones/historial", response_model=List[EjecucionAlertaResponse])
+def historial_ejecuciones(
+    id_alerta: Optional[int] = Query(None, description="Filtrar por regla"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return motor_alertas_crud.get_ejecuciones(db, id_alerta=id_alerta, skip=skip, limit=limit)
+
 @router.get("/estadisticas/general")
 def obtener_estadisticas_alertas(db: Session = Depends(get_db)):
-    return configuracion_alertas_crud.get_estadisticas_alertas(db)
+    return cache_estadisticas.obtener("configuracion_alertas", db)
 
 @router.post("/validar-emails")
 def validar_formato_emails(
@@ -229,7 +271,7 @@ def obtener_tipos_alertas_disponibles():
 @router.get("/resumen/configuracion")
 def obtener_resumen_configuracion(db: Session = Depends(get_db)):
     """Obtener resumen de la configuración actual de alertas"""
-    estadisticas = configuracion_alertas_crud.get_estadisticas_alertas(db)
+    estadisticas = cache_estadisticas.obtener("configuracion_alertas", db)
     alertas_activas = configuracion_alertas_crud.get_alertas_activas(db, limit=1000)
 
     # Calcular usuarios únicos notificados
@@ -9,9 +9,14 @@ from schemas import (
     ConteosFisicosCreate,
     ConteosFisicosUpdate,
     ConteosFisicosResponse,
-    ConteosFisicosWithRelations
+    ConteosFisicosWithRelations,
+    ConteosLoteRequest,
+    ConteosLoteResponse,
+    GeneracionAjustesRequest,
+    GeneracionAjustesResponse
 )
 from crud import conteos_fisicos_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/conteos-fisicos",
@@ -25,6 +30,24 @@ def crear_conteo(
 ):
     return conteos_fisicos_crud.create_conteo(db, conteo)
 
+@router.post("/programacion/{id_programacion}/lote", response_model=ConteosLoteResponse)
+def capturar_conteos_lote(
+    id_programacion: int,
+    lote: ConteosLoteRequest,
+    db: Session = Depends(get_db)
+):
+    """Registrar miles de líneas escaneadas; cantidad_sistema sale del snapshot tomado al iniciar el conteo"""
+    try:
+        resultado = conteos_fisicos_crud.capturar_lote(
+            db, id_programacion, [linea.model_dump() for linea in lote.lineas],
+            lote.id_usuario_contador, acumular=lote.acumular
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Programación no encontrada")
+    return resultado
+
 @router.get("/", response_model=List[ConteosFisicosResponse])
 def listar_conteos(
     skip: int = Query(0, ge=0),
@@ -316,9 +339,24 @@ def procesar_ajustes_automaticos(
         "ajustes": ajustes
     }
 
+@router.post("/programacion/{id_programacion}/generar-ajustes", response_model=GeneracionAjustesResponse)
+def generar_ajustes(
+    id_programacion: int,
+    solicitud: GeneracionAjustesRequest,
+    db: Session = Depends(get_db)
+):
+    """Crear los movimientos de ajuste (AJP/AJN) de todas las diferencias sin procesar; repetirlo no duplica ajustes"""
+    try:
+        resultado = conteos_fisicos_crud.generar_ajustes(db, id_programacion, solicitud.id_usuario)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Programación no encontrada")
+    return resultado
+
 @router.get("/estadisticas/generales")
 def obtener_estadisticas_generales(db: Session = Depends(get_db)):
-    return conteos_fisicos_crud.get_estadisticas_generales(db)
+    return cache_estadisticas.obtener("conteos_fisicos", db)
 
 @router.get("/estadisticas/programacion/{id_programacion}")
 def obtener_estadisticas_programacion(
@@ -0,0 +1,62 @@
+"""
+API routes para costos de productos: costo promedio ponderado y capas FIFO
+"""
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db, SessionLocal
+from schemas import ReconstruccionCostoRequest, ReconstruccionCostoResponse
+from crud import costo_promedio_crud, capa_costo_crud
+
+router = APIRouter(
+    prefix="/costos",
+    tags=["Costos"]
+)
+
+
+@router.post("/costo-promedio/reconstruir", response_model=ReconstruccionCostoResponse)
+def reconstruir_costo_promedio(
+    solicitud: ReconstruccionCostoRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Recalcula costo_promedio reproduciendo el kardex procesado.
+    Sin ids_producto se reconstruyen todos los productos.
+    """
+    return costo_promedio_crud.reconstruir(db, solicitud.ids_producto)
+
+
+@router.post("/capas/inicializar")
+def inicializar_capas_costo(db: Session = Depends(get_db)):
+    """
+    Crea capas de apertura al costo promedio para el stock de productos sin capas
+    """
+    capas = capa_costo_crud.inicializar(db)
+    return {"message": "Capas de apertura creadas", "capas": capas}
+
+
+@router.get("/valorizacion-fifo.csv")
+def exportar_valorizacion_fifo(
+    fecha_corte: Optional[date] = Query(None, description="Fecha de corte (hoy si se omite)"),
+    por: str = Query("bodega", pattern="^(bodega|obra)$", description="Agrupar por bodega u obra"),
+):
+    """
+    Valorización FIFO de todo el catálogo a una fecha, descargada como CSV en flujo
+    """
+    fecha_corte = fecha_corte or date.today()
+
+    def _generar():
+        # Sesión propia: la respuesta se sigue escribiendo después de retornar el endpoint
+        db = SessionLocal()
+        try:
+            yield from capa_costo_crud.valorizar_csv(db, fecha_corte, por)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        _generar(), media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="valorizacion_fifo_{por}_{fecha_corte}.csv"'}
+    )
@@ -0,0 +1,40 @@
+"""
+API routes para el dashboard compuesto
+
+El dashboard de inicio pide sus widgets en una sola llamada
+(/dashboard?widgets=workflow_tiempos,alertas_resumen,...) en lugar de un
+request por widget. Los widgets que no terminan dentro del plazo vuelven
+con estado TIMEOUT y el resto se entrega igual.
+"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+from config import DASHBOARD_TIMEOUT_MS, DASHBOARD_TIMEOUT_MAXIMO_MS
+from utils.dashboard import dashboard
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"]
+)
+
+
+@router.get("/")
+def obtener_dashboard(
+    widgets: Optional[str] = Query(None, description="Ids de widget separados por coma (todos si se omite)"),
+    timeout_ms: int = Query(DASHBOARD_TIMEOUT_MS, ge=100, le=DASHBOARD_TIMEOUT_MAXIMO_MS,
+                            description="Plazo por widget en milisegundos"),
+):
+    """Ejecuta los widgets pedidos a la vez y retorna sus resultados en una sola respuesta"""
+    ids = [id_widget.strip() for id_widget in widgets.split(",") if id_widget.strip()] if widgets else list(dashboard.widgets)
+    if not ids:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos un widget")
+    try:
+        return dashboard.componer(ids, timeout_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/widgets")
+def listar_widgets():
+    """Widgets disponibles para /dashboard"""
+    return dashboard.get_widgets()
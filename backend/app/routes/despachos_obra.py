@@ -9,9 +9,12 @@ from schemas import (
     DespachosObraCreate,
     DespachosObraUpdate,
     DespachosObraResponse,
-    DespachosObraWithRelations
+    DespachosObraWithRelations,
+    DespachoMasivoCreate,
+    DespachoMasivoResponse
 )
 from crud import despachos_obra_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/despachos-obra",
@@ -29,6 +32,21 @@ def crear_despacho(
 
     return despachos_obra_crud.create_despacho(db, despacho)
 
+@router.post("/masivo", response_model=DespachoMasivoResponse)
+def crear_despacho_masivo(
+    solicitud: DespachoMasivoCreate,
+    db: Session = Depends(get_db)
+):
+    """Crear despacho con todo su detalle y efectos de stock en una transacción"""
+    if solicitud.numero_despacho and despachos_obra_crud.get_despacho_by_numero(db, solicitud.numero_despacho):
+        raise HTTPException(status_code=400, detail="El número de despacho ya existe")
+    try:
+        return despachos_obra_crud.despachar_masivo(db, solicitud)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 @router.get("/", response_model=List[DespachosObraResponse])
 def listar_despachos(
     skip: int = Query(0, ge=0),
@@ -204,4 +222,4 @@ def cambiar_estado_despacho(
 
 @router.get("/estadisticas/general")
 def obtener_estadisticas_despachos(db: Session = Depends(get_db)):
-    return despachos_obra_crud.get_estadisticas_despachos(db)
\ No newline at end of file
+    return cache_estadisticas.obtener("despachos", db)
\ No newline at end of file
@@ -11,6 +11,7 @@ from schemas import (
     DespachosObraDetalleWithRelations
 )
 from crud import despachos_obra_detalle_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/despachos-obra-detalle",
@@ -22,7 +23,12 @@ def crear_detalle_despacho(
     detalle: DespachosObraDetalleCreate,
     db: Session = Depends(get_db)
 ):
-    return despachos_obra_detalle_crud.create_detalle(db, detalle)
+    try:
+        return despachos_obra_detalle_crud.create_detalle(db, detalle)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 @router.get("/", response_model=List[DespachosObraDetalleResponse])
 def listar_detalles_despacho(
@@ -210,4 +216,4 @@ def obtener_resumen_despacho(
 
 @router.get("/estadisticas/herramientas")
 def obtener_estadisticas_herramientas(db: Session = Depends(get_db)):
-    return despachos_obra_detalle_crud.get_estadisticas_herramientas(db)
\ No newline at end of file
+    return cache_estadisticas.obtener("herramientas_despachadas", db)
\ No newline at end of file
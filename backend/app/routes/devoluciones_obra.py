@@ -12,6 +12,7 @@ from schemas import (
     DevolucionesObraWithRelations
 )
 from crud import devoluciones_obra_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/devoluciones-obra",
@@ -236,4 +237,4 @@ def marcar_devolucion_como_recibida(
 
 @router.get("/estadisticas/general")
 def obtener_estadisticas_devoluciones(db: Session = Depends(get_db)):
-    return devoluciones_obra_crud.get_estadisticas_devoluciones(db)
\ No newline at end of file
+    return cache_estadisticas.obtener("devoluciones", db)
\ No newline at end of file
@@ -11,6 +11,7 @@ from schemas import (
     DevolucionesObraDetalleWithRelations
 )
 from crud import devoluciones_obra_detalle_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/devoluciones-obra-detalle",
@@ -246,4 +247,4 @@ def obtener_resumen_devolucion(
 
 @router.get("/estadisticas/productos-devueltos")
 def obtener_estadisticas_productos_devueltos(db: Session = Depends(get_db)):
-    return devoluciones_obra_detalle_crud.get_estadisticas_productos_devueltos(db)
\ No newline at end of file
+    return cache_estadisticas.obtener("productos_devueltos", db)
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+API routes para Disponibilidad (ATP)
+"""
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import DisponibilidadConsulta, DisponibilidadProductoResponse
+from crud import disponibilidad_crud
+
+router = APIRouter(
+    prefix="/disponibilidad",
+    tags=["Disponibilidad"]
+)
+
+
+@router.post("/consulta", response_model=List[DisponibilidadProductoResponse])
+def consultar_disponibilidad(
+    consulta: DisponibilidadConsulta,
+    db: Session = Depends(get_db)
+):
+    """
+    Disponibilidad de varios productos en una sola llamada.
+    Si la línea trae cantidad se indica si el disponible la cubre.
+    """
+    resultado = disponibilidad_crud.consultar(
+        db, [linea.model_dump() for linea in consulta.lineas], consulta.incluir_ubicaciones
+    )
+    # Persistir las filas que la consulta materializó por primera vez
+    db.commit()
+    return resultado
+
+
+@router.get("/{id_producto}", response_model=DisponibilidadProductoResponse)
+def obtener_disponibilidad_producto(
+    id_producto: int,
+    incluir_ubicaciones: bool = Query(True, description="Incluir el desglose por ubicación"),
+    db: Session = Depends(get_db)
+):
+    """
+    En mano, reservado, en tránsito, disponible y ATP de un producto
+    """
+    resultado = disponibilidad_crud.consultar(db, [{"id_producto": id_producto}], incluir_ubicaciones)
+    db.commit()
+    if not resultado:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return resultado[0]
+
+
+@router.post("/recalcular")
+def recalcular_disponibilidad(db: Session = Depends(get_db)):
+    """
+    Reconstruye la tabla de disponibilidad desde stock, reservas y OC abiertas
+    """
+    filas = disponibilidad_crud.recalcular(db)
+    return {"message": "Disponibilidad recalculada", "filas": filas}
@@ -0,0 +1,78 @@
+"""
+API routes para eventos en vivo (Server-Sent Events)
+
+El navegador abre new EventSource("/api/v1/eventos/stream?temas=alertas,stock")
+y recibe los eventos a medida que se confirman, en lugar de consultar
+/log-alertas cada pocos segundos. EventSource reconecta solo y envía
+Last-Event-ID para recibir lo que se perdió mientras estuvo desconectado.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from config import EVENTOS_ACTIVOS, EVENTOS_BROKER, EVENTOS_KEEPALIVE_SEGUNDOS
+from utils.eventos import TEMAS, hub_eventos
+
+router = APIRouter(
+    prefix="/eventos",
+    tags=["Eventos en vivo"]
+)
+
+
+def _formatear(evento: Dict[str, Any]) -> str:
+    datos = json.dumps({"tema": evento["tema"], "fecha": evento["fecha"], **evento["datos"]},
+                       default=str, ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+@router.get("/stream")
+async def stream_eventos(
+    request: Request,
+    temas: Optional[str] = Query(None, description="Temas separados por coma: alertas, stock, workflow (todos si se omite)"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    """Stream text/event-stream con alertas nuevas, cruces de stock mínimo y cambios de estado"""
+    if not EVENTOS_ACTIVOS:
+        raise HTTPException(status_code=503, detail="Los eventos en vivo están desactivados")
+    filtro = {tema.strip() for tema in temas.split(",") if tema.strip()} if temas else None
+    if filtro and not filtro <= set(TEMAS):
+        raise HTTPException(status_code=400, detail=f"Temas válidos: {', '.join(TEMAS)}")
+
+    # Suscribirse antes de leer el buffer para no perder eventos entre ambos pasos
+    suscripcion = hub_eventos.suscribir(filtro)
+
+    async def generar():
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id is not None:
+                for evento in hub_eventos.recientes(last_event_id, filtro):
+                    suscripcion.marcar_enviado(evento)
+                    yield _formatear(evento)
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=EVENTOS_KEEPALIVE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # Ya enviado al reenviar el buffer; BrokerDB puede publicar ids
+                # menores después de otros mayores, así que no se compara por orden
+                if not suscripcion.marcar_enviado(evento):
+                    continue
+                yield _formatear(evento)
+        finally:
+            hub_eventos.desuscribir(suscripcion)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/estado")
+def estado_eventos():
+    """Conexiones abiertas en este worker y eventos entregados"""
+    return {"activo": EVENTOS_ACTIVOS, "broker": EVENTOS_BROKER, **hub_eventos.get_estado()}
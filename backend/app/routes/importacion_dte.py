@@ -10,7 +10,7 @@ from models import (
     DocumentoCompraDetalle, ReferenciaDocumento, TipoDocumentoCompra
 )
 from schemas import DocumentoCompraResponse
-from utils.dte_parser import parse_dte_xml
+from utils.metrics import DTE_IMPORTADOS
 
 # Configuración del router
 router = APIRouter(
@@ -173,7 +173,8 @@ async def procesar_xml_dte(
         contenido_xml = await archivo.read()
         xml_string = contenido_xml.decode('utf-8')
 
-        # Parsear el XML
+        # Parsear el XML (el parser y xml.etree se cargan en el primer uso)
+        from utils.dte_parser import parse_dte_xml
         datos_dte = parse_dte_xml(xml_string)
 
         encabezado = datos_dte['encabezado']
@@ -293,12 +294,15 @@ async def procesar_xml_dte(
         db.commit()
         db.refresh(documento)
 
+        DTE_IMPORTADOS.inc(resultado="ok")
         return documento
 
     except ValueError as e:
+        DTE_IMPORTADOS.inc(resultado="invalido")
         raise HTTPException(status_code=400, detail=f"Error al procesar XML: {str(e)}")
     except Exception as e:
         db.rollback()
+        DTE_IMPORTADOS.inc(resultado="error")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
@@ -345,7 +349,8 @@ async def validar_xml_dte(
         contenido_xml = await archivo.read()
         xml_string = contenido_xml.decode('utf-8')
 
-        # Parsear el XML
+        # Parsear el XML (el parser y xml.etree se cargan en el primer uso)
+        from utils.dte_parser import parse_dte_xml
         datos_dte = parse_dte_xml(xml_string)
 
         return {
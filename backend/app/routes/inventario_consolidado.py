@@ -17,6 +17,7 @@ from schemas import (
     NivelStock
 )
 from crud import inventario_consolidado_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 # Configuración del router
 router = APIRouter(
@@ -253,7 +254,7 @@ def obtener_resumen_inventario(
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas consolidadas del inventario"""
-    stats_data = inventario_consolidado_crud.get_estadisticas_inventario(db)
+    stats_data = cache_estadisticas.obtener("inventario_consolidado", db)
 
     return EstadisticasInventario(**stats_data)
 
@@ -414,7 +415,7 @@ def exportar_inventario_excel(
             'Alto Valor': 'Sí' if producto.es_producto_alto_valor else 'No'
         })
 
-    estadisticas = inventario_consolidado_crud.get_estadisticas_inventario(db)
+    estadisticas = cache_estadisticas.obtener("inventario_consolidado", db)
 
     return {
         "metadata": {
@@ -432,7 +433,7 @@ def obtener_datos_dashboard(
     db: Session = Depends(get_db)
 ):
     """Obtener datos consolidados para dashboard de inventario"""
-    estadisticas = inventario_consolidado_crud.get_estadisticas_inventario(db)
+    estadisticas = cache_estadisticas.obtener("inventario_consolidado", db)
     alertas = inventario_consolidado_crud.get_alertas_inventario(db)
     productos_criticos = inventario_consolidado_crud.get_productos_criticos(db, limit=10)
     productos_alto_valor = inventario_consolidado_crud.get_productos_alto_valor(db, limit=10)
@@ -8,9 +8,12 @@ from schemas import (
     InventarioObraCreate,
     InventarioObraUpdate,
     InventarioObraResponse,
-    InventarioObraWithRelations
+    InventarioObraWithRelations,
+    CambiosStockObraRequest,
+    InventarioObraHistorialResponse
 )
 from crud import inventario_obra_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/inventario-obra",
@@ -222,6 +225,27 @@ def actualizar_stock_obra_producto(
         raise HTTPException(status_code=400, detail="No se pudo actualizar el stock")
     return inventario
 
+@router.post("/stock/lote")
+def aplicar_cambios_stock(
+    solicitud: CambiosStockObraRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Aplicar muchos cambios de stock (obra, producto, delta) en una sola transacción
+    """
+    afectados = inventario_obra_crud.aplicar_cambios_stock(db, [c.model_dump() for c in solicitud.cambios])
+    return {"message": "Cambios de stock aplicados", "cambios": len(solicitud.cambios), "registros_afectados": afectados}
+
+@router.get("/obra/{id_obra}/historial", response_model=List[InventarioObraHistorialResponse])
+def obtener_historial_stock_obra(
+    id_obra: int,
+    id_producto: Optional[int] = Query(None, description="Filtrar por producto"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return inventario_obra_crud.get_historial(db, id_obra, id_producto, skip=skip, limit=limit)
+
 @router.patch("/{id_inventario}/asignar-herramienta", response_model=InventarioObraResponse)
 def asignar_herramienta(
     id_inventario: int,
@@ -243,4 +267,4 @@ def obtener_resumen_inventario_obra(
 
 @router.get("/estadisticas/general")
 def obtener_estadisticas_inventarios(db: Session = Depends(get_db)):
-    return inventario_obra_crud.get_estadisticas_generales(db)
\ No newline at end of file
+    return cache_estadisticas.obtener("inventario_obra", db)
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+API routes para el Kardex de productos
+"""
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db, SessionLocal
+from crud import kardex_crud, producto_crud
+
+router = APIRouter(
+    prefix="/kardex",
+    tags=["Kardex"]
+)
+
+TIPOS_CONTENIDO = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@router.get("/{id_producto}")
+def obtener_kardex(
+    id_producto: int,
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    id_ubicacion: Optional[int] = Query(None, description="Kardex de una ubicación"),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Movimientos procesados del producto con saldo acumulado de cantidad y valor,
+    transmitidos en flujo como NDJSON o CSV
+    """
+    if not producto_crud.get_producto(db, id_producto):
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    def _generar():
+        # Sesión propia: la respuesta se sigue escribiendo después de retornar el endpoint
+        sesion = SessionLocal()
+        try:
+            yield from kardex_crud.exportar(sesion, id_producto, formato, id_ubicacion=id_ubicacion,
+                                            fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+        finally:
+            sesion.close()
+
+    return StreamingResponse(
+        _generar(), media_type=TIPOS_CONTENIDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="kardex_{id_producto}.{formato}"'}
+    )
@@ -15,6 +15,7 @@ from schemas import (
     IgnorarAlertaRequest
 )
 from crud import log_alertas_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/log-alertas",
@@ -391,7 +392,7 @@ def buscar_logs_por_mensaje(
 
 @router.get("/estadisticas/generales")
 def obtener_estadisticas_logs(db: Session = Depends(get_db)):
-    return log_alertas_crud.get_estadisticas_logs(db)
+    return cache_estadisticas.obtener("log_alertas", db)
 
 @router.get("/estadisticas/configuracion/{id_alerta}")
 def obtener_resumen_por_configuracion(
@@ -411,7 +412,7 @@ def limpiar_logs_antiguos(
 @router.get("/dashboard/resumen")
 def obtener_resumen_dashboard(db: Session = Depends(get_db)):
     """Obtener resumen para dashboard de alertas"""
-    estadisticas = log_alertas_crud.get_estadisticas_logs(db)
+    estadisticas = cache_estadisticas.obtener("log_alertas", db)
     logs_criticos_pendientes = log_alertas_crud.get_logs_criticos(db, limit=5)
     logs_sin_resolver = log_alertas_crud.get_logs_sin_resolver(db, 24, limit=10)
 
@@ -6,7 +6,10 @@ from datetime import date
 # Imports locales
 from database import get_db
 from models import Lote, Producto, Proveedor
-from schemas import LoteCreate, LoteUpdate, LoteResponse, LoteWithRelations, EstadoLoteEnum
+from schemas import (
+    LoteCreate, LoteUpdate, LoteResponse, LoteWithRelations, EstadoLoteEnum,
+    AsignacionLotesRequest, AsignacionLotesResponse
+)
 from crud import lote_crud, producto_crud, proveedor_crud
 
 # Configuración del router
@@ -291,6 +294,28 @@ def actualizar_cantidad_lote(
 # ENDPOINTS ESPECIALES
 # ========================================
 
+@router.post("/asignar", response_model=AsignacionLotesResponse)
+def asignar_lotes(
+    solicitud: AsignacionLotesRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Asignar lotes a una lista de (producto, cantidad) por FEFO o FIFO
+    - Bloquea los lotes elegidos y descuenta las cantidades en una sola transacción
+    - **simular**: retorna el plan de picking sin modificar nada
+    - **permitir_parcial**: asigna lo disponible en lugar de rechazar con 400
+    """
+    try:
+        return lote_crud.asignar_lotes(
+            db,
+            [linea.model_dump() for linea in solicitud.lineas],
+            criterio=solicitud.criterio.value,
+            simular=solicitud.simular,
+            permitir_parcial=solicitud.permitir_parcial
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/especiales/vencidos", response_model=List[LoteWithRelations])
 def obtener_lotes_vencidos(
     db: Session = Depends(get_db)
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List, Optional
+
+from utils.sql_instrumentation import get_resumen_rutas, reiniciar_resumen_rutas
+from utils.slow_query_log import get_consultas_lentas, limpiar_consultas_lentas
+from utils.cache_estadisticas import cache_estadisticas
+
+router = APIRouter(
+    prefix="/monitoreo",
+    tags=["Monitoreo"]
+)
+
+@router.get("/sql/rutas", response_model=List[Dict[str, Any]])
+def listar_consultas_por_ruta():
+    """Consultas y tiempo en BD por ruta, con histogramas y sospechas de N+1"""
+    return get_resumen_rutas()
+
+@router.delete("/sql/rutas")
+def reiniciar_consultas_por_ruta():
+    """Reinicia los agregados de consultas por ruta"""
+    reiniciar_resumen_rutas()
+    return {"message": "Agregados de consultas reiniciados"}
+
+@router.get("/sql/lentas", response_model=List[Dict[str, Any]])
+def listar_consultas_lentas(
+    limit: int = Query(50, ge=1, le=1000),
+    desde_archivo: bool = Query(False, description="Leer los archivos de todos los workers en lugar de la memoria de este proceso"),
+):
+    """Consultas lentas con parámetros, ruta de origen y plan EXPLAIN"""
+    return get_consultas_lentas(limit=limit, desde_archivo=desde_archivo)
+
+@router.delete("/sql/lentas")
+def limpiar_listado_consultas_lentas():
+    """Limpia las consultas lentas en memoria (el archivo se conserva)"""
+    limpiar_consultas_lentas()
+    return {"message": "Consultas lentas en memoria eliminadas"}
+
+@router.get("/estadisticas", response_model=List[Dict[str, Any]])
+def listar_cache_estadisticas():
+    """Estadísticas en cache de este worker: vigencia, aciertos, cálculos y coalescencias"""
+    return cache_estadisticas.get_estado()
+
+@router.delete("/estadisticas")
+def invalidar_cache_estadisticas(
+    nombre: Optional[str] = Query(None, description="Estadística a invalidar (todas si se omite)"),
+):
+    """Invalida estadísticas en cache de este worker"""
+    try:
+        invalidadas = cache_estadisticas.invalidar(nombre)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"message": f"{invalidadas} estadística(s) invalidadas"}
@@ -115,11 +115,11 @@ def crear_movimiento(
 ):
     """
     Crear nuevo movimiento de inventario
-    - Requiere número único
+    - Número único; si no se envía se asigna desde la secuencia MOV
     - Valida que existan tipo de movimiento y documento (opcional)
     """
     # Verificar que no existe un movimiento con el mismo número
-    existing_movimiento = movimiento_inventario_crud.get_movimiento_by_numero(db, movimiento.numero_movimiento)
+    existing_movimiento = movimiento.numero_movimiento and movimiento_inventario_crud.get_movimiento_by_numero(db, movimiento.numero_movimiento)
     if existing_movimiento:
         raise HTTPException(
             status_code=400,
@@ -159,7 +159,7 @@ def crear_movimiento_completo(
     - Crea movimiento y detalles automáticamente
     """
     # Validaciones del movimiento principal (reutilizar lógica)
-    existing_movimiento = movimiento_inventario_crud.get_movimiento_by_numero(
+    existing_movimiento = movimiento_completo.movimiento.numero_movimiento and movimiento_inventario_crud.get_movimiento_by_numero(
         db, movimiento_completo.movimiento.numero_movimiento
     )
     if existing_movimiento:
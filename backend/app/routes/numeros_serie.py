@@ -6,7 +6,10 @@ from datetime import date
 # Imports locales
 from database import get_db
 from models import NumeroSerie, Producto, Lote, ProductoUbicacion
-from schemas import NumeroSerieCreate, NumeroSerieUpdate, NumeroSerieResponse, NumeroSerieWithRelations, EstadoSerieEnum
+from schemas import (
+    NumeroSerieCreate, NumeroSerieUpdate, NumeroSerieResponse, NumeroSerieWithRelations, EstadoSerieEnum,
+    AsignacionSeriesRequest, AsignacionSeriesResponse, RegistroRangoSeriesRequest, RegistroRangoSeriesResponse
+)
 from crud import numero_serie_crud, producto_crud, lote_crud, producto_ubicacion_crud
 
 # Configuración del router
@@ -389,6 +392,67 @@ def liberar_numero_serie(
         joinedload(NumeroSerie.ubicacion)
     ).filter(NumeroSerie.id_serie == serie_id).first()
 
+# ========================================
+# OPERACIONES MASIVAS
+# ========================================
+
+@router.post("/asignar", response_model=AsignacionSeriesResponse)
+def asignar_numeros_serie(
+    solicitud: AsignacionSeriesRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Asignar N números de serie DISPONIBLES de un producto (opcionalmente de un lote o ubicación)
+    - Usa FOR UPDATE SKIP LOCKED: despachos concurrentes nunca reciben la misma serie
+    - Cambia el estado a RESERVADO o VENDIDO en un solo UPDATE
+    """
+    try:
+        series = numero_serie_crud.asignar_numeros_serie(
+            db,
+            id_producto=solicitud.id_producto,
+            cantidad=solicitud.cantidad,
+            nuevo_estado=solicitud.nuevo_estado.value,
+            cliente=solicitud.cliente,
+            id_lote=solicitud.id_lote,
+            id_ubicacion=solicitud.id_ubicacion,
+            fecha_venta=solicitud.fecha_venta
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "id_producto": solicitud.id_producto,
+        "estado": solicitud.nuevo_estado,
+        "cantidad": len(series),
+        "series": series
+    }
+
+@router.post("/rango", response_model=RegistroRangoSeriesResponse, status_code=201)
+def registrar_rango_numeros_serie(
+    solicitud: RegistroRangoSeriesRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Registrar un rango de números de serie al recibir mercadería
+    - **rango**: p.ej. EXT-000100..EXT-000400 (conserva los ceros a la izquierda)
+    """
+    producto = producto_crud.get_producto(db, solicitud.id_producto)
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    try:
+        return numero_serie_crud.registrar_rango(
+            db,
+            id_producto=solicitud.id_producto,
+            rango=solicitud.rango,
+            fecha_ingreso=solicitud.fecha_ingreso,
+            id_lote=solicitud.id_lote,
+            id_ubicacion=solicitud.id_ubicacion,
+            omitir_existentes=solicitud.omitir_existentes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ========================================
 # ENDPOINTS ESPECIALES DE CONSULTA
 # ========================================
@@ -7,6 +7,7 @@ from database import get_db
 from models import Obra, Cliente
 from schemas import ObraCreate, ObraUpdate, ObraResponse, ObraWithRelations, EstadoObraEnum, PrioridadObraEnum
 from crud import obra_crud, cliente_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 # Configuración del router
 router = APIRouter(
@@ -461,7 +462,7 @@ def estadisticas_resumen(
     db: Session = Depends(get_db)
 ):
     """Obtener estadísticas generales de obras"""
-    return obra_crud.get_estadisticas_obras(db)
+    return cache_estadisticas.obtener("obras", db)
 
 @router.get("/stats/por-estado")
 def estadisticas_por_estado(
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import date, timedelta
 from database import get_db
 import schemas, crud
 from utils.pdf_generator import generar_pdf_orden_compra
@@ -321,4 +322,48 @@ def generar_pdf_orden(
             }
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al generar PDF: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error al generar PDF: {str(e)}")
+
+
+@router.post("/pdf/lote", response_model=schemas.TrabajoEncoladoResponse)
+def exportar_pdf_ordenes(
+    solicitud: schemas.ExportacionPdfOrdenesRequest,
+    db: Session = Depends(get_db)
+):
+    """Encolar la exportación de PDF de varias órdenes; los archivos quedan en /trabajos/{id}/archivos"""
+    return crud.trabajos_cola_crud.encolar(db, "exportar_pdf_ordenes", {"ids_orden": solicitud.ids_orden})
+
+
+# ========================================
+# MÉTRICAS DE TIEMPO DEL WORKFLOW
+# ========================================
+
+@router.get("/metricas/tiempos-ciclo")
+def get_tiempos_ciclo(
+    fecha_desde: Optional[date] = Query(None, description="Por defecto, 90 días antes de fecha_hasta"),
+    fecha_hasta: Optional[date] = Query(None, description="Por defecto, hoy"),
+    id_proveedor: Optional[int] = Query(None),
+    por_proveedor: bool = Query(False, description="Agregar el desglose por proveedor"),
+    db: Session = Depends(get_db)
+):
+    """Tiempos entre estados (promedio, mínimo, máximo y percentiles) de los cambios de estado del período"""
+    fecha_hasta = fecha_hasta or date.today()
+    fecha_desde = fecha_desde or fecha_hasta - timedelta(days=90)
+    try:
+        return crud.metricas_workflow_crud.get_metricas(db, fecha_desde, fecha_hasta,
+                                                        id_proveedor=id_proveedor, por_proveedor=por_proveedor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/metricas/tiempos-ciclo/consolidar")
+def consolidar_tiempos_ciclo(
+    fecha_desde: date = Query(...),
+    fecha_hasta: date = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Recalcula las métricas diarias del período (la tarea consolidar_metricas_workflow lo hace cada noche)"""
+    try:
+        return crud.metricas_workflow_crud.consolidar(db, fecha_desde, fecha_hasta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
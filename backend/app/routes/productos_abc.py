@@ -9,7 +9,7 @@ from datetime import datetime
 from decimal import Decimal
 
 from database import get_db
-from crud import ProductosABCCRUD
+from crud import ProductosABCCRUD, trabajos_cola_crud
 from schemas import (
     VistaProductosABCRead,
     VistaProductosABCFilter,
@@ -18,7 +18,8 @@ from schemas import (
     CategoriaRotacion,
     CriticidadProducto,
     AccionRecomendada,
-    ImpactoFinanciero
+    ImpactoFinanciero,
+    TrabajoEncoladoResponse
 )
 
 router = APIRouter(
@@ -142,6 +143,11 @@ def obtener_estadisticas_generales(db: Session = Depends(get_db)):
     crud_productos = ProductosABCCRUD(db)
     return crud_productos.get_estadisticas_generales()
 
+@router.post("/estadisticas/generales/trabajo", response_model=TrabajoEncoladoResponse)
+def encolar_estadisticas_generales(db: Session = Depends(get_db)):
+    """Calcular las estadísticas ABC en segundo plano; el resultado queda en /trabajos/{id}"""
+    return trabajos_cola_crud.encolar(db, "estadisticas_abc")
+
 @router.get("/ranking/por-valor", response_model=List[Dict[str, Any]])
 def obtener_ranking_por_valor(
     top_productos: int = Query(20, ge=1, le=100, description="Número de productos en el ranking"),
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
-from datetime import date
+from datetime import date, timedelta
 
 from database import get_db
 from models import ProgramacionConteos
@@ -9,9 +9,13 @@ from schemas import (
     ProgramacionConteosCreate,
     ProgramacionConteosUpdate,
     ProgramacionConteosResponse,
-    ProgramacionConteosWithRelations
+    ProgramacionConteosWithRelations,
+    ProgramacionConteoLineaResponse,
+    PlanConteosCiclicosRequest,
+    PlanConteosCiclicosResponse
 )
-from crud import programacion_conteos_crud
+from crud import programacion_conteos_crud, planificador_conteos_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/programacion-conteos",
@@ -221,6 +225,35 @@ def listar_programaciones_por_rango_fechas(
                       .all())
     return programaciones
 
+@router.post("/ciclico/planificar", response_model=PlanConteosCiclicosResponse)
+def planificar_conteos_ciclicos(
+    plan: PlanConteosCiclicosRequest,
+    db: Session = Depends(get_db)
+):
+    """Generar las programaciones CICLICO del período según clase ABC, exactitud y valor, con carga diaria pareja por bodega"""
+    if plan.anio:
+        fecha_desde, fecha_hasta = date(plan.anio, 1, 1), date(plan.anio, 12, 31)
+    else:
+        fecha_desde = plan.fecha_desde or date.today()
+        fecha_hasta = plan.fecha_hasta or fecha_desde + timedelta(days=364)
+    try:
+        return planificador_conteos_crud.planificar(
+            db, fecha_desde, fecha_hasta, plan.id_usuario_responsable, ids_bodega=plan.ids_bodega,
+            feriados=plan.feriados, frecuencias=plan.frecuencias, simular=plan.simular, reemplazar=plan.reemplazar
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{id_programacion}/lineas", response_model=List[ProgramacionConteoLineaResponse])
+def listar_lineas_programacion(
+    id_programacion: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Productos y ubicaciones a contar en una programación cíclica"""
+    return planificador_conteos_crud.get_lineas(db, id_programacion, skip=skip, limit=limit)
+
 @router.patch("/{id_programacion}/iniciar", response_model=ProgramacionConteosResponse)
 def iniciar_conteo(
     id_programacion: int,
@@ -299,11 +332,11 @@ def listar_programaciones_vencidas(
 
 @router.get("/estadisticas/generales")
 def obtener_estadisticas_generales(db: Session = Depends(get_db)):
-    return programacion_conteos_crud.get_estadisticas_generales(db)
+    return cache_estadisticas.obtener("programacion_conteos", db)
 
 @router.get("/estadisticas/por-tipo")
 def obtener_estadisticas_por_tipo(db: Session = Depends(get_db)):
-    return programacion_conteos_crud.get_estadisticas_por_tipo(db)
+    return cache_estadisticas.obtener("programacion_conteos_por_tipo", db)
 
 @router.get("/resumen/pendientes")
 def obtener_resumen_pendientes(db: Session = Depends(get_db)):
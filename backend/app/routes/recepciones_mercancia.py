@@ -94,24 +94,43 @@ def create_recepcion_completa(
     recepcion_completa: schemas.RecepcionMercanciaCompleta,
     db: Session = Depends(get_db)
 ):
-    """Crear recepción de mercancía completa con detalles"""
-    try:
-        # Crear la recepción principal
-        db_recepcion = crud.recepcion_mercancia_crud.create_recepcion(db, recepcion_completa.recepcion)
+    """Crear recepción de mercancía completa con detalles
 
-        # Crear los detalles
-        detalles_response = []
-        for detalle in recepcion_completa.detalles:
-            db_detalle = crud.recepcion_mercancia_detalle_crud.create_detalle(db, detalle, db_recepcion.id_recepcion)
-            detalles_response.append(schemas.RecepcionMercanciaDetalleResponse.model_validate(db_detalle))
+    Se registra todo o nada: una línea que supera lo pendiente de la OC o
+    que no pertenece a la orden rechaza la recepción completa (400).
+    """
+    try:
+        # Recepción y detalles en una sola transacción, sin tocar el stock
+        resultado = crud.recepcion_mercancia_crud.recibir_masivo(db, schemas.RecepcionMasivaCreate(
+            **recepcion_completa.recepcion.model_dump(),
+            detalles=recepcion_completa.detalles,
+            actualizar_stock=False
+        ))
+        db_recepcion = crud.recepcion_mercancia_crud.get_recepcion(db, resultado["id_recepcion"])
+        detalles = crud.recepcion_mercancia_detalle_crud.get_detalles_by_recepcion(db, resultado["id_recepcion"])
 
         # Crear respuesta completa
         recepcion_response = schemas.RecepcionMercanciaCompletaResponse.model_validate(db_recepcion)
-        recepcion_response.detalles = detalles_response
+        recepcion_response.detalles = [schemas.RecepcionMercanciaDetalleResponse.model_validate(detalle) for detalle in detalles]
 
         return recepcion_response
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/masiva/", response_model=schemas.RecepcionMasivaResponse)
+def create_recepcion_masiva(
+    recepcion: schemas.RecepcionMasivaCreate,
+    db: Session = Depends(get_db)
+):
+    """Crear recepción con todas sus líneas en una transacción (stock y OC actualizados en bloque)"""
+    try:
+        return crud.recepcion_mercancia_crud.recibir_masivo(db, recepcion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 @router.put("/{recepcion_id}", response_model=schemas.RecepcionMercanciaResponse)
 def update_recepcion_mercancia(
@@ -12,6 +12,7 @@ from schemas import (
     ReservasWithRelations
 )
 from crud import reservas_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/reservas",
@@ -251,6 +252,10 @@ def listar_reservas_por_rango_fechas(
 def obtener_resumen_reservas(db: Session = Depends(get_db)):
     return reservas_crud.get_resumen_general(db)
 
+@router.get("/estadisticas/general")
+def obtener_estadisticas_reservas(db: Session = Depends(get_db)):
+    return cache_estadisticas.obtener("reservas", db)
+
 @router.get("/estadisticas/por-estado")
 def obtener_estadisticas_por_estado(db: Session = Depends(get_db)):
     return reservas_crud.get_estadisticas_por_estado(db)
@@ -10,6 +10,7 @@ from schemas import (
     RolesResponse
 )
 from crud import roles_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/roles",
@@ -154,12 +155,12 @@ def validar_nombre_unico(
 
 @router.get("/estadisticas/general")
 def obtener_estadisticas_roles(db: Session = Depends(get_db)):
-    return roles_crud.get_estadisticas_roles(db)
+    return cache_estadisticas.obtener("roles", db)
 
 @router.get("/resumen/configuracion")
 def obtener_resumen_configuracion(db: Session = Depends(get_db)):
     """Obtener resumen de la configuración de roles"""
-    estadisticas = roles_crud.get_estadisticas_roles(db)
+    estadisticas = cache_estadisticas.obtener("roles", db)
     roles_activos = roles_crud.get_roles_activos(db, limit=1000)
 
     # Roles más comunes (esto podría extenderse con relaciones a usuarios)
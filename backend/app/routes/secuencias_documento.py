@@ -0,0 +1,42 @@
+"""
+API routes para Secuencias de Documentos
+"""
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import SecuenciaDocumentoResponse, NumeroDocumentoResponse
+from crud import secuencia_documento_crud
+
+router = APIRouter(
+    prefix="/secuencias-documento",
+    tags=["Secuencias de Documentos"]
+)
+
+
+@router.get("", response_model=List[SecuenciaDocumentoResponse])
+def listar_secuencias(db: Session = Depends(get_db)):
+    """
+    Estado actual de las series de numeración (OC, DSP, DEV, RES, MOV)
+    """
+    return secuencia_documento_crud.get_secuencias(db)
+
+
+@router.post("/{prefijo}/siguiente", response_model=NumeroDocumentoResponse)
+def asignar_siguiente_numero(
+    prefijo: str,
+    fecha: Optional[date] = Query(None, description="Fecha del documento (define el año de la serie)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Asignar el siguiente número de la serie. El número queda consumido
+    aunque el documento no llegue a crearse.
+    """
+    try:
+        numero = secuencia_documento_crud.siguiente_numero(db, prefijo.upper(), fecha)
+        db.commit()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"prefijo": prefijo.upper(), "numero": numero}
@@ -0,0 +1,68 @@
+"""
+API routes para el planificador de tareas periódicas
+"""
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from config import PLANIFICADOR_ACTIVO
+from database import get_db
+from crud import ejecuciones_tareas_crud
+from schemas import EjecucionTareaResponse, PlanificadorEstadoResponse
+from utils.planificador import planificador
+
+router = APIRouter(
+    prefix="/tareas-programadas",
+    tags=["Tareas Programadas"]
+)
+
+
+@router.get("/", response_model=PlanificadorEstadoResponse)
+def listar_tareas(db: Session = Depends(get_db)):
+    """Tareas registradas, su programación y su última ejecución"""
+    ultimas = ejecuciones_tareas_crud.get_ultimas_por_tarea(db)
+    return {
+        "activo": PLANIFICADOR_ACTIVO,
+        "worker": planificador.worker,
+        "lider": planificador.lider,
+        "tareas": [{**tarea, "ultima_ejecucion": ultimas.get(tarea["nombre"])} for tarea in planificador.get_estado()],
+    }
+
+
+@router.get("/ejecuciones", response_model=List[EjecucionTareaResponse])
+def historial_ejecuciones(
+    tarea: Optional[str] = Query(None),
+    estado: Optional[str] = Query(None, pattern="^(EN_CURSO|OK|ERROR)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return ejecuciones_tareas_crud.get_ejecuciones(db, tarea=tarea, estado=estado, skip=skip, limit=limit)
+
+
+@router.get("/estadisticas", response_model=List[Dict[str, Any]])
+def estadisticas_ejecuciones(
+    dias: int = Query(7, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    """Ejecuciones, errores y duración por tarea"""
+    return ejecuciones_tareas_crud.get_estadisticas(db, dias=dias)
+
+
+@router.post("/{nombre}/ejecutar")
+def ejecutar_tarea(
+    nombre: str,
+    esperar: bool = Query(False, description="Esperar el resultado en lugar de ejecutar en segundo plano"),
+):
+    """Disparo manual de una tarea, en cualquier worker"""
+    if nombre not in planificador.tareas:
+        raise HTTPException(status_code=404, detail=f"Tarea '{nombre}' no registrada")
+    if not esperar:
+        if not planificador.disparar(nombre):
+            raise HTTPException(status_code=409, detail=f"La tarea '{nombre}' ya está en ejecución")
+        return {"message": f"Tarea '{nombre}' iniciada en segundo plano"}
+
+    ejecucion = planificador.ejecutar(nombre)
+    if ejecucion is None:
+        raise HTTPException(status_code=409, detail=f"La tarea '{nombre}' ya está en ejecución")
+    return EjecucionTareaResponse.model_validate(ejecucion)
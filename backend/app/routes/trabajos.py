@@ -0,0 +1,84 @@
+"""
+API routes para la cola de trabajos en segundo plano
+"""
+import os
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from config import COLA_DIRECTORIO_ARCHIVOS
+from database import get_db
+from crud import trabajos_cola_crud
+from schemas import TrabajoColaCreate, TrabajoColaResponse, TrabajoEncoladoResponse
+from utils.cola_trabajos import TIPOS
+
+router = APIRouter(
+    prefix="/trabajos",
+    tags=["Trabajos en Segundo Plano"]
+)
+
+
+@router.post("/", response_model=TrabajoEncoladoResponse)
+def encolar_trabajo(trabajo: TrabajoColaCreate, db: Session = Depends(get_db)):
+    """Encolar un trabajo; retorna su id de inmediato"""
+    if trabajo.tipo not in TIPOS:
+        raise HTTPException(status_code=400, detail=f"Tipo de trabajo desconocido. Tipos válidos: {sorted(TIPOS)}")
+    return trabajos_cola_crud.encolar(db, trabajo.tipo, trabajo.parametros, prioridad=trabajo.prioridad,
+                                      max_intentos=trabajo.max_intentos, id_usuario=trabajo.id_usuario)
+
+
+@router.get("/", response_model=List[TrabajoColaResponse])
+def listar_trabajos(
+    estado: Optional[str] = Query(None, pattern="^(PENDIENTE|EN_PROCESO|COMPLETADO|ERROR|CANCELADO)$"),
+    tipo: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return trabajos_cola_crud.get_trabajos(db, estado=estado, tipo=tipo, skip=skip, limit=limit)
+
+
+@router.get("/estadisticas/resumen", response_model=Dict[str, Any])
+def estadisticas_trabajos(db: Session = Depends(get_db)):
+    """Trabajos por tipo y estado, y espera del pendiente más antiguo"""
+    return {**trabajos_cola_crud.get_estadisticas(db), "tipos_registrados": sorted(TIPOS)}
+
+
+@router.get("/{id_trabajo}", response_model=TrabajoColaResponse)
+def obtener_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    trabajo = trabajos_cola_crud.get_trabajo(db, id_trabajo)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+
+@router.post("/{id_trabajo}/cancelar", response_model=TrabajoColaResponse)
+def cancelar_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    try:
+        trabajo = trabajos_cola_crud.cancelar(db, id_trabajo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+
+@router.post("/{id_trabajo}/reintentar", response_model=TrabajoColaResponse)
+def reintentar_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    try:
+        trabajo = trabajos_cola_crud.reintentar(db, id_trabajo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+
+@router.get("/{id_trabajo}/archivos/{nombre}")
+def descargar_archivo(id_trabajo: int, nombre: str):
+    """Descargar un archivo generado por el trabajo (p.ej. PDF exportados)"""
+    ruta = os.path.join(COLA_DIRECTORIO_ARCHIVOS, str(id_trabajo), os.path.basename(nombre))
+    if not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    return FileResponse(ruta, filename=os.path.basename(ruta))
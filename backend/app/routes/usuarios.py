@@ -14,6 +14,7 @@ from schemas import (
     LoginResponse
 )
 from crud import usuarios_crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter(
     prefix="/usuarios",
@@ -275,12 +276,12 @@ def validar_email_unico(
 
 @router.get("/estadisticas/generales")
 def obtener_estadisticas_usuarios(db: Session = Depends(get_db)):
-    return usuarios_crud.get_estadisticas_usuarios(db)
+    return cache_estadisticas.obtener("usuarios", db)
 
 @router.get("/dashboard/resumen")
 def obtener_resumen_dashboard(db: Session = Depends(get_db)):
     """Obtener resumen para dashboard de usuarios"""
-    estadisticas = usuarios_crud.get_estadisticas_usuarios(db)
+    estadisticas = cache_estadisticas.obtener("usuarios", db)
     usuarios_sin_acceso = usuarios_crud.get_usuarios_sin_acceso_reciente(db, 30, limit=1000)
     usuarios_nuevos = usuarios_crud.get_usuarios_ordenados(db, "fecha_creacion", False, limit=5)
 
@@ -4,6 +4,7 @@ from sqlalchemy import func
 from typing import List, Optional
 from database import get_db
 import schemas, crud
+from utils.cache_estadisticas import cache_estadisticas
 
 router = APIRouter()
 
@@ -74,7 +75,7 @@ def count_vista_ordenes_resumen(
 @router.get("/resumen/estadisticas/")
 def get_estadisticas_ordenes(db: Session = Depends(get_db)):
     """Obtener estadísticas generales de órdenes de compra"""
-    return crud.vista_ordenes_compra_resumen_crud.get_estadisticas_resumen(db)
+    return cache_estadisticas.obtener("ordenes_compra", db)
 
 # ========================================
 # ENDPOINTS PARA VISTA DETALLE COMPLETO
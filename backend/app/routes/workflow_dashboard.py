@@ -314,9 +314,12 @@ def get_ordenes_pendientes_por_paso(db: Session = Depends(get_db)):
 def get_metricas_tiempo_promedio(
     fecha_desde: Optional[date] = None,
     fecha_hasta: Optional[date] = None,
+    id_proveedor: Optional[int] = None,
+    por_proveedor: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Obtener métricas de tiempo promedio por paso del workflow"""
+    """Obtener métricas de tiempo promedio por paso del workflow (desde historial_estados_oc)"""
+    from crud import metricas_workflow_crud
 
     # Si no se proporcionan fechas, usar los últimos 3 meses
     if not fecha_hasta:
@@ -324,32 +327,11 @@ def get_metricas_tiempo_promedio(
     if not fecha_desde:
         fecha_desde = fecha_hasta - timedelta(days=90)
 
-    # Query base para órdenes en el período
-    ordenes_periodo = db.query(OrdenCompra).filter(
-        OrdenCompra.fecha_orden >= fecha_desde,
-        OrdenCompra.fecha_orden <= fecha_hasta,
-        OrdenCompra.activo == True
-    ).subquery()
-
-    # Calcular tiempo promedio entre estados usando el historial
-    # TODO: Implementar cálculo preciso usando historial_estados_oc
-    # Por ahora retornamos valores simulados
-
-    return {
-        "periodo": {
-            "fecha_desde": fecha_desde,
-            "fecha_hasta": fecha_hasta
-        },
-        "tiempos_promedio_dias": {
-            "orden_a_aprobacion": 2.5,
-            "aprobacion_a_recepcion": 7.2,
-            "recepcion_a_facturacion": 3.1,
-            "facturacion_a_conciliacion": 4.8,
-            "conciliacion_a_pago": 5.5,
-            "total_workflow": 23.1
-        },
-        "ordenes_analizadas": db.query(func.count()).select_from(ordenes_periodo).scalar()
-    }
+    try:
+        return metricas_workflow_crud.get_metricas(db, fecha_desde, fecha_hasta,
+                                                   id_proveedor=id_proveedor, por_proveedor=por_proveedor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/eficiencia-workflow")
 def get_eficiencia_workflow(
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 import xml.etree.ElementTree as ET
 import xml.dom.minidom as minidom
 from datetime import datetime
 import re
 from decimal import Decimal
 from database import get_db
+from crud import trabajos_cola_crud
 from models import (
     DocumentoOrdenCompra, OrdenCompra, OrdenCompraDetalle,
     Producto, ConciliacionOcFacturas
@@ -108,9 +109,30 @@ def procesar_lote_xml(
     validar_sii: bool = True,
     auto_conciliar: bool = True,
     limite: int = 50,
+    esperar: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Procesar un lote de documentos XML pendientes"""
+    """Procesar un lote de documentos XML pendientes (por defecto como trabajo en segundo plano)"""
+    if esperar:
+        return procesar_documentos_pendientes(db, validar_sii, auto_conciliar, limite)
+
+    trabajo = trabajos_cola_crud.encolar(db, "procesar_lote_xml", {
+        "validar_sii": validar_sii, "auto_conciliar": auto_conciliar, "limite": limite
+    })
+    return {
+        "mensaje": "Procesamiento de lote encolado",
+        "id_trabajo": trabajo.id_trabajo,
+        "estado": trabajo.estado
+    }
+
+def procesar_documentos_pendientes(
+    db: Session,
+    validar_sii: bool = True,
+    auto_conciliar: bool = True,
+    limite: int = 50,
+    al_avanzar: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """Procesar los documentos XML pendientes; `al_avanzar(procesados, total)` informa el avance"""
 
     # Obtener documentos pendientes de procesar
     documentos_pendientes = db.query(DocumentoOrdenCompra).filter(
@@ -129,7 +151,7 @@ def procesar_lote_xml(
     procesados_exitosos = 0
     procesados_con_errores = 0
 
-    for documento in documentos_pendientes:
+    for indice, documento in enumerate(documentos_pendientes, start=1):
         try:
             # Procesar cada documento individualmente
             resultado = procesar_xml_factura(
@@ -155,6 +177,9 @@ def procesar_lote_xml(
                 "error": str(e)
             })
 
+        if al_avanzar:
+            al_avanzar(indice, len(documentos_pendientes))
+
     return {
         "mensaje": f"Procesamiento de lote completado",
         "total_documentos": len(documentos_pendientes),
@@ -1,6 +1,6 @@
 from datetime import datetime, date, time
 from pydantic import BaseModel, Field, EmailStr
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from enum import Enum
 from decimal import Decimal
 
@@ -624,7 +624,7 @@ class MovimientoInventarioBase(BaseModel):
     estado: EstadoMovimientoEnum = EstadoMovimientoEnum.PENDIENTE
 
 class MovimientoInventarioCreate(MovimientoInventarioBase):
-    pass
+    numero_movimiento: Optional[str] = Field(None, min_length=1, max_length=50, description="Se asigna automáticamente (MOV-AAAA-NNNNNN) si se omite")
 
 class MovimientoInventarioUpdate(BaseModel):
     id_tipo_movimiento: Optional[int] = None
@@ -745,6 +745,39 @@ class LoteWithRelations(LoteResponse):
     proveedor: Optional['ProveedorResponse'] = None
     numeros_serie: List['NumeroSerieResponse'] = []
 
+class CriterioAsignacionLoteEnum(str, Enum):
+    FEFO = "FEFO"  # Primero en vencer, primero en salir
+    FIFO = "FIFO"  # Primero en ingresar, primero en salir
+
+class LineaAsignacionLote(BaseModel):
+    id_producto: int
+    cantidad: int = Field(..., gt=0)
+
+class AsignacionLotesRequest(BaseModel):
+    lineas: List[LineaAsignacionLote] = Field(..., min_length=1, max_length=2000)
+    criterio: CriterioAsignacionLoteEnum = CriterioAsignacionLoteEnum.FEFO
+    simular: bool = Field(False, description="Solo calcular el plan, sin bloquear ni descontar")
+    permitir_parcial: bool = Field(False, description="Asignar lo que haya en lugar de rechazar la solicitud")
+
+class PickLote(BaseModel):
+    id_lote: int
+    numero_lote: str
+    fecha_vencimiento: Optional[date] = None
+    cantidad: int
+
+class PlanLineaLote(BaseModel):
+    id_producto: int
+    cantidad_solicitada: int
+    cantidad_asignada: int
+    lotes: List[PickLote] = []
+
+class AsignacionLotesResponse(BaseModel):
+    criterio: CriterioAsignacionLoteEnum
+    simulado: bool
+    completo: bool
+    lineas: List[PlanLineaLote]
+    lotes_actualizados: int
+
 
 # ========================================
 # SCHEMAS PARA NÚMEROS DE SERIE
@@ -794,6 +827,39 @@ class NumeroSerieWithRelations(NumeroSerieResponse):
     lote: Optional['LoteResponse'] = None
     ubicacion: Optional['ProductoUbicacionResponse'] = None
 
+class AsignacionSeriesRequest(BaseModel):
+    id_producto: int
+    cantidad: int = Field(..., gt=0, le=5000)
+    nuevo_estado: EstadoSerieEnum = EstadoSerieEnum.RESERVADO
+    cliente: Optional[str] = Field(None, max_length=200)
+    id_lote: Optional[int] = None
+    id_ubicacion: Optional[int] = None
+    fecha_venta: Optional[date] = None
+
+class SerieAsignada(BaseModel):
+    id_serie: int
+    numero_serie: str
+
+class AsignacionSeriesResponse(BaseModel):
+    id_producto: int
+    estado: EstadoSerieEnum
+    cantidad: int
+    series: List[SerieAsignada]
+
+class RegistroRangoSeriesRequest(BaseModel):
+    id_producto: int
+    rango: str = Field(..., description="Rango inclusivo, p.ej. EXT-000100..EXT-000400")
+    fecha_ingreso: Optional[date] = None
+    id_lote: Optional[int] = None
+    id_ubicacion: Optional[int] = None
+    omitir_existentes: bool = Field(False, description="Saltar números ya registrados en lugar de rechazar")
+
+class RegistroRangoSeriesResponse(BaseModel):
+    registrados: int
+    omitidos: int
+    primero: str
+    ultimo: str
+
 
 # ========================================
 # SCHEMAS PARA CLIENTES
@@ -1033,6 +1099,7 @@ class DespachosObraBase(BaseModel):
     estado: str = Field(default="PREPARADO", description="Estado del despacho")
 
 class DespachosObraCreate(DespachosObraBase):
+    numero_despacho: Optional[str] = Field(None, max_length=50, description="Se asigna automáticamente (DSP-AAAA-NNNNNN) si se omite")
     id_obra: int = Field(..., description="ID de la obra")
 
 class DespachosObraUpdate(BaseModel):
@@ -1132,6 +1199,31 @@ class DespachosObraDetalleWithRelations(DespachosObraDetalleResponse):
     producto: Optional['ProductoResponse'] = None
     lote: Optional['LoteResponse'] = None
 
+class DespachoMasivoLinea(BaseModel):
+    id_producto: int
+    cantidad: int = Field(..., ge=1)
+    id_ubicacion_origen: Optional[int] = Field(None, description="Ubicación de bodega preferida; si no alcanza se completa con otras")
+    id_lote: Optional[int] = None
+    numeros_serie: Optional[str] = None
+    costo_unitario: Optional[Decimal] = Field(None, ge=0, description="Costo promedio del producto si se omite")
+    es_herramienta: bool = False
+    requiere_devolucion_obligatoria: bool = False
+    observaciones: Optional[str] = None
+
+class DespachoMasivoCreate(DespachosObraCreate):
+    estado: str = Field(default="PREPARADO", description="Estado del despacho")
+    lineas: List[DespachoMasivoLinea] = Field(..., min_length=1, max_length=2000)
+
+class DespachoMasivoResponse(BaseModel):
+    id_despacho: int
+    numero_despacho: str
+    id_movimiento: int
+    numero_movimiento: str
+    lineas: int
+    unidades: int
+    etapas_ms: Dict[str, float] = Field(..., description="Duración de cada etapa del pipeline")
+    total_ms: float
+
 
 # ========================================
 # SCHEMAS PARA DEVOLUCIONES DE OBRA
@@ -1159,6 +1251,7 @@ class DevolucionesObraBase(BaseModel):
     estado: str = Field(default="EN_TRANSITO", description="Estado de la devolución")
 
 class DevolucionesObraCreate(DevolucionesObraBase):
+    numero_devolucion: Optional[str] = Field(None, max_length=50, description="Se asigna automáticamente (DEV-AAAA-NNNNNN) si se omite")
     id_obra: int = Field(..., description="ID de la obra")
     id_despacho: int = Field(..., description="ID del despacho")
 
@@ -1314,6 +1407,28 @@ class InventarioObraWithRelations(InventarioObraResponse):
     obra: Optional['ObraResponse'] = None
     producto: Optional['ProductoResponse'] = None
 
+class CambioStockObra(BaseModel):
+    id_obra: int
+    id_producto: int
+    cantidad_cambio: int = Field(..., description="Positivo agrega, negativo descuenta")
+    motivo: Optional[str] = Field(None, max_length=200)
+    referencia: Optional[str] = Field(None, max_length=50, description="Documento de origen")
+
+class CambiosStockObraRequest(BaseModel):
+    cambios: List[CambioStockObra] = Field(..., min_length=1, max_length=5000)
+
+class InventarioObraHistorialResponse(BaseModel):
+    id_historial: int
+    id_obra: int
+    id_producto: int
+    cantidad_cambio: int
+    motivo: Optional[str] = None
+    referencia: Optional[str] = None
+    fecha: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 
 # ========================================
 # SCHEMAS PARA RESERVAS
@@ -1339,7 +1454,7 @@ class ReservasBase(BaseModel):
     observaciones: Optional[str] = Field(None, description="Observaciones adicionales")
 
 class ReservasCreate(ReservasBase):
-    pass
+    numero_reserva: Optional[str] = Field(None, max_length=50, description="Se asigna automáticamente (RES-AAAA-NNNNNN) si se omite")
 
 class ReservasUpdate(BaseModel):
     numero_reserva: Optional[str] = Field(None, max_length=50)
@@ -1476,6 +1591,105 @@ class ConteosFisicosWithRelations(ConteosFisicosResponse):
     obra: Optional['ObraResponse'] = None
     movimiento_ajuste: Optional['MovimientoInventarioResponse'] = None
 
+class ConteoLoteLinea(BaseModel):
+    id_producto: int
+    id_ubicacion: Optional[int] = None
+    id_obra: Optional[int] = Field(None, description="Por defecto la obra de la programación en conteos de obra")
+    cantidad_fisica: int = Field(..., ge=0)
+    observaciones: Optional[str] = None
+
+class ConteosLoteRequest(BaseModel):
+    id_usuario_contador: int
+    acumular: bool = Field(False, description="Sumar a los conteos ya registrados en lugar de reemplazarlos")
+    lineas: List[ConteoLoteLinea] = Field(..., min_length=1, max_length=50000)
+
+class ErrorConteoLote(BaseModel):
+    id_producto: int
+    id_ubicacion: Optional[int] = None
+    error: str
+
+class ConteosLoteResponse(BaseModel):
+    id_programacion: int
+    lineas_recibidas: int
+    registros: int = Field(..., description="Claves (producto, ubicación, obra) tras sumar líneas repetidas")
+    insertados: int
+    actualizados: int
+    rechazados: int
+    sin_diferencia: int
+    sobrantes: int
+    faltantes: int
+    unidades_sobrantes: int
+    unidades_faltantes: int
+    fuera_de_snapshot: int = Field(..., description="Claves sin cantidad en el snapshot (cantidad_sistema = 0)")
+    errores: List[ErrorConteoLote] = []
+
+class GeneracionAjustesRequest(BaseModel):
+    id_usuario: int = Field(..., description="Usuario que cierra las diferencias (registra y autoriza los movimientos)")
+
+class MovimientoAjusteConteo(BaseModel):
+    id_movimiento: int
+    numero_movimiento: str
+    codigo_tipo: str = Field(..., description="AJP sobrantes, AJN faltantes")
+    lineas: int
+    unidades: int
+
+class GeneracionAjustesResponse(BaseModel):
+    id_programacion: int
+    conteos_ajustados: int
+    ajustes_obra: int
+    unidades_sumadas: int
+    unidades_restadas: int
+    movimientos: List[MovimientoAjusteConteo] = []
+    etapas_ms: Dict[str, float] = Field(..., description="Duración de cada etapa del pipeline")
+    total_ms: float
+
+class ProgramacionConteoLineaResponse(BaseModel):
+    id_linea: int
+    id_programacion: int
+    id_producto: int
+    id_ubicacion: Optional[int] = None
+    clase_abc: Optional[str] = None
+    conteos_anuales: Optional[int] = None
+    motivo: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class PlanConteosCiclicosRequest(BaseModel):
+    anio: Optional[int] = Field(None, ge=2000, le=2100, description="Año completo; alternativa a fecha_desde/fecha_hasta")
+    fecha_desde: Optional[date] = Field(None, description="Por defecto hoy")
+    fecha_hasta: Optional[date] = Field(None, description="Por defecto un año desde fecha_desde")
+    id_usuario_responsable: int
+    ids_bodega: Optional[List[int]] = Field(None, description="Todas las bodegas si se omite")
+    feriados: List[date] = Field(default_factory=list, description="Días hábiles que no se cuentan")
+    frecuencias: Optional[Dict[str, int]] = Field(None, description="Conteos por año por clase, p.ej. {\"A\": 12, \"B\": 4, \"C\": 1}")
+    simular: bool = Field(False, description="Solo calcular la carga, sin crear programaciones")
+    reemplazar: bool = Field(False, description="Regenerar las programaciones cíclicas aún no iniciadas del período")
+
+class CargaBodegaConteo(BaseModel):
+    id_bodega: int
+    productos: int
+    lineas: int
+    lineas_por_dia_min: int
+    lineas_por_dia_max: int
+    lineas_por_dia_promedio: float
+
+class PlanConteosCiclicosResponse(BaseModel):
+    fecha_desde: date
+    fecha_hasta: date
+    dias_habiles: int
+    simulado: bool
+    frecuencias: Dict[str, int]
+    conteos_periodo: Dict[str, int] = Field(..., description="Conteos de cada clase en el período (frecuencias escaladas a su duración)")
+    productos: int
+    por_clase: Dict[str, int]
+    frecuencia_ajustada: int = Field(..., description="Productos con frecuencia distinta a la de su clase")
+    programaciones_creadas: int
+    programaciones_reemplazadas: int
+    lineas_creadas: int
+    bodegas: List[CargaBodegaConteo] = []
+    total_ms: float
+
 # Enums para ConfiguracionAlertas
 class TipoAlerta(str, Enum):
     STOCK_MINIMO = "STOCK_MINIMO"
@@ -1541,6 +1755,33 @@ class ConfiguracionAlertasResponse(BaseModel):
             fecha_creacion=obj.fecha_creacion
         )
 
+# Schemas del motor de evaluación de alertas
+class EvaluacionAlertasRequest(BaseModel):
+    ids_alerta: Optional[List[int]] = None  # None = todas las reglas activas
+    solo_pendientes: bool = False  # Solo las reglas cuya frecuencia de revisión ya se cumplió
+    resolver_obsoletas: bool = True
+
+class EjecucionAlertaResponse(BaseModel):
+    id_ejecucion: int
+    id_alerta: int
+    fecha_ejecucion: datetime
+    duracion_ms: float
+    candidatos: int
+    nuevas: int
+    resueltas: int
+    estado: str
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class EvaluacionAlertasResponse(BaseModel):
+    reglas_evaluadas: int
+    alertas_nuevas: int
+    alertas_resueltas: int
+    errores: int
+    ejecuciones: List[EjecucionAlertaResponse]
+
 # Enums para LogAlertas
 class NivelPrioridad(str, Enum):
     BAJA = "BAJA"
@@ -3044,6 +3285,25 @@ class RecepcionMercanciaCompletaResponse(RecepcionMercanciaResponse):
     class Config:
         from_attributes = True
 
+# Schema para recepción en bloque (lectura con escáner)
+class RecepcionMasivaCreate(RecepcionMercanciaBase):
+    detalles: List[RecepcionMercanciaDetalleCreate] = Field(..., min_length=1, max_length=5000)
+    actualizar_stock: bool = Field(default=True, description="Sumar lo aceptado al stock y registrar la entrada (ENT) en el kardex")
+    id_bodega: Optional[int] = Field(None, description="Bodega que recibe (para las capas de costo FIFO)")
+
+class RecepcionMasivaResponse(BaseModel):
+    id_recepcion: int
+    numero_recepcion: str
+    lineas: int
+    cantidad_aceptada: Decimal
+    lineas_orden_actualizadas: int
+    productos_actualizados: int
+    id_movimiento: Optional[int] = None
+    numero_movimiento: Optional[str] = None
+    orden_completa: bool
+    etapas_ms: Dict[str, float] = Field(..., description="Duración de cada etapa")
+    total_ms: float
+
 # Schema para filtros de búsqueda
 class RecepcionMercanciaFilters(BaseModel):
     id_orden_compra: Optional[int] = None
@@ -3678,3 +3938,144 @@ class ProcesarXMLResponse(BaseModel):
     mensaje: str
     datos_extraidos: Optional[Dict] = None
     errores: Optional[List[str]] = None
+
+
+# ========================================
+# SCHEMAS PARA SECUENCIAS DE DOCUMENTOS
+# ========================================
+
+class SecuenciaDocumentoResponse(BaseModel):
+    prefijo: str
+    anio: int = Field(..., description="Año de la serie (0 = sin reinicio anual)")
+    ultimo_valor: int
+    fecha_modificacion: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class NumeroDocumentoResponse(BaseModel):
+    prefijo: str
+    numero: str
+
+
+# ========================================
+# SCHEMAS PARA DISPONIBILIDAD (ATP)
+# ========================================
+
+class DisponibilidadUbicacionResponse(BaseModel):
+    id_ubicacion: int
+    en_mano: Decimal
+    reservado: Decimal
+    disponible: Decimal
+
+class DisponibilidadProductoResponse(BaseModel):
+    id_producto: int
+    en_mano: Decimal
+    reservado: Decimal
+    en_transito: Decimal
+    disponible: Decimal = Field(..., description="En mano menos reservado")
+    atp: Decimal = Field(..., description="Disponible más lo pendiente de recibir en OC abiertas")
+    cantidad_solicitada: Optional[Decimal] = None
+    suficiente: Optional[bool] = Field(None, description="Si el disponible cubre la cantidad solicitada")
+    ubicaciones: Optional[List[DisponibilidadUbicacionResponse]] = None
+
+class DisponibilidadLinea(BaseModel):
+    id_producto: int
+    cantidad: Optional[Decimal] = Field(None, ge=0, description="Cantidad requerida (opcional)")
+
+class DisponibilidadConsulta(BaseModel):
+    lineas: List[DisponibilidadLinea] = Field(..., min_length=1, max_length=2000)
+    incluir_ubicaciones: bool = False
+
+
+# ========================================
+# SCHEMAS PARA COSTO PROMEDIO
+# ========================================
+
+class ReconstruccionCostoRequest(BaseModel):
+    ids_producto: Optional[List[int]] = Field(None, max_length=10000, description="Productos a reconstruir; todos si se omite")
+
+class ReconstruccionCostoResponse(BaseModel):
+    movimientos: int
+    productos_actualizados: int
+    total_ms: float
+
+
+# ========================================
+# SCHEMAS PARA PLANIFICADOR DE TAREAS
+# ========================================
+
+class EjecucionTareaResponse(BaseModel):
+    id_ejecucion: int
+    tarea: str
+    origen: str
+    fecha_inicio: datetime
+    fecha_fin: Optional[datetime] = None
+    duracion_ms: Optional[float] = None
+    estado: str
+    resultado: Optional[str] = None  # JSON retornado por la tarea
+    error: Optional[str] = None
+    worker: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class TareaProgramadaResponse(BaseModel):
+    nombre: str
+    descripcion: str
+    cron: str
+    proxima_ejecucion: Optional[datetime] = None  # Solo la conoce el worker líder
+    en_curso: bool
+    ultima_ejecucion: Optional[EjecucionTareaResponse] = None
+
+class PlanificadorEstadoResponse(BaseModel):
+    activo: bool
+    worker: str
+    lider: bool
+    tareas: List[TareaProgramadaResponse]
+
+
+# ========================================
+# SCHEMAS PARA COLA DE TRABAJOS
+# ========================================
+
+class TrabajoColaCreate(BaseModel):
+    tipo: str = Field(..., max_length=100)
+    parametros: Dict[str, Any] = Field(default_factory=dict)
+    prioridad: int = Field(0, ge=-100, le=100, description="Mayor se toma primero")
+    max_intentos: int = Field(3, ge=1, le=20)
+    id_usuario: Optional[int] = None
+
+class TrabajoColaResponse(BaseModel):
+    id_trabajo: int
+    tipo: str
+    parametros: Optional[str] = None
+    prioridad: int
+    estado: str
+    intentos: int
+    max_intentos: int
+    disponible_desde: datetime
+    bloqueado_hasta: Optional[datetime] = None
+    worker: Optional[str] = None
+    progreso: float
+    mensaje_progreso: Optional[str] = None
+    resultado: Optional[str] = None  # JSON retornado por el trabajo
+    error: Optional[str] = None
+    id_usuario: Optional[int] = None
+    fecha_creacion: datetime
+    fecha_inicio: Optional[datetime] = None
+    fecha_fin: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class TrabajoEncoladoResponse(BaseModel):
+    id_trabajo: int
+    tipo: str
+    estado: str
+
+    class Config:
+        from_attributes = True
+
+class ExportacionPdfOrdenesRequest(BaseModel):
+    ids_orden: List[int] = Field(..., min_length=1, max_length=1000)
@@ -2,6 +2,12 @@
 Utilidades para el backend
 """
 
-from .dte_parser import DTEParser, parse_dte_xml
-
 __all__ = ['DTEParser', 'parse_dte_xml']
+
+
+def __getattr__(nombre):
+    # Carga diferida: el parser DTE (y xml.etree) solo se importa al usarse
+    if nombre in __all__:
+        from . import dte_parser
+        return getattr(dte_parser, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,238 @@
+"""
+Cache en proceso de las estadísticas de los dashboards
+
+Cada estadística se registra con registrar(nombre, funcion, tablas, ttl):
+`funcion(db)` retorna un dict serializable y `tablas` son las tablas de las
+que depende. obtener(nombre, db) la sirve desde memoria mientras esté
+vigente; si vence, el primer request la calcula y los que llegan mientras
+tanto esperan ese mismo resultado (single-flight) en lugar de repetir las
+consultas.
+
+Al confirmar una sesión que escribió en alguna de sus tablas la estadística
+se invalida, pero se recalcula a lo más cada ESTADISTICAS_TTL_MINIMO_SEGUNDOS.
+La invalidación es por proceso: los demás workers ven el cambio al vencer el
+TTL.
+"""
+
+import copy
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+
+from config import ESTADISTICAS_CACHE_ACTIVA, ESTADISTICAS_TTL_SEGUNDOS, ESTADISTICAS_TTL_MINIMO_SEGUNDOS
+from utils.cronometro import Cronometro
+from utils.metrics import ESTADISTICAS_CACHE, ESTADISTICAS_CALCULO
+
+# Un request que espera el cálculo de otro calcula por su cuenta pasado este plazo
+ESPERA_MAXIMA_SEGUNDOS = 30
+
+
+class Estadistica:
+    """Estadística registrada con su valor vigente y contadores"""
+
+    def __init__(self, nombre: str, funcion: Callable[[Any], Any], tablas: Iterable[str], ttl: float):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.tablas = frozenset(tablas)
+        self.ttl = ttl
+        self.valor: Any = None
+        self.calculada: Optional[float] = None
+        self.expira = 0.0
+        # Cambia con cada invalidación; un cálculo que la vio cambiar no queda vigente por todo el TTL
+        self.generacion = 0
+        self.duracion_ms: Optional[float] = None
+        self.aciertos = 0
+        self.calculos = 0
+        self.coalescidas = 0
+        self.invalidaciones = 0
+
+
+class _Calculo:
+    """Cálculo en curso que comparten los requests concurrentes"""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class CacheEstadisticas:
+    """Estadísticas registradas, vigentes por TTL e invalidadas por tabla"""
+
+    def __init__(self, ttl: float = ESTADISTICAS_TTL_SEGUNDOS, ttl_minimo: float = ESTADISTICAS_TTL_MINIMO_SEGUNDOS):
+        self.ttl = ttl
+        self.ttl_minimo = ttl_minimo
+        self.estadisticas: Dict[str, Estadistica] = {}
+        self._por_tabla: Dict[str, Set[str]] = {}
+        self._en_curso: Dict[str, _Calculo] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre: str, funcion: Callable[[Any], Any], tablas: Iterable[str],
+                  ttl: Optional[float] = None) -> None:
+        estadistica = Estadistica(nombre, funcion, tablas, ttl or self.ttl)
+        with self._lock:
+            self.estadisticas[nombre] = estadistica
+            for tabla in estadistica.tablas:
+                self._por_tabla.setdefault(tabla, set()).add(nombre)
+
+    # ---------- Lectura ----------
+
+    def obtener(self, nombre: str, db, refrescar: bool = False) -> Any:
+        """Valor vigente de la estadística; la calcula con `db` si venció (una vez por proceso)"""
+        estadistica = self.estadisticas.get(nombre)
+        if estadistica is None:
+            raise ValueError(f"Estadística no registrada: {nombre}")
+        if not ESTADISTICAS_CACHE_ACTIVA:
+            return estadistica.funcion(db)
+
+        with self._lock:
+            if not refrescar and estadistica.calculada is not None and estadistica.expira > time.monotonic():
+                estadistica.aciertos += 1
+                valor = estadistica.valor
+                resultado = "hit"
+                calculo = None
+            else:
+                calculo = self._en_curso.get(nombre)
+                lider = calculo is None
+                if lider:
+                    calculo = self._en_curso[nombre] = _Calculo()
+                    generacion = estadistica.generacion
+                    estadistica.calculos += 1
+                    resultado = "miss"
+                else:
+                    estadistica.coalescidas += 1
+                    resultado = "coalesced"
+        ESTADISTICAS_CACHE.inc(estadistica=nombre, resultado=resultado)
+
+        if calculo is None:
+            return copy.deepcopy(valor)
+        if not lider:
+            if not calculo.listo.wait(ESPERA_MAXIMA_SEGUNDOS):
+                return estadistica.funcion(db)
+            if calculo.error is not None:
+                raise calculo.error
+            return copy.deepcopy(calculo.valor)
+        return self._calcular(estadistica, calculo, generacion, db)
+
+    def _calcular(self, estadistica: Estadistica, calculo: _Calculo, generacion: int, db) -> Any:
+        cronometro = Cronometro()
+        try:
+            calculo.valor = estadistica.funcion(db)
+        except BaseException as e:
+            calculo.error = e
+            raise
+        else:
+            duracion_ms = cronometro.total_ms
+            ESTADISTICAS_CALCULO.observe(duracion_ms / 1000, estadistica=estadistica.nombre)
+            ahora = time.monotonic()
+            with self._lock:
+                estadistica.valor = calculo.valor
+                estadistica.calculada = ahora
+                estadistica.duracion_ms = duracion_ms
+                # Invalidada durante el cálculo: puede no incluir el último cambio
+                vigencia = estadistica.ttl if estadistica.generacion == generacion else min(estadistica.ttl, self.ttl_minimo)
+                estadistica.expira = ahora + vigencia
+            return copy.deepcopy(calculo.valor)
+        finally:
+            with self._lock:
+                self._en_curso.pop(estadistica.nombre, None)
+            calculo.listo.set()
+
+    # ---------- Invalidación ----------
+
+    def _invalidar(self, estadistica: Estadistica, inmediato: bool = False) -> None:
+        estadistica.generacion += 1
+        estadistica.invalidaciones += 1
+        if inmediato:
+            estadistica.expira = 0.0
+        elif estadistica.calculada is not None:
+            estadistica.expira = min(estadistica.expira, estadistica.calculada + self.ttl_minimo)
+
+    def invalidar(self, nombre: Optional[str] = None) -> int:
+        """Invalida ya una estadística (o todas), sin esperar ESTADISTICAS_TTL_MINIMO_SEGUNDOS"""
+        with self._lock:
+            nombres = [nombre] if nombre else list(self.estadisticas)
+            for actual in nombres:
+                if actual not in self.estadisticas:
+                    raise ValueError(f"Estadística no registrada: {actual}")
+                self._invalidar(self.estadisticas[actual], inmediato=True)
+        return len(nombres)
+
+    def invalidar_tablas(self, tablas: Iterable[str]) -> List[str]:
+        """Invalida las estadísticas que dependen de alguna de `tablas`"""
+        with self._lock:
+            nombres = set()
+            for tabla in tablas:
+                nombres |= self._por_tabla.get(tabla, set())
+            for nombre in nombres:
+                self._invalidar(self.estadisticas[nombre])
+        return sorted(nombres)
+
+    def get_estado(self) -> List[Dict[str, Any]]:
+        ahora = time.monotonic()
+        with self._lock:
+            return [
+                {"nombre": e.nombre, "tablas": sorted(e.tablas), "ttl_segundos": e.ttl,
+                 "vigente": e.calculada is not None and e.expira > ahora,
+                 "edad_segundos": round(ahora - e.calculada, 1) if e.calculada is not None else None,
+                 "expira_en_segundos": round(max(0.0, e.expira - ahora), 1) if e.calculada is not None else None,
+                 "calculando": e.nombre in self._en_curso, "duracion_ms": e.duracion_ms,
+                 "aciertos": e.aciertos, "calculos": e.calculos, "coalescidas": e.coalescidas,
+                 "invalidaciones": e.invalidaciones}
+                for e in self.estadisticas.values()
+            ]
+
+
+# Instancia global del cache de estadísticas
+cache_estadisticas = CacheEstadisticas()
+
+
+# ========================================
+# INVALIDACIÓN AL CONFIRMAR
+# ========================================
+
+_CLAVE_TABLAS = "tablas_modificadas"
+
+
+def marcar_tablas(db, *tablas: str) -> None:
+    """Para escrituras que no pasan por la sesión (engine/connection directos)"""
+    db.info.setdefault(_CLAVE_TABLAS, set()).update(tablas)
+
+
+def _despues_de_flush(session, contexto) -> None:
+    tablas = session.info.setdefault(_CLAVE_TABLAS, set())
+    for objeto in (*session.new, *session.dirty, *session.deleted):
+        tabla = getattr(objeto, "__table__", None)
+        if tabla is not None:
+            tablas.add(tabla.name)
+
+
+def _al_ejecutar(estado) -> None:
+    # INSERT/UPDATE/DELETE en bloque ejecutados con db.execute(...)
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        tabla = getattr(estado.statement, "table", None)
+        nombre = getattr(tabla, "name", None)
+        if nombre:
+            estado.session.info.setdefault(_CLAVE_TABLAS, set()).add(nombre)
+
+
+def _despues_de_commit(session) -> None:
+    tablas = session.info.pop(_CLAVE_TABLAS, None)
+    if tablas:
+        cache_estadisticas.invalidar_tablas(tablas)
+
+
+def _despues_de_rollback(session) -> None:
+    session.info.pop(_CLAVE_TABLAS, None)
+
+
+def instalar_invalidacion(session_factory) -> None:
+    """Invalida las estadísticas afectadas cuando confirman las sesiones de `session_factory`"""
+    if not ESTADISTICAS_CACHE_ACTIVA or event.contains(session_factory, "after_commit", _despues_de_commit):
+        return
+    event.listen(session_factory, "after_flush", _despues_de_flush)
+    event.listen(session_factory, "do_orm_execute", _al_ejecutar)
+    event.listen(session_factory, "after_commit", _despues_de_commit)
+    event.listen(session_factory, "after_rollback", _despues_de_rollback)
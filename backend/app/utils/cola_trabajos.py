@@ -0,0 +1,162 @@
+"""
+Workers de la cola durable de trabajos (tabla trabajos_cola)
+
+Los tipos de trabajo se registran con @tipo_trabajo("nombre") y reciben
+(db, parametros, contexto). Un worker toma el trabajo pendiente de mayor
+prioridad, lo reserva por COLA_LEASE_SEGUNDOS y un hilo de latido renueva
+el lease mientras corre; si el proceso muere el lease vence y otro worker lo
+retoma. contexto.progreso() informa el avance y corta el trabajo si fue
+cancelado. Los workers corren en python worker_trabajos.py o, con
+COLA_WORKERS_EN_PROCESO > 0, como hilos del proceso de la API.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import COLA_LEASE_SEGUNDOS, COLA_BACKOFF_SEGUNDOS, COLA_INTERVALO_SEGUNDOS
+from utils.cronometro import Cronometro
+from utils.metrics import TRABAJOS_PROCESADOS, TRABAJOS_DURACION
+
+# Cada cuántos segundos un worker devuelve a la cola los trabajos con lease vencido
+INTERVALO_BARRIDO_SEGUNDOS = 60
+
+TIPOS: Dict[str, Callable[[Any, Dict[str, Any], "ContextoTrabajo"], Any]] = {}
+
+
+def tipo_trabajo(nombre: str):
+    """Registra la función que ejecuta los trabajos de tipo `nombre`"""
+    def _registrar(funcion):
+        TIPOS[nombre] = funcion
+        return funcion
+    return _registrar
+
+
+class TrabajoCancelado(Exception):
+    """El trabajo se canceló o su lease pasó a otro worker"""
+
+
+class ContextoTrabajo:
+    """Avance y lease del trabajo en curso, con sesión propia para no tocar la transacción del trabajo"""
+
+    def __init__(self, id_trabajo: int, worker: str):
+        self.id_trabajo = id_trabajo
+        self.worker = worker
+        self.vigente = True
+
+    def renovar(self, progreso: Optional[float] = None, mensaje: Optional[str] = None) -> bool:
+        from database import SessionLocal
+        from crud import trabajos_cola_crud
+
+        db = SessionLocal()
+        try:
+            self.vigente = trabajos_cola_crud.renovar(db, self.id_trabajo, self.worker, COLA_LEASE_SEGUNDOS,
+                                                     progreso=progreso, mensaje=mensaje)
+        finally:
+            db.close()
+        return self.vigente
+
+    def progreso(self, porcentaje: float, mensaje: Optional[str] = None) -> None:
+        """Informa el avance (0-100); lanza TrabajoCancelado si el trabajo ya no es de este worker"""
+        if not self.renovar(porcentaje, mensaje):
+            raise TrabajoCancelado(f"Trabajo {self.id_trabajo} cancelado")
+
+
+class WorkerCola:
+    """Toma y ejecuta trabajos de la cola, uno a la vez"""
+
+    def __init__(self, nombre: Optional[str] = None, tipos: Optional[List[str]] = None):
+        self.nombre = nombre or f"{socket.gethostname()}:{os.getpid()}"
+        self.tipos = tipos
+
+    def procesar_uno(self) -> bool:
+        """Ejecuta el siguiente trabajo disponible; False si la cola está vacía"""
+        from database import SessionLocal
+        from crud import trabajos_cola_crud
+
+        db = SessionLocal()
+        try:
+            trabajo = trabajos_cola_crud.tomar(db, self.nombre, COLA_LEASE_SEGUNDOS, tipos=self.tipos)
+            if trabajo is None:
+                return False
+            id_trabajo, tipo, parametros = trabajo.id_trabajo, trabajo.tipo, json.loads(trabajo.parametros or "{}")
+        finally:
+            db.close()
+        self._ejecutar(id_trabajo, tipo, parametros)
+        return True
+
+    def _latido(self, contexto: ContextoTrabajo, detener: threading.Event) -> None:
+        while not detener.wait(COLA_LEASE_SEGUNDOS / 3):
+            try:
+                if not contexto.renovar():
+                    return
+            except Exception as e:
+                print(f"⚠️ No se pudo renovar el lease del trabajo {contexto.id_trabajo}: {e}")
+
+    def _ejecutar(self, id_trabajo: int, tipo: str, parametros: Dict[str, Any]) -> None:
+        from database import SessionLocal
+        from crud import trabajos_cola_crud
+
+        contexto = ContextoTrabajo(id_trabajo, self.nombre)
+        detener_latido = threading.Event()
+        threading.Thread(target=self._latido, args=(contexto, detener_latido),
+                         name=f"latido-{id_trabajo}", daemon=True).start()
+        cronometro = Cronometro()
+        db = SessionLocal()
+        try:
+            try:
+                funcion = TIPOS.get(tipo)
+                if funcion is None:
+                    raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+                resultado = funcion(db, parametros, contexto)
+                estado = "COMPLETADO" if trabajos_cola_crud.completar(db, id_trabajo, self.nombre, resultado) else "CANCELADO"
+            except TrabajoCancelado:
+                db.rollback()
+                estado = "CANCELADO"
+            except Exception as e:
+                db.rollback()
+                estado = trabajos_cola_crud.fallar(db, id_trabajo, self.nombre, str(e), COLA_BACKOFF_SEGUNDOS) or "CANCELADO"
+                print(f"⚠️ Trabajo {id_trabajo} ({tipo}) falló: {e} -> {estado}")
+        finally:
+            detener_latido.set()
+            db.close()
+
+        TRABAJOS_PROCESADOS.inc(tipo=tipo, resultado=estado)
+        TRABAJOS_DURACION.observe(cronometro.total_ms / 1000, tipo=tipo)
+
+    def ejecutar_siempre(self, detener: Optional[threading.Event] = None) -> None:
+        """Bucle del worker: procesa mientras haya trabajos y espera COLA_INTERVALO_SEGUNDOS si no"""
+        from database import SessionLocal
+        from crud import trabajos_cola_crud
+
+        ultimo_barrido = 0.0
+        while detener is None or not detener.is_set():
+            try:
+                if time.monotonic() - ultimo_barrido >= INTERVALO_BARRIDO_SEGUNDOS:
+                    db = SessionLocal()
+                    try:
+                        liberados = trabajos_cola_crud.liberar_vencidos(db)
+                    finally:
+                        db.close()
+                    if liberados:
+                        print(f"♻️ {liberados} trabajo(s) con lease vencido devueltos a la cola")
+                    ultimo_barrido = time.monotonic()
+                if not self.procesar_uno():
+                    time.sleep(COLA_INTERVALO_SEGUNDOS)
+            except Exception as e:
+                print(f"⚠️ Error en el worker {self.nombre}: {e}")
+                time.sleep(COLA_INTERVALO_SEGUNDOS)
+
+
+def iniciar_workers_en_proceso(cantidad: int, tipos: Optional[List[str]] = None) -> List[threading.Thread]:
+    """Lanza `cantidad` hilos worker dentro del proceso actual"""
+    hilos = []
+    for numero in range(cantidad):
+        worker = WorkerCola(f"{socket.gethostname()}:{os.getpid()}:{numero}", tipos=tipos)
+        hilo = threading.Thread(target=worker.ejecutar_siempre, name=f"worker-cola-{numero}", daemon=True)
+        hilo.start()
+        hilos.append(hilo)
+    return hilos
@@ -0,0 +1,23 @@
+"""
+Medición de etapas de los procesos en bloque (despachos, recepciones, ...)
+"""
+
+from time import perf_counter
+from typing import Dict
+
+
+class Cronometro:
+    """Acumula la duración en ms de cada etapa desde la marca anterior"""
+
+    def __init__(self):
+        self.inicio = self.marca = perf_counter()
+        self.etapas: Dict[str, float] = {}
+
+    def etapa(self, nombre: str) -> None:
+        ahora = perf_counter()
+        self.etapas[nombre] = round((ahora - self.marca) * 1000, 2)
+        self.marca = ahora
+
+    @property
+    def total_ms(self) -> float:
+        return round((perf_counter() - self.inicio) * 1000, 2)
@@ -0,0 +1,120 @@
+"""
+Dashboard compuesto: varios widgets en un solo request
+
+Cada widget se registra con registrar(id, funcion, descripcion) y
+`funcion(db)` retorna lo mismo que su endpoint. componer(ids, timeout_ms)
+los ejecuta a la vez en un pool de DASHBOARD_HILOS hilos, cada uno con su
+propia sesión (y conexión del pool), y retorna lo que terminó dentro del
+plazo; el resto se informa como TIMEOUT. En MySQL cada sesión fija
+MAX_EXECUTION_TIME al plazo del widget para que una consulta abandonada no
+siga ocupando la conexión.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from config import DASHBOARD_HILOS
+from utils.cronometro import Cronometro
+from utils.metrics import DASHBOARD_WIDGETS, DASHBOARD_WIDGET_DURACION
+
+
+def _describir_error(e: Exception) -> str:
+    # HTTPException trae el mensaje en detail; en las excepciones de SQLAlchemy detail es otra cosa (una lista)
+    detalle = getattr(e, "detail", None)
+    mensaje = detalle if isinstance(detalle, str) else str(e)
+    return f"{type(e).__name__}: {mensaje}" if mensaje else type(e).__name__
+
+
+class Widget:
+    """Widget registrado: `funcion(db)` retorna datos serializables por FastAPI"""
+
+    def __init__(self, id_widget: str, funcion: Callable[[Any], Any], descripcion: str = ""):
+        self.id = id_widget
+        self.funcion = funcion
+        self.descripcion = descripcion
+
+
+class Dashboard:
+    """Widgets registrados y pool de hilos que los ejecuta"""
+
+    def __init__(self, hilos: int = DASHBOARD_HILOS):
+        self.hilos = hilos
+        self.widgets: Dict[str, Widget] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def registrar(self, id_widget: str, funcion: Callable[[Any], Any], descripcion: str = "") -> None:
+        self.widgets[id_widget] = Widget(id_widget, funcion, descripcion)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="dashboard")
+            return self._pool
+
+    def _ejecutar(self, widget: Widget, timeout_ms: int) -> Dict[str, Any]:
+        """Corre en un hilo del pool: sesión propia y resultado ya serializado"""
+        from database import SessionLocal
+
+        cronometro = Cronometro()
+        db = SessionLocal()
+        mysql = db.get_bind().dialect.name == "mysql"
+        try:
+            if mysql:
+                db.execute(text("SET SESSION MAX_EXECUTION_TIME = :ms"), {"ms": timeout_ms})
+            # Serializar con la sesión abierta: los objetos ORM aún pueden cargar relaciones
+            datos = jsonable_encoder(widget.funcion(db))
+        finally:
+            if mysql:
+                # La conexión vuelve al pool: no dejarle el límite a otro request
+                try:
+                    db.rollback()
+                    db.execute(text("SET SESSION MAX_EXECUTION_TIME = DEFAULT"))
+                except Exception:
+                    db.invalidate()
+            db.close()
+            DASHBOARD_WIDGET_DURACION.observe(cronometro.total_ms / 1000, widget=widget.id)
+        return {"datos": datos, "duracion_ms": cronometro.total_ms}
+
+    def componer(self, ids: List[str], timeout_ms: int) -> Dict[str, Any]:
+        """Ejecuta los widgets `ids` a la vez y retorna sus resultados (parciales si alguno no alcanzó)"""
+        desconocidos = [id_widget for id_widget in ids if id_widget not in self.widgets]
+        if desconocidos:
+            raise ValueError(f"Widgets no registrados: {', '.join(desconocidos)}")
+
+        cronometro = Cronometro()
+        pool = self._get_pool()
+        limite = time.monotonic() + timeout_ms / 1000
+        futuros = {id_widget: pool.submit(self._ejecutar, self.widgets[id_widget], timeout_ms)
+                   for id_widget in dict.fromkeys(ids)}
+
+        resultados: Dict[str, Dict[str, Any]] = {}
+        for id_widget, futuro in futuros.items():
+            try:
+                resultados[id_widget] = {"estado": "OK", **futuro.result(timeout=max(0.0, limite - time.monotonic()))}
+            except FuturoTimeout:
+                # Si aún no empezó no se ejecuta; si está corriendo, MAX_EXECUTION_TIME lo corta
+                futuro.cancel()
+                resultados[id_widget] = {"estado": "TIMEOUT"}
+            except Exception as e:
+                resultados[id_widget] = {"estado": "ERROR", "error": _describir_error(e)}
+            DASHBOARD_WIDGETS.inc(widget=id_widget, estado=resultados[id_widget]["estado"])
+
+        return {
+            "widgets": resultados,
+            "completos": sum(1 for resultado in resultados.values() if resultado["estado"] == "OK"),
+            "timeout_ms": timeout_ms,
+            "duracion_ms": cronometro.total_ms,
+        }
+
+    def get_widgets(self) -> List[Dict[str, str]]:
+        return [{"id": widget.id, "descripcion": widget.descripcion} for widget in self.widgets.values()]
+
+
+# Instancia global del dashboard compuesto
+dashboard = Dashboard()
@@ -0,0 +1,47 @@
+"""
+Estadísticas de los dashboards registradas en el cache
+
+Cada estadística indica las tablas que lee (las vistas se listan por sus
+tablas base); un cambio confirmado en ellas la invalida.
+"""
+
+from utils.cache_estadisticas import cache_estadisticas
+
+
+def _crud(instancia: str, metodo: str):
+    def _calcular(db):
+        import crud
+        return getattr(getattr(crud, instancia), metodo)(db)
+    return _calcular
+
+
+# (nombre, instancia CRUD, método, tablas, ttl en segundos o None para ESTADISTICAS_TTL_SEGUNDOS)
+ESTADISTICAS = [
+    ("clientes", "cliente_crud", "get_estadisticas_clientes", ("clientes",), None),
+    ("obras", "obra_crud", "get_estadisticas_obras", ("obras",), None),
+    ("almacenes_obra", "almacen_obra_crud", "get_estadisticas_almacenes", ("almacen_obra",), None),
+    ("despachos", "despachos_obra_crud", "get_estadisticas_despachos", ("despachos_obra", "obras"), None),
+    ("herramientas_despachadas", "despachos_obra_detalle_crud", "get_estadisticas_herramientas",
+     ("despachos_obra_detalle",), None),
+    ("devoluciones", "devoluciones_obra_crud", "get_estadisticas_devoluciones", ("devoluciones_obra", "obras"), None),
+    ("productos_devueltos", "devoluciones_obra_detalle_crud", "get_estadisticas_productos_devueltos",
+     ("devoluciones_obra_detalle",), None),
+    ("inventario_obra", "inventario_obra_crud", "get_estadisticas_generales", ("inventario_obra",), None),
+    ("reservas", "reservas_crud", "get_estadisticas_reservas", ("reservas",), None),
+    ("programacion_conteos", "programacion_conteos_crud", "get_estadisticas_generales", ("programacion_conteos",), None),
+    ("programacion_conteos_por_tipo", "programacion_conteos_crud", "get_estadisticas_por_tipo",
+     ("programacion_conteos",), None),
+    ("conteos_fisicos", "conteos_fisicos_crud", "get_estadisticas_generales", ("conteos_fisicos",), None),
+    ("configuracion_alertas", "configuracion_alertas_crud", "get_estadisticas_alertas", ("configuracion_alertas",), None),
+    ("log_alertas", "log_alertas_crud", "get_estadisticas_logs", ("log_alertas",), None),
+    ("roles", "roles_crud", "get_estadisticas_roles", ("roles",), 300),
+    ("usuarios", "usuarios_crud", "get_estadisticas_usuarios", ("usuarios", "roles"), 300),
+    ("inventario_consolidado", "inventario_consolidado_crud", "get_estadisticas_inventario",
+     ("productos", "inventario_obra"), None),
+    ("ordenes_compra", "vista_ordenes_compra_resumen_crud", "get_estadisticas_resumen", ("ordenes_compra",), None),
+]
+
+
+def registrar_estadisticas() -> None:
+    for nombre, instancia, metodo, tablas, ttl in ESTADISTICAS:
+        cache_estadisticas.registrar(nombre, _crud(instancia, metodo), tablas, ttl)
@@ -0,0 +1,305 @@
+"""
+Eventos en vivo para los dashboards (Server-Sent Events)
+
+Los cambios se registran en la sesión con registrar(db, tema, tipo, datos)
+y se publican solo si la transacción confirma. Las altas y cambios de
+estado de LogAlertas y los cambios de estado de órdenes, despachos,
+devoluciones, obras y reservas hechos por el ORM se detectan solos al hacer
+flush; las operaciones en bloque (y los cruces de stock mínimo) los
+registran explícitamente.
+
+El hub reparte cada evento a las conexiones SSE abiertas en el proceso. Con
+EVENTOS_BROKER=db los eventos pasan por la tabla eventos_sistema y cada
+worker la lee con una sola consulta por intervalo, sin importar cuántos
+navegadores estén conectados.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event, inspect
+
+from config import EVENTOS_ACTIVOS, EVENTOS_BROKER, EVENTOS_INTERVALO_SEGUNDOS, EVENTOS_BUFFER
+
+TEMAS = ("alertas", "stock", "workflow")
+TAMANO_COLA_CONEXION = 500
+# Ids ya enviados que recuerda cada conexión (los ids no llegan siempre en orden)
+IDS_ENVIADOS_CONEXION = 2000
+
+
+def eventos_activos() -> bool:
+    return EVENTOS_ACTIVOS
+
+
+# ========================================
+# HUB EN PROCESO
+# ========================================
+
+class Suscripcion:
+    """Conexión SSE: cola asyncio en el loop de la conexión y temas que le interesan"""
+
+    def __init__(self, temas: Optional[Set[str]]):
+        self.temas = temas
+        self.loop = asyncio.get_running_loop()
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=TAMANO_COLA_CONEXION)
+        self.descartados = 0
+        self._enviados: Deque[int] = deque()
+        self._ids_enviados: Set[int] = set()
+
+    def acepta(self, evento: Dict[str, Any]) -> bool:
+        return self.temas is None or evento["tema"] in self.temas
+
+    def marcar_enviado(self, evento: Dict[str, Any]) -> bool:
+        """False si la conexión ya envió el evento; un id menor que llega después de uno mayor sí se envía"""
+        if evento["id"] in self._ids_enviados:
+            return False
+        self._enviados.append(evento["id"])
+        self._ids_enviados.add(evento["id"])
+        if len(self._enviados) > IDS_ENVIADOS_CONEXION:
+            self._ids_enviados.discard(self._enviados.popleft())
+        return True
+
+    def _poner(self, evento: Dict[str, Any]) -> None:
+        # Un cliente lento pierde los eventos más antiguos, no bloquea al resto
+        if self.cola.full():
+            self.cola.get_nowait()
+            self.descartados += 1
+        self.cola.put_nowait(evento)
+
+
+class HubEventos:
+    """Reparte los eventos a las suscripciones del proceso (seguro desde cualquier hilo)"""
+
+    def __init__(self, buffer: int = EVENTOS_BUFFER):
+        self._suscripciones: Set[Suscripcion] = set()
+        self._recientes: Deque[Dict[str, Any]] = deque(maxlen=buffer)
+        self._lock = threading.Lock()
+        self.entregados = 0
+
+    def suscribir(self, temas: Optional[Set[str]] = None) -> Suscripcion:
+        """Llamar desde el loop de la conexión"""
+        suscripcion = Suscripcion(temas)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion) -> None:
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def entregar(self, eventos: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._recientes.extend(eventos)
+            suscripciones = list(self._suscripciones)
+            self.entregados += len(eventos)
+        for suscripcion in suscripciones:
+            for evento in eventos:
+                if suscripcion.acepta(evento):
+                    try:
+                        suscripcion.loop.call_soon_threadsafe(suscripcion._poner, evento)
+                    except RuntimeError:
+                        # Loop cerrado: la conexión ya terminó
+                        self.desuscribir(suscripcion)
+                        break
+
+    def recientes(self, desde_id: int, temas: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """Eventos en memoria posteriores a `desde_id` (reconexión con Last-Event-ID)"""
+        with self._lock:
+            return [evento for evento in self._recientes
+                    if evento["id"] > desde_id and (temas is None or evento["tema"] in temas)]
+
+    def get_estado(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "conexiones": len(self._suscripciones),
+                "eventos_entregados": self.entregados,
+                "eventos_en_buffer": len(self._recientes),
+                "ultimo_id": self._recientes[-1]["id"] if self._recientes else None,
+                "descartados_por_conexion_lenta": sum(s.descartados for s in self._suscripciones),
+            }
+
+
+hub_eventos = HubEventos()
+
+
+# ========================================
+# BROKERS
+# ========================================
+
+class BrokerMemoria:
+    """Un solo proceso: los eventos van directo al hub"""
+
+    def __init__(self, hub: HubEventos):
+        self.hub = hub
+        self._ids = itertools.count(int(time.time() * 1000))
+
+    def publicar(self, eventos: List[Dict[str, Any]]) -> None:
+        for evento in eventos:
+            evento["id"] = next(self._ids)
+        self.hub.entregar(eventos)
+
+    def iniciar(self) -> None:
+        pass
+
+
+class BrokerDB:
+    """Varios workers: cada uno inserta en eventos_sistema y lee lo nuevo por id"""
+
+    # Ids por debajo del último leído que se vuelven a consultar: una
+    # transacción que tomó un id menor puede confirmar después de una mayor
+    VENTANA_IDS = 200
+
+    def __init__(self, hub: HubEventos, intervalo: float):
+        self.hub = hub
+        self.intervalo = intervalo
+        self._ultimo: Optional[int] = None
+        self._vistos: Deque[int] = deque(maxlen=self.VENTANA_IDS * 10)
+        self._hilo: Optional[threading.Thread] = None
+
+    def publicar(self, eventos: List[Dict[str, Any]]) -> None:
+        import models
+        from database import engine
+
+        with engine.begin() as conexion:
+            conexion.execute(models.EventoSistema.__table__.insert(), [
+                {"tema": evento["tema"], "tipo": evento["tipo"], "fecha": evento["fecha"],
+                 "datos": json.dumps(evento["datos"], default=str, ensure_ascii=False)}
+                for evento in eventos
+            ])
+
+    def _leer(self) -> int:
+        import models
+        from database import engine
+        from sqlalchemy import select, func
+
+        tabla = models.EventoSistema.__table__
+        with engine.connect() as conexion:
+            if self._ultimo is None:
+                self._ultimo = conexion.execute(select(func.coalesce(func.max(tabla.c.id_evento), 0))).scalar()
+                return 0
+            filas = conexion.execute(
+                select(tabla).where(tabla.c.id_evento > max(0, self._ultimo - self.VENTANA_IDS))
+                .order_by(tabla.c.id_evento).limit(1000)
+            ).all()
+        vistos = set(self._vistos)
+        eventos = []
+        for fila in filas:
+            if fila.id_evento in vistos:
+                continue
+            self._vistos.append(fila.id_evento)
+            self._ultimo = max(self._ultimo, fila.id_evento)
+            eventos.append({"id": fila.id_evento, "tema": fila.tema, "tipo": fila.tipo,
+                            "fecha": fila.fecha, "datos": json.loads(fila.datos or "null")})
+        if eventos:
+            self.hub.entregar(eventos)
+        return len(filas)
+
+    def _bucle(self) -> None:
+        while True:
+            try:
+                leidos = self._leer()
+            except Exception as e:
+                print(f"⚠️ Error leyendo eventos_sistema: {e}")
+                leidos = 0
+            if leidos < 1000:
+                time.sleep(self.intervalo)
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="eventos-broker", daemon=True)
+            self._hilo.start()
+
+
+broker = BrokerDB(hub_eventos, EVENTOS_INTERVALO_SEGUNDOS) if EVENTOS_BROKER == "db" else BrokerMemoria(hub_eventos)
+
+
+# ========================================
+# REGISTRO EN LA SESIÓN
+# ========================================
+
+_CLAVE_PENDIENTES = "eventos_pendientes"
+
+
+def registrar(db, tema: str, tipo: str, datos: Dict[str, Any]) -> None:
+    """Deja el evento pendiente hasta que la transacción de `db` confirme"""
+    if EVENTOS_ACTIVOS:
+        db.info.setdefault(_CLAVE_PENDIENTES, []).append(
+            {"tema": tema, "tipo": tipo, "fecha": datetime.now(), "datos": datos}
+        )
+
+
+def _despues_de_commit(session) -> None:
+    eventos = session.info.pop(_CLAVE_PENDIENTES, None)
+    if eventos:
+        try:
+            broker.publicar(eventos)
+        except Exception as e:
+            # El cambio ya está confirmado: perder el aviso no debe romper el request
+            print(f"⚠️ No se pudieron publicar {len(eventos)} evento(s): {e}")
+
+
+def _despues_de_rollback(session) -> None:
+    session.info.pop(_CLAVE_PENDIENTES, None)
+
+
+def _crear_deteccion_orm() -> Callable:
+    import models
+
+    # Entidad -> (nombre en el evento, columna de estado)
+    estados = {
+        models.OrdenCompra: ("orden_compra", "id_estado"),
+        models.DespachosObra: ("despacho", "estado"),
+        models.DevolucionesObra: ("devolucion", "estado"),
+        models.Obra: ("obra", "estado"),
+        models.Reservas: ("reserva", "estado"),
+    }
+
+    def _despues_de_flush(session, contexto) -> None:
+        for objeto in session.new:
+            if isinstance(objeto, models.LogAlertas):
+                registrar(session, "alertas", "alerta.nueva", {
+                    "id_log_alerta": objeto.id_log_alerta, "id_alerta": objeto.id_alerta,
+                    "nivel_prioridad": objeto.nivel_prioridad, "mensaje": objeto.mensaje,
+                    "id_producto": objeto.id_producto, "id_obra": objeto.id_obra, "id_despacho": objeto.id_despacho,
+                })
+        for objeto in session.dirty:
+            if isinstance(objeto, models.LogAlertas):
+                historial = inspect(objeto).attrs.estado.history
+                if historial.has_changes():
+                    registrar(session, "alertas", "alerta.actualizada", {
+                        "id_log_alerta": objeto.id_log_alerta, "id_alerta": objeto.id_alerta,
+                        "estado_anterior": historial.deleted[0] if historial.deleted else None, "estado": objeto.estado,
+                    })
+            entidad = estados.get(type(objeto))
+            if entidad:
+                nombre, columna = entidad
+                historial = getattr(inspect(objeto).attrs, columna).history
+                if historial.has_changes():
+                    registrar(session, "workflow", "estado.cambiado", {
+                        "entidad": nombre, "id": inspect(objeto).identity[0],
+                        "estado_anterior": historial.deleted[0] if historial.deleted else None,
+                        "estado": getattr(objeto, columna),
+                    })
+
+    return _despues_de_flush
+
+
+def instalar_eventos_sesion(session_factory, recibir: bool = True) -> None:
+    """Engancha la detección y la publicación a las sesiones de `session_factory`
+
+    Los procesos sin conexiones SSE (worker_trabajos.py) usan recibir=False:
+    publican pero no leen eventos_sistema.
+    """
+    if not EVENTOS_ACTIVOS or event.contains(session_factory, "after_commit", _despues_de_commit):
+        return
+    event.listen(session_factory, "after_flush", _crear_deteccion_orm())
+    event.listen(session_factory, "after_commit", _despues_de_commit)
+    event.listen(session_factory, "after_rollback", _despues_de_rollback)
+    if recibir:
+        broker.iniciar()
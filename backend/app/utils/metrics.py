@@ -0,0 +1,354 @@
+"""
+Métricas en proceso con exportación en formato de texto Prometheus
+
+Contadores, gauges e histogramas con etiquetas guardados en memoria con un
+lock por métrica. Con varios workers de uvicorn se define
+METRICS_MULTIPROC_DIR: cada proceso vuelca su snapshot a un archivo JSON en
+ese directorio y /metrics suma los archivos de todos los procesos. El
+directorio debe vaciarse en cada despliegue.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import METRICS_MULTIPROC_DIR as MULTIPROC_DIR, METRICS_FLUSH_SEGUNDOS as INTERVALO_VOLCADO
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def _clave(self, etiquetas: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            valores = [[list(clave), valor] for clave, valor in self._valores.items()]
+        return {"tipo": self.tipo, "ayuda": self.ayuda, "etiquetas": list(self.etiquetas), "valores": valores}
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+
+class Gauge(_Metrica):
+    tipo = "gauge"
+
+    def set(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def inc(self, valor: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def dec(self, valor: float = 1, **etiquetas) -> None:
+        self.inc(-valor, **etiquetas)
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observe(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        indice = len(self.buckets)
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                indice = i
+                break
+        with self._lock:
+            # [conteo por bucket no acumulado..., suma, total]
+            datos = self._valores.get(clave)
+            if datos is None:
+                datos = self._valores[clave] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            datos[indice] += 1
+            datos[-2] += valor
+            datos[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        datos = super().snapshot()
+        datos["buckets"] = list(self.buckets)
+        with self._lock:
+            datos["valores"] = [[list(clave), list(valor)] for clave, valor in self._valores.items()]
+        return datos
+
+
+REGISTRO: List[_Metrica] = []
+_COLECTORES: List[Callable[[], None]] = []
+
+
+def registrar_colector(funcion: Callable[[], None]) -> None:
+    """Función que actualiza gauges justo antes de cada snapshot (p.ej. el pool)"""
+    _COLECTORES.append(funcion)
+
+
+# ========================================
+# MÉTRICAS DE LA API
+# ========================================
+
+HTTP_REQUESTS = Contador("erp_http_requests_total", "Requests HTTP atendidos", ("method", "route", "status"))
+HTTP_LATENCIA = Histograma("erp_http_request_duration_seconds", "Latencia de requests HTTP", ("method", "route"))
+HTTP_EN_CURSO = Gauge("erp_http_requests_in_flight", "Requests HTTP en curso")
+
+DB_POOL_EN_USO = Gauge("erp_db_pool_checked_out", "Conexiones del pool en uso")
+DB_POOL_OVERFLOW = Gauge("erp_db_pool_overflow", "Conexiones abiertas sobre el tamaño del pool")
+DB_POOL_TAMANO = Gauge("erp_db_pool_size", "Tamaño configurado del pool")
+
+DTE_IMPORTADOS = Contador("erp_dte_importados_total", "DTEs procesados desde XML", ("resultado",))
+MOVIMIENTOS_PROCESADOS = Contador("erp_movimientos_procesados_total", "Movimientos de inventario procesados")
+
+TAREAS_EJECUTADAS = Contador("erp_tareas_ejecutadas_total", "Ejecuciones de tareas programadas", ("tarea", "resultado"))
+TAREAS_DURACION = Histograma("erp_tarea_duration_seconds", "Duración de las tareas programadas", ("tarea",),
+                             buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+PLANIFICADOR_LIDER = Gauge("erp_planificador_lider", "1 si este proceso es el líder del planificador")
+TRABAJOS_PROCESADOS = Contador("erp_trabajos_procesados_total", "Trabajos de la cola procesados", ("tipo", "resultado"))
+TRABAJOS_DURACION = Histograma("erp_trabajo_duration_seconds", "Duración de los trabajos de la cola", ("tipo",),
+                               buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+ESTADISTICAS_CACHE = Contador("erp_estadisticas_cache_total", "Consultas al cache de estadísticas",
+                              ("estadistica", "resultado"))
+ESTADISTICAS_CALCULO = Histograma("erp_estadistica_calculo_seconds", "Duración del cálculo de cada estadística",
+                                  ("estadistica",))
+DASHBOARD_WIDGETS = Contador("erp_dashboard_widgets_total", "Widgets del dashboard compuesto", ("widget", "estado"))
+DASHBOARD_WIDGET_DURACION = Histograma("erp_dashboard_widget_duration_seconds", "Duración de cada widget del dashboard",
+                                       ("widget",))
+
+
+def instalar_metricas_pool(engine) -> None:
+    """Publica el uso del pool de conexiones del engine"""
+    def _colectar():
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            DB_POOL_EN_USO.set(pool.checkedout())
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+            DB_POOL_TAMANO.set(pool.size())
+    registrar_colector(_colectar)
+
+
+def _snapshot_local() -> Dict[str, Any]:
+    for colector in _COLECTORES:
+        try:
+            colector()
+        except Exception:
+            pass
+    return {metrica.nombre: metrica.snapshot() for metrica in REGISTRO}
+
+
+# ========================================
+# MODO MULTIPROCESO
+# ========================================
+
+_hilo_volcado: Optional[threading.Thread] = None
+
+
+def _archivo_proceso(pid: int) -> str:
+    return os.path.join(MULTIPROC_DIR, f"metrics_{pid}.json")
+
+
+def volcar_snapshot() -> None:
+    """Escribe el snapshot de este proceso en el directorio compartido"""
+    if not MULTIPROC_DIR:
+        return
+    destino = _archivo_proceso(os.getpid())
+    temporal = f"{destino}.tmp"
+    with open(temporal, "w") as archivo:
+        json.dump(_snapshot_local(), archivo)
+    os.replace(temporal, destino)
+
+
+def iniciar_volcado_periodico() -> None:
+    """Lanza el hilo que vuelca el snapshot cada METRICS_FLUSH_SEGUNDOS"""
+    global _hilo_volcado
+    if not MULTIPROC_DIR or _hilo_volcado is not None:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+    def _bucle():
+        while True:
+            try:
+                volcar_snapshot()
+            except Exception as e:
+                print(f"⚠️ No se pudieron volcar las métricas: {e}")
+            time.sleep(INTERVALO_VOLCADO)
+
+    _hilo_volcado = threading.Thread(target=_bucle, name="metrics-flush", daemon=True)
+    _hilo_volcado.start()
+
+
+def _proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshots_procesos() -> List[Tuple[bool, Dict[str, Any]]]:
+    """Snapshots de todos los procesos: [(vivo, snapshot)]"""
+    volcar_snapshot()
+    resultado = []
+    for nombre in os.listdir(MULTIPROC_DIR):
+        if not (nombre.startswith("metrics_") and nombre.endswith(".json")):
+            continue
+        try:
+            pid = int(nombre[len("metrics_"):-len(".json")])
+            with open(os.path.join(MULTIPROC_DIR, nombre)) as archivo:
+                resultado.append((_proceso_vivo(pid), json.load(archivo)))
+        except (ValueError, OSError):
+            continue
+    return resultado
+
+
+def _agregar(snapshots: List[Tuple[bool, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Suma los snapshots de varios procesos
+
+    Contadores e histogramas se suman incluyendo procesos terminados; los
+    gauges solo consideran procesos vivos.
+    """
+    agregado: Dict[str, Any] = {}
+    for vivo, snapshot in snapshots:
+        for nombre, metrica in snapshot.items():
+            if metrica["tipo"] == "gauge" and not vivo:
+                continue
+            destino = agregado.setdefault(nombre, {**metrica, "valores": {}})
+            for clave, valor in metrica["valores"]:
+                clave = tuple(clave)
+                if metrica["tipo"] == "histogram":
+                    actual = destino["valores"].get(clave)
+                    destino["valores"][clave] = valor if actual is None else [a + b for a, b in zip(actual, valor)]
+                else:
+                    destino["valores"][clave] = destino["valores"].get(clave, 0) + valor
+    for metrica in agregado.values():
+        metrica["valores"] = [[list(clave), valor] for clave, valor in metrica["valores"].items()]
+    return agregado
+
+
+# ========================================
+# EXPOSICIÓN
+# ========================================
+
+def _formatear_etiquetas(nombres: List[str], valores: List[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pares = list(zip(nombres, valores)) + list((extra or {}).items())
+    if not pares:
+        return ""
+    contenido = ",".join(
+        f'{nombre}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for nombre, valor in pares
+    )
+    return "{" + contenido + "}"
+
+
+def _cuantil(buckets: List[float], conteos: List[int], total: int, q: float) -> float:
+    """Estimación por interpolación lineal dentro del bucket (como histogram_quantile)"""
+    objetivo = q * total
+    acumulado = 0
+    inferior = 0.0
+    for limite, conteo in zip(buckets, conteos):
+        if conteo and acumulado + conteo >= objetivo:
+            return inferior + (limite - inferior) * (objetivo - acumulado) / conteo
+        acumulado += conteo
+        inferior = limite
+    return buckets[-1] if buckets else 0.0
+
+
+def generar_texto_prometheus() -> str:
+    """Snapshot (agregado entre procesos si corresponde) en formato de texto Prometheus"""
+    if MULTIPROC_DIR:
+        metricas = _agregar(_snapshots_procesos())
+    else:
+        metricas = _snapshot_local()
+
+    lineas = []
+    for nombre, metrica in metricas.items():
+        lineas.append(f"# HELP {nombre} {metrica['ayuda']}")
+        lineas.append(f"# TYPE {nombre} {metrica['tipo']}")
+        etiquetas = metrica["etiquetas"]
+        if metrica["tipo"] != "histogram":
+            for clave, valor in metrica["valores"]:
+                lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas, clave)} {valor}")
+            continue
+
+        buckets = metrica["buckets"]
+        cuantiles = []
+        for clave, datos in metrica["valores"]:
+            conteos, suma, total = datos[:-2], datos[-2], datos[-1]
+            acumulado = 0
+            for limite, conteo in zip(buckets + ["+Inf"], conteos):
+                acumulado += conteo
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, clave, {'le': str(limite)})} {acumulado}")
+            lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas, clave)} {suma}")
+            lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas, clave)} {total}")
+            if total:
+                for q in CUANTILES:
+                    valor = _cuantil(buckets, conteos, total, q)
+                    cuantiles.append(f"{nombre}_quantile{_formatear_etiquetas(etiquetas, clave, {'quantile': str(q)})} {valor:.6f}")
+
+        # p50/p95/p99 estimados desde los buckets agregados
+        if cuantiles:
+            lineas.append(f"# HELP {nombre}_quantile Cuantiles estimados desde los buckets de {nombre}")
+            lineas.append(f"# TYPE {nombre}_quantile gauge")
+            lineas.extend(cuantiles)
+
+    return "\n".join(lineas) + "\n"
+
+
+# ========================================
+# MIDDLEWARE
+# ========================================
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide latencia, estado y requests en curso por ruta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = {"codigo": 500}
+
+        async def _send(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        HTTP_EN_CURSO.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            duracion = time.perf_counter() - inicio
+            HTTP_EN_CURSO.dec()
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path_format", None) or getattr(ruta, "path", None) or "sin_ruta"
+            HTTP_LATENCIA.observe(duracion, method=scope["method"], route=plantilla)
+            HTTP_REQUESTS.inc(method=scope["method"], route=plantilla, status=estado["codigo"])
@@ -0,0 +1,287 @@
+"""
+Planificador de tareas periódicas en proceso
+
+Cada tarea tiene una expresión cron de 5 campos (minuto hora día mes
+día-de-la-semana). Con varios workers de uvicorn todos arrancan el hilo,
+pero solo el que obtiene el lock GET_LOCK de MySQL (el líder) programa
+ejecuciones; si su conexión se cae el lock se libera y otro worker toma el
+relevo. Cada ejecución, programada o manual, toma además un lock por tarea
+para no correr dos veces a la vez y queda registrada en ejecuciones_tareas.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import func, text
+
+from config import PLANIFICADOR_INTERVALO_SEGUNDOS
+from utils.cronometro import Cronometro
+from utils.metrics import TAREAS_EJECUTADAS, TAREAS_DURACION, PLANIFICADOR_LIDER
+
+LOCK_LIDER = "erp_planificador_lider"
+
+
+class ExpresionCron:
+    """Expresión cron: minuto hora día-del-mes mes día-de-la-semana (0 y 7 = domingo)"""
+
+    RANGOS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"La expresión cron debe tener 5 campos: '{expresion}'")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            self._campo(campo, minimo, maximo) for campo, (minimo, maximo) in zip(campos, self.RANGOS)
+        )
+        self.dias_semana = {dia % 7 for dia in dias_semana}
+        # Con ambos campos de día restringidos basta con que se cumpla uno (como cron)
+        self.dia_libre = campos[2] == "*"
+        self.dia_semana_libre = campos[4] == "*"
+
+    @staticmethod
+    def _campo(campo: str, minimo: int, maximo: int) -> Set[int]:
+        valores = set()
+        for parte in campo.split(","):
+            rango, _, paso = parte.partition("/")
+            paso = int(paso) if paso else 1
+            if rango == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in rango:
+                inicio, fin = (int(valor) for valor in rango.split("-", 1))
+            else:
+                inicio = int(rango)
+                fin = maximo if paso > 1 else inicio
+            if paso < 1 or inicio < minimo or fin > maximo or inicio > fin:
+                raise ValueError(f"Campo cron fuera de rango: '{parte}'")
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def _dia_valido(self, momento: datetime) -> bool:
+        dia = momento.day in self.dias
+        dia_semana = (momento.weekday() + 1) % 7 in self.dias_semana
+        if self.dia_libre and self.dia_semana_libre:
+            return True
+        if self.dia_libre:
+            return dia_semana
+        if self.dia_semana_libre:
+            return dia
+        return dia or dia_semana
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """Primer minuto posterior a `desde` que cumple la expresión"""
+        momento = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = momento + timedelta(days=366 * 5)
+        while momento <= limite:
+            if momento.month not in self.meses:
+                momento = (momento.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._dia_valido(momento):
+                momento = momento.replace(hour=0, minute=0) + timedelta(days=1)
+            elif momento.hour not in self.horas:
+                momento = momento.replace(minute=0) + timedelta(hours=1)
+            elif momento.minute not in self.minutos:
+                momento += timedelta(minutes=1)
+            else:
+                return momento
+        raise ValueError(f"La expresión cron '{self.expresion}' no tiene fechas válidas")
+
+
+class Tarea:
+    """Tarea registrada: `funcion(db)` retorna un resultado serializable a JSON (o None)"""
+
+    def __init__(self, nombre: str, cron: str, funcion: Callable[[Any], Any], descripcion: str = ""):
+        self.nombre = nombre
+        self.cron = ExpresionCron(cron)
+        self.funcion = funcion
+        self.descripcion = descripcion
+        self.proxima: Optional[datetime] = None
+        self.en_curso = False
+
+
+class Planificador:
+    """Hilo que revisa cada PLANIFICADOR_INTERVALO_SEGUNDOS qué tareas corresponde ejecutar"""
+
+    def __init__(self, intervalo: float = PLANIFICADOR_INTERVALO_SEGUNDOS):
+        self.intervalo = intervalo
+        self.tareas: Dict[str, Tarea] = {}
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.lider = False
+        self._conexion_lider = None
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre: str, cron: str, funcion: Callable[[Any], Any], descripcion: str = "") -> None:
+        self.tareas[nombre] = Tarea(nombre, cron, funcion, descripcion)
+
+    def iniciar(self) -> None:
+        """Lanza el hilo del planificador (una vez por proceso)"""
+        if self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._bucle, name="planificador", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self) -> None:
+        while True:
+            try:
+                self._revisar()
+            except Exception as e:
+                print(f"⚠️ Error en el planificador: {e}")
+            time.sleep(self.intervalo)
+
+    # ---------- Liderazgo ----------
+
+    def _soltar_liderazgo(self) -> None:
+        if self._conexion_lider is not None:
+            try:
+                self._conexion_lider.close()
+            except Exception:
+                pass
+        self._conexion_lider = None
+        self.lider = False
+
+    def _verificar_liderazgo(self) -> bool:
+        """El líder conserva una conexión propia con el lock; si se cae, MySQL lo libera"""
+        from database import engine
+
+        if engine.dialect.name != "mysql":
+            # Sin locks de sesión (SQLite en desarrollo): un solo proceso
+            return True
+        try:
+            if self._conexion_lider is None:
+                # AUTOCOMMIT para no dejar una transacción abierta mientras se es líder
+                conexion = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                if not conexion.execute(text("SELECT GET_LOCK(:nombre, 0)"), {"nombre": LOCK_LIDER}).scalar():
+                    conexion.close()
+                    return False
+                self._conexion_lider = conexion
+                print(f"👑 Planificador: {self.worker} es el líder")
+                return True
+            propio = self._conexion_lider.execute(
+                text("SELECT IS_USED_LOCK(:nombre) = CONNECTION_ID()"), {"nombre": LOCK_LIDER}
+            ).scalar()
+            if not propio:
+                raise RuntimeError("el lock de líder ya no pertenece a esta conexión")
+            return True
+        except Exception as e:
+            print(f"⚠️ Planificador: {self.worker} pierde el liderazgo: {e}")
+            self._soltar_liderazgo()
+            return False
+
+    # ---------- Programación ----------
+
+    def _preparar_proximas(self) -> None:
+        """Próxima ejecución de cada tarea según su última ejecución registrada"""
+        import models
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            ultimas = dict(db.query(models.EjecucionTarea.tarea, func.max(models.EjecucionTarea.fecha_inicio))
+                           .group_by(models.EjecucionTarea.tarea).all())
+        finally:
+            db.close()
+        ahora = datetime.now()
+        for tarea in self.tareas.values():
+            # Una ejecución perdida durante un reinicio se recupera una sola vez
+            tarea.proxima = tarea.cron.siguiente(ultimas.get(tarea.nombre) or ahora)
+
+    def _revisar(self) -> None:
+        lider = self._verificar_liderazgo()
+        PLANIFICADOR_LIDER.set(1 if lider else 0)
+        if lider and not self.lider:
+            self._preparar_proximas()
+        self.lider = lider
+        if not lider:
+            return
+
+        ahora = datetime.now()
+        for tarea in self.tareas.values():
+            if tarea.proxima is not None and tarea.proxima <= ahora and not tarea.en_curso:
+                tarea.proxima = tarea.cron.siguiente(ahora)
+                self.disparar(tarea.nombre, "PROGRAMADA")
+
+    # ---------- Ejecución ----------
+
+    def disparar(self, nombre: str, origen: str = "MANUAL") -> bool:
+        """Ejecuta la tarea en un hilo propio; False si ya está en curso en este proceso"""
+        if self.tareas[nombre].en_curso:
+            return False
+        threading.Thread(target=self.ejecutar, args=(nombre, origen), name=f"tarea-{nombre}", daemon=True).start()
+        return True
+
+    def ejecutar(self, nombre: str, origen: str = "MANUAL"):
+        """Ejecuta la tarea y retorna su EjecucionTarea; None si ya está en curso en algún worker"""
+        from database import engine
+
+        tarea = self.tareas[nombre]
+        with self._lock:
+            if tarea.en_curso:
+                return None
+            tarea.en_curso = True
+
+        conexion = None
+        try:
+            if engine.dialect.name == "mysql":
+                conexion = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                if not conexion.execute(text("SELECT GET_LOCK(:nombre, 0)"), {"nombre": f"erp_tarea_{nombre}"}).scalar():
+                    print(f"⏭️ Tarea {nombre} omitida: ya está en ejecución en otro worker")
+                    return None
+            return self._ejecutar_registrando(tarea, origen)
+        finally:
+            if conexion is not None:
+                try:
+                    conexion.execute(text("SELECT RELEASE_LOCK(:nombre)"), {"nombre": f"erp_tarea_{nombre}"})
+                finally:
+                    conexion.close()
+            with self._lock:
+                tarea.en_curso = False
+
+    def _ejecutar_registrando(self, tarea: Tarea, origen: str):
+        import models
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            registro = models.EjecucionTarea(tarea=tarea.nombre, origen=origen, fecha_inicio=datetime.now(),
+                                             estado="EN_CURSO", worker=self.worker)
+            db.add(registro)
+            db.commit()
+
+            cronometro = Cronometro()
+            try:
+                resultado = tarea.funcion(db)
+                registro.estado = "OK"
+                if resultado is not None:
+                    registro.resultado = json.dumps(resultado, default=str, ensure_ascii=False)
+            except Exception as e:
+                db.rollback()
+                registro.estado = "ERROR"
+                registro.error = str(e)[:2000]
+                print(f"⚠️ Error en la tarea {tarea.nombre}: {e}")
+
+            registro.duracion_ms = cronometro.total_ms
+            registro.fecha_fin = datetime.now()
+            db.commit()
+            db.refresh(registro)
+            TAREAS_EJECUTADAS.inc(tarea=tarea.nombre, resultado=registro.estado)
+            TAREAS_DURACION.observe(float(registro.duracion_ms) / 1000, tarea=tarea.nombre)
+            return registro
+        finally:
+            db.close()
+
+    def get_estado(self) -> List[Dict[str, Any]]:
+        """Tareas registradas con su programación en este proceso"""
+        return [
+            {"nombre": tarea.nombre, "descripcion": tarea.descripcion, "cron": tarea.cron.expresion,
+             "proxima_ejecucion": tarea.proxima, "en_curso": tarea.en_curso}
+            for tarea in self.tareas.values()
+        ]
+
+
+# Instancia global del planificador
+planificador = Planificador()
@@ -0,0 +1,177 @@
+"""
+Registro de consultas lentas con captura automática de EXPLAIN
+
+Las sentencias que superan SLOW_QUERY_MS se encolan junto con sus
+parámetros y la ruta que las originó. Un hilo en segundo plano obtiene el
+plan con EXPLAIN FORMAT=JSON (solo SELECT en MySQL, con una conexión propia)
+y escribe cada registro como una línea JSON en un archivo rotativo. Los
+últimos registros quedan también en memoria para el endpoint de monitoreo.
+
+Cada proceso escribe en su propio archivo (SLOW_QUERY_LOG_FILE con el pid
+antes de la extensión): varios workers rotando el mismo archivo se pisan.
+"""
+
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from config import (
+    SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN, SLOW_QUERY_LOG_FILE,
+    SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS
+)
+from utils.sql_instrumentation import get_request_actual
+
+_recientes: deque = deque(maxlen=200)
+_cola: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=500)
+_local = threading.local()
+_logger = logging.getLogger("erp.slow_queries")
+_engine = None
+_hilo: Optional[threading.Thread] = None
+
+
+def _archivo_proceso() -> str:
+    base, extension = os.path.splitext(SLOW_QUERY_LOG_FILE)
+    return f"{base}.{os.getpid()}{extension}"
+
+
+def _archivos_procesos() -> List[str]:
+    """Archivos vigentes de todos los procesos (sin los respaldos rotados)"""
+    base, extension = os.path.splitext(SLOW_QUERY_LOG_FILE)
+    return glob.glob(f"{glob.escape(base)}.*{extension}")
+
+
+def _valor_serializable(valor: Any) -> Any:
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor if not isinstance(valor, str) or len(valor) <= 200 else valor[:200] + "..."
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return f"<{len(valor)} bytes>"
+    if isinstance(valor, dict):
+        return {str(k): _valor_serializable(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_valor_serializable(v) for v in valor[:50]]
+    return repr(valor)[:200]
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_inicio_consulta_lenta", []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("_inicio_consulta_lenta")
+    if not inicios:
+        return
+    duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+    if duracion_ms < SLOW_QUERY_MS or getattr(_local, "en_explain", False):
+        return
+
+    request = get_request_actual()
+    registro = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "duracion_ms": round(duracion_ms, 1),
+        "ruta": request.ruta if request else None,
+        "sentencia": statement,
+        "parametros": _valor_serializable(parameters[:3] if executemany else parameters),
+        "executemany": bool(executemany),
+        "filas": cursor.rowcount,
+        "dialecto": conn.dialect.name,
+        "_parametros_crudos": None if executemany else parameters,
+    }
+    try:
+        _cola.put_nowait(registro)
+    except queue.Full:
+        pass
+
+
+def _obtener_plan(registro: Dict[str, Any]) -> Optional[Any]:
+    """EXPLAIN FORMAT=JSON de la sentencia, solo para SELECT en MySQL"""
+    sentencia = registro["sentencia"].lstrip()
+    if (not SLOW_QUERY_EXPLAIN or registro["executemany"] or registro["dialecto"] != "mysql"
+            or not sentencia[:6].upper() == "SELECT"):
+        return None
+    _local.en_explain = True
+    try:
+        with _engine.connect() as connection:
+            fila = connection.exec_driver_sql(
+                "EXPLAIN FORMAT=JSON " + sentencia, registro["_parametros_crudos"] or ()
+            ).first()
+        return json.loads(fila[0]) if fila else None
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        _local.en_explain = False
+
+
+def _procesar_cola():
+    while True:
+        registro = _cola.get()
+        registro["plan"] = _obtener_plan(registro)
+        registro.pop("_parametros_crudos", None)
+        registro.pop("dialecto", None)
+        _recientes.append(registro)
+        try:
+            _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+        except Exception as e:
+            print(f"⚠️ No se pudo escribir la consulta lenta: {e}")
+
+
+def instalar_registro_consultas_lentas(engine) -> None:
+    """Registra los listeners en el engine y arranca el hilo de escritura"""
+    global _engine, _hilo
+    if _hilo is not None or SLOW_QUERY_MS <= 0:
+        return
+    _engine = engine
+
+    directorio = os.path.dirname(SLOW_QUERY_LOG_FILE)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    handler = RotatingFileHandler(
+        _archivo_proceso(), maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+    event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+    _hilo = threading.Thread(target=_procesar_cola, name="slow-query-log", daemon=True)
+    _hilo.start()
+
+
+def get_consultas_lentas(limit: int = 50, desde_archivo: bool = False) -> List[Dict[str, Any]]:
+    """Últimas consultas lentas, las más recientes primero"""
+    if not desde_archivo:
+        return list(_recientes)[-limit:][::-1]
+
+    # Las últimas `limit` líneas de cada worker, mezcladas por fecha
+    registros: List[Dict[str, Any]] = []
+    for ruta in _archivos_procesos():
+        with open(ruta, encoding="utf-8") as archivo:
+            lineas = deque(archivo, maxlen=limit)
+        for linea in lineas:
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                continue
+    registros.sort(key=lambda registro: registro.get("fecha") or "", reverse=True)
+    return registros[:limit]
+
+
+def limpiar_consultas_lentas() -> None:
+    _recientes.clear()
@@ -0,0 +1,225 @@
+"""
+Instrumentación SQL por request
+
+Engancha los eventos del engine de SQLAlchemy para contar las consultas de
+cada request, medir el tiempo total en base de datos y agrupar sentencias
+repetidas por huella (fingerprint). Una misma huella SELECT ejecutada muchas
+veces en un request se marca como probable N+1.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# Límites de los histogramas por ruta
+BUCKETS_CONSULTAS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+BUCKETS_TIEMPO_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_PARAM = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_RE_LISTA_IN = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def fingerprint_sql(statement: str) -> str:
+    """Normaliza una sentencia reemplazando literales y parámetros por '?'"""
+    huella = _RE_STRING.sub("?", statement)
+    huella = _RE_PARAM.sub("?", huella)
+    huella = _RE_NUMERO.sub("?", huella)
+    huella = _RE_LISTA_IN.sub("IN (...)", huella)
+    return _RE_ESPACIOS.sub(" ", huella).strip()
+
+
+class EstadisticasRequest:
+    """Acumulador de consultas de un request"""
+
+    __slots__ = ("ruta", "consultas", "tiempo_db", "huellas")
+
+    def __init__(self, ruta: str = ""):
+        self.ruta = ruta
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.huellas: Counter = Counter()
+
+    def registrar(self, statement: str, duracion: float) -> None:
+        self.consultas += 1
+        self.tiempo_db += duracion
+        self.huellas[fingerprint_sql(statement)] += 1
+
+    def sospechas_n_mas_1(self, umbral: int) -> List[Dict[str, Any]]:
+        """Huellas SELECT repetidas al menos `umbral` veces"""
+        return [
+            {"fingerprint": huella, "repeticiones": veces}
+            for huella, veces in self.huellas.most_common()
+            if veces >= umbral and huella.upper().startswith("SELECT")
+        ]
+
+
+_request_actual: ContextVar[Optional[EstadisticasRequest]] = ContextVar("sql_request_actual", default=None)
+
+
+def get_request_actual() -> Optional[EstadisticasRequest]:
+    """Estadísticas del request en curso (None fuera de un request)"""
+    return _request_actual.get()
+
+
+@contextmanager
+def capturar_consultas(etiqueta: str = ""):
+    """Mide las consultas ejecutadas dentro del bloque (fuera de un request HTTP)"""
+    estadisticas = EstadisticasRequest(etiqueta)
+    token = _request_actual.set(estadisticas)
+    try:
+        yield estadisticas
+    finally:
+        _request_actual.reset(token)
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_inicio_consulta", []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("_inicio_consulta")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    estadisticas = _request_actual.get()
+    if estadisticas is not None:
+        estadisticas.registrar(statement, duracion)
+
+
+def instalar_instrumentacion(engine) -> None:
+    """Registra los listeners de consultas en el engine"""
+    if not event.contains(engine, "before_cursor_execute", _antes_de_ejecutar):
+        event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+        event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+
+
+# ========================================
+# AGREGADOS POR RUTA
+# ========================================
+
+def _indice_bucket(limites: List[float], valor: float) -> int:
+    for indice, limite in enumerate(limites):
+        if valor <= limite:
+            return indice
+    return len(limites)
+
+
+class _AgregadoRuta:
+    __slots__ = ("requests", "consultas", "tiempo_db", "max_consultas",
+                 "hist_consultas", "hist_tiempo", "n_mas_1", "huellas_n_mas_1")
+
+    def __init__(self):
+        self.requests = 0
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.max_consultas = 0
+        self.hist_consultas = [0] * (len(BUCKETS_CONSULTAS) + 1)
+        self.hist_tiempo = [0] * (len(BUCKETS_TIEMPO_MS) + 1)
+        self.n_mas_1 = 0
+        self.huellas_n_mas_1: Counter = Counter()
+
+
+_agregados: Dict[str, _AgregadoRuta] = {}
+_lock_agregados = threading.Lock()
+
+
+def registrar_request(ruta: str, estadisticas: EstadisticasRequest, sospechas: List[Dict[str, Any]]) -> None:
+    """Suma un request terminado a los histogramas de su ruta"""
+    tiempo_ms = estadisticas.tiempo_db * 1000
+    with _lock_agregados:
+        agregado = _agregados.get(ruta)
+        if agregado is None:
+            agregado = _agregados[ruta] = _AgregadoRuta()
+        agregado.requests += 1
+        agregado.consultas += estadisticas.consultas
+        agregado.tiempo_db += estadisticas.tiempo_db
+        agregado.max_consultas = max(agregado.max_consultas, estadisticas.consultas)
+        agregado.hist_consultas[_indice_bucket(BUCKETS_CONSULTAS, estadisticas.consultas)] += 1
+        agregado.hist_tiempo[_indice_bucket(BUCKETS_TIEMPO_MS, tiempo_ms)] += 1
+        if sospechas:
+            agregado.n_mas_1 += 1
+            for sospecha in sospechas:
+                agregado.huellas_n_mas_1[sospecha["fingerprint"]] += 1
+
+
+def _histograma(limites: List[float], conteos: List[int]) -> Dict[str, int]:
+    etiquetas = [f"<={limite}" for limite in limites] + [f">{limites[-1]}"]
+    return dict(zip(etiquetas, conteos))
+
+
+def get_resumen_rutas() -> List[Dict[str, Any]]:
+    """Resumen por ruta ordenado por consultas promedio"""
+    with _lock_agregados:
+        resumen = [
+            {
+                "ruta": ruta,
+                "requests": agregado.requests,
+                "consultas_promedio": round(agregado.consultas / agregado.requests, 2),
+                "consultas_max": agregado.max_consultas,
+                "tiempo_db_promedio_ms": round(agregado.tiempo_db * 1000 / agregado.requests, 2),
+                "requests_con_n_mas_1": agregado.n_mas_1,
+                "huellas_n_mas_1": [
+                    {"fingerprint": huella, "requests": veces}
+                    for huella, veces in agregado.huellas_n_mas_1.most_common(5)
+                ],
+                "histograma_consultas": _histograma(BUCKETS_CONSULTAS, agregado.hist_consultas),
+                "histograma_tiempo_db_ms": _histograma(BUCKETS_TIEMPO_MS, agregado.hist_tiempo),
+            }
+            for ruta, agregado in _agregados.items()
+        ]
+    return sorted(resumen, key=lambda item: item["consultas_promedio"], reverse=True)
+
+
+def reiniciar_resumen_rutas() -> None:
+    with _lock_agregados:
+        _agregados.clear()
+
+
+def ruta_de_request(request) -> str:
+    """Plantilla de la ruta atendida (p.ej. /api/v1/lotes/{lote_id})"""
+    ruta = request.scope.get("route")
+    plantilla = getattr(ruta, "path_format", None) or getattr(ruta, "path", None)
+    return f"{request.method} {plantilla or request.url.path}"
+
+
+class SQLInstrumentacionMiddleware(BaseHTTPMiddleware):
+    """Middleware que mide las consultas de cada request"""
+
+    def __init__(self, app, debug: bool = False, umbral_n_mas_1: int = 5):
+        super().__init__(app)
+        self.debug = debug
+        self.umbral_n_mas_1 = umbral_n_mas_1
+
+    async def dispatch(self, request, call_next):
+        # Ruta cruda mientras se atiende; al terminar se reemplaza por la plantilla
+        estadisticas = EstadisticasRequest(f"{request.method} {request.url.path}")
+        token = _request_actual.set(estadisticas)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_actual.reset(token)
+
+        ruta = ruta_de_request(request)
+        estadisticas.ruta = ruta
+        sospechas = estadisticas.sospechas_n_mas_1(self.umbral_n_mas_1)
+        registrar_request(ruta, estadisticas, sospechas)
+
+        if sospechas:
+            print(f"⚠️ Posible N+1 en {ruta}: {sospechas[0]['repeticiones']}x {sospechas[0]['fingerprint'][:120]}")
+
+        if self.debug:
+            response.headers["X-DB-Query-Count"] = str(estadisticas.consultas)
+            response.headers["X-DB-Time-Ms"] = f"{estadisticas.tiempo_db * 1000:.1f}"
+            if sospechas:
+                response.headers["X-DB-N-Plus-One"] = str(len(sospechas))
+        return response
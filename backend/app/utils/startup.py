@@ -0,0 +1,100 @@
+"""
+Utilidades de arranque: importación medida de módulos y verificación del esquema
+"""
+
+import importlib
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+
+# Desglose de la última importación: [(modulo, segundos)]
+TIEMPOS_IMPORTACION: List[Tuple[str, float]] = []
+
+
+def importar_modulos(nombres: List[str]) -> Dict[str, object]:
+    """
+    Importa los módulos indicados en orden y registra el tiempo de cada uno
+
+    El tiempo de un módulo incluye solo lo que no había sido importado antes,
+    por lo que conviene importar primero las dependencias pesadas compartidas
+    (models, schemas, crud) para que no se atribuyan al primer router.
+    """
+    modulos = {}
+    for nombre in nombres:
+        inicio = time.perf_counter()
+        modulos[nombre] = importlib.import_module(nombre)
+        TIEMPOS_IMPORTACION.append((nombre, time.perf_counter() - inicio))
+    return modulos
+
+
+def reportar_tiempos_importacion(top: int = 15) -> None:
+    """Imprime los módulos más lentos de importar y el total"""
+    total = sum(segundos for _, segundos in TIEMPOS_IMPORTACION)
+    print(f"⏱️ Importación de módulos: {total * 1000:.0f} ms en {len(TIEMPOS_IMPORTACION)} módulos")
+    ordenados = sorted(TIEMPOS_IMPORTACION, key=lambda item: item[1], reverse=True)
+    for nombre, segundos in ordenados[:top]:
+        print(f"   {segundos * 1000:8.1f} ms  {nombre}")
+
+
+def get_tiempos_importacion() -> Dict[str, object]:
+    """Desglose de importación en formato serializable"""
+    return {
+        "total_ms": round(sum(segundos for _, segundos in TIEMPOS_IMPORTACION) * 1000, 1),
+        "modulos": [
+            {"modulo": nombre, "ms": round(segundos * 1000, 1)}
+            for nombre, segundos in sorted(TIEMPOS_IMPORTACION, key=lambda item: item[1], reverse=True)
+        ]
+    }
+
+
+def verificar_version_esquema(engine, version_requerida: int) -> bool:
+    """
+    Compara la versión registrada en schema_version con la requerida por el código
+
+    No ejecuta DDL: si la tabla no existe o la versión es menor se informa
+    y retorna False; main.py detiene el arranque salvo que se haya definido
+    STARTUP_OMITIR_VERIFICACION_ESQUEMA.
+    """
+    try:
+        with engine.connect() as connection:
+            version = connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except Exception as e:
+        print(f"⚠️ No se pudo leer schema_version: {e}")
+        return False
+
+    if version is None or version < version_requerida:
+        print(f"⚠️ Esquema en versión {version}, se requiere {version_requerida}. Aplique los scripts de database/")
+        return False
+
+    print(f"✅ Esquema de base de datos en versión {version}")
+    return True
+
+
+# Migraciones ya confirmadas en este proceso: {(url, version)}
+_MIGRACIONES_CONFIRMADAS = set()
+
+
+def requerir_migracion(db, version: int, script: str) -> None:
+    """
+    Lanza RuntimeError si la migración indicada de database/ no está aplicada
+
+    Protege los caminos que aplican en la aplicación efectos que antes hacían
+    triggers: sin la migración el trigger sigue activo y el efecto se aplica
+    dos veces. Solo se verifica en MySQL (los triggers vienen de los scripts
+    de database/, no de create_all) y una vez por proceso.
+    """
+    bind = db.get_bind()
+    clave = (str(bind.url), version)
+    if bind.dialect.name != "mysql" or clave in _MIGRACIONES_CONFIRMADAS:
+        return
+    try:
+        actual = db.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    except Exception:
+        actual = None
+    if actual is None or actual < version:
+        raise RuntimeError(
+            f"Aplique database/{script} (versión de esquema {version}) antes de usar esta operación; "
+            f"el esquema está en la versión {actual}"
+        )
+    _MIGRACIONES_CONFIRMADAS.add(clave)
@@ -0,0 +1,81 @@
+"""
+Tareas periódicas del ERP registradas en el planificador
+
+La programación por defecto se puede reemplazar por tarea con la variable
+PLANIFICADOR_CRON (ver config).
+"""
+
+from config import PLANIFICADOR_CRON
+from utils.planificador import planificador
+
+
+def _reservas_vencidas(db):
+    from crud import reservas_crud
+    return {"reservas_vencidas": reservas_crud.marcar_vencidas(db)}
+
+
+def _lotes_vencidos(db):
+    from crud import lote_crud
+    return {"lotes_vencidos": lote_crud.marcar_vencidos(db)}
+
+
+def _limpiar_logs_alertas(db):
+    from crud import log_alertas_crud
+    return {"logs_eliminados": log_alertas_crud.limpiar_logs_antiguos(db, dias_antiguedad=90)}
+
+
+def _programaciones_vencidas(db):
+    # ProgramacionConteos no tiene estado VENCIDO: la tarea solo informa
+    from crud import programacion_conteos_crud
+    vencidas = programacion_conteos_crud.get_programaciones_vencidas(db, limit=1000)
+    return {"programaciones_vencidas": len(vencidas),
+            "ids_programacion": [programacion.id_programacion for programacion in vencidas]}
+
+
+def _evaluar_alertas(db):
+    from crud import motor_alertas_crud
+    ejecuciones = motor_alertas_crud.evaluar(db, solo_pendientes=True)
+    return {"reglas_evaluadas": len(ejecuciones),
+            "alertas_nuevas": sum(ejecucion.nuevas for ejecucion in ejecuciones),
+            "alertas_resueltas": sum(ejecucion.resueltas for ejecucion in ejecuciones)}
+
+
+def _purgar_trabajos_cola(db):
+    from crud import trabajos_cola_crud
+    return {"trabajos_eliminados": trabajos_cola_crud.purgar(db, dias=30)}
+
+
+def _purgar_eventos(db):
+    from crud import eventos_sistema_crud
+    return {"eventos_eliminados": eventos_sistema_crud.purgar(db, horas=24)}
+
+
+def _consolidar_metricas_workflow(db):
+    from crud import metricas_workflow_crud
+    return metricas_workflow_crud.consolidar_pendientes(db)
+
+
+# (nombre, cron por defecto, función, descripción)
+TAREAS = [
+    ("reservas_vencidas", "*/15 * * * *", _reservas_vencidas,
+     "Marca como VENCIDA las reservas activas con fecha de vencimiento pasada"),
+    ("lotes_vencidos", "5 0 * * *", _lotes_vencidos,
+     "Marca como VENCIDO los lotes activos o en cuarentena con fecha de vencimiento pasada"),
+    ("limpiar_logs_alertas", "30 3 * * *", _limpiar_logs_alertas,
+     "Elimina los logs de alertas resueltos o ignorados de más de 90 días"),
+    ("programaciones_conteo_vencidas", "0 7 * * *", _programaciones_vencidas,
+     "Informa las programaciones de conteo con fecha pasada que siguen PROGRAMADO"),
+    ("evaluar_alertas", "*/10 * * * *", _evaluar_alertas,
+     "Evalúa las reglas de alertas cuya frecuencia de revisión ya se cumplió"),
+    ("purgar_trabajos_cola", "45 3 * * *", _purgar_trabajos_cola,
+     "Elimina los trabajos de la cola terminados hace más de 30 días"),
+    ("purgar_eventos", "50 * * * *", _purgar_eventos,
+     "Elimina los eventos en vivo (eventos_sistema) de más de 24 horas"),
+    ("consolidar_metricas_workflow", "20 1 * * *", _consolidar_metricas_workflow,
+     "Agrega en metricas_workflow_diarias los días sin consolidar hasta ayer (tiempos entre estados de las OC)"),
+]
+
+
+def registrar_tareas() -> None:
+    for nombre, cron, funcion, descripcion in TAREAS:
+        planificador.registrar(nombre, PLANIFICADOR_CRON.get(nombre, cron), funcion, descripcion)
@@ -0,0 +1,57 @@
+"""
+Tipos de trabajo del ERP que se ejecutan en la cola (ver utils/cola_trabajos.py)
+"""
+
+import os
+
+from config import COLA_DIRECTORIO_ARCHIVOS
+from utils.cola_trabajos import tipo_trabajo
+
+
+@tipo_trabajo("procesar_lote_xml")
+def procesar_lote_xml(db, parametros, contexto):
+    from routes.xml_processor import procesar_documentos_pendientes
+    return procesar_documentos_pendientes(
+        db, parametros.get("validar_sii", True), parametros.get("auto_conciliar", True), parametros.get("limite", 50),
+        al_avanzar=lambda hechos, total: contexto.progreso(100 * hechos / total, f"{hechos}/{total} documentos")
+    )
+
+
+@tipo_trabajo("estadisticas_abc")
+def estadisticas_abc(db, parametros, contexto):
+    from crud import ProductosABCCRUD
+    return ProductosABCCRUD(db).get_estadisticas_generales()
+
+
+@tipo_trabajo("evaluar_alertas")
+def evaluar_alertas(db, parametros, contexto):
+    from crud import motor_alertas_crud
+    ejecuciones = motor_alertas_crud.evaluar(db, ids_alerta=parametros.get("ids_alerta"),
+                                             solo_pendientes=parametros.get("solo_pendientes", False))
+    return [{"id_alerta": ejecucion.id_alerta, "estado": ejecucion.estado, "candidatos": ejecucion.candidatos,
+             "nuevas": ejecucion.nuevas, "resueltas": ejecucion.resueltas, "error": ejecucion.error}
+            for ejecucion in ejecuciones]
+
+
+@tipo_trabajo("exportar_pdf_ordenes")
+def exportar_pdf_ordenes(db, parametros, contexto):
+    """Genera el PDF de cada orden en COLA_DIRECTORIO_ARCHIVOS/<id_trabajo>/"""
+    from crud import orden_compra_crud, orden_compra_detalle_crud
+    from utils.pdf_generator import generar_pdf_orden_compra
+
+    directorio = os.path.join(COLA_DIRECTORIO_ARCHIVOS, str(contexto.id_trabajo))
+    os.makedirs(directorio, exist_ok=True)
+    ids_orden = parametros.get("ids_orden", [])
+    archivos, errores = [], []
+    for numero, id_orden in enumerate(ids_orden, start=1):
+        orden = orden_compra_crud.get_orden(db, id_orden)
+        detalles = orden_compra_detalle_crud.get_detalles_by_orden(db, id_orden) if orden else []
+        if not detalles:
+            errores.append({"id_orden": id_orden, "error": "Orden no encontrada o sin detalles"})
+        else:
+            nombre = f"orden_compra_{orden.numero_orden}.pdf"
+            with open(os.path.join(directorio, nombre), "wb") as archivo:
+                archivo.write(generar_pdf_orden_compra(orden, detalles))
+            archivos.append(nombre)
+        contexto.progreso(100 * numero / len(ids_orden), f"{numero}/{len(ids_orden)} órdenes")
+    return {"archivos": archivos, "errores": errores}
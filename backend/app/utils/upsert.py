@@ -0,0 +1,33 @@
+"""
+INSERT ... ON DUPLICATE KEY / ON CONFLICT portable para cargas en bloque
+
+MySQL usa ON DUPLICATE KEY UPDATE; PostgreSQL y SQLite usan ON CONFLICT.
+Con executemany, pymysql agrupa las filas en un solo INSERT multi-VALUES.
+"""
+
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Sequence
+
+
+def upsert(db, tabla, filas: List[Dict[str, Any]], claves: Sequence[str],
+           actualizar: Callable[[Any], Dict[str, Any]]) -> bool:
+    """Inserta `filas` y, si la clave ya existe, aplica `actualizar(nuevos)`
+
+    `actualizar` recibe la pseudo-tabla de valores propuestos (VALUES() en
+    MySQL, EXCLUDED en el resto) y retorna {columna: expresión}. Retorna
+    False si el dialecto no soporta upsert y no ejecuta nada.
+    """
+    if not filas:
+        return True
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(tabla)
+        db.execute(stmt.on_duplicate_key_update(actualizar(stmt.inserted)), filas)
+        return True
+    if dialecto in ("postgresql", "sqlite"):
+        insert = import_module(f"sqlalchemy.dialects.{dialecto}").insert
+        stmt = insert(tabla)
+        db.execute(stmt.on_conflict_do_update(index_elements=list(claves), set_=actualizar(stmt.excluded)), filas)
+        return True
+    return False
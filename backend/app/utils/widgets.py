@@ -0,0 +1,60 @@
+"""
+Widgets del dashboard de inicio registrados en el dashboard compuesto
+
+Cada widget retorna lo mismo que el endpoint que reemplaza, para que el
+frontend pueda pedirlos juntos en /dashboard o por separado.
+"""
+
+from utils.dashboard import dashboard
+
+
+def _alertas_resumen(db):
+    from routes.log_alertas import obtener_resumen_dashboard
+    return obtener_resumen_dashboard(db=db)
+
+
+def _inventario_criticos(db):
+    from routes.inventario_consolidado import obtener_productos_criticos
+    return obtener_productos_criticos(limit=10, db=db)
+
+
+def _inventario_agotados(db):
+    from routes.inventario_consolidado import obtener_productos_agotados
+    return obtener_productos_agotados(limit=10, db=db)
+
+
+def _devoluciones_pendientes(db):
+    from crud import DevolucionesPendientesCRUD
+    return DevolucionesPendientesCRUD(db).get_dashboard_kpis()
+
+
+def _workflow_tiempos(db):
+    from datetime import date, timedelta
+    from crud import metricas_workflow_crud
+    return metricas_workflow_crud.get_metricas(db, date.today() - timedelta(days=90), date.today())
+
+
+def _estadistica(nombre: str):
+    def _obtener(db):
+        from utils.cache_estadisticas import cache_estadisticas
+        return cache_estadisticas.obtener(nombre, db)
+    return _obtener
+
+
+# (id, función, descripción)
+WIDGETS = [
+    ("workflow_tiempos", _workflow_tiempos, "Tiempos entre estados de las órdenes de compra (90 días)"),
+    ("alertas_resumen", _alertas_resumen, "Resumen de alertas: estadísticas, críticas y sin resolver"),
+    ("inventario_criticos", _inventario_criticos, "10 productos con stock bajo el mínimo"),
+    ("inventario_agotados", _inventario_agotados, "10 productos agotados"),
+    ("inventario_estadisticas", _estadistica("inventario_consolidado"), "Estadísticas del inventario consolidado"),
+    ("devoluciones_pendientes", _devoluciones_pendientes, "KPIs de devoluciones pendientes"),
+    ("obras_estadisticas", _estadistica("obras"), "Estadísticas de obras"),
+    ("despachos_estadisticas", _estadistica("despachos"), "Estadísticas de despachos a obra"),
+    ("reservas_estadisticas", _estadistica("reservas"), "Estadísticas de reservas"),
+]
+
+
+def registrar_widgets() -> None:
+    for id_widget, funcion, descripcion in WIDGETS:
+        dashboard.registrar(id_widget, funcion, descripcion)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Worker de la cola de trabajos en segundo plano
+
+Uso (desde backend/app, junto a la API):
+    python worker_trabajos.py --hilos 2
+    python worker_trabajos.py --tipos procesar_lote_xml,exportar_pdf_ordenes
+
+Se pueden levantar tantos procesos como se necesite: cada trabajo lo toma
+un solo worker (SELECT ... FOR UPDATE SKIP LOCKED).
+"""
+
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import models  # noqa: F401  (registra los modelos)
+import utils.trabajos  # noqa: F401  (registra los tipos de trabajo)
+from config import EVENTOS_BROKER
+from database import SessionLocal
+from utils.cola_trabajos import TIPOS, iniciar_workers_en_proceso
+from utils.eventos import instalar_eventos_sesion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker de la cola de trabajos del ERP")
+    parser.add_argument("--hilos", type=int, default=1, help="Trabajos en paralelo en este proceso")
+    parser.add_argument("--tipos", default="", help="Tipos a procesar separados por coma (todos si se omite)")
+    args = parser.parse_args()
+
+    # Solo con el broker en base de datos los eventos de este proceso llegan a la API
+    if EVENTOS_BROKER == "db":
+        instalar_eventos_sesion(SessionLocal, recibir=False)
+
+    tipos = [tipo.strip() for tipo in args.tipos.split(",") if tipo.strip()] or None
+    print(f"👷 Worker de trabajos: {args.hilos} hilo(s), tipos {tipos or sorted(TIPOS)}")
+
+    hilos = iniciar_workers_en_proceso(args.hilos, tipos)
+    try:
+        for hilo in hilos:
+            hilo.join()
+    except KeyboardInterrupt:
+        print("👋 Worker detenido")
+
+
+if __name__ == "__main__":
+    main()
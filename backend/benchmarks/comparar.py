@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Compara dos reportes de benchmarks (base y nuevo)
+
+Uso: python benchmarks/comparar.py base.json nuevo.json [--umbral 10]
+Retorna código 1 si algún benchmark empeora más que el umbral (%) en la mediana.
+"""
+
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Comparar reportes de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=10.0, help="Regresión máxima tolerada en %%")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as archivo:
+        base = json.load(archivo)
+    with open(args.nuevo, encoding="utf-8") as archivo:
+        nuevo = json.load(archivo)
+
+    if base.get("escala") != nuevo.get("escala") or base.get("motor") != nuevo.get("motor"):
+        print(f"⚠️ Reportes no comparables: escala {base.get('escala')} vs {nuevo.get('escala')}, "
+              f"motor {base.get('motor')} vs {nuevo.get('motor')}")
+
+    print(f"{'benchmark':<28}{'base ms':>12}{'nuevo ms':>12}{'cambio':>10}{'consultas':>16}")
+    regresiones = []
+    for nombre in sorted(set(base["resultados"]) | set(nuevo["resultados"])):
+        antes = base["resultados"].get(nombre, {})
+        despues = nuevo["resultados"].get(nombre, {})
+        if "mediana_ms" not in antes or "mediana_ms" not in despues:
+            print(f"{nombre:<28}{'-':>12}{'-':>12}{'n/a':>10}")
+            continue
+        cambio = (despues["mediana_ms"] - antes["mediana_ms"]) / antes["mediana_ms"] * 100 if antes["mediana_ms"] else 0.0
+        consultas = f"{antes['consultas_promedio']} → {despues['consultas_promedio']}"
+        marca = " ⚠️" if cambio > args.umbral else ""
+        print(f"{nombre:<28}{antes['mediana_ms']:>12.2f}{despues['mediana_ms']:>12.2f}{cambio:>9.1f}%{consultas:>16}{marca}")
+        if cambio > args.umbral:
+            regresiones.append(nombre)
+
+    if regresiones:
+        print(f"❌ Regresiones sobre {args.umbral}%: {', '.join(regresiones)}")
+        return 1
+    print("✅ Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Carga de un dataset sintético escalable para los benchmarks
+
+Con escala=1.0 se generan 50k productos, 5M movimientos_detalle, 500 obras y
+100k log_alertas. Los IDs se asignan explícitamente, por lo que la base debe
+estar vacía (esquema aplicado en MySQL o creado con create_all en SQLite).
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import models
+
+ESCALA_BASE = {
+    "productos": 50_000,
+    "movimientos_detalle": 5_000_000,
+    "obras": 500,
+    "log_alertas": 100_000,
+    "dte_xml": 20_000,
+}
+
+PROVEEDORES = 200
+CLIENTES = 100
+BODEGAS, PASILLOS_POR_BODEGA, ESTANTES_POR_PASILLO = 3, 10, 20
+DETALLES_POR_MOVIMIENTO = 10
+TAMANO_LOTE = 5_000
+
+RUT_EMPRESA = "66666666-6"
+
+TIPOS_ALERTA = [
+    "STOCK_MINIMO", "VENCIMIENTO", "SIN_MOVIMIENTO", "CERTIFICACION_VENCIDA",
+    "DEVOLUCION_PENDIENTE", "OBRA_SIN_ACTIVIDAD", "MATERIAL_VENCIDO_EN_OBRA", "DESPACHO_NO_ENTREGADO",
+]
+
+
+def tamanos(escala: float) -> Dict[str, int]:
+    """Cantidad de filas por entidad para la escala indicada"""
+    return {nombre: max(1, int(base * escala)) for nombre, base in ESCALA_BASE.items()}
+
+
+def _insertar(conn, modelo, filas: List[dict]) -> int:
+    tabla = modelo.__table__
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        conn.execute(tabla.insert(), filas[inicio:inicio + TAMANO_LOTE])
+    return len(filas)
+
+
+def cargar_dataset(engine, escala: float = 0.01, semilla: int = 42) -> Dict[str, int]:
+    """Inserta el dataset completo y retorna las filas insertadas por tabla"""
+    rnd = random.Random(semilla)
+    n = tamanos(escala)
+    ahora = datetime.now()
+    conteos: Dict[str, int] = {}
+
+    with engine.begin() as conn:
+        # Catálogos
+        conteos["unidades_medida"] = _insertar(conn, models.UnidadMedida, [
+            {"id_unidad": 1, "codigo_unidad": "UN", "nombre_unidad": "Unidad"}
+        ])
+        conteos["categorias"] = _insertar(conn, models.Categoria, [
+            {"id_categoria": i, "codigo_categoria": f"CAT{i}", "nombre_categoria": f"Categoría {i}"}
+            for i in range(1, 6)
+        ])
+        conteos["subcategorias"] = _insertar(conn, models.Subcategoria, [
+            {"id_subcategoria": i, "id_categoria": (i - 1) % 5 + 1,
+             "codigo_subcategoria": f"SUB{i}", "nombre_subcategoria": f"Subcategoría {i}"}
+            for i in range(1, 21)
+        ])
+        conteos["tipos_producto"] = _insertar(conn, models.TipoProducto, [
+            {"id_tipo_producto": i, "id_subcategoria": (i - 1) % 20 + 1,
+             "codigo_tipo": f"TP{i}", "nombre_tipo": f"Tipo {i}"}
+            for i in range(1, 101)
+        ])
+        conteos["marcas"] = _insertar(conn, models.Marca, [
+            {"id_marca": i, "nombre_marca": f"Marca {i}"} for i in range(1, 51)
+        ])
+        from dte_sintetico import rut_proveedor
+        conteos["proveedores"] = _insertar(conn, models.Proveedor, [
+            {"id_proveedor": i + 1, "codigo_proveedor": f"PRV{i:05d}", "nombre_proveedor": f"Proveedor Sintético {i}",
+             "razon_social": f"Proveedor Sintético {i}", "rfc": rut_proveedor(i), "pais": "Chile"}
+            for i in range(PROVEEDORES)
+        ])
+        conteos["roles"] = _insertar(conn, models.Roles, [{"id_rol": 1, "nombre_rol": "BENCHMARK"}])
+        conteos["usuarios"] = _insertar(conn, models.Usuarios, [
+            {"id_usuario": 1, "username": "benchmark", "email": "benchmark@example.com",
+             "nombre_completo": "Usuario Benchmark", "password_hash": "-", "id_rol": 1}
+        ])
+        conteos["empresas"] = _insertar(conn, models.Empresa, [
+            {"id_empresa": 1, "rut_empresa": RUT_EMPRESA, "razon_social": "Empresa Benchmark"}
+        ])
+        conteos["tipos_documentos_compra"] = _insertar(conn, models.TipoDocumentoCompra, [
+            {"id_tipo_documento": 1, "nombre": "Factura Electrónica", "codigo_dte": "33", "requiere_folio": True}
+        ])
+        conteos["tipos_movimiento"] = _insertar(conn, models.TipoMovimiento, [
+            {"id_tipo_movimiento": 1, "codigo_tipo": "ENT", "nombre_tipo": "Entrada",
+             "afecta_stock": "AUMENTA", "requiere_autorizacion": False},
+            {"id_tipo_movimiento": 2, "codigo_tipo": "SAL", "nombre_tipo": "Salida",
+             "afecta_stock": "DISMINUYE", "requiere_autorizacion": False},
+            {"id_tipo_movimiento": 3, "codigo_tipo": "DSO", "nombre_tipo": "Despacho a Obra",
+             "afecta_stock": "DISMINUYE", "requiere_autorizacion": False},
+        ])
+
+        # Ubicaciones físicas
+        bodegas, pasillos, estantes = [], [], []
+        for b in range(1, BODEGAS + 1):
+            bodegas.append({"id_bodega": b, "codigo_bodega": chr(64 + b), "nombre_bodega": f"Bodega {b}"})
+            for p in range(1, PASILLOS_POR_BODEGA + 1):
+                id_pasillo = len(pasillos) + 1
+                pasillos.append({"id_pasillo": id_pasillo, "id_bodega": b, "numero_pasillo": p})
+                for e in range(1, ESTANTES_POR_PASILLO + 1):
+                    estantes.append({"id_estante": len(estantes) + 1, "id_pasillo": id_pasillo, "codigo_estante": f"E{e}"})
+        conteos["bodegas"] = _insertar(conn, models.Bodega, bodegas)
+        conteos["pasillos"] = _insertar(conn, models.Pasillo, pasillos)
+        conteos["estantes"] = _insertar(conn, models.Estante, estantes)
+
+        # Productos y su ubicación principal
+        productos, ubicaciones = [], []
+        for i in range(1, n["productos"] + 1):
+            stock = rnd.randint(0, 500)
+            productos.append({
+                "id_producto": i, "sku": f"SKU{i:07d}", "nombre_producto": f"Producto sintético {i}",
+                "id_tipo_producto": rnd.randint(1, 100), "id_unidad_medida": 1, "id_marca": rnd.randint(1, 50),
+                "stock_actual": stock, "stock_minimo": rnd.randint(0, 50), "stock_maximo": 600,
+                "punto_reorden": rnd.randint(10, 80), "costo_promedio": round(rnd.uniform(500, 150000), 4),
+                "precio_venta": round(rnd.uniform(800, 250000), 2),
+            })
+            ubicaciones.append({"id_ubicacion": i, "id_producto": i, "id_estante": rnd.randint(1, len(estantes)),
+                                "cantidad": stock})
+        conteos["productos"] = _insertar(conn, models.Producto, productos)
+        conteos["producto_ubicaciones"] = _insertar(conn, models.ProductoUbicacion, ubicaciones)
+        del productos
+
+        # Clientes y obras
+        conteos["clientes"] = _insertar(conn, models.Cliente, [
+            {"id_cliente": i, "codigo_cliente": f"CLI{i:04d}", "nombre_cliente": f"Cliente {i}", "tipo_cliente": "PRIVADO"}
+            for i in range(1, CLIENTES + 1)
+        ])
+        conteos["obras"] = _insertar(conn, models.Obra, [
+            {"id_obra": i, "codigo_obra": f"OBR{i:05d}", "nombre_obra": f"Obra {i}",
+             "id_cliente": rnd.randint(1, CLIENTES), "estado": rnd.choice(["PLANIFICACION", "EN_EJECUCION", "FINALIZADA"])}
+            for i in range(1, n["obras"] + 1)
+        ])
+
+        # Alertas
+        conteos["configuracion_alertas"] = _insertar(conn, models.ConfiguracionAlertas, [
+            {"id_alerta": i + 1, "nombre_alerta": tipo.title(), "tipo_alerta": tipo}
+            for i, tipo in enumerate(TIPOS_ALERTA)
+        ])
+        conteos["log_alertas"] = _insertar(conn, models.LogAlertas, [
+            {"id_log_alerta": i, "id_alerta": rnd.randint(1, len(TIPOS_ALERTA)),
+             "id_producto": rnd.randint(1, n["productos"]), "mensaje": f"Alerta sintética {i}",
+             "nivel_prioridad": rnd.choice(["BAJA", "MEDIA", "ALTA", "CRITICA"]),
+             "estado": rnd.choice(["PENDIENTE", "VISTA", "RESUELTA", "IGNORADA"]),
+             "fecha_generacion": ahora - timedelta(minutes=rnd.randrange(525_600))}
+            for i in range(1, n["log_alertas"] + 1)
+        ])
+
+    # Movimientos procesados, en transacciones por bloque para no crecer sin límite
+    total_movimientos = max(1, n["movimientos_detalle"] // DETALLES_POR_MOVIMIENTO)
+    id_detalle = 0
+    for inicio in range(0, total_movimientos, TAMANO_LOTE):
+        cabeceras, detalles = [], []
+        for id_movimiento in range(inicio + 1, min(inicio + TAMANO_LOTE, total_movimientos) + 1):
+            tipo = 1 if rnd.random() < 0.6 else 2
+            cabeceras.append({
+                "id_movimiento": id_movimiento, "id_tipo_movimiento": tipo, "numero_movimiento": f"MOV{id_movimiento:08d}",
+                "fecha_movimiento": ahora - timedelta(minutes=rnd.randrange(525_600)),
+                "id_usuario": 1, "estado": "PROCESADO",
+            })
+            for _ in range(DETALLES_POR_MOVIMIENTO):
+                id_detalle += 1
+                id_producto = rnd.randint(1, n["productos"])
+                cantidad = rnd.randint(1, 20)
+                costo = round(rnd.uniform(500, 150000), 4)
+                detalles.append({
+                    "id_detalle": id_detalle, "id_movimiento": id_movimiento, "id_producto": id_producto,
+                    "id_ubicacion_destino" if tipo == 1 else "id_ubicacion_origen": id_producto,
+                    "cantidad": cantidad, "costo_unitario": costo, "costo_total": round(cantidad * costo, 2),
+                })
+        with engine.begin() as conn:
+            _insertar(conn, models.MovimientoInventario, cabeceras)
+            # executemany exige las mismas claves en todas las filas
+            for detalle in detalles:
+                detalle.setdefault("id_ubicacion_origen", None)
+                detalle.setdefault("id_ubicacion_destino", None)
+            _insertar(conn, models.MovimientoDetalle, detalles)
+    conteos["movimientos_inventario"] = total_movimientos
+    conteos["movimientos_detalle"] = id_detalle
+
+    return conteos
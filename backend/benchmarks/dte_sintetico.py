@@ -0,0 +1,82 @@
+"""
+Generador de XML DTE sintéticos con la forma de frontend/DTE-33-01.xml
+"""
+
+import copy
+import random
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, List
+
+PLANTILLA = Path(__file__).resolve().parents[2] / "frontend" / "DTE-33-01.xml"
+
+ITEMS = [
+    "Extintor PQS 6 kg", "Extintor CO2 5 kg", "Rociador colgante K5.6", "Válvula de retención 4\"",
+    "Manguera 1 1/2\" x 30 m", "Gabinete red húmeda", "Detector de humo óptico", "Sirena estroboscópica",
+    "Pulsador manual", "Cañería acero ranurada 2\"", "Copla ranurada 2\"", "Panel de control 4 zonas",
+]
+
+
+def _cargar_plantilla() -> ET.Element:
+    contenido = PLANTILLA.read_bytes().strip()
+    return ET.fromstring(contenido)
+
+
+def rut_proveedor(indice: int) -> str:
+    """RUT sintético determinista para el proveedor `indice`"""
+    return f"{76000000 + indice}-{indice % 10}"
+
+
+def generar_dtes(cantidad: int, proveedores: int, rut_receptor: str, semilla: int = 42,
+                 folio_inicial: int = 1) -> Iterator[bytes]:
+    """Genera `cantidad` DTE tipo 33 en UTF-8 variando emisor, folio y detalle"""
+    rnd = random.Random(semilla)
+    base = _cargar_plantilla()
+    documento_base = base.find("Documento")
+    detalle_base = documento_base.find("Detalle")
+    fecha_base = date.today() - timedelta(days=365)
+
+    for i in range(cantidad):
+        raiz = copy.deepcopy(base)
+        documento = raiz.find("Documento")
+        folio = folio_inicial + i
+        indice_proveedor = rnd.randrange(proveedores)
+        fecha = (fecha_base + timedelta(days=rnd.randrange(365))).isoformat()
+
+        documento.set("ID", f"FacturaElectronica_{folio}")
+        documento.find("Encabezado/IdDoc/Folio").text = str(folio)
+        documento.find("Encabezado/IdDoc/FchEmis").text = fecha
+        documento.find("Encabezado/Emisor/RUTEmisor").text = rut_proveedor(indice_proveedor)
+        documento.find("Encabezado/Emisor/RznSoc").text = f"Proveedor Sintético {indice_proveedor}"
+        documento.find("Encabezado/Receptor/RUTRecep").text = rut_receptor
+
+        for detalle in documento.findall("Detalle"):
+            documento.remove(detalle)
+        posicion = list(documento).index(documento.find("Encabezado")) + 1
+        neto = 0
+        lineas: List[ET.Element] = []
+        for numero in range(1, rnd.randint(1, 20) + 1):
+            detalle = copy.deepcopy(detalle_base)
+            cantidad_item = rnd.randint(1, 200)
+            precio = rnd.randint(500, 250000)
+            monto = cantidad_item * precio
+            neto += monto
+            detalle.find("NroLinDet").text = str(numero)
+            detalle.find("NmbItem").text = rnd.choice(ITEMS)
+            detalle.find("QtyItem").text = str(cantidad_item)
+            detalle.find("PrcItem").text = str(precio)
+            detalle.find("MontoItem").text = str(monto)
+            lineas.append(detalle)
+        for desplazamiento, detalle in enumerate(lineas):
+            documento.insert(posicion + desplazamiento, detalle)
+
+        iva = round(neto * 0.19)
+        documento.find("Encabezado/Totales/MntNeto").text = str(neto)
+        documento.find("Encabezado/Totales/IVA").text = str(iva)
+        documento.find("Encabezado/Totales/MntTotal").text = str(neto + iva)
+        referencia = documento.find("Referencia/FolioRef")
+        if referencia is not None:
+            referencia.text = str(folio)
+
+        yield b'<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(raiz, encoding="utf-8", xml_declaration=False)
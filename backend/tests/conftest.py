@@ -0,0 +1,68 @@
+import os
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+# Los módulos de la aplicación se importan como en main.py (desde backend/app)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+# database.py crea su engine al importarse: que no apunte a MySQL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import Boolean, Date, DateTime, Numeric, Float, Integer, TIMESTAMP, Time, create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre una base SQLite en memoria con todo el esquema (las vistas quedan como tablas)"""
+    from database import Base
+    import models  # noqa: F401
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    sesion = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        engine.dispose()
+
+
+def _valor_por_defecto(columna, secuencia: int):
+    tipo = columna.type
+    if isinstance(tipo, Boolean):
+        return True
+    if isinstance(tipo, (Integer, Numeric, Float)):
+        return 1 if columna.foreign_keys else 0
+    if isinstance(tipo, (DateTime, TIMESTAMP)):
+        return datetime(2026, 1, 1)
+    if isinstance(tipo, Date):
+        return date(2026, 1, 1)
+    if isinstance(tipo, Time):
+        return datetime(2026, 1, 1).time()
+    if getattr(tipo, "enums", None):
+        return tipo.enums[0]
+    longitud = getattr(tipo, "length", None) or 20
+    return f"{columna.name[:longitud - 4]}{secuencia}"[-longitud:]
+
+
+@pytest.fixture
+def crear(db):
+    """crear(Modelo, **valores): inserta una fila completando las columnas obligatorias sin valor"""
+    secuencia = iter(range(1, 1_000_000))
+
+    def _crear(modelo, **valores):
+        for columna in modelo.__table__.columns:
+            if (columna.name in valores or columna.nullable or columna.default is not None
+                    or columna.server_default is not None or (columna.primary_key and columna.autoincrement)):
+                continue
+            valores[columna.name] = _valor_por_defecto(columna, next(secuencia))
+        objeto = modelo(**valores)
+        db.add(objeto)
+        db.flush()
+        return objeto
+
+    return _crear
@@ -0,0 +1,72 @@
+"""Asignación de lotes por FEFO / FIFO (LoteCRUD.asignar_lotes)"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import models
+from crud import lote_crud
+
+
+@pytest.fixture
+def lotes(db, crear):
+    """Un producto con un lote vencido y tres vigentes de 5 unidades cada uno"""
+    producto = crear(models.Producto, sku="SKU-1", nombre_producto="Producto 1")
+    hoy = date.today()
+    ids = {}
+    # numero: (fecha_creacion, fecha_vencimiento)
+    for numero, creado, vence in (("VENCIDO", datetime(2025, 12, 1), hoy - timedelta(days=1)),
+                                  ("ANTIGUO", datetime(2026, 1, 1), hoy + timedelta(days=400)),
+                                  ("PROXIMO", datetime(2026, 2, 1), hoy + timedelta(days=30)),
+                                  ("SIN_VENC", datetime(2026, 3, 1), None)):
+        lote = crear(models.Lote, id_producto=producto.id_producto, numero_lote=numero, cantidad_inicial=5,
+                     cantidad_actual=5, estado="ACTIVO", fecha_creacion=creado, fecha_vencimiento=vence)
+        ids[numero] = lote.id_lote
+    db.commit()
+    return producto.id_producto, ids
+
+
+def _picks(resultado):
+    return [(pick["id_lote"], pick["cantidad"]) for pick in resultado["lineas"][0]["lotes"]]
+
+
+def test_fefo_toma_primero_el_vencimiento_mas_cercano(db, lotes):
+    id_producto, ids = lotes
+
+    resultado = lote_crud.asignar_lotes(db, [{"id_producto": id_producto, "cantidad": 12}], "FEFO", simular=True)
+
+    assert _picks(resultado) == [(ids["PROXIMO"], 5), (ids["ANTIGUO"], 5), (ids["SIN_VENC"], 2)]
+
+
+def test_fifo_toma_primero_el_lote_mas_antiguo_sin_usar_vencidos(db, lotes):
+    id_producto, ids = lotes
+
+    resultado = lote_crud.asignar_lotes(db, [{"id_producto": id_producto, "cantidad": 8}], "FIFO")
+
+    assert _picks(resultado) == [(ids["ANTIGUO"], 5), (ids["PROXIMO"], 3)]
+    actuales = dict(db.query(models.Lote.id_lote, models.Lote.cantidad_actual))
+    assert actuales == {ids["VENCIDO"]: 5, ids["ANTIGUO"]: 0, ids["PROXIMO"]: 2, ids["SIN_VENC"]: 5}
+    assert db.get(models.Lote, ids["ANTIGUO"]).estado == "AGOTADO"
+
+
+def test_faltante_rechaza_sin_descontar(db, lotes):
+    id_producto, ids = lotes
+
+    with pytest.raises(ValueError, match=rf"Stock en lotes insuficiente: producto {id_producto} \(1\)"):
+        lote_crud.asignar_lotes(db, [{"id_producto": id_producto, "cantidad": 16}])
+
+    assert {cantidad for _, cantidad in db.query(models.Lote.id_lote, models.Lote.cantidad_actual)} == {5}
+
+    parcial = lote_crud.asignar_lotes(db, [{"id_producto": id_producto, "cantidad": 16}], permitir_parcial=True)
+    assert parcial["completo"] is False
+    assert parcial["lineas"][0]["cantidad_asignada"] == 15
+
+
+def test_faltante_con_commit_false_no_deshace_la_transaccion_del_llamador(db, crear, lotes):
+    id_producto, _ = lotes
+    crear(models.Producto, sku="SKU-PENDIENTE", nombre_producto="Sin confirmar")
+
+    with pytest.raises(ValueError, match="insuficiente"):
+        lote_crud.asignar_lotes(db, [{"id_producto": id_producto, "cantidad": 16}], commit=False)
+
+    assert db.query(models.Producto).filter(models.Producto.sku == "SKU-PENDIENTE").count() == 1
@@ -0,0 +1,78 @@
+"""Consumo de capas de costo FIFO (CapaCostoCRUD.consumir)"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import models
+from crud import capa_costo_crud
+
+
+@pytest.fixture
+def capas(db, crear):
+    """Producto 1 con tres capas en dos bodegas; producto 2 sin capas y costo promedio 7"""
+    bodegas = [crear(models.Bodega, codigo_bodega=f"B{i}", nombre_bodega=f"Bodega {i}").id_bodega for i in (1, 2)]
+    p1 = crear(models.Producto, sku="SKU-1", nombre_producto="Producto 1", costo_promedio=Decimal("18")).id_producto
+    p2 = crear(models.Producto, sku="SKU-2", nombre_producto="Producto 2", costo_promedio=Decimal("7")).id_producto
+    ids = {}
+    # nombre: (bodega, día de entrada, cantidad, costo)
+    for nombre, bodega, dia, cantidad, costo in (("A", 0, 1, 3, 10), ("B", 1, 2, 5, 20), ("C", 0, 3, 4, 30)):
+        ids[nombre] = crear(models.CapaCosto, id_producto=p1, id_bodega=bodegas[bodega],
+                            fecha_entrada=datetime(2026, 1, dia), cantidad_inicial=cantidad,
+                            cantidad_restante=cantidad, costo_unitario=costo, origen="REC").id_capa
+    db.commit()
+    return p1, p2, bodegas, ids
+
+
+def _restantes(db):
+    return {id_capa: float(restante) for id_capa, restante in
+            db.query(models.CapaCosto.id_capa, models.CapaCosto.cantidad_restante)}
+
+
+def _consumos(db):
+    return [(fila.id_capa, float(fila.cantidad), float(fila.costo_unitario)) for fila in
+            db.query(models.ConsumoCapa).order_by(models.ConsumoCapa.id_consumo)]
+
+
+def test_consumir_toma_las_capas_mas_antiguas(db, capas):
+    p1, _, _, ids = capas
+
+    costos = capa_costo_crud.consumir(db, [{"id_producto": p1, "cantidad": 5}], "DSP", "DSP-1", id_obra=9)
+
+    assert float(costos[p1]) == 3 * 10 + 2 * 20
+    assert _restantes(db) == {ids["A"]: 0, ids["B"]: 3, ids["C"]: 4}
+    assert _consumos(db) == [(ids["A"], 3, 10), (ids["B"], 2, 20)]
+    assert {(c.origen, c.referencia, c.id_obra) for c in db.query(models.ConsumoCapa)} == {("DSP", "DSP-1", 9)}
+
+
+def test_consumir_prefiere_las_capas_de_su_bodega(db, capas):
+    p1, _, (b1, _), ids = capas
+
+    costos = capa_costo_crud.consumir(db, [{"id_producto": p1, "cantidad": 5, "id_bodega": b1}], "MOV")
+
+    # A y C son de la bodega 1: se consumen en orden FIFO antes que B
+    assert float(costos[p1]) == 3 * 10 + 2 * 30
+    assert _restantes(db) == {ids["A"]: 0, ids["B"]: 5, ids["C"]: 2}
+
+
+def test_consumir_sin_capas_suficientes_usa_el_costo_promedio(db, capas):
+    p1, p2, _, ids = capas
+
+    costos = capa_costo_crud.consumir(db, [
+        {"id_producto": p1, "cantidad": 15},
+        {"id_producto": p2, "cantidad": 4},
+    ], "DSP")
+
+    # 12 unidades en capas (3 * 10 + 5 * 20 + 4 * 30) y 3 al promedio (18)
+    assert float(costos[p1]) == 250 + 3 * 18
+    assert float(costos[p2]) == 4 * 7
+    assert _restantes(db) == {ids["A"]: 0, ids["B"]: 0, ids["C"]: 0}
+    assert _consumos(db) == [(ids["A"], 3, 10), (ids["B"], 5, 20), (ids["C"], 4, 30), (None, 3, 18), (None, 4, 7)]
+
+
+def test_consumir_ignora_cantidades_no_positivas(db, capas):
+    p1, _, _, _ = capas
+
+    assert capa_costo_crud.consumir(db, [{"id_producto": p1, "cantidad": 0}], "DSP") == {}
+    assert db.query(models.ConsumoCapa).count() == 0
@@ -0,0 +1,107 @@
+"""Ajustes de inventario desde conteos físicos (ConteosFisicosCRUD.generar_ajustes)"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import models
+from crud import conteos_fisicos_crud
+
+
+@pytest.fixture
+def conteo(db, crear):
+    """Programación EN_PROCESO con un sobrante, un faltante, un conteo sin diferencia y uno de obra"""
+    tipos = {codigo: crear(models.TipoMovimiento, codigo_tipo=codigo, nombre_tipo=codigo).id_tipo_movimiento
+             for codigo in ("AJP", "AJN")}
+    bodega = crear(models.Bodega, codigo_bodega="A", nombre_bodega="Central")
+    pasillo = crear(models.Pasillo, id_bodega=bodega.id_bodega, numero_pasillo=1)
+    estante = crear(models.Estante, id_pasillo=pasillo.id_pasillo, codigo_estante="E1")
+    p1 = crear(models.Producto, sku="SKU-1", nombre_producto="Producto 1", stock_actual=10,
+               costo_promedio=Decimal("5")).id_producto
+    p2 = crear(models.Producto, sku="SKU-2", nombre_producto="Producto 2", stock_actual=3,
+               costo_promedio=Decimal("2")).id_producto
+    u1 = crear(models.ProductoUbicacion, id_producto=p1, id_estante=estante.id_estante, cantidad=8).id_ubicacion
+    u2 = crear(models.ProductoUbicacion, id_producto=p2, id_estante=estante.id_estante, cantidad=3).id_ubicacion
+    id_obra = crear(models.Obra, codigo_obra="OB-1", nombre_obra="Obra 1").id_obra
+    crear(models.InventarioObra, id_obra=id_obra, id_producto=p1, cantidad_actual=4)
+    programacion = crear(models.ProgramacionConteos, nombre_conteo="Conteo", fecha_programada=date(2026, 10, 19),
+                         tipo_conteo="COMPLETO", estado="EN_PROCESO", id_usuario_responsable=1).id_programacion
+    conteos = {}
+    # nombre: (producto, ubicación, obra, sistema, física)
+    for nombre, valores in {"sobrante": (p1, u1, None, 8, 10), "faltante": (p2, u2, None, 3, 1),
+                            "exacto": (p1, None, None, 10, 10), "obra": (p1, None, id_obra, 4, 6)}.items():
+        id_producto, id_ubicacion, obra, sistema, fisica = valores
+        conteos[nombre] = crear(models.ConteosFisicos, id_programacion=programacion, id_producto=id_producto,
+                                id_ubicacion=id_ubicacion, id_obra=obra, cantidad_sistema=sistema,
+                                cantidad_fisica=fisica, id_usuario_contador=1, ajuste_procesado=False).id_conteo
+    db.commit()
+    return programacion, tipos, (p1, p2), (u1, u2), id_obra, conteos
+
+
+def _stock(db):
+    productos = dict(db.query(models.Producto.id_producto, models.Producto.stock_actual))
+    ubicaciones = dict(db.query(models.ProductoUbicacion.id_ubicacion, models.ProductoUbicacion.cantidad))
+    obra = dict(db.query(models.InventarioObra.id_producto, models.InventarioObra.cantidad_actual))
+    return productos, ubicaciones, obra
+
+
+def test_generar_ajustes_crea_ajp_y_ajn(db, conteo):
+    programacion, tipos, (p1, p2), (u1, u2), _, conteos = conteo
+
+    resultado = conteos_fisicos_crud.generar_ajustes(db, programacion, id_usuario=1)
+
+    assert (resultado["conteos_ajustados"], resultado["ajustes_obra"]) == (3, 1)
+    assert (resultado["unidades_sumadas"], resultado["unidades_restadas"]) == (2, 2)
+    movimientos = {movimiento["codigo_tipo"]: movimiento["id_movimiento"] for movimiento in resultado["movimientos"]}
+    assert set(movimientos) == {"AJP", "AJN"}
+    tipo_por_movimiento = dict(db.query(models.MovimientoInventario.id_movimiento,
+                                        models.MovimientoInventario.id_tipo_movimiento))
+    assert tipo_por_movimiento == {movimientos["AJP"]: tipos["AJP"], movimientos["AJN"]: tipos["AJN"]}
+
+    detalle = sorted((fila.id_movimiento, fila.id_producto, fila.id_ubicacion_origen, fila.id_ubicacion_destino,
+                      fila.cantidad, float(fila.costo_unitario)) for fila in db.query(models.MovimientoDetalle))
+    assert detalle == sorted([(movimientos["AJP"], p1, None, u1, 2, 5.0), (movimientos["AJN"], p2, u2, None, 2, 2.0)])
+
+    assert _stock(db) == ({p1: 12, p2: 1}, {u1: 10, u2: 1}, {p1: 6})
+    disponibles = dict(db.query(models.DisponibilidadProducto.id_producto, models.DisponibilidadProducto.en_mano)
+                       .filter(models.DisponibilidadProducto.id_ubicacion == 0))
+    assert disponibles == {p1: 12, p2: 1}
+    # El sobrante entra como capa al costo promedio; el faltante se consume (sin capas, al promedio)
+    assert [(c.id_producto, float(c.cantidad_inicial), float(c.costo_unitario), c.origen)
+            for c in db.query(models.CapaCosto)] == [(p1, 2.0, 5.0, "AJU")]
+    assert [(c.id_producto, float(c.cantidad), c.id_capa) for c in db.query(models.ConsumoCapa)] == [(p2, 2.0, None)]
+
+    procesados = {fila.id_conteo: (fila.ajuste_procesado, fila.id_movimiento_ajuste)
+                  for fila in db.query(models.ConteosFisicos)}
+    assert procesados == {
+        conteos["sobrante"]: (True, movimientos["AJP"]),
+        conteos["faltante"]: (True, movimientos["AJN"]),
+        conteos["exacto"]: (False, None),
+        conteos["obra"]: (True, None),
+    }
+    historial = db.query(models.InventarioObraHistorial.cantidad_cambio, models.InventarioObraHistorial.referencia).all()
+    assert historial == [(2, f"CONTEO-{programacion}")]
+
+
+def test_generar_ajustes_dos_veces_no_vuelve_a_aplicar(db, conteo):
+    programacion, _, _, _, _, _ = conteo
+    conteos_fisicos_crud.generar_ajustes(db, programacion, id_usuario=1)
+    despues = _stock(db)
+
+    segundo = conteos_fisicos_crud.generar_ajustes(db, programacion, id_usuario=1)
+
+    assert (segundo["conteos_ajustados"], segundo["ajustes_obra"], segundo["movimientos"]) == (0, 0, [])
+    assert _stock(db) == despues
+    assert db.query(models.MovimientoInventario).count() == 2
+    assert db.query(models.InventarioObraHistorial).count() == 1
+
+
+def test_generar_ajustes_exige_conteo_en_proceso_o_completado(db, conteo):
+    programacion, _, _, _, _, _ = conteo
+    db.get(models.ProgramacionConteos, programacion).estado = "PROGRAMADO"
+    db.commit()
+
+    with pytest.raises(ValueError, match="EN_PROCESO o COMPLETADO"):
+        conteos_fisicos_crud.generar_ajustes(db, programacion, id_usuario=1)
+    assert db.query(models.MovimientoInventario).count() == 0
@@ -0,0 +1,108 @@
+"""Snapshot de conteos y captura en lote (tomar_snapshot / capturar_lote)"""
+
+from datetime import date
+
+import pytest
+
+import models
+from crud import conteos_fisicos_crud, programacion_conteos_crud
+
+
+@pytest.fixture
+def bodega(db, crear):
+    """Dos productos con una ubicación activa cada uno y una ubicación inactiva"""
+    bodega = crear(models.Bodega, codigo_bodega="A", nombre_bodega="Central")
+    pasillo = crear(models.Pasillo, id_bodega=bodega.id_bodega, numero_pasillo=1)
+    estante = crear(models.Estante, id_pasillo=pasillo.id_pasillo, codigo_estante="E1")
+    p1 = crear(models.Producto, sku="SKU-1", nombre_producto="Producto 1", stock_actual=10).id_producto
+    p2 = crear(models.Producto, sku="SKU-2", nombre_producto="Producto 2", stock_actual=3).id_producto
+    u1 = crear(models.ProductoUbicacion, id_producto=p1, id_estante=estante.id_estante, cantidad=8).id_ubicacion
+    u2 = crear(models.ProductoUbicacion, id_producto=p2, id_estante=estante.id_estante, cantidad=3).id_ubicacion
+    crear(models.ProductoUbicacion, id_producto=p2, id_estante=estante.id_estante, cantidad=5, activo=False)
+    db.commit()
+    return p1, p2, u1, u2
+
+
+def _iniciar(db, crear, tipo_conteo="COMPLETO", **valores):
+    programacion = crear(models.ProgramacionConteos, nombre_conteo="Conteo", fecha_programada=date(2026, 10, 19),
+                         tipo_conteo=tipo_conteo, estado="PROGRAMADO", id_usuario_responsable=1, **valores)
+    db.commit()
+    return programacion_conteos_crud.iniciar_conteo(db, programacion.id_programacion)
+
+
+def _snapshot(db, id_programacion):
+    filas = [(fila.id_producto, fila.id_ubicacion, fila.id_obra, fila.cantidad_sistema)
+             for fila in db.query(models.ConteoSnapshot).filter(models.ConteoSnapshot.id_programacion == id_programacion)]
+    return sorted(filas, key=lambda fila: tuple(valor or 0 for valor in fila))
+
+
+def test_iniciar_conteo_congela_ubicaciones_activas_y_stock_total(db, crear, bodega):
+    p1, p2, u1, u2 = bodega
+
+    programacion = _iniciar(db, crear)
+
+    esperado = [(p1, None, None, 10), (p1, u1, None, 8), (p2, None, None, 3), (p2, u2, None, 3)]
+    assert _snapshot(db, programacion.id_programacion) == esperado
+    # Un segundo snapshot de la misma programación no agrega filas
+    assert programacion_conteos_crud.tomar_snapshot(db, programacion) == 0
+    assert _snapshot(db, programacion.id_programacion) == esperado
+
+
+def test_snapshot_de_obra_usa_el_inventario_de_la_obra(db, crear, bodega):
+    p1, p2, _, _ = bodega
+    obras = [crear(models.Obra, codigo_obra=f"OB-{i}", nombre_obra=f"Obra {i}").id_obra for i in (1, 2)]
+    crear(models.InventarioObra, id_obra=obras[0], id_producto=p1, cantidad_actual=4)
+    crear(models.InventarioObra, id_obra=obras[1], id_producto=p2, cantidad_actual=6)
+
+    programacion = _iniciar(db, crear, tipo_conteo="OBRA", id_obra=obras[0])
+
+    assert _snapshot(db, programacion.id_programacion) == [(p1, None, obras[0], 4)]
+
+
+def test_capturar_lote_compara_contra_el_snapshot(db, crear, bodega):
+    p1, p2, u1, u2 = bodega
+    programacion = _iniciar(db, crear)
+    # Movimientos posteriores al inicio no cambian la cantidad del sistema del conteo
+    db.get(models.ProductoUbicacion, u1).cantidad = 2
+    db.commit()
+
+    resultado = conteos_fisicos_crud.capturar_lote(db, programacion.id_programacion, [
+        {"id_producto": p1, "id_ubicacion": u1, "cantidad_fisica": 7},
+        {"id_producto": p2, "id_ubicacion": u2, "cantidad_fisica": 1},
+        {"id_producto": p2, "id_ubicacion": u2, "cantidad_fisica": 3},
+        {"id_producto": p1, "id_ubicacion": u2, "cantidad_fisica": 1},
+    ], id_usuario_contador=5)
+
+    assert resultado["lineas_recibidas"] == 4
+    assert (resultado["insertados"], resultado["actualizados"], resultado["rechazados"]) == (2, 0, 1)
+    assert (resultado["faltantes"], resultado["unidades_faltantes"]) == (1, 1)
+    assert (resultado["sobrantes"], resultado["unidades_sobrantes"]) == (1, 1)
+    conteos = {(fila.id_producto, fila.id_ubicacion): (fila.cantidad_sistema, fila.cantidad_fisica)
+               for fila in db.query(models.ConteosFisicos)}
+    assert conteos == {(p1, u1): (8, 7), (p2, u2): (3, 4)}
+
+
+def test_capturar_lote_repetido_no_duplica_conteos(db, crear, bodega):
+    p1, _, u1, _ = bodega
+    programacion = _iniciar(db, crear)
+    lote = [{"id_producto": p1, "id_ubicacion": u1, "cantidad_fisica": 7}]
+
+    conteos_fisicos_crud.capturar_lote(db, programacion.id_programacion, lote, id_usuario_contador=5)
+    reenvio = conteos_fisicos_crud.capturar_lote(db, programacion.id_programacion, lote, id_usuario_contador=6)
+    assert (reenvio["insertados"], reenvio["actualizados"]) == (0, 1)
+    assert [(c.cantidad_fisica, c.id_usuario_contador) for c in db.query(models.ConteosFisicos)] == [(7, 6)]
+
+    conteos_fisicos_crud.capturar_lote(db, programacion.id_programacion, lote, id_usuario_contador=6, acumular=True)
+    assert [c.cantidad_fisica for c in db.query(models.ConteosFisicos)] == [14]
+    assert db.query(models.ConteoSnapshot).count() == 4
+
+
+def test_capturar_lote_exige_conteo_en_proceso(db, crear, bodega):
+    p1, _, _, _ = bodega
+    programacion = crear(models.ProgramacionConteos, nombre_conteo="Conteo", fecha_programada=date(2026, 10, 19),
+                         tipo_conteo="COMPLETO", estado="PROGRAMADO", id_usuario_responsable=1)
+    db.commit()
+
+    with pytest.raises(ValueError, match="EN_PROCESO"):
+        conteos_fisicos_crud.capturar_lote(db, programacion.id_programacion,
+                                           [{"id_producto": p1, "cantidad_fisica": 1}], id_usuario_contador=5)
@@ -0,0 +1,70 @@
+"""Costo promedio ponderado en entradas (CostoPromedioCRUD.aplicar_entradas)"""
+
+from decimal import Decimal
+
+import pytest
+
+import models
+from crud import costo_promedio_crud
+
+
+@pytest.fixture
+def productos(db, crear):
+    """(stock, costo): con stock, sin stock con costo previo, en negativo y nuevo"""
+    ids = []
+    for indice, (stock, costo) in enumerate(((10, "5"), (0, "99"), (-2, "50"), (0, None)), start=1):
+        ids.append(crear(models.Producto, sku=f"SKU-{indice}", nombre_producto=f"Producto {indice}", stock_actual=stock,
+                         costo_promedio=Decimal(costo) if costo else None).id_producto)
+    db.commit()
+    return ids
+
+
+def _estado(db):
+    return {fila.id_producto: (fila.stock_actual, float(fila.costo_promedio) if fila.costo_promedio is not None else None)
+            for fila in db.query(models.Producto.id_producto, models.Producto.stock_actual, models.Producto.costo_promedio)}
+
+
+def test_aplicar_entradas_promedia_y_suma_stock(db, productos):
+    p1, p2, p3, p4 = productos
+
+    actualizados = costo_promedio_crud.aplicar_entradas(db, [
+        {"id_producto": p1, "cantidad": 10, "costo_unitario": Decimal("8")},
+        {"id_producto": p2, "cantidad": 4, "costo_unitario": Decimal("3")},
+        {"id_producto": p3, "cantidad": 4, "costo_unitario": Decimal("6")},
+        # Dos entradas del mismo producto a costos distintos: (2 * 10 + 6 * 2) / 8
+        {"id_producto": p4, "cantidad": 2, "costo_unitario": Decimal("10")},
+        {"id_producto": p4, "cantidad": 6, "costo_unitario": Decimal("2")},
+    ])
+    db.commit()
+
+    assert actualizados == 4
+    assert _estado(db) == {
+        p1: (20, pytest.approx(6.5)),  # (10 * 5 + 10 * 8) / 20
+        p2: (4, pytest.approx(3)),     # sin stock el costo anterior no pesa
+        p3: (2, pytest.approx(6)),     # el stock negativo cuenta como cero
+        p4: (8, pytest.approx(4)),
+    }
+
+
+def test_aplicar_entradas_ignora_lineas_sin_cantidad_o_costo(db, productos):
+    p1, p2, _, _ = productos
+    antes = _estado(db)
+
+    actualizados = costo_promedio_crud.aplicar_entradas(db, [
+        {"id_producto": p1, "cantidad": 0, "costo_unitario": Decimal("8")},
+        {"id_producto": p1, "cantidad": -3, "costo_unitario": Decimal("8")},
+        {"id_producto": p2, "cantidad": 5, "costo_unitario": None},
+    ])
+
+    assert actualizados == 0
+    assert _estado(db) == antes
+
+
+def test_aplicar_entradas_sin_sumar_stock(db, productos):
+    p1, _, _, _ = productos
+
+    costo_promedio_crud.aplicar_entradas(db, [{"id_producto": p1, "cantidad": 10, "costo_unitario": Decimal("8")}],
+                                         sumar_stock=False)
+    db.commit()
+
+    assert _estado(db)[p1] == (10, pytest.approx(6.5))
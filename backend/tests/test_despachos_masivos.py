@@ -0,0 +1,96 @@
+"""Despacho a obra en bloque (DespachosObraCRUD.despachar_masivo)"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+import models
+import schemas
+from crud import despachos_obra_crud
+from utils import startup
+
+
+@pytest.fixture
+def bodega(db, crear):
+    """Tipo DSO, una obra y dos productos con stock en una ubicación"""
+    crear(models.TipoMovimiento, codigo_tipo="DSO", nombre_tipo="Despacho a Obra")
+    obra = crear(models.Obra, codigo_obra="OB-1", nombre_obra="Obra 1")
+    bodega = crear(models.Bodega, codigo_bodega="A", nombre_bodega="Central")
+    pasillo = crear(models.Pasillo, id_bodega=bodega.id_bodega, numero_pasillo=1)
+    estante = crear(models.Estante, id_pasillo=pasillo.id_pasillo, codigo_estante="E1")
+    productos, ubicaciones = [], []
+    for indice in (1, 2):
+        producto = crear(models.Producto, sku=f"SKU-{indice}", nombre_producto=f"Producto {indice}",
+                         stock_actual=10, costo_promedio=Decimal("5"))
+        ubicacion = crear(models.ProductoUbicacion, id_producto=producto.id_producto,
+                          id_estante=estante.id_estante, cantidad=10)
+        productos.append(producto.id_producto)
+        ubicaciones.append(ubicacion.id_ubicacion)
+    db.commit()
+    return obra.id_obra, productos, ubicaciones
+
+
+def _solicitud(id_obra, lineas):
+    return schemas.DespachoMasivoCreate(
+        id_obra=id_obra, fecha_despacho=date(2026, 10, 19), id_usuario_despacha=1,
+        lineas=[schemas.DespachoMasivoLinea(id_producto=id_producto, cantidad=cantidad)
+                for id_producto, cantidad in lineas]
+    )
+
+
+def test_despachar_masivo_descuenta_bodega_e_ingresa_en_obra(db, bodega):
+    id_obra, (p1, p2), (u1, u2) = bodega
+
+    resultado = despachos_obra_crud.despachar_masivo(db, _solicitud(id_obra, [(p1, 4), (p2, 3), (p1, 1)]))
+
+    assert resultado["numero_despacho"] == "DSP-2026-000001"
+    assert resultado["lineas"] == 3
+    assert resultado["unidades"] == 8
+    assert db.query(models.DespachosObraDetalle).count() == 3
+
+    stock = dict(db.query(models.Producto.id_producto, models.Producto.stock_actual))
+    assert stock == {p1: 5, p2: 7}
+    en_ubicacion = dict(db.query(models.ProductoUbicacion.id_ubicacion, models.ProductoUbicacion.cantidad))
+    assert en_ubicacion == {u1: 5, u2: 7}
+    en_obra = dict(db.query(models.InventarioObra.id_producto, models.InventarioObra.cantidad_actual)
+                   .filter(models.InventarioObra.id_obra == id_obra))
+    assert en_obra == {p1: 5, p2: 3}
+
+    kardex = (db.query(models.MovimientoDetalle.id_ubicacion_origen, models.MovimientoDetalle.cantidad)
+              .filter(models.MovimientoDetalle.id_movimiento == resultado["id_movimiento"]).all())
+    assert sorted(kardex) == [(u1, 1), (u1, 4), (u2, 3)]
+    disponibles = dict(db.query(models.DisponibilidadProducto.id_producto, models.DisponibilidadProducto.en_mano)
+                       .filter(models.DisponibilidadProducto.id_ubicacion == 0))
+    assert disponibles == {p1: 5, p2: 7}
+
+
+def test_despachar_masivo_sin_stock_suficiente_no_escribe_nada(db, bodega):
+    id_obra, (p1, p2), _ = bodega
+
+    with pytest.raises(ValueError, match="Stock insuficiente"):
+        despachos_obra_crud.despachar_masivo(db, _solicitud(id_obra, [(p1, 4), (p2, 11)]))
+
+    assert db.query(models.DespachosObra).count() == 0
+    assert db.query(models.DespachosObraDetalle).count() == 0
+    assert db.query(models.InventarioObra).count() == 0
+    assert db.query(models.MovimientoInventario).count() == 0
+    assert dict(db.query(models.Producto.id_producto, models.Producto.stock_actual)) == {p1: 10, p2: 10}
+
+
+def test_despachar_masivo_exige_la_migracion_en_mysql(db, bodega, monkeypatch):
+    id_obra, (p1, _), _ = bodega
+    monkeypatch.setattr(db.get_bind().dialect, "name", "mysql")
+    monkeypatch.setattr(startup, "_MIGRACIONES_CONFIRMADAS", set())
+    db.execute(text("CREATE TABLE schema_version (version INTEGER, descripcion TEXT)"))
+    db.execute(text("INSERT INTO schema_version VALUES (4, 'anterior')"))
+    db.commit()
+
+    with pytest.raises(RuntimeError, match="despachos_masivos.sql"):
+        despachos_obra_crud.despachar_masivo(db, _solicitud(id_obra, [(p1, 1)]))
+    assert db.query(models.DespachosObra).count() == 0
+
+    db.execute(text("INSERT INTO schema_version VALUES (5, 'despachos')"))
+    startup.requerir_migracion(db, 5, "despachos_masivos.sql")
+    assert startup._MIGRACIONES_CONFIRMADAS == {(str(db.get_bind().url), 5)}
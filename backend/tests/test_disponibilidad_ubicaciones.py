@@ -0,0 +1,56 @@
+"""Disponibilidad por ubicación al cambiar ProductoUbicacion desde sus endpoints"""
+
+import pytest
+
+import models
+from crud import disponibilidad_crud
+from routes.disponibilidad import obtener_disponibilidad_producto
+from routes.producto_ubicaciones import (
+    actualizar_cantidad, actualizar_ubicacion, crear_ubicacion, eliminar_ubicacion, toggle_estado_ubicacion
+)
+from schemas import ProductoUbicacionCreate, ProductoUbicacionUpdate
+
+
+@pytest.fixture
+def producto(db, crear):
+    """Producto con 10 en stock y dos estantes vacíos"""
+    bodega = crear(models.Bodega, codigo_bodega="A", nombre_bodega="Central")
+    pasillo = crear(models.Pasillo, id_bodega=bodega.id_bodega, numero_pasillo=1)
+    estantes = [crear(models.Estante, id_pasillo=pasillo.id_pasillo, codigo_estante=f"E{i}").id_estante for i in (1, 2)]
+    producto = crear(models.Producto, sku="SKU-1", nombre_producto="Producto 1", stock_actual=10)
+    db.commit()
+    return producto.id_producto, estantes
+
+
+def _en_mano_por_ubicacion(db, id_producto):
+    disponibilidad = obtener_disponibilidad_producto(id_producto, incluir_ubicaciones=True, db=db)
+    return {fila["id_ubicacion"]: fila["en_mano"] for fila in disponibilidad["ubicaciones"]}
+
+
+def test_cambios_de_ubicacion_se_reflejan_en_disponibilidad(db, producto):
+    id_producto, (e1, e2) = producto
+    assert _en_mano_por_ubicacion(db, id_producto) == {}
+
+    u1 = crear_ubicacion(ProductoUbicacionCreate(id_producto=id_producto, id_estante=e1, cantidad=6), db).id_ubicacion
+    u2 = crear_ubicacion(ProductoUbicacionCreate(id_producto=id_producto, id_estante=e2, cantidad=4), db).id_ubicacion
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 6, u2: 4}
+
+    actualizar_cantidad(u1, nueva_cantidad=3, db=db)
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 3, u2: 4}
+
+    actualizar_ubicacion(u2, ProductoUbicacionUpdate(cantidad=7), db)
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 3, u2: 7}
+
+    toggle_estado_ubicacion(u2, db)
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 3, u2: 0}
+    toggle_estado_ubicacion(u2, db)
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 3, u2: 7}
+
+    eliminar_ubicacion(u1, db)
+    assert _en_mano_por_ubicacion(db, id_producto) == {u1: 0, u2: 7}
+    # El total del producto sigue saliendo de stock_actual
+    assert obtener_disponibilidad_producto(id_producto, incluir_ubicaciones=False, db=db)["en_mano"] == 10
+
+    # Lo mantenido de forma incremental coincide con un recálculo desde origen
+    disponibilidad_crud.recalcular(db)
+    assert {u: c for u, c in _en_mano_por_ubicacion(db, id_producto).items() if c} == {u2: 7}
@@ -0,0 +1,43 @@
+"""Entrega de eventos por conexión SSE"""
+
+import asyncio
+
+from utils import eventos
+from utils.eventos import HubEventos
+
+
+def _evento(id_evento: int) -> dict:
+    return {"id": id_evento, "tema": "alertas", "tipo": "alerta_creada", "fecha": "2026-10-19T10:00:00", "datos": {}}
+
+
+def _recibidos(hub: HubEventos, lotes) -> list:
+    """Ids que la conexión envía al cliente para los lotes entregados en orden"""
+    async def _leer():
+        suscripcion = hub.suscribir()
+        for lote in lotes:
+            hub.entregar([_evento(id_evento) for id_evento in lote])
+        await asyncio.sleep(0)
+        enviados = []
+        while not suscripcion.cola.empty():
+            evento = suscripcion.cola.get_nowait()
+            if suscripcion.marcar_enviado(evento):
+                enviados.append(evento["id"])
+        hub.desuscribir(suscripcion)
+        return enviados
+
+    return asyncio.run(_leer())
+
+
+def test_id_menor_confirmado_despues_se_envia():
+    # BrokerDB publica el 41 después del 42 si su transacción confirmó más tarde
+    assert _recibidos(HubEventos(), [[40, 42], [41]]) == [40, 42, 41]
+
+
+def test_id_repetido_no_se_reenvia():
+    assert _recibidos(HubEventos(), [[40, 41], [41, 42]]) == [40, 41, 42]
+
+
+def test_ids_enviados_acotados(monkeypatch):
+    monkeypatch.setattr(eventos, "IDS_ENVIADOS_CONEXION", 3)
+    # El 1 ya salió de la ventana de ids recordados
+    assert _recibidos(HubEventos(), [[1, 2, 3, 4], [1, 4]]) == [1, 2, 3, 4, 1]
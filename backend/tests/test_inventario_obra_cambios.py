@@ -0,0 +1,53 @@
+"""Cambios de stock en obra en bloque (InventarioObraCRUD.aplicar_cambios_stock)"""
+
+import pytest
+
+import models
+from crud import inventario_obra_crud
+
+
+@pytest.fixture
+def obra(db, crear):
+    """Una obra con dos productos ya en inventario (5 y 2) y dos sin fila"""
+    id_obra = crear(models.Obra, codigo_obra="OB-1", nombre_obra="Obra 1").id_obra
+    productos = [crear(models.Producto, sku=f"SKU-{i}", nombre_producto=f"Producto {i}").id_producto
+                 for i in range(1, 5)]
+    for id_producto, cantidad in zip(productos, (5, 2)):
+        crear(models.InventarioObra, id_obra=id_obra, id_producto=id_producto, cantidad_actual=cantidad)
+    db.commit()
+    return id_obra, productos
+
+
+@pytest.mark.parametrize("con_upsert", [True, False], ids=["upsert", "sin_upsert"])
+def test_aplicar_cambios_stock(db, obra, monkeypatch, con_upsert):
+    id_obra, (p1, p2, p3, p4) = obra
+    if not con_upsert:
+        # Dialecto sin upsert: UPDATE de las filas existentes e INSERT de las nuevas
+        monkeypatch.setattr("utils.upsert.upsert", lambda *args, **kwargs: False)
+
+    afectados = inventario_obra_crud.aplicar_cambios_stock(db, [
+        {"id_obra": id_obra, "id_producto": p1, "cantidad_cambio": 3, "motivo": "Despacho", "referencia": "DSP-1"},
+        {"id_obra": id_obra, "id_producto": p1, "cantidad_cambio": -1, "motivo": "Consumo"},
+        {"id_obra": id_obra, "id_producto": p2, "cantidad_cambio": -5, "motivo": "Consumo"},
+        {"id_obra": id_obra, "id_producto": p3, "cantidad_cambio": 4, "motivo": "Despacho"},
+        {"id_obra": id_obra, "id_producto": p4, "cantidad_cambio": -2, "motivo": "x" * 250},
+    ])
+
+    assert afectados == 4
+    cantidades = dict(db.query(models.InventarioObra.id_producto, models.InventarioObra.cantidad_actual))
+    # p1 suma los dos cambios; p2 y p4 (fila nueva) no quedan en negativo
+    assert cantidades == {p1: 7, p2: 0, p3: 4, p4: 0}
+    assert all(fila.fecha_ultimo_movimiento is not None for fila in db.query(models.InventarioObra))
+
+    historial = (db.query(models.InventarioObraHistorial.id_producto, models.InventarioObraHistorial.cantidad_cambio,
+                          models.InventarioObraHistorial.motivo, models.InventarioObraHistorial.referencia)
+                 .order_by(models.InventarioObraHistorial.id_historial).all())
+    assert historial == [
+        (p1, 3, "Despacho", "DSP-1"), (p1, -1, "Consumo", None), (p2, -5, "Consumo", None),
+        (p3, 4, "Despacho", None), (p4, -2, "x" * 200, None),
+    ]
+
+
+def test_aplicar_cambios_stock_sin_cambios_no_escribe(db, obra):
+    assert inventario_obra_crud.aplicar_cambios_stock(db, []) == 0
+    assert db.query(models.InventarioObraHistorial).count() == 0
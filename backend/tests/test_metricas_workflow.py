@@ -0,0 +1,101 @@
+"""Tiempos del workflow de OC (MetricasWorkflowCRUD)"""
+
+from datetime import date, datetime
+
+import pytest
+
+import models
+from crud import MetricasWorkflowCRUD
+
+
+@pytest.fixture
+def historial(db, crear):
+    """Dos OC de proveedores distintos creadas el 1 de marzo con sus cambios de estado
+
+    OC 1: PENDIENTE a las 12 h (12 h), APROBADA 24 h después y ENVIADA 48 h después.
+    OC 2: PENDIENTE a las 6 h (6 h) y APROBADA 48 h después.
+    Los cambios a APROBADA no registran el estado anterior: lo aporta LAG().
+    """
+    estados = {codigo: crear(models.EstadoOrdenCompra, codigo_estado=codigo, nombre_estado=codigo).id_estado
+               for codigo in ("PENDIENTE", "APROBADA", "ENVIADA")}
+    proveedores = [crear(models.Proveedor, codigo_proveedor=f"P{i}", nombre_proveedor=f"Proveedor {i}").id_proveedor
+                   for i in (1, 2)]
+    cambios = (
+        (proveedores[0], [(datetime(2026, 3, 1, 12), None, "PENDIENTE"), (datetime(2026, 3, 2, 12), None, "APROBADA"),
+                          (datetime(2026, 3, 4, 12), "APROBADA", "ENVIADA")]),
+        (proveedores[1], [(datetime(2026, 3, 1, 6), None, "PENDIENTE"), (datetime(2026, 3, 3, 6), None, "APROBADA")]),
+    )
+    for numero, (id_proveedor, lista) in enumerate(cambios, start=1):
+        orden = crear(models.OrdenCompra, numero_orden=f"OC-{numero}", id_proveedor=id_proveedor,
+                      fecha_orden=date(2026, 3, 1), fecha_creacion=datetime(2026, 3, 1), activo=True)
+        for fecha, anterior, nuevo in lista:
+            crear(models.HistorialEstadosOc, id_orden_compra=orden.id_orden_compra, fecha_cambio=fecha,
+                  id_estado_anterior=estados[anterior] if anterior else None, id_estado_nuevo=estados[nuevo])
+    db.commit()
+    return proveedores
+
+
+def _por_transicion(resultado):
+    return {(fila["estado_anterior"], fila["estado_nuevo"]): fila for fila in resultado["transiciones"]}
+
+
+def test_duraciones_con_lag_desde_el_cambio_anterior(db, historial):
+    # El rango excluye los cambios a PENDIENTE, pero APROBADA mide desde ellos
+    resultado = MetricasWorkflowCRUD().get_metricas(db, date(2026, 3, 2), date(2026, 3, 10))
+
+    assert resultado["dias_consolidados"] == 0
+    assert resultado["transiciones_analizadas"] == 3
+    transiciones = _por_transicion(resultado)
+    assert set(transiciones) == {("PENDIENTE", "APROBADA"), ("APROBADA", "ENVIADA")}
+    aprobacion = transiciones[("PENDIENTE", "APROBADA")]
+    assert (aprobacion["cantidad"], aprobacion["promedio_dias"]) == (2, 1.5)
+    assert (aprobacion["minimo_dias"], aprobacion["maximo_dias"]) == (1.0, 2.0)
+    assert transiciones[("APROBADA", "ENVIADA")]["promedio_dias"] == 2.0
+
+    tiempos = resultado["tiempos_promedio_dias"]
+    assert tiempos["orden_a_aprobacion"] == 1.5
+    assert tiempos["aprobacion_a_recepcion"] == 2.0
+    assert tiempos["total_workflow"] == 3.5
+
+
+def test_primer_cambio_mide_desde_la_creacion_y_por_proveedor(db, historial):
+    p1, p2 = historial
+
+    resultado = MetricasWorkflowCRUD().get_metricas(db, date(2026, 3, 1), date(2026, 3, 1), por_proveedor=True)
+
+    # 12 h y 6 h desde fecha_creacion
+    assert _por_transicion(resultado)[(None, "PENDIENTE")]["promedio_dias"] == round(9 / 24, 2)
+    por_proveedor = {fila["id_proveedor"]: fila["tiempos_promedio_dias"]["orden_a_aprobacion"]
+                     for fila in resultado["por_proveedor"]}
+    assert por_proveedor == {p1: 0.5, p2: 0.25}
+
+
+def test_dias_consolidados_dan_el_mismo_resultado(db, historial):
+    metricas = MetricasWorkflowCRUD()
+    calculado = metricas.get_metricas(db, date(2026, 3, 2), date(2026, 3, 10))
+
+    metricas.consolidar(db, date(2026, 3, 1), date(2026, 3, 10))
+    consolidado = metricas.get_metricas(db, date(2026, 3, 2), date(2026, 3, 10))
+
+    assert (consolidado["dias_consolidados"], consolidado["dias_calculados"]) == (9, 0)
+    assert consolidado["tiempos_promedio_dias"] == calculado["tiempos_promedio_dias"]
+    assert consolidado["transiciones"] == calculado["transiciones"]
+
+
+def test_percentil_interpola_dentro_del_tramo():
+    metricas = MetricasWorkflowCRUD()
+    tramos = [{"cantidad": 4, "minimo": 0, "maximo": 100}, {"cantidad": 6, "minimo": 200, "maximo": 800}]
+
+    assert metricas._percentil(tramos, 20) == pytest.approx(50)    # 2 de 4 en el primer tramo
+    assert metricas._percentil(tramos, 50) == pytest.approx(300)   # 1 de 6 en el segundo
+    assert metricas._percentil(tramos, 90) == pytest.approx(700)   # 5 de 6
+    assert metricas._percentil(tramos, 100) == pytest.approx(800)
+    assert metricas._percentil([], 50) == 0.0
+
+
+def test_percentiles_por_transicion(db, historial):
+    resultado = MetricasWorkflowCRUD().get_metricas(db, date(2026, 3, 2), date(2026, 3, 10))
+
+    # 24 h y 48 h caen en tramos distintos de una observación cada uno
+    aprobacion = _por_transicion(resultado)[("PENDIENTE", "APROBADA")]
+    assert (aprobacion["p50_dias"], aprobacion["p90_dias"], aprobacion["p95_dias"]) == (1.0, 2.0, 2.0)
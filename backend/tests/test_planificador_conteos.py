@@ -0,0 +1,75 @@
+"""Planificación de conteos cíclicos a partir del análisis ABC"""
+
+from datetime import date
+
+import pytest
+
+import models
+from crud import PlanificadorConteosCRUD
+
+
+@pytest.fixture
+def bodega(db, crear):
+    """Una bodega con un producto A, uno B y uno C, cada uno en una ubicación"""
+    bodega = crear(models.Bodega, codigo_bodega="A", nombre_bodega="Central")
+    pasillo = crear(models.Pasillo, id_bodega=bodega.id_bodega, numero_pasillo=1)
+    estante = crear(models.Estante, id_pasillo=pasillo.id_pasillo, codigo_estante="E1")
+    productos = {}
+    # movimientos * costo: 200.000 (A), 40.000 (B) y 1.000 (C)
+    for clase, movimientos, costo in (("A", 100, 2000), ("B", 40, 1000), ("C", 10, 100)):
+        producto = crear(models.Producto, sku=f"SKU-{clase}", nombre_producto=f"Producto {clase}")
+        crear(models.ProductoUbicacion, id_producto=producto.id_producto, id_estante=estante.id_estante, cantidad=5)
+        crear(models.VistaProductosABC, id_producto=producto.id_producto, sku=producto.sku,
+              nombre_producto=producto.nombre_producto, stock_actual=5, costo_promedio=costo,
+              valor_inventario=5 * costo, movimientos_anuales=movimientos)
+        productos[clase] = producto.id_producto
+    db.commit()
+    return bodega.id_bodega, productos
+
+
+def _lineas_por_producto(db):
+    return dict(db.query(models.ProgramacionConteoLinea.id_producto,
+                         models.func.count(models.ProgramacionConteoLinea.id_linea))
+                .group_by(models.ProgramacionConteoLinea.id_producto).all())
+
+
+def test_planificar_escala_las_frecuencias_anuales_al_periodo(db, bodega):
+    id_bodega, productos = bodega
+    # 1 de enero al 31 de marzo: 89 días, A=12 por año -> 3 conteos, B y C -> 1
+    resultado = PlanificadorConteosCRUD().planificar(db, date(2027, 1, 1), date(2027, 3, 31), id_usuario_responsable=1)
+
+    assert resultado["por_clase"] == {"A": 1, "B": 1, "C": 1}
+    assert resultado["conteos_periodo"] == {"A": 3, "B": 1, "C": 1}
+    assert resultado["lineas_creadas"] == 5
+    assert _lineas_por_producto(db) == {productos["A"]: 3, productos["B"]: 1, productos["C"]: 1}
+
+    anuales = dict(db.query(models.ProgramacionConteoLinea.id_producto, models.ProgramacionConteoLinea.conteos_anuales))
+    assert anuales == {productos["A"]: 12, productos["B"]: 4, productos["C"]: 1}
+    programaciones = db.query(models.ProgramacionConteos).all()
+    assert {programacion.tipo_conteo for programacion in programaciones} == {"CICLICO"}
+    assert all(programacion.id_bodega == id_bodega for programacion in programaciones)
+    assert all(date(2027, 1, 1) <= programacion.fecha_programada <= date(2027, 3, 31)
+               and programacion.fecha_programada.weekday() < 5 for programacion in programaciones)
+
+
+def test_planificar_anio_completo_usa_las_frecuencias_configuradas(db, bodega):
+    _, productos = bodega
+    resultado = PlanificadorConteosCRUD().planificar(db, date(2028, 1, 1), date(2028, 12, 31), id_usuario_responsable=1,
+                                                     simular=True)
+
+    assert resultado["conteos_periodo"] == {"A": 12, "B": 4, "C": 1}
+    assert resultado["lineas_creadas"] == 17
+    # Simular no escribe
+    assert _lineas_por_producto(db) == {}
+
+
+def test_planificar_no_duplica_sin_reemplazar(db, bodega):
+    planificador = PlanificadorConteosCRUD()
+    planificador.planificar(db, date(2027, 1, 1), date(2027, 3, 31), id_usuario_responsable=1)
+
+    with pytest.raises(ValueError, match="reemplazar"):
+        planificador.planificar(db, date(2027, 1, 1), date(2027, 3, 31), id_usuario_responsable=1)
+
+    resultado = planificador.planificar(db, date(2027, 1, 1), date(2027, 3, 31), id_usuario_responsable=1, reemplazar=True)
+    assert resultado["programaciones_reemplazadas"] == resultado["programaciones_creadas"]
+    assert sum(_lineas_por_producto(db).values()) == 5
@@ -0,0 +1,136 @@
+"""Recepción de mercancía en bloque (RecepcionMercanciaCRUD.recibir_masivo)"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+import models
+import schemas
+from crud import recepcion_mercancia_crud
+from routes.recepciones_mercancia import create_recepcion_completa
+from utils import startup
+
+
+@pytest.fixture
+def orden(db, crear):
+    """OC con dos líneas: 10 unidades a 10 (producto 1) y 5 a 40 (producto 2)"""
+    crear(models.TipoMovimiento, codigo_tipo="ENT", nombre_tipo="Entrada por Compra")
+    usuario = crear(models.Usuarios, username="bodega", email="bodega@example.com")
+    orden = crear(models.OrdenCompra, numero_orden="OC-1", impuestos=Decimal("19"), descuentos=Decimal("0"),
+                  subtotal=Decimal("0"), total=Decimal("0"))
+    detalles, productos = [], []
+    for linea, (cantidad, precio) in enumerate(((10, 10), (5, 40)), start=1):
+        producto = crear(models.Producto, sku=f"SKU-{linea}", nombre_producto=f"Producto {linea}", stock_actual=0)
+        detalle = crear(models.OrdenCompraDetalle, id_orden_compra=orden.id_orden_compra,
+                        id_producto=producto.id_producto, numero_linea=linea,
+                        cantidad_solicitada=cantidad, cantidad_recibida=0, cantidad_pendiente=cantidad,
+                        precio_unitario=precio, precio_neto=precio, importe_total=cantidad * precio)
+        detalles.append(detalle.id_detalle)
+        productos.append(producto.id_producto)
+    db.commit()
+    return orden.id_orden_compra, usuario.id_usuario, detalles, productos
+
+
+def _recepcion(orden, numero, lineas, **extra):
+    id_orden, id_usuario, _, _ = orden
+    return schemas.RecepcionMasivaCreate(
+        numero_recepcion=numero, id_orden_compra=id_orden, id_usuario_receptor=id_usuario,
+        fecha_recepcion=date(2026, 10, 19),
+        detalles=[schemas.RecepcionMercanciaDetalleCreate(id_detalle_orden=id_detalle, cantidad_recibida=recibida,
+                                                          cantidad_aceptada=aceptada,
+                                                          cantidad_rechazada=recibida - aceptada)
+                  for id_detalle, recibida, aceptada in lineas],
+        **extra
+    )
+
+
+def _pendientes(db):
+    return dict(db.query(models.OrdenCompraDetalle.id_detalle, models.OrdenCompraDetalle.cantidad_pendiente))
+
+
+def test_recibir_masivo_actualiza_oc_stock_y_kardex(db, orden):
+    id_orden, _, (d1, d2), (p1, p2) = orden
+
+    resultado = recepcion_mercancia_crud.recibir_masivo(
+        db, _recepcion(orden, "REC-1", [(d1, 5, 4), (d1, 2, 2), (d2, 5, 5)]))
+
+    assert resultado["lineas"] == 3
+    assert resultado["lineas_orden_actualizadas"] == 2
+    assert resultado["cantidad_aceptada"] == 11
+    assert resultado["orden_completa"] is False
+    assert db.query(models.RecepcionMercanciaDetalle).count() == 3
+
+    assert _pendientes(db) == {d1: 4, d2: 0}
+    recibidas = dict(db.query(models.OrdenCompraDetalle.id_detalle, models.OrdenCompraDetalle.cantidad_recibida))
+    assert recibidas == {d1: 6, d2: 5}
+    db_orden = db.get(models.OrdenCompra, id_orden)
+    assert (db_orden.subtotal, db_orden.total) == (300, 319)
+
+    productos = {fila.id_producto: fila for fila in db.query(models.Producto)}
+    assert (productos[p1].stock_actual, productos[p1].costo_promedio) == (6, 10)
+    assert (productos[p2].stock_actual, productos[p2].costo_promedio) == (5, 40)
+    kardex = dict(db.query(models.MovimientoDetalle.id_producto, models.MovimientoDetalle.cantidad)
+                  .filter(models.MovimientoDetalle.id_movimiento == resultado["id_movimiento"]))
+    assert kardex == {p1: 6, p2: 5}
+
+
+def test_recibir_masivo_marca_la_recepcion_que_completa_la_orden(db, orden):
+    _, _, (d1, d2), _ = orden
+    recepcion_mercancia_crud.recibir_masivo(db, _recepcion(orden, "REC-1", [(d1, 6, 6)]))
+
+    resultado = recepcion_mercancia_crud.recibir_masivo(db, _recepcion(orden, "REC-2", [(d1, 4, 4), (d2, 5, 5)]))
+
+    assert resultado["orden_completa"] is True
+    assert recepcion_mercancia_crud.get_recepcion(db, resultado["id_recepcion"]).recepcion_completa is True
+    assert _pendientes(db) == {d1: 0, d2: 0}
+
+
+def test_recibir_masivo_rechaza_lo_que_supera_la_pendiente(db, orden):
+    _, _, (d1, d2), (p1, _) = orden
+
+    # Cada línea cabe, pero la suma para el detalle 1 (11) supera lo pendiente (10)
+    with pytest.raises(ValueError, match="supera la pendiente"):
+        recepcion_mercancia_crud.recibir_masivo(db, _recepcion(orden, "REC-1", [(d1, 6, 6), (d1, 5, 5), (d2, 1, 1)]))
+
+    assert db.query(models.RecepcionMercancia).count() == 0
+    assert db.query(models.RecepcionMercanciaDetalle).count() == 0
+    assert _pendientes(db) == {d1: 10, d2: 5}
+    assert db.get(models.Producto, p1).stock_actual == 0
+
+
+def test_recepcion_completa_no_toca_stock_y_rechaza_excesos_sin_registrar(db, orden):
+    _, _, (d1, d2), (p1, _) = orden
+
+    def _completa(numero, lineas):
+        solicitud = _recepcion(orden, numero, lineas)
+        return schemas.RecepcionMercanciaCompleta(
+            recepcion=schemas.RecepcionMercanciaCreate(
+                **solicitud.model_dump(exclude={"detalles", "actualizar_stock", "id_bodega"})),
+            detalles=solicitud.detalles
+        )
+
+    with pytest.raises(HTTPException) as error:
+        create_recepcion_completa(_completa("REC-1", [(d1, 3, 3), (d2, 6, 6)]), db)
+    assert error.value.status_code == 400
+    assert db.query(models.RecepcionMercancia).count() == 0
+    assert _pendientes(db) == {d1: 10, d2: 5}
+
+    respuesta = create_recepcion_completa(_completa("REC-1", [(d1, 3, 3), (d2, 5, 5)]), db)
+    assert len(respuesta.detalles) == 2
+    assert _pendientes(db) == {d1: 7, d2: 0}
+    assert db.get(models.Producto, p1).stock_actual == 0
+    assert db.query(models.MovimientoInventario).count() == 0
+
+
+def test_recibir_masivo_exige_la_migracion_en_mysql(db, orden, monkeypatch):
+    _, _, (d1, _), _ = orden
+    monkeypatch.setattr(db.get_bind().dialect, "name", "mysql")
+    monkeypatch.setattr(startup, "_MIGRACIONES_CONFIRMADAS", set())
+    db.execute(text("CREATE TABLE schema_version (version INTEGER, descripcion TEXT)"))
+    db.execute(text("INSERT INTO schema_version VALUES (5, 'despachos')"))
+
+    with pytest.raises(RuntimeError, match="recepciones_masivas.sql"):
+        recepcion_mercancia_crud.recibir_masivo(db, _recepcion(orden, "REC-1", [(d1, 1, 1)]))
@@ -0,0 +1,75 @@
+"""Numeración de documentos por series (SecuenciaDocumentoCRUD)"""
+
+from datetime import date
+
+import pytest
+
+import config
+import models
+from crud import SecuenciaDocumentoCRUD, orden_compra_crud
+
+
+def _ultimos(db):
+    return {(fila.prefijo, fila.anio): fila.ultimo_valor for fila in db.query(models.SecuenciaDocumento)}
+
+
+def test_numeros_correlativos_por_serie_y_anio(db):
+    secuencias = SecuenciaDocumentoCRUD()
+
+    numeros = [secuencias.siguiente_numero(db, "DSP", date(2026, 3, 1)) for _ in range(2)]
+    numeros.append(secuencias.siguiente_numero(db, "DSP", date(2027, 1, 5)))
+    numeros.append(secuencias.siguiente_numero(db, "RES", date(2026, 3, 1)))
+    db.commit()
+
+    assert numeros == ["DSP-2026-000001", "DSP-2026-000002", "DSP-2027-000001", "RES-2026-000001"]
+    assert _ultimos(db) == {("DSP", 2026): 2, ("DSP", 2027): 1, ("RES", 2026): 1}
+
+
+def test_serie_nueva_continua_desde_los_documentos_existentes(db, crear):
+    # Solo cuentan los números del mismo año; el orden es numérico, no alfabético
+    for numero in ("MOV-2026-000009", "MOV-2026-000012", "MOV-2025-000500"):
+        crear(models.MovimientoInventario, numero_movimiento=numero)
+    db.commit()
+    secuencias = SecuenciaDocumentoCRUD()
+
+    assert secuencias.siguiente_numero(db, "MOV", date(2026, 6, 1)) == "MOV-2026-000013"
+    assert secuencias.siguiente_numero(db, "MOV", date(2026, 6, 1)) == "MOV-2026-000014"
+    assert _ultimos(db) == {("MOV", 2026): 14}
+
+
+def test_orden_de_compra_usa_la_serie_sin_anio(db, crear):
+    crear(models.OrdenCompra, numero_orden="OC-0041")
+    db.commit()
+
+    assert orden_compra_crud.generar_siguiente_numero(db) == "OC-0042"
+    assert orden_compra_crud.generar_siguiente_numero(db) == "OC-0043"
+    assert _ultimos(db) == {("OC", 0): 43}
+
+
+def test_reservar_bloque_y_serie_desconocida(db):
+    secuencias = SecuenciaDocumentoCRUD()
+
+    assert secuencias.reservar_bloque(db, "DEV", 2026, 10) == 10
+    assert secuencias.siguiente_numero(db, "DEV", date(2026, 2, 1)) == "DEV-2026-000011"
+    with pytest.raises(ValueError, match="no definida"):
+        secuencias.siguiente_numero(db, "XYZ")
+
+
+def test_bloques_pre_asignados_se_reparten_sin_volver_al_contador(db, monkeypatch):
+    secuencias = SecuenciaDocumentoCRUD()
+    reservas = []
+
+    def reservar(db, prefijo, anio, cantidad=1):
+        reservas.append(cantidad)
+        return secuencias._incrementar_generico(db.connection(), prefijo, anio, cantidad)
+
+    # En MySQL los bloques se piden con LAST_INSERT_ID; aquí se reservan por la vía genérica
+    monkeypatch.setattr(db.get_bind().dialect, "name", "mysql")
+    monkeypatch.setattr(config, "SECUENCIA_BLOQUES", {"MOV": 3})
+    monkeypatch.setattr(secuencias, "reservar_bloque", reservar)
+
+    valores = [secuencias.siguiente_valor(db, "MOV", 2026) for _ in range(4)]
+
+    assert valores == [1, 2, 3, 4]
+    assert reservas == [3, 3]
+    assert _ultimos(db) == {("MOV", 2026): 6}
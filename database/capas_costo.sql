@@ -0,0 +1,46 @@
+-- =============================================
+-- Tablas: capas_costo, consumos_capa
+-- Descripción: Capas de costo FIFO por producto y bodega. Cada entrada
+--              valorizada (recepción, movimiento de entrada) agrega una
+--              capa por producto y documento; cada salida consume las
+--              capas más antiguas y deja un registro en consumos_capa, lo
+--              que permite valorizar el inventario a cualquier fecha.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS capas_costo (
+    id_capa INT AUTO_INCREMENT PRIMARY KEY,
+    id_producto INT NOT NULL COMMENT 'Producto',
+    id_bodega INT NULL COMMENT 'Bodega de la capa (NULL = sin bodega asignada)',
+    fecha_entrada DATETIME NOT NULL COMMENT 'Fecha de ingreso (orden FIFO)',
+    cantidad_inicial DECIMAL(14,4) NOT NULL COMMENT 'Cantidad ingresada',
+    cantidad_restante DECIMAL(14,4) NOT NULL COMMENT 'Cantidad aún no consumida',
+    costo_unitario DECIMAL(15,4) NOT NULL COMMENT 'Costo unitario de la capa',
+    origen VARCHAR(10) NOT NULL COMMENT 'APE (apertura), REC (recepción), MOV (movimiento)',
+    referencia VARCHAR(50) NULL COMMENT 'Documento de origen',
+    INDEX idx_capas_producto_fecha (id_producto, fecha_entrada, id_capa),
+    CONSTRAINT fk_capas_producto FOREIGN KEY (id_producto) REFERENCES productos(id_producto),
+    CONSTRAINT fk_capas_bodega FOREIGN KEY (id_bodega) REFERENCES bodegas(id_bodega)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Capas de costo FIFO';
+
+CREATE TABLE IF NOT EXISTS consumos_capa (
+    id_consumo INT AUTO_INCREMENT PRIMARY KEY,
+    id_capa INT NULL COMMENT 'Capa consumida (NULL = salida sin capa, al costo promedio)',
+    id_producto INT NOT NULL COMMENT 'Producto',
+    id_bodega INT NULL COMMENT 'Bodega de salida',
+    id_obra INT NULL COMMENT 'Obra de destino en despachos',
+    fecha DATETIME NOT NULL COMMENT 'Fecha de la salida',
+    cantidad DECIMAL(14,4) NOT NULL COMMENT 'Cantidad consumida de la capa',
+    costo_unitario DECIMAL(15,4) NOT NULL COMMENT 'Costo unitario aplicado',
+    origen VARCHAR(10) NOT NULL COMMENT 'DSP (despacho), MOV (movimiento)',
+    referencia VARCHAR(50) NULL COMMENT 'Documento de origen',
+    INDEX idx_consumos_capa_fecha (id_capa, fecha),
+    INDEX idx_consumos_obra_fecha (id_obra, id_producto, fecha),
+    CONSTRAINT fk_consumos_capa FOREIGN KEY (id_capa) REFERENCES capas_costo(id_capa),
+    CONSTRAINT fk_consumos_producto FOREIGN KEY (id_producto) REFERENCES productos(id_producto),
+    CONSTRAINT fk_consumos_bodega FOREIGN KEY (id_bodega) REFERENCES bodegas(id_bodega),
+    CONSTRAINT fk_consumos_obra FOREIGN KEY (id_obra) REFERENCES obras(id_obra)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Consumos de capas de costo FIFO';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(7, 'capas_costo.sql: capas de costo FIFO y sus consumos');
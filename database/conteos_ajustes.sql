@@ -0,0 +1,15 @@
+-- =============================================
+-- Tipos de movimiento para ajustes por conteo físico
+-- Descripción: El cierre de diferencias de una programación de conteo
+--              genera un movimiento AJP (sobrantes, suma stock) y uno AJN
+--              (faltantes, resta stock). AJU no sirve para esto porque es
+--              NO_AFECTA y el kardex por producto lo ignoraría.
+-- Fecha: 2026-10-19
+-- =============================================
+
+INSERT IGNORE INTO tipos_movimiento (codigo_tipo, nombre_tipo, afecta_stock, requiere_autorizacion) VALUES
+('AJP', 'Ajuste Positivo por Conteo', 'AUMENTA', FALSE),
+('AJN', 'Ajuste Negativo por Conteo', 'DISMINUYE', FALSE);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(14, 'conteos_ajustes.sql: tipos de movimiento AJP/AJN para ajustes por conteo');
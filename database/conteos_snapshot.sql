@@ -0,0 +1,30 @@
+-- =============================================
+-- Tabla: conteos_snapshot
+-- Descripción: Cantidades del sistema congeladas al iniciar una
+--              programación de conteo (una consulta INSERT ... SELECT por
+--              fuente). La captura en lote de conteos físicos toma
+--              cantidad_sistema de aquí, no del stock vivo, para que los
+--              movimientos posteriores no alteren las diferencias.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS conteos_snapshot (
+    id_snapshot INT AUTO_INCREMENT PRIMARY KEY,
+    id_programacion INT NOT NULL,
+    id_producto INT NOT NULL,
+    id_ubicacion INT NULL COMMENT 'NULL con id_obra NULL = stock total del producto',
+    id_obra INT NULL,
+    cantidad_sistema INT NOT NULL,
+    fecha_snapshot DATETIME NOT NULL,
+    INDEX idx_conteos_snapshot_programacion (id_programacion, id_producto),
+    FOREIGN KEY (id_programacion) REFERENCES programacion_conteos(id_programacion),
+    FOREIGN KEY (id_producto) REFERENCES productos(id_producto),
+    FOREIGN KEY (id_ubicacion) REFERENCES producto_ubicaciones(id_ubicacion),
+    FOREIGN KEY (id_obra) REFERENCES obras(id_obra)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Cantidades del sistema al iniciar cada conteo';
+
+-- La captura en lote busca los conteos ya registrados por programación y producto
+CREATE INDEX idx_conteos_fisicos_programacion_producto ON conteos_fisicos (id_programacion, id_producto);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(13, 'conteos_snapshot.sql: snapshot de cantidades para conteos físicos');
@@ -0,0 +1,19 @@
+-- =============================================
+-- Despachos a obra en bloque
+-- Descripción: Elimina el trigger por fila tr_after_despacho_detail_insert.
+--              Los efectos de stock (bodega e inventario en obra) los aplica
+--              la aplicación (DespachosObraCRUD.despachar_masivo y
+--              DespachosObraDetalleCRUD.create_detalle), que también
+--              actualiza disponibilidad, capas de costo y kardex.
+--              Se elimina sp_despachar_material_obra: sin el trigger
+--              dejaría el despacho sin efectos de stock. La aplicación no
+--              lo usa y no se vuelve a crear.
+-- Fecha: 2026-10-19
+-- =============================================
+
+DROP TRIGGER IF EXISTS tr_after_despacho_detail_insert;
+
+DROP PROCEDURE IF EXISTS sp_despachar_material_obra;
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(5, 'despachos_masivos.sql: efectos de stock de despachos sin trigger por fila');
@@ -0,0 +1,64 @@
+-- =============================================
+-- Tabla: disponibilidad_productos
+-- Descripción: Disponibilidad (ATP) materializada por producto y ubicación.
+--              id_ubicacion = 0 es el total del producto (stock_actual y
+--              pendiente de OC abiertas). El backend la mantiene de forma
+--              incremental al crear/modificar reservas, procesar movimientos
+--              y cambiar OC; POST /api/v1/disponibilidad/recalcular la
+--              reconstruye completa.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS disponibilidad_productos (
+    id_producto INT NOT NULL COMMENT 'Producto',
+    id_ubicacion INT NOT NULL DEFAULT 0 COMMENT 'Ubicación (0 = total del producto)',
+    en_mano DECIMAL(14,4) NOT NULL DEFAULT 0 COMMENT 'Stock físico',
+    reservado DECIMAL(14,4) NOT NULL DEFAULT 0 COMMENT 'Reservas activas',
+    en_transito DECIMAL(14,4) NOT NULL DEFAULT 0 COMMENT 'Pendiente de recibir en OC abiertas (solo fila total)',
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_producto, id_ubicacion),
+    CONSTRAINT fk_disponibilidad_producto FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Disponibilidad materializada (ATP)';
+
+-- Carga inicial: totales por producto
+INSERT INTO disponibilidad_productos (id_producto, id_ubicacion, en_mano, reservado, en_transito)
+SELECT
+    p.id_producto,
+    0,
+    COALESCE(p.stock_actual, 0),
+    COALESCE(r.reservado, 0),
+    COALESCE(t.en_transito, 0)
+FROM productos p
+LEFT JOIN (
+    SELECT id_producto, SUM(cantidad_reservada) AS reservado
+    FROM reservas WHERE estado = 'ACTIVA'
+    GROUP BY id_producto
+) r ON r.id_producto = p.id_producto
+LEFT JOIN (
+    SELECT d.id_producto, SUM(d.cantidad_pendiente) AS en_transito
+    FROM ordenes_compra_detalle d
+    INNER JOIN ordenes_compra oc ON oc.id_orden_compra = d.id_orden_compra
+    INNER JOIN estados_orden_compra e ON e.id_estado = oc.id_estado
+    WHERE oc.activo = TRUE AND d.activo = TRUE AND d.cantidad_pendiente > 0
+      AND e.es_estado_inicial = FALSE AND e.es_estado_final = FALSE
+    GROUP BY d.id_producto
+) t ON t.id_producto = p.id_producto
+ON DUPLICATE KEY UPDATE en_mano = VALUES(en_mano), reservado = VALUES(reservado), en_transito = VALUES(en_transito);
+
+-- Carga inicial: por ubicación
+INSERT INTO disponibilidad_productos (id_producto, id_ubicacion, en_mano, reservado)
+SELECT
+    pu.id_producto,
+    pu.id_ubicacion,
+    pu.cantidad,
+    COALESCE(r.reservado, 0)
+FROM producto_ubicaciones pu
+LEFT JOIN (
+    SELECT id_ubicacion, SUM(cantidad_reservada) AS reservado
+    FROM reservas WHERE estado = 'ACTIVA'
+    GROUP BY id_ubicacion
+) r ON r.id_ubicacion = pu.id_ubicacion
+ON DUPLICATE KEY UPDATE en_mano = VALUES(en_mano), reservado = VALUES(reservado);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(3, 'disponibilidad_productos.sql: disponibilidad materializada (ATP)');
@@ -0,0 +1,29 @@
+-- =============================================
+-- Tabla: ejecuciones_alertas
+-- Descripción: Registro de cada evaluación de una regla de
+--              configuracion_alertas por el motor de alertas: duración,
+--              filas que cumplen la regla, alertas nuevas y resueltas.
+--              La última ejecución define cuándo corresponde la siguiente
+--              según frecuencia_revision_horas.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS ejecuciones_alertas (
+    id_ejecucion INT AUTO_INCREMENT PRIMARY KEY,
+    id_alerta INT NOT NULL COMMENT 'Regla evaluada',
+    fecha_ejecucion DATETIME NOT NULL COMMENT 'Inicio de la evaluación',
+    duracion_ms DECIMAL(12,2) NOT NULL DEFAULT 0 COMMENT 'Duración de la evaluación',
+    candidatos INT NOT NULL DEFAULT 0 COMMENT 'Filas que cumplen la regla',
+    nuevas INT NOT NULL DEFAULT 0 COMMENT 'Alertas insertadas',
+    resueltas INT NOT NULL DEFAULT 0 COMMENT 'Alertas cerradas porque la condición ya no se cumple',
+    estado ENUM('OK', 'ERROR') NOT NULL DEFAULT 'OK',
+    error TEXT NULL,
+    INDEX idx_ejecuciones_alerta_fecha (id_alerta, fecha_ejecucion),
+    CONSTRAINT fk_ejecuciones_alerta FOREIGN KEY (id_alerta) REFERENCES configuracion_alertas(id_alerta)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Ejecuciones del motor de alertas';
+
+-- Búsqueda de alertas abiertas por regla al evitar duplicados
+CREATE INDEX idx_log_alertas_regla_estado ON log_alertas (id_alerta, estado);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(9, 'ejecuciones_alertas.sql: registro del motor de evaluación de alertas');
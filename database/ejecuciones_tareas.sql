@@ -0,0 +1,27 @@
+-- =============================================
+-- Tabla: ejecuciones_tareas
+-- Descripción: Historial de las tareas periódicas del planificador en
+--              proceso (reservas vencidas, limpieza de alertas, ...). Una
+--              fila por ejecución, programada o manual, con su duración y
+--              el resultado retornado. La última ejecución de cada tarea
+--              define su próxima ejecución tras un reinicio o un cambio
+--              de worker líder.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS ejecuciones_tareas (
+    id_ejecucion INT AUTO_INCREMENT PRIMARY KEY,
+    tarea VARCHAR(100) NOT NULL,
+    origen ENUM('PROGRAMADA', 'MANUAL') NOT NULL DEFAULT 'PROGRAMADA',
+    fecha_inicio DATETIME NOT NULL,
+    fecha_fin DATETIME NULL,
+    duracion_ms DECIMAL(12,2) NULL,
+    estado ENUM('EN_CURSO', 'OK', 'ERROR') NOT NULL DEFAULT 'EN_CURSO',
+    resultado TEXT NULL COMMENT 'JSON retornado por la tarea',
+    error TEXT NULL,
+    worker VARCHAR(100) NULL COMMENT 'host:pid que ejecutó la tarea',
+    INDEX idx_ejecuciones_tarea_fecha (tarea, fecha_inicio)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Historial del planificador de tareas';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(10, 'ejecuciones_tareas.sql: historial del planificador de tareas');
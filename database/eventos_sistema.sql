@@ -0,0 +1,22 @@
+-- =============================================
+-- Tabla: eventos_sistema
+-- Descripción: Broker local de los eventos en vivo (SSE) cuando la API
+--              corre con varios workers (EVENTOS_BROKER=db). Cada worker
+--              inserta los eventos de sus transacciones confirmadas y lee
+--              los nuevos por id con una consulta por intervalo, que luego
+--              reparte a sus conexiones abiertas. Las filas se purgan a las
+--              24 horas con una tarea programada.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS eventos_sistema (
+    id_evento INT AUTO_INCREMENT PRIMARY KEY,
+    tema VARCHAR(50) NOT NULL COMMENT 'alertas, stock, workflow',
+    tipo VARCHAR(100) NOT NULL,
+    datos TEXT NULL COMMENT 'JSON',
+    fecha DATETIME NOT NULL,
+    INDEX idx_eventos_sistema_fecha (fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Eventos en vivo compartidos entre workers';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(12, 'eventos_sistema.sql: broker de eventos en vivo entre workers');
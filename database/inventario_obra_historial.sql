@@ -0,0 +1,23 @@
+-- =============================================
+-- Tabla: inventario_obra_historial
+-- Descripción: Historial compacto de cambios de stock en obra. Reemplaza
+--              la concatenación de notas en inventario_obra.observaciones
+--              en cada cambio de stock.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS inventario_obra_historial (
+    id_historial INT AUTO_INCREMENT PRIMARY KEY,
+    id_obra INT NOT NULL COMMENT 'Obra',
+    id_producto INT NOT NULL COMMENT 'Producto',
+    cantidad_cambio INT NOT NULL COMMENT 'Variación aplicada (negativa = salida)',
+    motivo VARCHAR(200) NULL COMMENT 'Motivo del cambio',
+    referencia VARCHAR(50) NULL COMMENT 'Documento de origen (despacho, devolución, ...)',
+    fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_historial_obra_producto (id_obra, id_producto, fecha),
+    CONSTRAINT fk_historial_obra FOREIGN KEY (id_obra) REFERENCES obras(id_obra),
+    CONSTRAINT fk_historial_producto FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Historial de cambios de stock en obra';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(4, 'inventario_obra_historial.sql: historial de cambios de stock en obra');
@@ -0,0 +1,12 @@
+-- =============================================
+-- Índice para el kardex por producto
+-- Descripción: El kardex lee los detalles de un producto y los une con su
+--              movimiento; el índice evita recorrer movimientos_detalle
+--              completo en productos con muchos movimientos.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE INDEX idx_md_producto_movimiento ON movimientos_detalle (id_producto, id_movimiento);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(8, 'kardex.sql: índice de movimientos_detalle por producto');
@@ -0,0 +1,33 @@
+-- =============================================
+-- Tabla: metricas_workflow_diarias
+-- Descripción: Tiempos entre cambios de estado de las órdenes de compra
+--              (historial_estados_oc con LAG()) agregados por día,
+--              proveedor, transición y tramo de duración. Los tramos
+--              permiten estimar percentiles con SUM() sin leer el
+--              historial completo. La tarea consolidar_metricas_workflow
+--              la completa cada noche.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS metricas_workflow_diarias (
+    id_metrica INT AUTO_INCREMENT PRIMARY KEY,
+    fecha DATE NOT NULL COMMENT 'Día en que ocurrió el cambio de estado',
+    id_proveedor INT NOT NULL,
+    id_estado_anterior INT NULL COMMENT 'NULL: desde la creación de la orden',
+    id_estado_nuevo INT NOT NULL,
+    tramo TINYINT NOT NULL COMMENT 'Tramo de duración en horas (ver MetricasWorkflowCRUD.TRAMOS_HORAS)',
+    cantidad INT NOT NULL,
+    segundos_total BIGINT NOT NULL,
+    segundos_minimo BIGINT NOT NULL,
+    segundos_maximo BIGINT NOT NULL,
+    INDEX idx_metricas_workflow_diarias_fecha (fecha, id_proveedor),
+    FOREIGN KEY (id_proveedor) REFERENCES proveedores(id_proveedor),
+    FOREIGN KEY (id_estado_anterior) REFERENCES estados_orden_compra(id_estado),
+    FOREIGN KEY (id_estado_nuevo) REFERENCES estados_orden_compra(id_estado)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Tiempos del workflow de OC agregados por día';
+
+-- LAG() OVER (PARTITION BY id_orden_compra ORDER BY fecha_cambio) recorre este índice
+CREATE INDEX idx_historial_estados_oc_orden_fecha ON historial_estados_oc (id_orden_compra, fecha_cambio);
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(16, 'metricas_workflow_diarias.sql: tiempos del workflow de OC por día');
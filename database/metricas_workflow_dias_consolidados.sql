@@ -0,0 +1,19 @@
+-- =============================================
+-- Tabla: metricas_workflow_dias_consolidados
+-- Descripción: Días ya consolidados en metricas_workflow_diarias. Un día
+--              sin cambios de estado no deja filas en la tabla de métricas,
+--              por lo que la consolidación se registra aquí por día: las
+--              consultas leen del agregado solo estos días y calculan los
+--              demás desde historial_estados_oc, y la tarea nocturna
+--              completa los días que falten (también los anteriores).
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS metricas_workflow_dias_consolidados (
+    fecha DATE PRIMARY KEY COMMENT 'Día cerrado consolidado',
+    transiciones INT NOT NULL DEFAULT 0 COMMENT 'Cambios de estado del día',
+    fecha_consolidacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Días consolidados de metricas_workflow_diarias';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(17, 'metricas_workflow_dias_consolidados.sql: días consolidados de las métricas del workflow');
@@ -0,0 +1,26 @@
+-- =============================================
+-- Tabla: programacion_conteos_lineas
+-- Descripción: Productos y ubicaciones que debe contar cada programación
+--              CICLICO generada por el planificador de conteos cíclicos
+--              (frecuencia por clase ABC, exactitud y valor, repartida en
+--              días hábiles con carga pareja por bodega). El snapshot del
+--              conteo se limita a estas líneas.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS programacion_conteos_lineas (
+    id_linea INT AUTO_INCREMENT PRIMARY KEY,
+    id_programacion INT NOT NULL,
+    id_producto INT NOT NULL,
+    id_ubicacion INT NULL,
+    clase_abc CHAR(1) NULL COMMENT 'Clase ABC usada al planificar',
+    conteos_anuales INT NULL COMMENT 'Frecuencia asignada al producto',
+    motivo VARCHAR(100) NULL COMMENT 'Ajuste de la frecuencia de su clase',
+    INDEX idx_programacion_conteos_lineas_programacion (id_programacion, id_producto),
+    FOREIGN KEY (id_programacion) REFERENCES programacion_conteos(id_programacion),
+    FOREIGN KEY (id_producto) REFERENCES productos(id_producto),
+    FOREIGN KEY (id_ubicacion) REFERENCES producto_ubicaciones(id_ubicacion)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Líneas de las programaciones de conteo cíclico';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(15, 'programacion_conteos_lineas.sql: líneas de conteos cíclicos planificados');
@@ -0,0 +1,17 @@
+-- =============================================
+-- Recepciones de mercancía en bloque
+-- Descripción: Elimina los triggers por fila sobre ordenes_compra_detalle.
+--              La aplicación actualiza cantidad_pendiente y los totales de
+--              la OC una vez por recepción (RecepcionMercanciaCRUD.recibir_masivo)
+--              o por cambio de detalle (OrdenCompraDetalleCRUD).
+--              tr_actualizar_cantidad_pendiente además actualizaba la misma
+--              tabla que lo dispara, lo que MySQL rechaza (error 1442).
+-- Fecha: 2026-10-19
+-- =============================================
+
+DROP TRIGGER IF EXISTS tr_actualizar_cantidad_pendiente;
+DROP TRIGGER IF EXISTS tr_actualizar_totales_orden;
+DROP TRIGGER IF EXISTS tr_actualizar_totales_orden_update;
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(6, 'recepciones_masivas.sql: recepciones sin triggers por fila en ordenes_compra_detalle');
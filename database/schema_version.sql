@@ -0,0 +1,16 @@
+-- =============================================
+-- Tabla: schema_version
+-- Descripción: Versión del esquema aplicada. El backend en STARTUP_MODE=fast
+--              no ejecuta DDL y solo compara esta versión con la requerida.
+--              Cada script de migración nuevo debe registrar su versión aquí.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT NOT NULL PRIMARY KEY COMMENT 'Número de versión del esquema',
+    descripcion VARCHAR(200) NOT NULL COMMENT 'Script o cambio aplicado',
+    fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha en que se aplicó la versión'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Control de versiones del esquema';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(1, 'Esquema base (init.sql, ordenes_compra.sql, documentos_compra.sql y scripts asociados)');
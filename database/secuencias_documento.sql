@@ -0,0 +1,118 @@
+-- =============================================
+-- Tabla: secuencias_documento
+-- Descripción: Contadores de numeración de documentos (OC, DSP, DEV, RES, MOV).
+--              Reemplaza la generación con MAX()/COUNT(*)+1, que bajo
+--              concurrencia entrega números duplicados. El backend incrementa
+--              la fila con UPDATE ... LAST_INSERT_ID(ultimo_valor + n) en una
+--              transacción corta propia.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS secuencias_documento (
+    prefijo VARCHAR(10) NOT NULL COMMENT 'Serie: OC, DSP, DEV, RES, MOV',
+    anio INT NOT NULL DEFAULT 0 COMMENT 'Año de la serie; 0 = sin reinicio anual',
+    ultimo_valor INT NOT NULL DEFAULT 0 COMMENT 'Último número asignado',
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (prefijo, anio)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Contadores de numeración de documentos';
+
+-- Inicializar los contadores con los números ya emitidos
+INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+SELECT 'OC', 0, COALESCE(MAX(CAST(SUBSTRING_INDEX(numero_orden, '-', -1) AS UNSIGNED)), 0)
+FROM ordenes_compra WHERE numero_orden LIKE 'OC-%'
+ON DUPLICATE KEY UPDATE ultimo_valor = GREATEST(ultimo_valor, VALUES(ultimo_valor));
+
+INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+SELECT 'DSP', CAST(SUBSTRING(numero_despacho, 5, 4) AS UNSIGNED), MAX(CAST(SUBSTRING_INDEX(numero_despacho, '-', -1) AS UNSIGNED))
+FROM despachos_obra WHERE numero_despacho LIKE 'DSP-____-%'
+GROUP BY CAST(SUBSTRING(numero_despacho, 5, 4) AS UNSIGNED)
+ON DUPLICATE KEY UPDATE ultimo_valor = GREATEST(ultimo_valor, VALUES(ultimo_valor));
+
+INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+SELECT 'DEV', CAST(SUBSTRING(numero_devolucion, 5, 4) AS UNSIGNED), MAX(CAST(SUBSTRING_INDEX(numero_devolucion, '-', -1) AS UNSIGNED))
+FROM devoluciones_obra WHERE numero_devolucion LIKE 'DEV-____-%'
+GROUP BY CAST(SUBSTRING(numero_devolucion, 5, 4) AS UNSIGNED)
+ON DUPLICATE KEY UPDATE ultimo_valor = GREATEST(ultimo_valor, VALUES(ultimo_valor));
+
+INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+SELECT 'RES', CAST(SUBSTRING(numero_reserva, 5, 4) AS UNSIGNED), MAX(CAST(SUBSTRING_INDEX(numero_reserva, '-', -1) AS UNSIGNED))
+FROM reservas WHERE numero_reserva LIKE 'RES-____-%'
+GROUP BY CAST(SUBSTRING(numero_reserva, 5, 4) AS UNSIGNED)
+ON DUPLICATE KEY UPDATE ultimo_valor = GREATEST(ultimo_valor, VALUES(ultimo_valor));
+
+INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+SELECT 'MOV', CAST(SUBSTRING(numero_movimiento, 5, 4) AS UNSIGNED), MAX(CAST(SUBSTRING_INDEX(numero_movimiento, '-', -1) AS UNSIGNED))
+FROM movimientos_inventario WHERE numero_movimiento LIKE 'MOV-____-%'
+GROUP BY CAST(SUBSTRING(numero_movimiento, 5, 4) AS UNSIGNED)
+ON DUPLICATE KEY UPDATE ultimo_valor = GREATEST(ultimo_valor, VALUES(ultimo_valor));
+
+-- Procedimiento de despacho: número desde el contador en lugar de COUNT(*) + 1
+DROP PROCEDURE IF EXISTS sp_despachar_material_obra;
+
+DELIMITER //
+CREATE PROCEDURE sp_despachar_material_obra(
+    IN p_id_obra INT,
+    IN p_id_almacen_obra INT,
+    IN p_id_solicitud INT,
+    IN p_fecha_despacho DATE,
+    IN p_id_usuario_despacha INT,
+    IN p_observaciones TEXT,
+    OUT p_numero_despacho VARCHAR(50),
+    OUT p_resultado VARCHAR(100)
+)
+BEGIN
+    DECLARE v_id_despacho INT;
+    DECLARE v_numero INT;
+    
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        SET p_resultado = 'ERROR: No se pudo procesar el despacho';
+        SET p_numero_despacho = NULL;
+    END;
+    
+    START TRANSACTION;
+    
+    -- Generar número de despacho (incremento atómico del contador anual)
+    INSERT INTO secuencias_documento (prefijo, anio, ultimo_valor)
+    VALUES ('DSP', YEAR(p_fecha_despacho), 1)
+    ON DUPLICATE KEY UPDATE ultimo_valor = LAST_INSERT_ID(ultimo_valor + 1);
+    SET v_numero = IF(ROW_COUNT() = 1, 1, LAST_INSERT_ID());
+    SET p_numero_despacho = CONCAT('DSP-', YEAR(p_fecha_despacho), '-', LPAD(v_numero, 6, '0'));
+    
+    -- Crear el despacho
+    INSERT INTO despachos_obra (
+        numero_despacho, id_obra, id_almacen_obra, id_solicitud,
+        fecha_despacho, id_usuario_despacha, observaciones, estado
+    ) VALUES (
+        p_numero_despacho, p_id_obra, p_id_almacen_obra, p_id_solicitud,
+        p_fecha_despacho, p_id_usuario_despacha, p_observaciones, 'PREPARADO'
+    );
+    
+    SET v_id_despacho = LAST_INSERT_ID();
+    
+    -- Si hay solicitud, copiar el detalle autorizado
+    IF p_id_solicitud IS NOT NULL THEN
+        INSERT INTO despachos_obra_detalle (
+            id_despacho, id_producto, cantidad_despachada, costo_unitario, costo_total
+        )
+        SELECT 
+            v_id_despacho,
+            sod.id_producto,
+            sod.cantidad_autorizada,
+            p.costo_promedio,
+            sod.cantidad_autorizada * p.costo_promedio
+        FROM solicitudes_obra_detalle sod
+        INNER JOIN productos p ON sod.id_producto = p.id_producto
+        WHERE sod.id_solicitud = p_id_solicitud 
+          AND sod.cantidad_autorizada > 0;
+    END IF;
+    
+    COMMIT;
+    SET p_resultado = 'DESPACHO_CREADO_EXITOSAMENTE';
+    
+END //
+DELIMITER ;
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(2, 'secuencias_documento.sql: contadores de numeración de documentos');
@@ -0,0 +1,39 @@
+-- =============================================
+-- Tabla: trabajos_cola
+-- Descripción: Cola durable de trabajos en segundo plano (procesamiento de
+--              lotes XML, estadísticas ABC, exportación de PDF, evaluación
+--              de alertas). Los workers toman el trabajo pendiente de mayor
+--              prioridad con SELECT ... FOR UPDATE SKIP LOCKED y lo
+--              reservan por un lease (bloqueado_hasta) que renuevan mientras
+--              trabajan; si el worker muere, el lease vence y el trabajo
+--              vuelve a la cola. Los fallos se reintentan con backoff
+--              exponencial hasta max_intentos.
+-- Fecha: 2026-10-19
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS trabajos_cola (
+    id_trabajo INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(100) NOT NULL,
+    parametros TEXT NULL COMMENT 'JSON con los argumentos del trabajo',
+    prioridad INT NOT NULL DEFAULT 0 COMMENT 'Mayor se toma primero',
+    estado ENUM('PENDIENTE', 'EN_PROCESO', 'COMPLETADO', 'ERROR', 'CANCELADO') NOT NULL DEFAULT 'PENDIENTE',
+    intentos INT NOT NULL DEFAULT 0,
+    max_intentos INT NOT NULL DEFAULT 3,
+    disponible_desde DATETIME NOT NULL COMMENT 'No se toma antes (reintentos con backoff)',
+    bloqueado_hasta DATETIME NULL COMMENT 'Fin del lease del worker actual',
+    worker VARCHAR(100) NULL,
+    progreso DECIMAL(5,2) NOT NULL DEFAULT 0,
+    mensaje_progreso VARCHAR(255) NULL,
+    resultado MEDIUMTEXT NULL COMMENT 'JSON retornado por el trabajo',
+    error TEXT NULL,
+    id_usuario INT NULL,
+    fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio DATETIME NULL,
+    fecha_fin DATETIME NULL,
+    INDEX idx_trabajos_cola_toma (estado, prioridad, disponible_desde),
+    INDEX idx_trabajos_cola_lease (estado, bloqueado_hasta),
+    CONSTRAINT fk_trabajos_cola_usuario FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Cola de trabajos en segundo plano';
+
+INSERT IGNORE INTO schema_version (version, descripcion) VALUES
+(11, 'trabajos_cola.sql: cola durable de trabajos en segundo plano');